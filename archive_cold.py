@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+冷热分离：把较早的归档票据从 app.db 移入 cold.db（同目录），热库只保留近期与流转中的票据。
+
+- 移动对象：status 为 archived / rejected-modified 且票据日期早于截止日期的票据，连同其 bill_events 流转事件
+  与 bill_edits 修改记录（originalId 或 newId 为该票据）
+- 冷库结构与索引按热库同步（与后端 attachCold 相同口径：复制建表语句、补齐后加的列、复制索引）
+- 分批移动：每批在一个 BEGIN IMMEDIATE 事务内 INSERT OR REPLACE 到冷库、核对冷库行数与热库一致后再从热库删除，
+  任一数量不符即回滚该批并退出；批间休眠让出写锁，后端可继续处理请求
+- WAL 模式下跨库提交并非整体原子：若进程恰在提交间隙崩溃，同一票据可能同时存在于两库；
+  后端读取时以热库为准，重新执行本工具即可收敛（冷库写入为 INSERT OR REPLACE，可重复执行）
+- 统计汇总表（stats_*）不受影响；gc_uploads.py / backup.py / stats.py 会同时读取 cold.db，图片文件不移动
+
+后端以 ATTACH 方式读取冷库：详情、修改记录、归档列表、状态计数、导出与统计重建自动包含冷数据，
+待办与审批等热路径只访问热库。
+
+用法：
+  python3 archive_cold.py --older-than 1y --dry-run    # 只统计将移动的票据
+  python3 archive_cold.py --older-than 1y              # 移动一年前的归档票据
+  python3 archive_cold.py --before 2024-01-01 --batch 1000
+  python3 archive_cold.py --verify                     # 核对两库无重复、冷库引用完整
+"""
+
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, 'server', 'data')
+DEFAULT_DB = os.path.join(DATA_DIR, 'app.db')
+DEFAULT_COLD = os.path.join(DATA_DIR, 'cold.db')
+COLD_TABLES = ('bills', 'bill_events', 'bill_edits')
+COLD_STATUSES = ('archived', 'rejected-modified')
+DEFAULT_AGE = '1y'
+BATCH = 500
+SLEEP = 0.05
+
+
+def parse_age(text):
+    """1y / 6m / 90d → 截止日期字符串 YYYY-MM-DD（票据日期早于该日的才移动）。"""
+    s = str(text).strip().lower()
+    m = re.fullmatch(r'(\d+)([ymd])', s)
+    if not m:
+        raise RuntimeError(f'无法解析时长：{text}（示例：1y、6m、90d）')
+    n, unit = int(m.group(1)), m.group(2)
+    today = datetime.date.today()
+    if unit == 'd':
+        return (today - datetime.timedelta(days=n)).isoformat()
+    months = n * 12 if unit == 'y' else n
+    y, mo = divmod(today.year * 12 + today.month - 1 - months, 12)
+    return datetime.date(y, mo + 1, min(today.day, 28)).isoformat()
+
+
+def connect(db_path, cold_path):
+    if not os.path.isfile(db_path):
+        raise RuntimeError(f"数据库不存在：{db_path}")
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA busy_timeout = 30000')
+    conn.execute('ATTACH DATABASE ? AS cold', (cold_path,))
+    conn.execute('PRAGMA cold.journal_mode = WAL')
+    return conn
+
+
+def columns(conn, schema, table):
+    return [r[1] for r in conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+
+def ensure_cold_schema(conn):
+    """按热库同步冷库的表结构与索引（与 server/index.cjs 的 attachCold 一致）。"""
+    for t in COLD_TABLES:
+        row = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (t,)).fetchone()
+        if not row:
+            raise RuntimeError(f'热库缺少 {t} 表（先启动一次后端完成建表与迁移）')
+        conn.execute(re.sub(r'^CREATE TABLE\s+(IF NOT EXISTS\s+)?["`]?\w+["`]?', f'CREATE TABLE IF NOT EXISTS cold.{t}',
+                            row[0], flags=re.I))
+        have = set(columns(conn, 'cold', t))
+        for _, name, ctype, *_ in conn.execute(f'PRAGMA main.table_info({t})'):
+            if name not in have:
+                conn.execute(f'ALTER TABLE cold.{t} ADD COLUMN {name} {ctype or ""}')
+    marks = ','.join('?' * len(COLD_TABLES))
+    for (sql,) in conn.execute(f"SELECT sql FROM main.sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+                               f"AND tbl_name IN ({marks})", COLD_TABLES).fetchall():
+        conn.execute(re.sub(r'^CREATE (UNIQUE )?INDEX\s+(IF NOT EXISTS\s+)?["`]?(\w+)["`]?',
+                            lambda m: f'CREATE {m.group(1) or ""}INDEX IF NOT EXISTS cold.{m.group(3)}', sql, flags=re.I))
+
+
+def candidates(conn, cutoff, statuses):
+    marks = ','.join('?' * len(statuses))
+    return [r[0] for r in conn.execute(f'SELECT id FROM main.bills WHERE status IN ({marks}) AND date < ? '
+                                       f'ORDER BY date, id', (*statuses, cutoff))]
+
+
+def _count(conn, sql, params):
+    return conn.execute(sql, params).fetchone()[0]
+
+
+def move_batch(conn, ids, cutoff, statuses):
+    """在一个事务内移动一批票据，返回 (票据, 事件, 修改记录) 行数；核对不一致时回滚并抛出异常。"""
+    smarks = ','.join('?' * len(statuses))
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # 事务内重新筛选：状态或日期在扫描后被修改的票据不移动
+        ids = [r[0] for r in conn.execute(
+            f"SELECT id FROM main.bills WHERE id IN ({','.join('?' * len(ids))}) AND status IN ({smarks}) AND date < ?",
+            (*ids, *statuses, cutoff))]
+        if not ids:
+            conn.execute('COMMIT')
+            return 0, 0, 0
+        marks = ','.join('?' * len(ids))
+        where = {
+            'bills': (f'id IN ({marks})', ids),
+            'bill_events': (f'billId IN ({marks})', ids),
+            'bill_edits': (f'originalId IN ({marks}) OR newId IN ({marks})', ids + ids),
+        }
+        moved = []
+        for t in COLD_TABLES:
+            cond, params = where[t]
+            cols = ', '.join(columns(conn, 'main', t))
+            expected = _count(conn, f'SELECT COUNT(*) FROM main.{t} WHERE {cond}', params)
+            conn.execute(f'INSERT OR REPLACE INTO cold.{t} ({cols}) SELECT {cols} FROM main.{t} WHERE {cond}', params)
+            copied = _count(conn, f'SELECT COUNT(*) FROM cold.{t} WHERE {cond}', params)
+            if copied < expected:
+                raise RuntimeError(f'{t} 核对失败：热库 {expected} 行，冷库仅 {copied} 行')
+            deleted = conn.execute(f'DELETE FROM main.{t} WHERE {cond}', params).rowcount
+            if deleted != expected:
+                raise RuntimeError(f'{t} 核对失败：应删除 {expected} 行，实际 {deleted} 行')
+            moved.append(deleted)
+        conn.execute('COMMIT')
+        return tuple(moved)
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def verify(conn):
+    """返回问题列表：两库重复的票据、冷库中无对应票据的事件。"""
+    problems = []
+    dup = _count(conn, 'SELECT COUNT(*) FROM cold.bills c JOIN main.bills m ON m.id = c.id', ())
+    if dup:
+        problems.append(f'{dup} 张票据同时存在于热库与冷库（重新执行归档即可收敛）')
+    orphan = _count(conn, 'SELECT COUNT(*) FROM cold.bill_events e WHERE NOT EXISTS '
+                          '(SELECT 1 FROM cold.bills b WHERE b.id = e.billId)', ())
+    if orphan:
+        problems.append(f'冷库中有 {orphan} 条流转事件没有对应票据')
+    left = _count(conn, 'SELECT COUNT(*) FROM main.bill_events e WHERE NOT EXISTS '
+                        '(SELECT 1 FROM main.bills b WHERE b.id = e.billId) AND EXISTS '
+                        '(SELECT 1 FROM cold.bills b WHERE b.id = e.billId)', ())
+    if left:
+        problems.append(f'热库中有 {left} 条流转事件属于已移入冷库的票据')
+    return problems
+
+
+def _fmt_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.1f}{unit}" if unit != 'B' else f"{n}B"
+        n /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把较早的归档票据移入冷库 cold.db。')
+    parser.add_argument('--db', default=DEFAULT_DB, help='热库路径（默认 server/data/app.db）')
+    parser.add_argument('--cold', default=None, help='冷库路径（默认与热库同目录的 cold.db，后端只读取该位置）')
+    age = parser.add_mutually_exclusive_group()
+    age.add_argument('--older-than', default=DEFAULT_AGE, help=f'票据日期早于多久之前，如 1y、6m、90d（默认 {DEFAULT_AGE}）')
+    age.add_argument('--before', help='票据日期早于该日（YYYY-MM-DD）')
+    parser.add_argument('--status', default=','.join(COLD_STATUSES),
+                        help=f'移动的票据状态，逗号分隔（默认 {",".join(COLD_STATUSES)}）')
+    parser.add_argument('--batch', type=int, default=BATCH, help=f'每批票据数（默认 {BATCH}）')
+    parser.add_argument('--sleep', type=float, default=SLEEP, help=f'批间休眠秒数（默认 {SLEEP}）')
+    parser.add_argument('--dry-run', action='store_true', help='只统计，不移动')
+    parser.add_argument('--verify', action='store_true', help='只核对两库一致性')
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db)
+    cold_path = os.path.abspath(args.cold or os.path.join(os.path.dirname(db_path), 'cold.db'))
+    statuses = tuple(s.strip() for s in args.status.split(',') if s.strip())
+    bad = [s for s in statuses if s not in COLD_STATUSES]
+    if bad:
+        raise RuntimeError(f'只能移动已结束流转的票据状态 {COLD_STATUSES}，不支持：{bad}')
+    cutoff = args.before or parse_age(args.older_than)
+    if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', cutoff):
+        raise RuntimeError(f'日期格式应为 YYYY-MM-DD：{cutoff}')
+
+    conn = connect(db_path, cold_path)
+    try:
+        ensure_cold_schema(conn)
+        if args.verify:
+            problems = verify(conn)
+            for p in problems:
+                print(f'  {p}')
+            if problems:
+                print(f'[cold] 核对发现 {len(problems)} 个问题')
+                sys.exit(1)
+            hot = _count(conn, 'SELECT COUNT(*) FROM main.bills', ())
+            cold = _count(conn, 'SELECT COUNT(*) FROM cold.bills', ())
+            print(f'[cold] 一致：热库 {hot} 张票据，冷库 {cold} 张')
+            return
+        ids = candidates(conn, cutoff, statuses)
+        print(f'[cold] 票据日期早于 {cutoff}、状态 {"/".join(statuses)}：{len(ids)} 张')
+        if args.dry_run or not ids:
+            return
+        started = time.monotonic()
+        totals = [0, 0, 0]
+        size = max(1, args.batch)
+        for i in range(0, len(ids), size):
+            for k, n in enumerate(move_batch(conn, ids[i:i + size], cutoff, statuses)):
+                totals[k] += n
+            done = min(i + size, len(ids))
+            if done == len(ids) or (i // size) % 20 == 0:
+                print(f'  {done}/{len(ids)}（{time.monotonic() - started:.1f}s）')
+            if args.sleep and done < len(ids):
+                time.sleep(args.sleep)
+        conn.execute('PRAGMA cold.wal_checkpoint(TRUNCATE)')
+        problems = verify(conn)
+        print(f'[cold] 已移动 {totals[0]} 张票据、{totals[1]} 条流转事件、{totals[2]} 条修改记录'
+              f'（{time.monotonic() - started:.1f}s），冷库 {_fmt_size(os.path.getsize(cold_path))}')
+        for p in problems:
+            print(f'  {p}')
+        print('[cold] 热库释放的空闲页由 db_maint.py 回收（python3 deploy.py --maintain-db）')
+        if problems:
+            sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"归档失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+在线增量备份 app.db 与上传文件（替代 FreeFileSync 同步 server/data）。
+
+- 数据库：使用 SQLite 在线备份 API，每次只复制少量页面并短暂休眠，后端持续读写也不会被长时间阻塞，
+  得到的是一致的快照（直接复制正在写入的 app.db 可能得到损坏的副本）
+- 上传文件：按清单（大小 / mtime / SHA-256）与上一份快照比较，未变化的文件以硬链接引用上一份快照，
+  只复制新增或变化的文件；因此备份耗时随变化量增长，而非随总数据量增长
+  （dedupe_uploads.py 的索引中已有的哈希会直接复用）
+- 冷库 cold.db（archive_cold.py 移出的旧票据）存在时一并备份；它很少变化，源文件大小 / mtime 与上一份快照
+  相同且没有未检查点的 WAL 时直接硬链接上一份。先备份 app.db 再备份 cold.db：两次复制之间若有归档搬迁，
+  票据只会在两边各有一份（后端读取时热库优先、搬迁为 INSERT OR REPLACE），不会两边都缺
+- 每份快照是独立完整、可直接恢复的目录：<备份目录>/<YYYYmmdd-HHMMSS>/{app.db, [cold.db,] uploads/, manifest.json}
+
+用法：
+  python3 backup.py backup [--dest DIR] [--keep 14]     # 生成快照，可选只保留最近 N 份
+  python3 backup.py list                                # 列出快照
+  python3 backup.py verify [快照目录]                    # 校验数据库完整性与文件哈希（默认最新一份）
+  python3 backup.py restore <快照目录> [--force]         # 恢复到 server/data（需先停止服务）
+
+备份目录默认 ./backups，可用 --dest 或环境变量 BACKUP_DIR 指定（建议放在另一块磁盘）。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, 'server', 'data')
+DEFAULT_DEST = os.environ.get('BACKUP_DIR') or os.path.join(ROOT, 'backups')
+DB_NAME = 'app.db'
+COLD_DB_NAME = 'cold.db'
+UPLOADS_NAME = 'uploads'
+MANIFEST_NAME = 'manifest.json'
+DEDUP_INDEX_NAME = '.dedup-index.db'
+SNAPSHOT_FORMAT = '%Y%m%d-%H%M%S'
+# 每步复制的页数与步间休眠：后端写事务最多等待一步的时间
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.005
+CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def copy_with_sha256(src, dst):
+    """复制文件并在同一遍读取中计算 SHA-256，保留 mtime。"""
+    h = hashlib.sha256()
+    with open(src, 'rb') as fi, open(dst, 'wb') as fo:
+        for chunk in iter(lambda: fi.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+            fo.write(chunk)
+    shutil.copystat(src, dst)
+    return h.hexdigest()
+
+
+def list_snapshots(dest):
+    """按时间顺序返回 dest 下已完成（含 manifest.json）的快照目录。"""
+    try:
+        names = sorted(os.listdir(dest))
+    except OSError:
+        return []
+    return [os.path.join(dest, n) for n in names
+            if not n.startswith('.') and os.path.isfile(os.path.join(dest, n, MANIFEST_NAME))]
+
+
+def load_manifest(snapshot):
+    with open(os.path.join(snapshot, MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def backup_db(src_path, dst_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """在线备份数据库，返回 (页数, 耗时秒)。"""
+    started = time.monotonic()
+    src = sqlite3.connect(src_path, timeout=30)
+    dst = sqlite3.connect(dst_path)
+    total = 0
+
+    def progress(status, remaining, count):
+        nonlocal total
+        total = count
+
+    try:
+        src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+        # 快照库单文件即可恢复：切回 DELETE 日志模式，不留 -wal/-shm
+        dst.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        dst.close()
+        src.close()
+    return total, time.monotonic() - started
+
+
+def _wal_size(db_path):
+    try:
+        return os.path.getsize(db_path + '-wal')
+    except OSError:
+        return 0
+
+
+def backup_cold(cold_path, work, prev_dir, prev_cold, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """备份冷库；未变化时硬链接上一份快照。返回 (manifest 条目, 是否沿用, 耗时秒)。"""
+    started = time.monotonic()
+    st = os.stat(cold_path)
+    source = [st.st_size, st.st_mtime_ns]
+    target = os.path.join(work, COLD_DB_NAME)
+    if prev_cold and prev_cold.get('source') == source and _wal_size(cold_path) == 0:
+        try:
+            _link_or_copy(os.path.join(prev_dir, prev_cold['file']), target)
+            return dict(prev_cold), True, time.monotonic() - started
+        except OSError:
+            pass  # 上一份快照中的冷库缺失：重新备份
+    backup_db(cold_path, target, pages=pages, sleep=sleep)
+    entry = {'file': COLD_DB_NAME, 'size': os.path.getsize(target), 'sha256': file_sha256(target), 'source': source}
+    return entry, False, time.monotonic() - started
+
+
+def iter_upload_files(root):
+    """递归列出上传目录中的普通文件，返回 (相对路径, 绝对路径, stat)；跳过以 . 开头的文件与目录。"""
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name.startswith('.'):
+                        continue
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file(follow_symlinks=False):
+                        try:
+                            st = e.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        yield os.path.relpath(e.path, root).replace(os.sep, '/'), e.path, st
+        except OSError:
+            continue
+
+
+def dedup_hashes(uploads):
+    """读取 dedupe_uploads.py 的索引：{rel: (size, mtime_ns, sha256)}；不存在时返回空字典。"""
+    path = os.path.join(uploads, DEDUP_INDEX_NAME)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            return {rel: (size, mtime_ns, sha) for rel, size, mtime_ns, sha in
+                    conn.execute('SELECT rel, size, mtime_ns, sha256 FROM files')}
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:  # 跨文件系统等：退回复制
+        shutil.copy2(src, dst)
+        return False
+
+
+def backup(data_dir=DATA_DIR, dest=DEFAULT_DEST, keep=None, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP):
+    """生成一份快照，返回统计字典。"""
+    db_path = os.path.join(data_dir, DB_NAME)
+    uploads = os.path.join(data_dir, UPLOADS_NAME)
+    if not os.path.isfile(db_path):
+        raise RuntimeError(f"数据库不存在：{db_path}")
+    os.makedirs(dest, exist_ok=True)
+    started = time.monotonic()
+
+    previous = list_snapshots(dest)
+    prev_dir = previous[-1] if previous else None
+    prev_manifest = load_manifest(prev_dir) if prev_dir else {}
+    prev_files = prev_manifest.get('files', {})
+    prev_by_sha = {}
+    for rel, (_, _, sha) in prev_files.items():
+        prev_by_sha.setdefault(sha, rel)
+
+    name = time.strftime(SNAPSHOT_FORMAT)
+    final = os.path.join(dest, name)
+    if os.path.exists(final):
+        raise RuntimeError(f"快照已存在：{final}（一秒内重复执行？）")
+    # 先写入临时目录，完成后改名：中途失败不会留下半份“快照”
+    work = os.path.join(dest, f'.{name}.partial')
+    shutil.rmtree(work, ignore_errors=True)
+    os.makedirs(os.path.join(work, UPLOADS_NAME))
+
+    pages_copied, db_seconds = backup_db(db_path, os.path.join(work, DB_NAME), pages=pages, sleep=sleep)
+    db_sha = file_sha256(os.path.join(work, DB_NAME))
+    cold_path = os.path.join(data_dir, COLD_DB_NAME)
+    cold, cold_linked, cold_seconds = None, False, 0.0
+    if os.path.isfile(cold_path):
+        cold, cold_linked, cold_seconds = backup_cold(cold_path, work, prev_dir, prev_manifest.get('cold'),
+                                                      pages=pages, sleep=sleep)
+
+    known = dedup_hashes(uploads) if os.path.isdir(uploads) else {}
+    files = {}
+    linked = copied = copied_bytes = total_bytes = 0
+    made_dirs = set()
+    for rel, path, st in (iter_upload_files(uploads) if os.path.isdir(uploads) else ()):
+        target = os.path.join(work, UPLOADS_NAME, *rel.split('/'))
+        parent = os.path.dirname(target)
+        if parent not in made_dirs:
+            os.makedirs(parent, exist_ok=True)
+            made_dirs.add(parent)
+        total_bytes += st.st_size
+        prev = prev_files.get(rel)
+        source = None
+        if prev and prev[0] == st.st_size and prev[1] == st.st_mtime_ns:
+            sha = prev[2]
+            source = rel
+        else:
+            hit = known.get(rel)
+            sha = hit[2] if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns else None
+            if sha and sha in prev_by_sha:
+                source = prev_by_sha[sha]
+        if source is not None:
+            try:
+                _link_or_copy(os.path.join(prev_dir, UPLOADS_NAME, *source.split('/')), target)
+                files[rel] = [st.st_size, st.st_mtime_ns, sha]
+                linked += 1
+                continue
+            except OSError:
+                pass  # 上一份快照中的文件缺失：重新复制
+        try:
+            sha = copy_with_sha256(path, target)
+        except FileNotFoundError:
+            continue  # 扫描后被删除
+        files[rel] = [st.st_size, st.st_mtime_ns, sha]
+        copied += 1
+        copied_bytes += st.st_size
+
+    manifest = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source': os.path.abspath(data_dir),
+        'base': os.path.basename(prev_dir) if prev_dir else None,
+        'db': {'file': DB_NAME, 'size': os.path.getsize(os.path.join(work, DB_NAME)), 'sha256': db_sha},
+        'files': files,
+    }
+    if cold:
+        manifest['cold'] = cold
+    with open(os.path.join(work, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    os.replace(work, final)
+
+    pruned = []
+    if keep and keep > 0:
+        for old in list_snapshots(dest)[:-keep]:
+            shutil.rmtree(old, ignore_errors=True)
+            pruned.append(os.path.basename(old))
+    return {
+        'snapshot': final,
+        'base': manifest['base'],
+        'db_pages': pages_copied,
+        'db_bytes': manifest['db']['size'],
+        'db_seconds': db_seconds,
+        'cold_bytes': cold['size'] if cold else None,
+        'cold_linked': cold_linked,
+        'cold_seconds': cold_seconds,
+        'files': len(files),
+        'total_bytes': total_bytes,
+        'linked': linked,
+        'copied': copied,
+        'copied_bytes': copied_bytes,
+        'pruned': pruned,
+        'seconds': time.monotonic() - started,
+    }
+
+
+def resolve_snapshot(arg, dest):
+    if arg:
+        path = arg if os.path.isdir(arg) else os.path.join(dest, arg)
+        if not os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+            raise RuntimeError(f"不是有效的快照目录：{arg}")
+        return os.path.abspath(path)
+    snapshots = list_snapshots(dest)
+    if not snapshots:
+        raise RuntimeError(f"{dest} 下没有快照")
+    return snapshots[-1]
+
+
+def verify(snapshot, workers=None):
+    """校验快照：数据库 integrity_check 与哈希，上传文件逐个比对 SHA-256。返回问题列表。"""
+    manifest = load_manifest(snapshot)
+    problems = []
+    for key in ('db', 'cold'):
+        entry = manifest.get(key)
+        if not entry:
+            continue
+        db_path = os.path.join(snapshot, entry['file'])
+        if not os.path.isfile(db_path):
+            problems.append(f"缺少数据库文件 {entry['file']}")
+            continue
+        if file_sha256(db_path) != entry['sha256']:
+            problems.append(f"{entry['file']} 文件哈希不一致")
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            result = [r[0] for r in conn.execute('PRAGMA integrity_check')]
+        finally:
+            conn.close()
+        if result != ['ok']:
+            problems.append(f"{entry['file']} integrity_check 失败：" + '; '.join(result[:5]))
+    if any(p.startswith('缺少数据库文件') for p in problems):
+        return problems
+
+    def check(item):
+        rel, (size, _, sha) = item
+        path = os.path.join(snapshot, UPLOADS_NAME, *rel.split('/'))
+        try:
+            if os.path.getsize(path) != size:
+                return f"{rel}：大小不一致"
+            if file_sha256(path) != sha:
+                return f"{rel}：哈希不一致"
+        except OSError:
+            return f"{rel}：文件缺失"
+        return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        problems.extend(p for p in pool.map(check, manifest['files'].items()) if p)
+    return problems
+
+
+def restore(snapshot, data_dir=DATA_DIR, force=False, prune=False):
+    """把快照恢复到 data_dir，返回统计字典。调用前需停止后端。"""
+    manifest = load_manifest(snapshot)
+    db_target = os.path.join(data_dir, DB_NAME)
+    uploads = os.path.join(data_dir, UPLOADS_NAME)
+    if os.path.exists(db_target) and not force:
+        raise RuntimeError(f"{db_target} 已存在；确认已停止服务后加 --force 覆盖")
+    os.makedirs(uploads, exist_ok=True)
+
+    # 数据库：先复制为临时文件再原子替换，并删除旧的 -wal/-shm（否则会被重放到恢复后的库上）
+    # 冷库与 app.db 必须成对恢复：快照中没有冷库时删除现有冷库，否则已恢复的热库会和较新的冷库混在一起
+    cold_target = os.path.join(data_dir, COLD_DB_NAME)
+    pairs = [(db_target, manifest['db'])]
+    if manifest.get('cold'):
+        pairs.append((cold_target, manifest['cold']))
+    for target, entry in pairs:
+        tmp = f'{target}.restore{os.getpid()}'
+        shutil.copy2(os.path.join(snapshot, entry['file']), tmp)
+        for suffix in ('-wal', '-shm'):
+            try:
+                os.remove(target + suffix)
+            except FileNotFoundError:
+                pass
+        os.replace(tmp, target)
+    if not manifest.get('cold'):
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(cold_target + suffix)
+            except FileNotFoundError:
+                pass
+
+    restored = skipped = 0
+    for rel, (size, mtime_ns, _) in manifest['files'].items():
+        target = os.path.join(uploads, *rel.split('/'))
+        try:
+            st = os.stat(target)
+            if st.st_size == size and st.st_mtime_ns == mtime_ns:
+                skipped += 1
+                continue
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f'{target}.restore{os.getpid()}'
+        shutil.copy2(os.path.join(snapshot, UPLOADS_NAME, *rel.split('/')), tmp)
+        os.replace(tmp, target)
+        restored += 1
+
+    extra = [rel for rel, path, _ in iter_upload_files(uploads) if rel not in manifest['files']]
+    if prune:
+        for rel in extra:
+            try:
+                os.remove(os.path.join(uploads, *rel.split('/')))
+            except OSError:
+                pass
+    return {'restored': restored, 'skipped': skipped, 'extra': len(extra), 'pruned': prune}
+
+
+def _fmt_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='app.db 与上传文件的在线增量备份、校验与恢复。')
+    parser.add_argument('--dest', default=DEFAULT_DEST, help='备份目录（默认 ./backups 或 BACKUP_DIR）')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='数据目录（默认 server/data）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_backup = sub.add_parser('backup', help='生成快照')
+    p_backup.add_argument('--keep', type=int, default=None, help='只保留最近 N 份快照')
+    p_backup.add_argument('--pages', type=int, default=BACKUP_PAGES, help=f'数据库每步复制页数（默认 {BACKUP_PAGES}）')
+    p_backup.add_argument('--sleep', type=float, default=BACKUP_SLEEP, help=f'步间休眠秒数（默认 {BACKUP_SLEEP}）')
+
+    sub.add_parser('list', help='列出快照')
+
+    p_verify = sub.add_parser('verify', help='校验快照（默认最新一份）')
+    p_verify.add_argument('snapshot', nargs='?', help='快照目录或名称')
+    p_verify.add_argument('--workers', type=int, default=None, help='并行校验线程数')
+
+    p_restore = sub.add_parser('restore', help='从快照恢复（需先停止服务：python3 stop.py）')
+    p_restore.add_argument('snapshot', help='快照目录或名称')
+    p_restore.add_argument('--force', action='store_true', help='覆盖现有 app.db')
+    p_restore.add_argument('--prune', action='store_true', help='删除快照中不存在的上传文件')
+    args = parser.parse_args()
+
+    dest = os.path.abspath(args.dest)
+    data_dir = os.path.abspath(args.data_dir)
+    if args.command == 'backup':
+        s = backup(data_dir, dest, keep=args.keep, pages=args.pages, sleep=args.sleep)
+        print(f"[backup] 快照：{s['snapshot']}" + (f"（基于 {s['base']}）" if s['base'] else '（全量）'))
+        print(f"[backup] 数据库 {_fmt_size(s['db_bytes'])}，{s['db_pages']} 页，在线复制 {s['db_seconds']:.2f}s")
+        if s['cold_bytes'] is not None:
+            how = '未变化，沿用上一份' if s['cold_linked'] else f"在线复制 {s['cold_seconds']:.2f}s"
+            print(f"[backup] 冷库 {_fmt_size(s['cold_bytes'])}，{how}")
+        print(f"[backup] 上传文件 {s['files']} 个（{_fmt_size(s['total_bytes'])}）：复制 {s['copied']} 个"
+              f"（{_fmt_size(s['copied_bytes'])}），沿用上一份 {s['linked']} 个；耗时 {s['seconds']:.2f}s")
+        if s['pruned']:
+            print(f"[backup] 已删除旧快照：{', '.join(s['pruned'])}")
+    elif args.command == 'list':
+        snapshots = list_snapshots(dest)
+        if not snapshots:
+            print(f"[backup] {dest} 下没有快照")
+        for snap in snapshots:
+            m = load_manifest(snap)
+            size = sum(f[0] for f in m['files'].values())
+            cold = f"+ 冷库 {_fmt_size(m['cold']['size'])}  " if m.get('cold') else ''
+            print(f"{os.path.basename(snap)}  数据库 {_fmt_size(m['db']['size'])}  {cold}"
+                  f"上传 {len(m['files'])} 个 / {_fmt_size(size)}")
+    elif args.command == 'verify':
+        snapshot = resolve_snapshot(args.snapshot, dest)
+        problems = verify(snapshot, workers=args.workers)
+        for p in problems[:50]:
+            print(f"  {p}")
+        if problems:
+            print(f"[backup] 校验失败：{snapshot}（{len(problems)} 个问题）")
+            sys.exit(1)
+        print(f"[backup] 校验通过：{snapshot}")
+    elif args.command == 'restore':
+        snapshot = resolve_snapshot(args.snapshot, dest)
+        s = restore(snapshot, data_dir, force=args.force, prune=args.prune)
+        print(f"[backup] 已从 {snapshot} 恢复到 {data_dir}：上传文件恢复 {s['restored']} 个，未变 {s['skipped']} 个")
+        if s['extra']:
+            verb = '已删除' if s['pruned'] else '保留（--prune 可删除）'
+            print(f"[backup] 快照中不存在的上传文件 {s['extra']} 个：{verb}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"备份失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1 @@
+"""Express API 异步压测与基准对比套件（python3 -m bench --help）。"""
@@ -0,0 +1,423 @@
+"""
+Express API 异步压测与基准对比。
+
+默认将 server/data/app.db 复制到临时目录，以 DATA_DIR 指向该副本启动一个独立后端，
+再用 asyncio 并发虚拟用户运行混合场景：
+- list：GET /api/bills（按发起人过滤 + 投影，首页与下一页）、GET /api/bills/archived（首页与下一页）
+- todos：GET /api/todos/:role（各审批角色与会计）
+- chain：新建 → 逐级审批 → 归档
+- reject：新建 → 一级拒绝 → 发起人重新提交
+- upload：新建 → 多图上传 /api/bill/:id/upload
+
+每个接口输出吞吐与 p50/p95/p99 延迟（JSON），并可与保存的基线对比。
+
+用法：
+  python3 -m bench                                     # 默认 mixed，20 并发，30 秒
+  python3 -m bench --db /tmp/big.db -c 50 -d 60        # 针对生成的大库
+  python3 -m bench --url http://127.0.0.1:6666/api     # 压测已运行的后端（会写入数据！）
+  python3 -m bench --save-baseline bench/baseline.json
+  python3 -m bench --baseline bench/baseline.json --fail-on-regression 15
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import zlib
+
+from .httpclient import HttpClient, multipart
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(ROOT, 'server', 'data', 'app.db')
+APPROVER_ROLES = ['approver1', 'approver2', 'approver3', 'accountant']
+STAFF_IDS = [f'user{i:02d}' for i in range(1, 16)]
+DEFAULT_PASSWORD = '123456'
+
+SCENARIO_WEIGHTS = {
+    'mixed': {'list': 30, 'todos': 40, 'chain': 15, 'reject': 10, 'upload': 5},
+    'list': {'list': 1},
+    'todos': {'todos': 1},
+    'chain': {'chain': 1},
+    'reject': {'reject': 1},
+    'upload': {'upload': 1},
+}
+
+
+# ---------- 统计 ----------
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.started = None
+        self.finished = None
+
+    def record(self, name, seconds, ok):
+        self.samples.setdefault(name, []).append(seconds)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self):
+        elapsed = max(1e-9, (self.finished or time.monotonic()) - (self.started or time.monotonic()))
+        endpoints = {}
+        total = errors = 0
+        for name, values in sorted(self.samples.items()):
+            values = sorted(values)
+            n = len(values)
+            total += n
+            errors += self.errors.get(name, 0)
+            endpoints[name] = {
+                'count': n,
+                'errors': self.errors.get(name, 0),
+                'rps': round(n / elapsed, 2),
+                'mean_ms': round(sum(values) / n * 1000, 2),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+            }
+        return {
+            'total': {'requests': total, 'errors': errors, 'seconds': round(elapsed, 2),
+                      'rps': round(total / elapsed, 2)},
+            'endpoints': endpoints,
+        }
+
+
+def percentile(sorted_values, pct):
+    """最近秩法百分位。"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+# ---------- 测试数据 ----------
+
+def make_png(target_kb, rng):
+    """生成约 target_kb 大小的 PNG（随机像素，不可压缩）。"""
+    width = 256
+    height = max(1, (target_kb * 1024) // (width * 3))
+    raw = b''.join(b'\x00' + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b'')
+
+
+class Context:
+    def __init__(self, args, recorder):
+        self.args = args
+        self.recorder = recorder
+        self.tokens = {}
+        self.rng = random.Random(args.seed)
+        self.images = [make_png(args.image_kb, random.Random(args.seed + i)) for i in range(3)]
+
+
+async def call(ctx, client, name, method, path, payload=None, token=None, body=None, content_type=None):
+    headers = {'Authorization': f'Bearer {token}'} if token else None
+    if payload is not None:
+        body = json.dumps(payload).encode('utf-8')
+    started = time.perf_counter()
+    ok = False
+    data = None
+    try:
+        status, raw = await client.request(method, path, body=body, headers=headers, content_type=content_type)
+        ok = status < 400
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = None
+    finally:
+        ctx.recorder.record(name, time.perf_counter() - started, ok)
+    return ok, data
+
+
+# ---------- 场景 ----------
+
+LIST_FIELDS = 'id,title,amount,category,date,createdBy,status,steps,currentStepIndex,createdAt'
+
+
+async def scenario_list(ctx, client):
+    # 与首页/归档页一致：取首页，再按 nextCursor 取下一页
+    user = ctx.rng.choice(list(ctx.tokens))
+    for name, path in (('GET /api/bills', f'/bills?createdBy={user}&fields={LIST_FIELDS}'),
+                       ('GET /api/bills/archived', f'/bills/archived?fields={LIST_FIELDS}')):
+        ok, page = await call(ctx, client, name, 'GET', path)
+        cursor = page.get('nextCursor') if ok and isinstance(page, dict) else None
+        if cursor:
+            await call(ctx, client, name + ' (cursor)', 'GET', f'{path}&cursor={cursor}')
+
+
+async def scenario_todos(ctx, client):
+    role = ctx.rng.choice(APPROVER_ROLES)
+    await call(ctx, client, 'GET /api/todos/:role', 'GET', f'/todos/{role}')
+
+
+async def create_bill(ctx, client, user):
+    payload = {
+        'title': f'bench-{ctx.rng.randrange(1 << 30):x}',
+        # 金额取大值，避免被免审阈值裁剪掉一级审批（重提场景要求一级拒绝）
+        'amount': round(ctx.rng.uniform(5000, 50000), 2),
+        'category': '差旅',
+        'date': time.strftime('%Y-%m-%d'),
+    }
+    ok, bill = await call(ctx, client, 'POST /api/bill', 'POST', '/bill', payload=payload, token=ctx.tokens[user])
+    return bill if ok and isinstance(bill, dict) else None
+
+
+async def scenario_chain(ctx, client):
+    user = ctx.rng.choice(list(ctx.tokens))
+    bill = await create_bill(ctx, client, user)
+    if not bill:
+        return
+    for _ in range(len(bill.get('steps') or []) + 1):
+        ok, bill = await call(ctx, client, 'POST /api/bill/approve', 'POST', '/bill/approve', payload={'id': bill['id']})
+        if not ok or not isinstance(bill, dict) or bill.get('status') != 'pending':
+            break
+
+
+async def scenario_reject(ctx, client):
+    user = ctx.rng.choice(list(ctx.tokens))
+    bill = await create_bill(ctx, client, user)
+    if not bill:
+        return
+    ok, _ = await call(ctx, client, 'POST /api/bill/reject', 'POST', '/bill/reject',
+                       payload={'id': bill['id'], 'reason': 'bench'})
+    if not ok:
+        return
+    await call(ctx, client, 'POST /api/bill/resubmit', 'POST', '/bill/resubmit', token=ctx.tokens[user],
+               payload={'id': bill['id'], 'editorId': user, 'updates': {'title': bill['title'] + '-v2'}})
+
+
+async def scenario_upload(ctx, client):
+    user = ctx.rng.choice(list(ctx.tokens))
+    bill = await create_bill(ctx, client, user)
+    if not bill:
+        return
+    n = ctx.rng.randint(1, ctx.args.images)
+    files = [(f'r{i}.png', ctx.images[i % len(ctx.images)], 'image/png') for i in range(n)]
+    body, ctype = multipart('images', files)
+    await call(ctx, client, 'POST /api/bill/:id/upload', 'POST', f"/bill/{bill['id']}/upload",
+               token=ctx.tokens[user], body=body, content_type=ctype)
+
+
+SCENARIOS = {
+    'list': scenario_list,
+    'todos': scenario_todos,
+    'chain': scenario_chain,
+    'reject': scenario_reject,
+    'upload': scenario_upload,
+}
+
+
+async def prepare(ctx, base_url, reset_passwords):
+    client = HttpClient(base_url)
+    try:
+        # 仅对临时副本重置密码（独立后端以 ALLOW_DEV_RESET=1 启动）；--url 模式绝不改动线上账号
+        if reset_passwords:
+            await client.post_json('/dev/reset-passwords', {})
+        for uid in STAFF_IDS:
+            status, data = await client.post_json('/login', {'id': uid, 'password': ctx.args.password})
+            if status == 200 and isinstance(data, dict) and data.get('token'):
+                ctx.tokens[uid] = data['token']
+    finally:
+        await client.close()
+    if not ctx.tokens:
+        raise RuntimeError('无法登录任何工作人员账号（user01..user15，密码见 --password），写入类场景无法运行')
+
+
+async def virtual_user(ctx, base_url, deadline, weights, seed):
+    rng = random.Random(seed)
+    names = list(weights)
+    cum = [weights[n] for n in names]
+    client = HttpClient(base_url)
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights=cum)[0]
+            try:
+                await SCENARIOS[name](ctx, client)
+            except Exception:
+                ctx.recorder.record(f'{name}: exception', 0.0, False)
+                await client.close()
+    finally:
+        await client.close()
+
+
+async def run_load(args, base_url, reset_passwords=False):
+    weights = SCENARIO_WEIGHTS[args.scenario]
+    ctx = Context(args, Recorder())
+    await prepare(ctx, base_url, reset_passwords)
+    if args.warmup > 0:
+        warm = Context(args, Recorder())
+        warm.tokens = ctx.tokens
+        await asyncio.gather(*(virtual_user(warm, base_url, time.monotonic() + args.warmup, weights, i)
+                               for i in range(args.concurrency)))
+    ctx.recorder.started = time.monotonic()
+    deadline = ctx.recorder.started + args.duration
+    await asyncio.gather(*(virtual_user(ctx, base_url, deadline, weights, args.seed * 1000 + i)
+                           for i in range(args.concurrency)))
+    ctx.recorder.finished = time.monotonic()
+    return ctx.recorder.summary()
+
+
+# ---------- 后端生命周期 ----------
+
+def wait_ping(url, proc, deadline=30.0):
+    started = time.monotonic()
+    delay = 0.05
+    while time.monotonic() - started < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1.0) as resp:
+                if resp.status == 200:
+                    return time.monotonic() - started
+        except Exception:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError(f'后端提前退出（exit={proc.returncode}）')
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    raise RuntimeError(f'后端 {deadline:.0f}s 内未就绪')
+
+
+class ThrowawayBackend:
+    """复制数据库到临时 DATA_DIR 并启动独立的 node server/index.cjs。"""
+
+    def __init__(self, db_path, port, keep=False):
+        self.db_path = db_path
+        self.port = port
+        self.keep = keep
+        self.tmp = None
+        self.proc = None
+        self.log = None
+
+    def __enter__(self):
+        self.tmp = tempfile.mkdtemp(prefix='handv-bench-')
+        if self.db_path and os.path.exists(self.db_path):
+            shutil.copy2(self.db_path, os.path.join(self.tmp, 'app.db'))
+        os.makedirs(os.path.join(self.tmp, 'uploads'), exist_ok=True)
+        env = os.environ.copy()
+        env.update({'PORT': str(self.port), 'DATA_DIR': self.tmp, 'ALLOW_DEV_RESET': '1'})
+        self.log = open(os.path.join(self.tmp, 'server.log'), 'wb')
+        self.proc = subprocess.Popen(['node', os.path.join(ROOT, 'server', 'index.cjs')], cwd=ROOT, env=env,
+                                     stdout=self.log, stderr=subprocess.STDOUT)
+        try:
+            ready = wait_ping(f'http://127.0.0.1:{self.port}/api/ping', self.proc)
+        except Exception:
+            self.__exit__(None, None, None)
+            raise
+        print(f'[bench] 临时后端就绪（{ready:.2f}s），端口 {self.port}，数据目录 {self.tmp}', file=sys.stderr)
+        return f'http://127.0.0.1:{self.port}/api'
+
+    def __exit__(self, *exc):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        if self.log:
+            self.log.close()
+        if self.tmp and not self.keep:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+        elif self.tmp:
+            print(f'[bench] 保留临时数据目录：{self.tmp}', file=sys.stderr)
+
+
+# ---------- 基线对比 ----------
+
+def compare(result, baseline, threshold):
+    """打印与基线的差异，返回回归（p95 变慢或吞吐下降超过 threshold%）的接口列表。"""
+    regressions = []
+    out = sys.stderr
+    print(f"{'接口':<30} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16} {'rps':>16}", file=out)
+    base_eps = baseline.get('endpoints', {})
+    for name, cur in result['endpoints'].items():
+        base = base_eps.get(name)
+        if not base:
+            print(f"{name:<30} {cur['p50_ms']:>16} {cur['p95_ms']:>16} {cur['p99_ms']:>16} {cur['rps']:>16}  (新增)", file=out)
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'rps'):
+            b, c = base[key], cur[key]
+            delta = ((c - b) / b * 100) if b else 0.0
+            cells.append(f"{c:>8}({delta:+.0f}%)")
+        print(f"{name:<30} " + ' '.join(f'{c:>16}' for c in cells), file=out)
+        p95_delta = ((cur['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100) if base['p95_ms'] else 0.0
+        rps_delta = ((cur['rps'] - base['rps']) / base['rps'] * 100) if base['rps'] else 0.0
+        if p95_delta > threshold or rps_delta < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m bench', description='Express API 异步压测与基准对比。')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--db', default=DEFAULT_DB, help='复制该数据库并启动独立后端（默认 server/data/app.db）')
+    target.add_argument('--url', help='直接压测已运行的后端 API 基址（如 http://127.0.0.1:6666/api；会写入数据）')
+    parser.add_argument('--port', type=int, default=6777, help='独立后端端口（默认 6777）')
+    parser.add_argument('--scenario', choices=list(SCENARIO_WEIGHTS), default='mixed', help='场景（默认 mixed）')
+    parser.add_argument('-c', '--concurrency', type=int, default=20, help='并发虚拟用户数（默认 20）')
+    parser.add_argument('-d', '--duration', type=float, default=30.0, help='压测时长（秒，默认 30）')
+    parser.add_argument('--warmup', type=float, default=2.0, help='预热时长（秒，不计入统计，默认 2）')
+    parser.add_argument('--images', type=int, default=5, help='upload 场景每次最多上传图片数（默认 5）')
+    parser.add_argument('--image-kb', type=int, default=200, help='上传图片大小（KB，默认 200）')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='user01..user15 的登录密码（默认 123456）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（默认 1）')
+    parser.add_argument('--output', help='结果 JSON 写入文件（默认仅输出到 stdout）')
+    parser.add_argument('--baseline', help='与该基线 JSON 对比')
+    parser.add_argument('--save-baseline', help='将本次结果保存为基线')
+    parser.add_argument('--fail-on-regression', type=float, default=None, metavar='PCT',
+                        help='与基线相比 p95 变慢或吞吐下降超过 PCT%% 时以非零状态退出')
+    parser.add_argument('--keep', action='store_true', help='保留临时数据目录（便于排查）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    meta = {
+        'scenario': args.scenario,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'target': args.url or os.path.abspath(args.db),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if args.url:
+        summary = asyncio.run(run_load(args, args.url.rstrip('/')))
+    else:
+        with ThrowawayBackend(args.db, args.port, keep=args.keep) as base_url:
+            summary = asyncio.run(run_load(args, base_url, reset_passwords=True))
+    result = {'meta': meta, **summary}
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n[bench] 与基线对比：{args.baseline}（{baseline.get('meta', {}).get('time', '?')}）", file=sys.stderr)
+        regressions = compare(result, baseline, args.fail_on_regression or 10.0)
+        if regressions:
+            print(f"[bench] 可能的回归：{', '.join(regressions)}", file=sys.stderr)
+            if args.fail_on_regression is not None:
+                sys.exit(2)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"压测失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,533 @@
+"""
+合成数据集生成器：直接写出与 server/index.cjs ensureSchema 一致的 app.db，用于压测与剖析。
+
+生成内容：
+- users / approval_order / settings（approvalThresholds、reasonHierarchy、companyName）
+- reason_categories / reason_items（与 reasonHierarchy 一致）
+- bills：steps 按 approval_order + 免审阈值裁剪并追加 accountant；流转事件模拟逐级审批、
+  高级别退回（demoteTo）、一级拒绝；归档/待审/拒绝/已修改重提（relatedId 双向关联，可多次重提）；
+  待审票据写入 currentRole
+- bill_events：每张票据的流转事件（与后端迁移后相同，bills.history 为 NULL）
+- bill_edits：每次重提一条，diff 结构与 /api/bill/resubmit 相同
+- images：/uploads/bills/<id>/<毫秒>-<随机数>.<ext> 引用；--write-images 时同时写出占位 PNG 文件
+- 索引与统计汇总表（stats_*，由 stats.py rebuild 填充）：后端启动时无需再迁移或回填
+
+按时间分片在多进程中并行生成（每片独立种子），主进程以 executemany 在单个大事务中写入，
+并关闭日志/同步、加大缓存；百万级票据为秒级而非小时级。相同 --seed 与 --end-date
+生成完全相同的数据，与进程数无关。
+
+输出目录即后端的 DATA_DIR（<out>/app.db、<out>/uploads）：
+  python3 -m bench.gendata --bills 100k --out /tmp/handv-100k
+  python3 -m bench.gendata --bills 1m --out /tmp/handv-1m --seed 7 --end-date 2025-12-31
+  python3 -m bench.gendata --bills 10k --out /tmp/handv-10k --write-images
+  python3 -m bench --db /tmp/handv-100k/app.db
+  DATA_DIR=/tmp/handv-100k PORT=6777 node server/index.cjs
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime, timezone
+
+# 与 server/index.cjs ensureSchema 保持一致（relatedId、currentRole 为其迁移后追加的列，位置相同）
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, name TEXT, role TEXT, password TEXT)",
+    "CREATE TABLE IF NOT EXISTS approval_order (role TEXT PRIMARY KEY, sort INTEGER)",
+    """CREATE TABLE IF NOT EXISTS bills (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    amount REAL,
+    category TEXT,
+    date TEXT,
+    createdBy TEXT,
+    status TEXT,
+    steps TEXT,
+    currentStepIndex INTEGER,
+    history TEXT,
+    images TEXT,
+    relatedId TEXT,
+    currentRole TEXT
+  )""",
+    "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)",
+    """CREATE TABLE IF NOT EXISTS bill_edits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    originalId TEXT,
+    newId TEXT,
+    editorId TEXT,
+    time TEXT,
+    diff TEXT
+  )""",
+    """CREATE TABLE IF NOT EXISTS bill_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    billId TEXT NOT NULL,
+    action TEXT,
+    time TEXT,
+    data TEXT NOT NULL
+  )""",
+    """CREATE TABLE IF NOT EXISTS reason_categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    sort INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'enabled'
+  )""",
+    """CREATE TABLE IF NOT EXISTS reason_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    categoryId INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    sort INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'enabled',
+    FOREIGN KEY(categoryId) REFERENCES reason_categories(id)
+  )""",
+]
+# 同 ensureSchema 的索引；写完数据后再建，比逐行维护索引快得多
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_bill_edits_original ON bill_edits(originalId)",
+    "CREATE INDEX IF NOT EXISTS idx_bill_edits_new ON bill_edits(newId)",
+    "CREATE INDEX IF NOT EXISTS idx_bill_events_bill ON bill_events(billId, id)",
+    "CREATE INDEX IF NOT EXISTS idx_bills_status_date ON bills(status, date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_bills_status_role_date ON bills(status, currentRole, date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_bills_createdby_date ON bills(createdBy, date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_bills_date ON bills(date, id)",
+    "CREATE INDEX IF NOT EXISTS idx_bills_createdby_status ON bills(createdBy, status)",
+]
+
+# 与 seedDefaults 相同的默认账号
+USERS = (
+    [('admin', '管理员', 'admin', 'admin123'),
+     ('approver1', '一级审核', 'approver1', '123456'),
+     ('approver2', '二级审核', 'approver2', '123456'),
+     ('approver3', '三级审核', 'approver3', '123456')]
+    + [(f'user{i:02d}', f'用户{i}', 'staff', '123456') for i in range(1, 16)]
+    + [('accountant', '会计', 'accountant', '123456')]
+)
+APPROVAL_ORDER = ['approver1', 'approver2', 'approver3']
+THRESHOLDS = {'approver1': 0, 'approver2': 0, 'approver3': 10000}
+REASONS = {
+    '工程费用': ['材料采购', '设备租赁', '劳务费', '检测费', '运输费'],
+    '后勤费用': ['办公用品', '餐费', '水电费', '物业费', '维修费'],
+    '差旅费用': ['交通费', '住宿费', '出差补贴'],
+    '行政费用': ['培训费', '会议费', '招待费', '通讯费'],
+    '其他': ['未分类'],
+}
+REJECT_REASONS = ['', '', '金额与发票不符', '缺少发票', '事由不清', '重复报销', '超出预算', '附件不清晰']
+NOTES = ['', '', '', '一月', '二期', '项目部', '补录', '月度', '急', '现场']
+
+# 票据最终结局权重：归档 / 待审（停在任意一步）/ 一级拒绝 / 拒绝后修改重提（形成 relatedId 链）
+OUTCOMES = (('archived', 70), ('pending', 15), ('rejected', 7), ('resubmit', 8))
+# 每个分片的票据数（分片是并行生成与确定性种子的单位）
+CHUNK_BILLS = 10000
+
+
+# ---------- 工具 ----------
+
+def parse_count(text):
+    """解析 10k / 100k / 1m / 2500 这类数量。"""
+    s = str(text).strip().lower().replace('_', '')
+    mult = 1
+    if s.endswith('k'):
+        mult, s = 1000, s[:-1]
+    elif s.endswith('m'):
+        mult, s = 1000000, s[:-1]
+    try:
+        n = int(float(s) * mult)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'无效数量：{text}')
+    if n <= 0:
+        raise argparse.ArgumentTypeError(f'数量须为正数：{text}')
+    return n
+
+
+def dumps(value):
+    # 与 JSON.stringify 相同的紧凑格式
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def placeholder_png(width, height, rgb):
+    """纯色占位 PNG（仅标准库，体积仅数百字节）。"""
+    row = b'\x00' + bytes(rgb) * width
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IDAT', zlib.compress(row * height, 9)) + chunk(b'IEND', b'')
+
+
+# ---------- 生成 ----------
+
+_DAY_MS = 86400000
+_day_prefix = {}
+# 一天内各秒的 HH:MM:SS 与毫秒后缀查表，iso() 只做字符串拼接
+_HMS = [f'{h:02d}:{m:02d}:{s:02d}' for h in range(24) for m in range(60) for s in range(60)]
+_MILLIS = [f'.{n:03d}Z' for n in range(1000)]
+
+
+def iso(ms):
+    """毫秒时间戳 → 2025-10-14T10:51:46.989Z（与 new Date().toISOString() 相同）。"""
+    day, rem = divmod(ms, _DAY_MS)
+    prefix = _day_prefix.get(day)
+    if prefix is None:
+        prefix = _day_prefix[day] = datetime.fromtimestamp(day * 86400, tz=timezone.utc).strftime('%Y-%m-%dT')
+    return prefix + _HMS[rem // 1000] + _MILLIS[rem % 1000]
+
+
+class Generator:
+    """生成一个分片的票据：各分片覆盖互不重叠的时间段、使用独立的种子，可并行且结果确定。"""
+
+    def __init__(self, args, index, chunks):
+        self.args = args
+        self.rng = random.Random(f'{args.seed}:{index}')
+        end = args.end_date or date.today()
+        end_ms = int(datetime(end.year, end.month, end.day, tzinfo=timezone.utc).timestamp() * 1000)
+        span = args.days * _DAY_MS
+        self.slice_ms = span // chunks
+        self.slice_start = end_ms - span + index * self.slice_ms
+        self.staff = [u[0] for u in USERS if u[2] == 'staff']
+        self.others = [u[0] for u in USERS if u[2] not in ('staff', 'admin')]
+        self.role_label = {}
+        for uid, name, role, _ in USERS:
+            self.role_label.setdefault(role, dumps(f'{name}({uid})'))
+        self.reasons = [(cat, items) for cat, items in REASONS.items()]
+        self.reject_reasons = [dumps(r) for r in REJECT_REASONS]
+        self.numeric_ids = set()
+        self.steps_cache = {}
+        self.stats = {'bills': 0, 'edits': 0, 'images': 0, 'history': 0, 'status': {}}
+        self.image_paths = []
+
+    def pick(self, seq):
+        return seq[int(self.rng.random() * len(seq))]
+
+    def steps_for(self, amount):
+        """按免审阈值裁剪审批顺序并追加 accountant（同 POST /api/bill）。"""
+        key = tuple(r for r in APPROVAL_ORDER
+                    if not (r in THRESHOLDS and THRESHOLDS[r] > 0 and amount < THRESHOLDS[r]))
+        cached = self.steps_cache.get(key)
+        if cached is None:
+            steps = list(key) + ['accountant']
+            cached = self.steps_cache[key] = (steps, dumps(steps))
+        return cached
+
+    def new_id(self, created_ms):
+        # 旧数据以 Date.now() 为主键，新数据为 randomUUID()
+        if self.rng.random() < 0.3:
+            n = created_ms
+            while n in self.numeric_ids:
+                n += 1
+            self.numeric_ids.add(n)
+            return str(n)
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def amount(self):
+        # 对数正态：多数为几十到几千元，少量上万，覆盖 approver3 免审阈值两侧
+        return round(min(500000.0, self.rng.lognormvariate(6.5, 1.6)), 2)
+
+    def title_and_category(self):
+        cat, items = self.pick(self.reasons)
+        item = self.pick(items)
+        note = self.pick(NOTES)
+        return (f'{item} - {note}' if note else item), cat
+
+    def images_for(self, bill_id, created_ms):
+        r = self.rng.random
+        x = r()
+        n = 0 if x < 0.35 else 1 if x < 0.70 else 2 if x < 0.85 else 3 if x < 0.95 else 5
+        out = []
+        for i in range(n):
+            ext = '.jpg' if r() < 0.6 else '.png'
+            out.append(f'/uploads/bills/{bill_id}/{created_ms + 40 + i}-{int(r() * 1000000)}{ext}')
+        return out
+
+    def later(self, ms, lo_min=1, hi_min=60 * 48):
+        return ms + lo_min * 60000 + int(self.rng.random() * (hi_min - lo_min) * 60000)
+
+    # 流转事件为 (action, time, data)，data 直接拼接为 JSON 片段（与 JSON.stringify 输出一致），避免百万级 dict + dumps
+    def h_approve(self, role, ms):
+        t = iso(ms)
+        return 'approve', t, f'{{"action":"approve","role":"{role}","time":"{t}"}}'
+
+    def h_demote(self, role, demote, ms):
+        t = iso(ms)
+        return 'reject', t, (f'{{"action":"reject","role":"{role}","reason":{self.pick(self.reject_reasons)},'
+                             f'"demoteTo":{self.role_label.get(demote) or dumps(demote)},"time":"{t}"}}')
+
+    def h_event(self, action, ms, fields):
+        t = iso(ms)
+        return action, t, f'{{"action":"{action}",{fields},"time":"{t}"}}'
+
+    def walk(self, history, steps, target, ms):
+        """从第 0 步审批到第 target 步（target == len(steps) 表示全部通过），途中随机高级别退回。"""
+        idx = 0
+        bounce = self.args.bounce_rate
+        r = self.rng.random
+        guard = 0
+        while idx < target and guard < 64:
+            guard += 1
+            ms = self.later(ms)
+            if idx > 0 and r() < bounce:
+                history.append(self.h_demote(steps[idx], steps[idx - 1], ms))
+                idx -= 1
+            else:
+                history.append(self.h_approve(steps[idx], ms))
+                idx += 1
+        return min(idx, len(steps) - 1), ms
+
+    def generate(self, count):
+        """生成 count 张票据，返回 (bills 行, bill_edits 行, bill_events 行)；重提链一次产出多张票据。"""
+        r = self.rng.random
+        bills_out, edits_out, events_out = [], [], []
+        status_stats = self.stats['status']
+        remaining = count
+        while remaining > 0:
+            x = r() * 100
+            outcome = 'archived' if x < 70 else 'pending' if x < 85 else 'rejected' if x < 92 else 'resubmit'
+            created_ms = self.slice_start + int(r() * (self.slice_ms - 60000))
+            bill_date = iso(created_ms - int(r() * 10) * _DAY_MS)[:10]
+            creator = self.pick(self.staff) if r() < 0.92 else self.pick(self.others)
+            title, category = self.title_and_category()
+            amount = self.amount()
+            chain = 1
+            if outcome == 'resubmit':
+                y = r()
+                chain = min(remaining, 2 if y < 0.8 else 3 if y < 0.95 else 4)
+            bills = []
+            edits = []
+            prev_id = None
+            ms = created_ms
+            for link in range(chain):
+                last = link == chain - 1
+                bill_id = self.new_id(ms)
+                steps, steps_json = self.steps_for(amount)
+                history = [self.h_event('create', ms, f'"by":"{creator}"')]
+                if prev_id is not None:
+                    history.append(self.h_event('resubmit_from', ms, f'"from":"{prev_id}"'))
+                images = self.images_for(bill_id, ms)
+                if not last:
+                    kind = 'rejected'
+                elif outcome == 'resubmit':
+                    # 重提链末端：多数走完流程，部分仍在审批中
+                    kind = 'archived' if r() < 0.75 else 'pending'
+                else:
+                    kind = outcome
+                if kind == 'archived':
+                    idx, ms = self.walk(history, steps, len(steps), ms)
+                    status, current = 'archived', len(steps) - 1
+                elif kind == 'pending':
+                    idx, ms = self.walk(history, steps, int(r() * len(steps)), ms)
+                    status, current = 'pending', idx
+                else:
+                    idx, ms = self.walk(history, steps, int(r() * len(steps)), ms)
+                    # 高级别逐级退回到第 0 步，再由一级拒绝（图片随之清空）
+                    while idx > 0:
+                        ms = self.later(ms)
+                        history.append(self.h_demote(steps[idx], steps[idx - 1], ms))
+                        idx -= 1
+                    ms = self.later(ms)
+                    reason = self.pick(self.reject_reasons)
+                    history.append(self.h_event('reject', ms, f'"role":"{steps[0]}","reason":{reason}'))
+                    status, current, images = 'rejected', 0, []
+                if not last:
+                    # 发起人修改后重提：原票据标记 rejected-modified，并与新票据互相关联（nextId 稍后回填）
+                    ms = self.later(ms, 5, 60 * 24 * 3)
+                    next_amount = amount if r() < 0.5 else round(amount * (0.5 + r() * 0.6), 2)
+                    next_title = title if r() < 0.6 else self.title_and_category()[0]
+                    status = 'rejected-modified'
+                    changed = []
+                    if next_title != title:
+                        changed.append({'field': 'title', 'before': title, 'after': next_title})
+                    if next_amount != amount:
+                        changed.append({'field': 'amount', 'before': amount, 'after': next_amount})
+                    edits.append((len(bills), creator, iso(ms), dumps({'changed': changed})))
+                bills.append([bill_id, title, amount, category, bill_date, creator, status, steps_json,
+                              current, history, images, prev_id, steps[current] if status == 'pending' else None])
+                if not last:
+                    prev_id = bill_id
+                    title, amount = next_title, next_amount
+            # 回填重提链的 nextId / relatedId / bill_edits.newId
+            for pos, editor, when, diff in edits:
+                nxt = bills[pos + 1][0]
+                bills[pos][9].append(('modified', when, f'{{"action":"modified","by":"{editor}","time":"{when}","nextId":"{nxt}"}}'))
+                bills[pos][11] = nxt
+                edits_out.append((bills[pos][0], nxt, editor, when, diff))
+            for b in bills:
+                status_stats[b[6]] = status_stats.get(b[6], 0) + 1
+                self.stats['history'] += len(b[9])
+                self.stats['images'] += len(b[10])
+                if self.args.write_images and b[10]:
+                    self.image_paths.extend(b[10])
+                events_out.extend((b[0], action, t, data) for action, t, data in b[9])
+                b[9] = None
+                b[10] = dumps(b[10])
+                bills_out.append(tuple(b))
+            remaining -= len(bills)
+        self.stats['bills'] = len(bills_out)
+        self.stats['edits'] = len(edits_out)
+        return bills_out, edits_out, events_out
+
+
+def generate_chunk(job):
+    """子进程入口：生成一个分片。"""
+    args, index, chunks, count = job
+    gen = Generator(args, index, chunks)
+    bills, edits, events = gen.generate(count)
+    return bills, edits, events, gen.stats, gen.image_paths
+
+
+def iter_chunks(args):
+    """按时间顺序产出各分片结果；多核时并行生成，主进程只负责写库。"""
+    chunks = max(1, -(-args.bills // CHUNK_BILLS))
+    base, extra = divmod(args.bills, chunks)
+    jobs = [(args, i, chunks, base + (1 if i < extra else 0)) for i in range(chunks)]
+    workers = max(1, min(args.workers, chunks))
+    if workers == 1:
+        yield from map(generate_chunk, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(generate_chunk, jobs)
+
+
+def seed_reference_data(conn):
+    conn.executemany("INSERT INTO users (id, name, role, password) VALUES (?, ?, ?, ?)", USERS)
+    conn.executemany("INSERT INTO approval_order (role, sort) VALUES (?, ?)",
+                     [(r, i) for i, r in enumerate(APPROVAL_ORDER)])
+    hierarchy = []
+    for c_sort, (cat, items) in enumerate(REASONS.items()):
+        cat_sort = 999 if cat == '其他' else c_sort
+        cur = conn.execute("INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')", (cat, cat_sort))
+        hierarchy.append({'text': cat, 'level': 0})
+        for i_sort, item in enumerate(items):
+            conn.execute("INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')",
+                         (cur.lastrowid, item, 999 if item == '未分类' else i_sort))
+            hierarchy.append({'text': item, 'level': 1})
+    conn.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", [
+        ('companyName', '汉德威票据审核'),
+        ('approvalThresholds', dumps(THRESHOLDS)),
+        ('reasonHierarchy', dumps(hierarchy)),
+    ])
+
+
+def write_db(args, db_path):
+    import sqlite3
+
+    # bench 以包方式运行（python3 -m bench.gendata），仓库根目录已在 sys.path 中
+    from stats import rebuild as rebuild_stats
+
+    tmp = f'{db_path}.tmp{os.getpid()}'
+    for p in (tmp, tmp + '-journal'):
+        if os.path.exists(p):
+            os.remove(p)
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        # 全新文件、单写者：关闭回滚日志与同步，大缓存，内存临时表
+        for pragma in ('page_size = 8192', 'journal_mode = OFF', 'synchronous = OFF', 'locking_mode = EXCLUSIVE',
+                       'temp_store = MEMORY', 'cache_size = -262144'):
+            conn.execute(f'PRAGMA {pragma}')
+        conn.execute('BEGIN')
+        for ddl in SCHEMA:
+            conn.execute(ddl)
+        seed_reference_data(conn)
+        bill_sql = ("INSERT INTO bills (id, title, amount, category, date, createdBy, status, steps, "
+                    "currentStepIndex, history, images, relatedId, currentRole) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+        edit_sql = "INSERT INTO bill_edits (originalId, newId, editorId, time, diff) VALUES (?, ?, ?, ?, ?)"
+        event_sql = "INSERT INTO bill_events (billId, action, time, data) VALUES (?, ?, ?, ?)"
+        totals = {'bills': 0, 'edits': 0, 'images': 0, 'history': 0, 'status': {}}
+        image_paths = []
+        next_report = time.monotonic() + 2.0
+        for bills, edits, events, stats, paths in iter_chunks(args):
+            conn.executemany(bill_sql, bills)
+            conn.executemany(edit_sql, edits)
+            conn.executemany(event_sql, events)
+            for k in ('bills', 'edits', 'images', 'history'):
+                totals[k] += stats[k]
+            for k, v in stats['status'].items():
+                totals['status'][k] = totals['status'].get(k, 0) + v
+            image_paths.extend(paths)
+            if time.monotonic() >= next_report:
+                print(f"[gendata] {totals['bills']}/{args.bills} 张票据", file=sys.stderr)
+                next_report = time.monotonic() + 2.0
+        for ddl in INDEXES:
+            conn.execute(ddl)
+        conn.execute('COMMIT')
+        rebuild_stats(conn)
+        # 交付给后端前切回其运行模式（WAL），并收集统计信息
+        conn.execute('PRAGMA locking_mode = NORMAL')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    os.replace(tmp, db_path)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(tmp + suffix):
+            os.remove(tmp + suffix)
+    return totals, image_paths
+
+
+def write_images(image_paths, uploads_dir, threads, size):
+    """为所有图片引用写出占位 PNG（内容按路径确定，保证可复现）。"""
+    palette = [placeholder_png(size, size * 3 // 4, (r, g, b))
+               for r in (60, 140, 220) for g in (60, 140, 220) for b in (90, 200)]
+
+    def write(rel):
+        path = os.path.join(uploads_dir, *rel[len('/uploads/'):].split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(palette[zlib.crc32(rel.encode('utf-8')) % len(palette)])
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for _ in pool.map(write, image_paths):
+            pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m bench.gendata', description='生成合成票据数据库（app.db）。')
+    parser.add_argument('--bills', type=parse_count, default=parse_count('10k'), help='票据数量，如 10k / 100k / 1m（默认 10k）')
+    parser.add_argument('--out', required=True, help='输出目录（作为 DATA_DIR：<out>/app.db、<out>/uploads）')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（默认 1）')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                        help='最近票据日期 YYYY-MM-DD（默认今天；固定后输出完全可复现）')
+    parser.add_argument('--days', type=int, default=730, help='票据日期跨度（天，默认 730）')
+    parser.add_argument('--bounce-rate', type=float, default=0.08, help='每步被高级别退回的概率（默认 0.08）')
+    parser.add_argument('--write-images', action='store_true', help='在 <out>/uploads/bills/<id>/ 写出占位图片文件')
+    parser.add_argument('--image-px', type=int, default=320, help='占位图片宽度（像素，默认 320）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行生成的进程数（默认 CPU 核数）')
+    parser.add_argument('--force', action='store_true', help='覆盖已存在的 app.db')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    out = os.path.abspath(args.out)
+    db_path = os.path.join(out, 'app.db')
+    if os.path.exists(db_path) and not args.force:
+        raise RuntimeError(f'{db_path} 已存在（使用 --force 覆盖）')
+    os.makedirs(os.path.join(out, 'uploads'), exist_ok=True)
+    started = time.monotonic()
+    stats, image_paths = write_db(args, db_path)
+    db_seconds = time.monotonic() - started
+    print(f"[gendata] 票据 {stats['bills']} 张（{stats['bills'] / max(db_seconds, 1e-9):.0f}/s，{db_seconds:.1f}s），"
+          f"修改记录 {stats['edits']} 条，流转事件 {stats['history']} 条，图片引用 {stats['images']} 个")
+    print('[gendata] 状态分布：' + '，'.join(f'{k} {v}' for k, v in sorted(stats['status'].items())))
+    if args.write_images:
+        t = time.monotonic()
+        write_images(image_paths, os.path.join(out, 'uploads'), 16, args.image_px)
+        print(f"[gendata] 占位图片 {len(image_paths)} 个已写入 {os.path.join(out, 'uploads')}（{time.monotonic() - t:.1f}s）")
+    print(f"[gendata] 输出：{db_path}（{os.path.getsize(db_path) / 1048576:.1f}MB）")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"生成失败：{e}", file=sys.stderr)
+        sys.exit(1)
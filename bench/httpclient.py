@@ -0,0 +1,122 @@
+"""
+基于 asyncio 的最小 HTTP/1.1 客户端（仅标准库），每个实例持有一条 keep-alive 连接。
+"""
+
+import asyncio
+import json
+import uuid
+from urllib.parse import urlsplit
+
+
+class HttpError(Exception):
+    """连接或协议错误。"""
+
+
+class HttpClient:
+    def __init__(self, base_url, timeout=30.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, method, path, body=None, headers=None, content_type=None):
+        """发送请求并返回 (状态码, 响应体 bytes)；连接被服务端关闭时自动重连一次。"""
+        for attempt in (0, 1):
+            if self._writer is None:
+                await self._connect()
+            try:
+                return await asyncio.wait_for(self._roundtrip(method, path, body, headers, content_type), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError, HttpError):
+                await self.close()
+                if attempt:
+                    raise
+        raise HttpError('unreachable')
+
+    async def _roundtrip(self, method, path, body, headers, content_type):
+        lines = [f'{method} {self.prefix}{path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                 'Connection: keep-alive', 'Accept: application/json']
+        if body is not None:
+            lines.append(f'Content-Type: {content_type or "application/json"}')
+            lines.append(f'Content-Length: {len(body)}')
+        for k, v in (headers or {}).items():
+            lines.append(f'{k}: {v}')
+        self._writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise HttpError('connection closed')
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            raise HttpError(f'bad status line: {status_line!r}')
+        resp_headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            k, _, v = line.decode('latin-1').partition(':')
+            resp_headers[k.strip().lower()] = v.strip()
+        if resp_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readexactly(2)
+            data = b''.join(chunks)
+        elif 'content-length' in resp_headers:
+            data = await self._reader.readexactly(int(resp_headers['content-length']))
+        else:
+            data = await self._reader.read()
+            await self.close()
+        if resp_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, data
+
+    async def get_json(self, path, headers=None):
+        status, data = await self.request('GET', path, headers=headers)
+        return status, _loads(data)
+
+    async def post_json(self, path, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        status, data = await self.request('POST', path, body=body, headers=headers)
+        return status, _loads(data)
+
+
+def _loads(data):
+    try:
+        return json.loads(data) if data else None
+    except ValueError:
+        return None
+
+
+def multipart(field, files):
+    """构造 multipart/form-data 请求体，files 为 [(文件名, 内容, MIME)]。返回 (body, content_type)。"""
+    boundary = f'----bench{uuid.uuid4().hex}'
+    parts = []
+    for name, content, mime in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{name}"\r\n'
+            f'Content-Type: {mime}\r\n\r\n'.encode('utf-8') + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
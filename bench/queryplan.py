@@ -0,0 +1,595 @@
+"""
+后端 SQL 查询计划分析：从 server/*.cjs 中提取 SQL 字面量（或读取目录文件），
+在数据库的临时副本上执行 EXPLAIN QUERY PLAN 与计时，找出需要加索引的语句。
+
+- 提取：扫描模板字符串与单引号字符串，保留以 SELECT/INSERT/UPDATE/DELETE/REPLACE/WITH 开头的语句；
+  ${NAME} 引用顶层常量（HISTORY_SQL、STATS_*_SQL、EXPORT_PAGE_SIZE 等）时按常量展开，
+  其他插值（listBills 等按条件拼接的 WHERE）视为动态 SQL，由目录文件 bench/queries.json 提供代表性写法
+- 参数：按 `列 = ?`、`列 IN (?)`、`(列, 列) < (?, ?)`、`列 LIKE ?` 从库中取样真实值；目录文件中可写 "@表.列"
+- 标记：全表扫描（SCAN 表）、ORDER BY/GROUP BY 临时 B 树、OR 条件导致的扫描
+- 建议：按等值列 + 范围/排序列为被扫描的表生成 CREATE INDEX（OR 条件每个分支各建一个，使 SQLite 可走 MULTI-INDEX OR），
+  应用到副本并 ANALYZE 后重新计时，报告每条语句的加速比
+- 写语句（UPDATE/DELETE/INSERT）在副本上 BEGIN … ROLLBACK 内计时，原库只读取一次用于复制
+- 副本先补齐后端 ensureSchema 的表、列与索引并回填 currentRole（同 bench.todos --migrate）；
+  bills.history 尚未拆分到 bill_events 的库直接拒绝分析（结果没有意义），需先以该库启动一次后端
+- 执行失败的语句排在报告最前并以退出码 1 结束
+
+用法：
+  python3 -m bench.gendata --bills 100k --out /tmp/handv-100k
+  python3 -m bench.queryplan --db /tmp/handv-100k/app.db
+  python3 -m bench.queryplan --db /tmp/handv-100k/app.db --all --json /tmp/plan.json
+  python3 -m bench.queryplan --catalog my_queries.json --no-extract
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(ROOT, 'server', 'data', 'app.db')
+DEFAULT_SOURCES = os.path.join(ROOT, 'server', '*.cjs')
+DEFAULT_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'queries.json')
+REPEAT = 5
+# 行数低于该值的表（配置、汇总表）扫描代价可忽略，不标记也不建议索引
+MIN_ROWS = 1000
+# 与后端 COLD_TABLES 一致：archive_cold.py 移入 cold.db 的表
+COLD_NAME = 'cold.db'
+COLD_TABLES = ('bills', 'bill_events', 'bill_edits')
+# 加索引后相关语句合计提速不足该倍数的建议视为无明显收益
+MIN_SPEEDUP = 1.5
+SQL_START = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.I)
+SCHEMA_FUNC = 'async function ensureSchema() {'
+SCHEMA_DDL = re.compile(r'^\s*(CREATE\s+(TABLE|(UNIQUE\s+)?INDEX)|ALTER\s+TABLE)\b', re.I)
+ADD_COLUMN_RE = re.compile(r'^ALTER TABLE\s+"?(\w+)"?\s+ADD COLUMN\s+"?(\w+)"?', re.I)
+CREATE_NAME_RE = re.compile(r'^CREATE\s+(?:TABLE|(?:UNIQUE\s+)?INDEX)\s+(?:IF NOT EXISTS\s+)?"?(\w+)"?', re.I)
+CONST_RE = re.compile(r'^const ([A-Z][A-Z0-9_]*) = (?:`([^`$]*)`|\'([^\'\\]*)\'|(\d+))\s*$', re.M)
+INTERP_RE = re.compile(r'\$\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}')
+# 计划中的问题类型 → (说明, 权重)
+ISSUES = {
+    'scan': ('全表扫描', 3),
+    'or': ('OR 条件未走索引', 3),
+    'temp': ('临时 B 树排序/分组', 2),
+    'index-scan': ('全索引扫描', 1),
+}
+
+
+# ---------- 提取 ----------
+
+def _read_template(src, i):
+    """src[i] 为反引号；返回 (模板内容, 结束位置后一位)。${…} 内可嵌套模板，整段原样保留。"""
+    out, j, n = [], i + 1, len(src)
+    while j < n:
+        c = src[j]
+        if c == '\\':
+            out.append(src[j:j + 2])
+            j += 2
+        elif c == '`':
+            return ''.join(out), j + 1
+        elif src.startswith('${', j):
+            depth, k = 1, j + 2
+            while k < n and depth:
+                if src[k] == '`':
+                    _, k = _read_template(src, k)
+                    continue
+                depth += {'{': 1, '}': -1}.get(src[k], 0)
+                k += 1
+            out.append(src[j:k])
+            j = k
+        else:
+            out.append(c)
+            j += 1
+    return ''.join(out), j
+
+
+def iter_string_literals(src):
+    """产出 (内容, 行号)：模板字符串与单引号字符串（跳过注释与双引号字符串）。"""
+    i, n = 0, len(src)
+    while i < n:
+        c = src[i]
+        if src.startswith('//', i):
+            i = src.find('\n', i)
+            i = n if i < 0 else i
+        elif src.startswith('/*', i):
+            i = src.find('*/', i + 2)
+            i = n if i < 0 else i + 2
+        elif c == '`':
+            text, end = _read_template(src, i)
+            yield text, src.count('\n', 0, i) + 1
+            i = end
+        elif c in '\'"':
+            j = i + 1
+            while j < n and src[j] != c and src[j] != '\n':
+                j += 2 if src[j] == '\\' else 1
+            if c == '\'':
+                yield src[i + 1:j].replace('\\\'', '\''), src.count('\n', 0, i) + 1
+            i = j + 1
+        else:
+            i += 1
+
+
+def load_constants(sources):
+    consts = {}
+    for path in sources:
+        with open(path, encoding='utf-8') as f:
+            for m in CONST_RE.finditer(f.read()):
+                consts[m.group(1)] = next(g for g in m.groups()[1:] if g is not None)
+    return consts
+
+
+def expand(sql, consts):
+    """展开 ${常量}；仍含其他插值时返回 None（动态 SQL）。"""
+    for _ in range(3):
+        sql = INTERP_RE.sub(lambda m: consts.get(m.group(1), m.group(0)), sql)
+    return None if '${' in sql else sql
+
+
+def normalize_sql(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def extract(sources, consts):
+    """返回 (语句列表, 动态语句列表)；语句为 {name, sql, params, where}，按 SQL 去重并合并出处。"""
+    found, dynamic = {}, []
+    for path in sources:
+        rel = os.path.relpath(path, ROOT)
+        with open(path, encoding='utf-8') as f:
+            src = f.read()
+        for text, line in iter_string_literals(src):
+            if not SQL_START.match(text):
+                continue
+            sql = expand(text, consts)
+            if sql is None:
+                dynamic.append(f'{rel}:{line}')
+                continue
+            sql = normalize_sql(sql)
+            entry = found.setdefault(sql, {'name': f'{rel}:{line}', 'sql': sql, 'params': None, 'where': []})
+            entry['where'].append(f'{rel}:{line}')
+    return list(found.values()), dynamic
+
+
+def load_catalog(path, consts):
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    out = []
+    for item in items:
+        sql = expand(item['sql'], consts)
+        if sql is None:
+            raise RuntimeError(f"目录文件 {path} 中 {item.get('name')} 含未知插值")
+        out.append({'name': item.get('name') or sql[:40], 'sql': normalize_sql(sql),
+                    'params': item.get('params'), 'where': [os.path.relpath(path, ROOT)]})
+    return out
+
+
+# ---------- 后端结构 ----------
+
+def schema_ddl(sources):
+    """按出现顺序返回 ensureSchema 中的建表、加列与建索引语句。"""
+    for path in sources:
+        with open(path, encoding='utf-8') as f:
+            src = f.read()
+        start = src.find(SCHEMA_FUNC)
+        if start < 0:
+            continue
+        end = src.find('\n}\n', start)
+        body = src[start:end if end >= 0 else len(src)]
+        return [normalize_sql(text) for text, _ in iter_string_literals(body) if SCHEMA_DDL.match(text)]
+    return []
+
+
+def apply_schema(conn, ddl):
+    """在副本上补齐后端结构（与 ensureSchema 相同的幂等语句），返回补上的表/列/索引名。"""
+    added = []
+    for sql in ddl:
+        m = ADD_COLUMN_RE.match(sql)
+        if m:
+            table, column = m.groups()
+            if column in {r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')}:
+                continue
+            added.append(f'{table}.{column}')
+        else:
+            m = CREATE_NAME_RE.match(sql)
+            if m and conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (m.group(1),)).fetchone():
+                continue
+            added.append(m.group(1) if m else sql[:40])
+        conn.execute(sql)
+    return added
+
+
+def migrate_scratch(conn, ddl):
+    """让副本与后端启动后的库一致；返回补齐说明。history 未迁移时抛出异常。"""
+    from .todos import migrate as backfill_current_role
+
+    added = apply_schema(conn, ddl)
+    pending = conn.execute('SELECT COUNT(*) FROM bills WHERE history IS NOT NULL').fetchone()[0]
+    if pending:
+        raise RuntimeError(f'数据库尚未完成后端迁移：{pending} 张票据的 history 未拆分到 bill_events。'
+                           f'请先以该库启动一次后端（DATA_DIR=<目录> node server/index.cjs），'
+                           f'或用 python3 -m bench.gendata 重新生成')
+    filled = backfill_current_role(conn)
+    notes = []
+    if added:
+        notes.append(f'补齐后端结构 {len(added)} 项（{", ".join(added[:8])}{" …" if len(added) > 8 else ""}）')
+    if filled:
+        notes.append(f'回填 currentRole {filled} 行')
+    return notes
+
+
+# ---------- 参数取样 ----------
+
+class Sampler:
+    """按列名从库中取一个真实值（取中间位置的行，避免总取到最旧/最新的数据）。"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cache = {}
+        self.tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                                                   "AND name NOT LIKE 'sqlite_%'")]
+        self.columns = {t: [r[1] for r in conn.execute(f'PRAGMA table_info("{t}")')] for t in self.tables}
+        self.rows = {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in self.tables}
+
+    def value(self, column, prefer=None):
+        tables = ([prefer] if prefer in self.columns else []) + self.tables
+        for t in tables:
+            if column not in self.columns.get(t, ()):
+                continue
+            key = (t, column)
+            if key not in self.cache:
+                n = self.conn.execute(f'SELECT COUNT(*) FROM "{t}" WHERE "{column}" IS NOT NULL').fetchone()[0]
+                row = self.conn.execute(f'SELECT "{column}" FROM "{t}" WHERE "{column}" IS NOT NULL LIMIT 1 OFFSET ?',
+                                        (n // 2,)).fetchone()
+                self.cache[key] = row[0] if row else None
+            return self.cache[key]
+        return None
+
+    def row_values(self, columns, table):
+        n = self.conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        cols = ', '.join(f'"{c}"' for c in columns)
+        row = self.conn.execute(f'SELECT {cols} FROM "{table}" ORDER BY {cols} LIMIT 1 OFFSET ?', (n // 2,)).fetchone()
+        return list(row) if row else [None] * len(columns)
+
+    def resolve(self, value):
+        if isinstance(value, str) and value.startswith('@') and '.' in value:
+            table, column = value[1:].split('.', 1)
+            return self.value(column, table)
+        return value
+
+
+def _strip_literals(sql):
+    """把字符串字面量替换为等长占位，便于按位置定位 ? 而不误匹配字面量中的问号。"""
+    return re.sub(r"'(?:[^']|'')*'", lambda m: "'" + '_' * (len(m.group(0)) - 2) + "'", sql)
+
+
+def main_table(sql):
+    m = re.search(r'\b(?:FROM|INTO|UPDATE)\s+(?:cold\.)?"?(\w+)"?', sql, re.I)
+    return m.group(1) if m else None
+
+
+def bind_params(sql, sampler):
+    """为语句中的每个 ? 推断取样值。"""
+    text = _strip_literals(sql)
+    table = main_table(text)
+    slots = [m.start() for m in re.finditer(r'\?', text)]
+    values = [None] * len(slots)
+    filled = set()
+    # (a, b) < (?, ?) 行值比较：整行取样，保证组合有效
+    for m in re.finditer(r'\(\s*([\w\s,]+?)\s*\)\s*(?:<=|>=|<|>|=)\s*\(\s*(\?(?:\s*,\s*\?)*)\s*\)', text):
+        cols = [c.strip() for c in m.group(1).split(',')]
+        marks = [p for p in slots if m.start(2) <= p < m.end(2)]
+        if len(cols) == len(marks) and table in sampler.columns:
+            for p, v in zip(marks, sampler.row_values(cols, table)):
+                values[slots.index(p)] = v
+                filled.add(p)
+    # INSERT … (cols) VALUES (?, …)：按列顺序取样
+    m = re.search(r'\(([\w\s,]+)\)\s*VALUES\s*\(', text, re.I)
+    if m:
+        cols = [c.strip() for c in m.group(1).split(',')]
+        marks = [p for p in slots if p > m.end()]
+        for p, c in zip(marks, cols):
+            values[slots.index(p)] = sampler.value(c, table)
+            filled.add(p)
+    for i, p in enumerate(slots):
+        if p in filled:
+            continue
+        before = text[:p]
+        m = (re.search(r'"?(\w+)"?\s*(?:=|<>|!=|<=|>=|<|>|\bIS)\s*$', before, re.I)
+             or re.search(r'"?(\w+)"?\s+(?:NOT\s+)?IN\s*\((?:\s*\?\s*,)*\s*$', before, re.I))
+        like = re.search(r'"?(\w+)"?\s+LIKE\s*$', before, re.I)
+        if like:
+            v = sampler.value(like.group(1), table)
+            values[i] = f'%{str(v)[1:4]}%' if v is not None else '%'
+        elif m:
+            values[i] = sampler.value(m.group(1), table)
+        elif re.search(r'\bLIMIT\s*$|\bOFFSET\s*$', before, re.I):
+            values[i] = 50
+        else:
+            values[i] = ''
+    return values
+
+
+# ---------- 计划与计时 ----------
+
+def query_plan(conn, sql, params):
+    return [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+
+def is_write(sql):
+    return not re.match(r'^\s*(SELECT|WITH)\b', sql, re.I)
+
+
+def time_statement(conn, sql, params, repeat=REPEAT):
+    """执行 repeat 次取中位数（毫秒）；写语句在事务中执行并回滚。"""
+    samples = []
+    for _ in range(max(1, repeat)):
+        write = is_write(sql)
+        if write:
+            conn.execute('BEGIN')
+        try:
+            t = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - t) * 1000)
+        finally:
+            if write:
+                conn.execute('ROLLBACK')
+    return statistics.median(samples)
+
+
+def find_issues(sql, plan, tables):
+    """返回 [(类型, 表名或说明)]；只针对行数不少于 MIN_ROWS 的真实表（跳过小表、子查询、json_each 等虚表）。"""
+    issues = []
+    main = main_table(_strip_literals(sql))
+    has_or = re.search(r'\bOR\b', _strip_literals(sql), re.I) is not None
+    multi_or = any('MULTI-INDEX OR' in p for p in plan)
+    for p in plan:
+        m = re.match(r'SCAN (\w+)(?: AS \w+)?( USING (?:COVERING )?INDEX \w+)?', p)
+        if m and m.group(1) in tables:
+            if m.group(2):
+                issues.append(('index-scan', m.group(1)))
+            else:
+                issues.append(('or' if has_or and not multi_or else 'scan', m.group(1)))
+        m = re.match(r'USE TEMP B-TREE FOR (.+)', p)
+        if m and main in tables:
+            issues.append(('temp', m.group(1)))
+    return issues
+
+
+def _existing_prefixes(conn, table):
+    out = []
+    for row in conn.execute(f'PRAGMA index_list("{table}")'):
+        out.append(tuple(r[2] for r in conn.execute(f'PRAGMA index_info("{row[1]}")')))
+    return out
+
+
+def suggest_indexes(conn, sql, issues, columns):
+    """按 WHERE 的等值列 + 范围/排序列生成索引建议；OR 条件为每个分支列各建一个。返回 [(表, (列…))]。"""
+    text = _strip_literals(sql)
+    out = []
+    for kind, table in issues:
+        if kind not in ('scan', 'or', 'temp') or kind == 'temp' and table not in ('ORDER BY', 'GROUP BY'):
+            continue
+        tbl = table if kind != 'temp' else main_table(text)
+        cols = set(columns.get(tbl, ()))
+        if not cols:
+            continue
+        where = re.search(r'\bWHERE\b(.*?)(?:\bGROUP BY\b|\bORDER BY\b|\bLIMIT\b|$)', text, re.I | re.S)
+        where = where.group(1) if where else ''
+        group = re.search(r'\bGROUP BY\b(.*?)(?:\bHAVING\b|\bORDER BY\b|\bLIMIT\b|$)', text, re.I | re.S)
+        order = re.search(r'\bORDER BY\b(.*?)(?:\bLIMIT\b|$)', text, re.I | re.S)
+        order_cols = []
+        for clause in (group, order):
+            if clause and not order_cols:
+                order_cols = [c for c in re.findall(r'(\w+)(?:\s+(?:ASC|DESC))?\s*(?:,|$)', clause.group(1).strip())
+                              if c in cols]
+        if kind == 'or':
+            for c in re.findall(r'"?(\w+)"?\s*=\s*\?', where):
+                if c in cols:
+                    out.append((tbl, (c,)))
+            continue
+        if re.search(r'\bOR\b', where, re.I):
+            continue  # OR 条件按分支建议（见上），组合索引无法同时服务两个分支
+        eq = [c for c in re.findall(r'"?(\w+)"?\s*(?:=\s*(?:\?|\'[^\']*\'|\d+)|IN\s*\()', where) if c in cols]
+        rng = [c for c in re.findall(r'"?(\w+)"?\s*(?:<=|>=|<|>)\s*\?', where) if c in cols]
+        rest = order_cols if order_cols else rng[:1]
+        key = tuple(dict.fromkeys(eq + [c for c in rest if c not in eq]))
+        if key:
+            out.append((tbl, key))
+    existing = {}
+    result = []
+    for tbl, key in dict.fromkeys(out):
+        prefixes = existing.setdefault(tbl, _existing_prefixes(conn, tbl))
+        if not any(p[:len(key)] == key for p in prefixes):
+            result.append((tbl, key))
+    return result
+
+
+def index_ddl(table, cols):
+    return f'CREATE INDEX IF NOT EXISTS idx_{table}_{"_".join(cols).lower()} ON {table}({", ".join(cols)})'
+
+
+def profile(conn, statements, sampler, repeat):
+    tables = {t for t, n in sampler.rows.items() if n >= MIN_ROWS}
+    for st in statements:
+        params = st['params']
+        st['params'] = [sampler.resolve(v) for v in params] if params is not None else bind_params(st['sql'], sampler)
+        st['plan'], st['ms'], st['issues'], st['error'], st['score'] = [], 0.0, [], None, 0.0
+        try:
+            st['plan'] = query_plan(conn, st['sql'], st['params'])
+        except sqlite3.Error as e:
+            st['error'] = str(e)
+            continue
+        st['issues'] = find_issues(st['sql'], st['plan'], tables)
+        try:
+            st['ms'] = time_statement(conn, st['sql'], st['params'], repeat)
+        except sqlite3.IntegrityError as e:
+            # 取样参数与现有数据冲突（如重建汇总表前需先清空）：保留计划分析，不计时
+            st['note'] = f'未计时：{e}'
+        except sqlite3.Error as e:
+            st['error'] = str(e)
+        st['score'] = st['ms'] * (1 + sum(ISSUES[k][1] for k, _ in st['issues']))
+    return statements
+
+
+def attach_cold(conn, db_path, tmp):
+    """与后端 attachCold 一致：ATTACH 冷库副本（不存在时为空库并镜像表结构、后加的列与索引），使 cold.* 语句可分析。"""
+    src = os.path.join(os.path.dirname(db_path), COLD_NAME)
+    scratch = os.path.join(tmp, COLD_NAME)
+    if os.path.isfile(src):
+        copy_db(src, scratch)
+    conn.execute('ATTACH DATABASE ? AS cold', (scratch,))
+    for t in COLD_TABLES:
+        row = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (t,)).fetchone()
+        if row:
+            conn.execute(re.sub(r'^CREATE TABLE\s+(?:IF NOT EXISTS\s+)?"?\w+"?', f'CREATE TABLE IF NOT EXISTS cold.{t}', row[0],
+                                flags=re.I))
+            have = {r[1] for r in conn.execute(f'PRAGMA cold.table_info("{t}")')}
+            for _, name, ctype, *_ in conn.execute(f'PRAGMA main.table_info("{t}")').fetchall():
+                if name not in have:
+                    conn.execute(f'ALTER TABLE cold.{t} ADD COLUMN {name} {ctype or ""}')
+        for name, sql in conn.execute("SELECT name, sql FROM main.sqlite_master WHERE type = 'index' "
+                                      "AND tbl_name = ? AND sql IS NOT NULL", (t,)).fetchall():
+            conn.execute(re.sub(r'^CREATE (UNIQUE )?INDEX\s+(?:IF NOT EXISTS\s+)?"?\w+"?',
+                                lambda m: f'CREATE {m.group(1) or ""}INDEX IF NOT EXISTS cold.{name}', sql, flags=re.I))
+    conn.execute('ANALYZE cold')
+
+
+def copy_db(src, dst):
+    s = sqlite3.connect(f'file:{src}?mode=ro', uri=True)
+    d = sqlite3.connect(dst)
+    try:
+        s.backup(d)
+    finally:
+        s.close()
+        d.close()
+
+
+# ---------- 报告 ----------
+
+def _rank(st):
+    # 执行失败的语句排在最前
+    return (st['error'] is None, -st['score'])
+
+
+def print_report(statements, dynamic, applied, show_all=False, top=20):
+    flagged = sorted((s for s in statements if s['issues'] or s['error']), key=_rank)
+    failed = sum(1 for s in statements if s['error'])
+    print(f'[queryplan] 共 {len(statements)} 条语句，{len(flagged)} 条存在问题（其中 {failed} 条执行失败）；'
+          f'{len(dynamic)} 处动态 SQL 由目录文件覆盖')
+    rows = sorted(statements, key=_rank) if show_all else flagged[:top]
+    for i, st in enumerate(rows, 1):
+        tags = [f'{ISSUES[k][0]}({t})' for k, t in dict.fromkeys(st['issues'])]
+        tags = '，'.join((['执行失败'] if st['error'] else []) + tags) or '无'
+        print(f'\n#{i} {st["name"]}  {st["ms"]:.2f}ms  问题：{tags}')
+        if len(st['where']) > 1:
+            print(f'   出处：{", ".join(st["where"][:6])}{" …" if len(st["where"]) > 6 else ""}')
+        print(f'   {st["sql"][:220]}{" …" if len(st["sql"]) > 220 else ""}')
+        if st['error']:
+            print(f'   执行失败：{st["error"]}')
+        if st.get('note'):
+            print(f'   {st["note"]}')
+        for p in st['plan']:
+            print(f'   | {p}')
+        if st.get('after') is not None:
+            speed = st['ms'] / st['after'] if st['after'] > 0 else float('inf')
+            print(f'   加索引后：{st["after"]:.2f}ms（{speed:.1f}x）')
+            for p in st['after_plan']:
+                print(f'   | {p}')
+    useful = [a for a in applied if a[1][1] <= 0 or a[1][0] / a[1][1] >= MIN_SPEEDUP]
+    if useful:
+        print('\n[queryplan] 建议索引（已在副本上验证）：')
+        for ddl, gain in useful:
+            print(f'  {ddl};  -- 相关语句合计 {gain[0]:.2f}ms → {gain[1]:.2f}ms')
+    rest = [a for a in applied if a not in useful]
+    if rest:
+        print(f'\n[queryplan] 无明显收益（不足 {MIN_SPEEDUP}x，不建议添加）：')
+        for ddl, gain in rest:
+            print(f'  {ddl};  -- {gain[0]:.2f}ms → {gain[1]:.2f}ms')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m bench.queryplan', description='后端 SQL 查询计划分析与索引建议。')
+    parser.add_argument('--db', default=DEFAULT_DB, help='数据库路径（默认 server/data/app.db；只读取，分析在临时副本上进行）')
+    parser.add_argument('--sources', default=DEFAULT_SOURCES, help='提取 SQL 的源文件 glob（默认 server/*.cjs）')
+    parser.add_argument('--catalog', default=DEFAULT_CATALOG, help='补充语句目录文件（JSON，默认 bench/queries.json）')
+    parser.add_argument('--no-extract', action='store_true', help='不从源码提取，只使用目录文件')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help=f'每条语句计时次数（默认 {REPEAT}）')
+    parser.add_argument('--top', type=int, default=20, help='报告列出的问题语句数（默认 20）')
+    parser.add_argument('--all', action='store_true', help='列出全部语句（按耗时与问题加权排序）')
+    parser.add_argument('--no-apply', action='store_true', help='只给出建议，不在副本上验证')
+    parser.add_argument('--json', help='同时将结果写入 JSON 文件')
+    args = parser.parse_args(argv)
+
+    db_path = os.path.abspath(args.db)
+    if not os.path.isfile(db_path):
+        raise RuntimeError(f'数据库不存在：{db_path}')
+    sources = sorted(glob.glob(args.sources))
+    consts = load_constants(sources)
+    statements, dynamic = ([], []) if args.no_extract else extract(sources, consts)
+    if args.catalog and os.path.isfile(args.catalog):
+        statements += load_catalog(args.catalog, consts)
+    if not statements:
+        raise RuntimeError('没有可分析的语句')
+
+    tmp = tempfile.mkdtemp(prefix='queryplan-')
+    try:
+        scratch = os.path.join(tmp, 'app.db')
+        t = time.monotonic()
+        copy_db(db_path, scratch)
+        conn = sqlite3.connect(scratch, isolation_level=None)
+        notes = migrate_scratch(conn, schema_ddl(sources))
+        # 统计信息与生产环境一致（db_maint.py 定期 ANALYZE）
+        conn.execute('ANALYZE')
+        attach_cold(conn, db_path, tmp)
+        print(f'[queryplan] 已复制到临时副本并 ANALYZE（{time.monotonic() - t:.1f}s）：{scratch}')
+        for note in notes:
+            print(f'[queryplan] 副本{note}')
+        sampler = Sampler(conn)
+        profile(conn, statements, sampler, args.repeat)
+
+        suggestions = {}
+        for st in statements:
+            if st['error']:
+                continue
+            for tbl, key in suggest_indexes(conn, st['sql'], st['issues'], sampler.columns):
+                suggestions.setdefault(index_ddl(tbl, key), []).append(st)
+        applied = []
+        if suggestions and not args.no_apply:
+            for ddl in suggestions:
+                conn.execute(ddl)
+            conn.execute('ANALYZE')
+            for st in {id(s): s for group in suggestions.values() for s in group}.values():
+                st['after_plan'] = query_plan(conn, st['sql'], st['params'])
+                st['after'] = time_statement(conn, st['sql'], st['params'], args.repeat)
+            for ddl, group in suggestions.items():
+                applied.append((ddl, (sum(s['ms'] for s in group), sum(s['after'] for s in group))))
+            applied.sort(key=lambda a: a[1][1] - a[1][0])
+        elif suggestions:
+            applied = [(ddl, (sum(s['ms'] for s in g), sum(s['ms'] for s in g))) for ddl, g in suggestions.items()]
+        conn.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print_report(statements, dynamic, applied, show_all=args.all, top=args.top)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'db': db_path, 'dynamic': dynamic, 'statements': statements,
+                       'indexes': [{'ddl': d, 'beforeMs': g[0], 'afterMs': g[1]} for d, g in applied]},
+                      f, ensure_ascii=False, indent=2, default=str)
+        print(f'[queryplan] 结果已写入 {args.json}')
+    return 1 if any(s['error'] for s in statements) else 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"分析失败：{e}", file=sys.stderr)
+        sys.exit(1)
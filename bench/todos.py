@@ -0,0 +1,174 @@
+"""
+待办队列迁移核对：对比旧实现（扫描全部 pending 票据并逐行解析 steps）与新实现
+（bills.currentRole + idx_bills_status_role_date 索引范围扫描）返回的结果。
+
+后端启动时（ensureSchema + backfillCurrentRole）会自动加列、建索引并分批回填；
+--migrate 以相同口径在本地直接迁移数据库，便于在未启动后端时核对旧库（gendata 生成的库已含 currentRole，迁移为空操作）。
+核对内容：每个角色的票据 id 列表（含顺序）完全一致、新查询计划不扫表且无临时排序，并输出两种方式的耗时。
+
+用法：
+  python3 -m bench.gendata --bills 100k --out /tmp/handv-100k
+  python3 -m bench.todos --db /tmp/handv-100k/app.db --migrate
+  python3 -m bench.todos --db server/data/app.db      # 后端已完成迁移时只核对（只读）
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DB = os.path.join(ROOT, 'server', 'data', 'app.db')
+BACKFILL_BATCH = 500
+
+OLD_SQL = ("SELECT id, steps, currentStepIndex FROM bills WHERE status = 'pending' "
+           "ORDER BY date DESC, id DESC")
+NEW_SQL = ("SELECT id FROM bills WHERE status = 'pending' AND currentRole = ? "
+           "ORDER BY date DESC, id DESC")
+
+
+def parse_json_array(value):
+    """与 server/index.cjs 的 parseJsonArraySafe 一致：最多解两层（兼容双重编码）。"""
+    x = value
+    for _ in range(2):
+        if isinstance(x, list):
+            return x
+        if not isinstance(x, str):
+            break
+        try:
+            x = json.loads(x)
+        except ValueError:
+            break
+    return x if isinstance(x, list) else []
+
+
+def current_role_of(status, steps, current_step_index):
+    """与 server/index.cjs 的 currentRoleOf 一致。"""
+    if status != 'pending':
+        return None
+    try:
+        idx = int(current_step_index or 0)
+    except (TypeError, ValueError):
+        idx = 0
+    steps = parse_json_array(steps)
+    role = steps[idx] if 0 <= idx < len(steps) else None
+    return role if isinstance(role, str) else None
+
+
+def migrate(conn):
+    """按 ensureSchema/backfillCurrentRole 的方式加列、建索引并分批回填，返回回填行数。"""
+    cols = {r[1] for r in conn.execute('PRAGMA table_info(bills)')}
+    if 'currentRole' not in cols:
+        conn.execute('ALTER TABLE bills ADD COLUMN currentRole TEXT')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_bills_status_role_date ON bills(status, currentRole, date, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_bills_createdby_date ON bills(createdBy, date, id)')
+    ids = [r[0] for r in conn.execute("SELECT rowid FROM bills WHERE status = 'pending' AND currentRole IS NULL")]
+    updated = 0
+    for i in range(0, len(ids), BACKFILL_BATCH):
+        batch = ids[i:i + BACKFILL_BATCH]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(f"SELECT rowid, status, steps, currentStepIndex FROM bills "
+                                f"WHERE rowid IN ({','.join('?' * len(batch))})", batch).fetchall()
+            for rid, status, steps, idx in rows:
+                role = current_role_of(status, steps, idx)
+                if role:
+                    conn.execute("UPDATE bills SET currentRole = ? WHERE rowid = ? AND status = 'pending' "
+                                 "AND currentRole IS NULL", (role, rid))
+                    updated += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    conn.execute('ANALYZE')
+    return updated
+
+
+def old_todos(conn):
+    """旧实现：一次扫描全部 pending 票据，按 steps[currentStepIndex] 归入各角色。"""
+    by_role = {}
+    for bill_id, steps, idx in conn.execute(OLD_SQL):
+        steps = parse_json_array(steps)
+        try:
+            idx = int(idx or 0)
+        except (TypeError, ValueError):
+            idx = 0
+        role = steps[idx] if 0 <= idx < len(steps) else None
+        if isinstance(role, str):
+            by_role.setdefault(role, []).append(bill_id)
+    return by_role
+
+
+def check(conn):
+    """返回 (不一致列表, 每角色耗时 {role: (旧 ms, 新 ms, 张数)}, 新查询计划)。"""
+    cols = {r[1] for r in conn.execute('PRAGMA table_info(bills)')}
+    if 'currentRole' not in cols:
+        raise RuntimeError('bills 尚无 currentRole 列（先启动一次后端，或使用 --migrate）')
+    roles = [r[0] for r in conn.execute('SELECT role FROM approval_order ORDER BY sort')] + ['accountant']
+    conn.execute('BEGIN')  # 同一读快照内比较
+    try:
+        t = time.perf_counter()
+        old = old_todos(conn)
+        old_ms = (time.perf_counter() - t) * 1000
+        roles += sorted(set(old) - set(roles))
+        diffs, timing = [], {}
+        for role in roles:
+            t = time.perf_counter()
+            new = [r[0] for r in conn.execute(NEW_SQL, (role,))]
+            timing[role] = (old_ms, (time.perf_counter() - t) * 1000, len(new))
+            expected = old.get(role, [])
+            if new != expected:
+                missing = set(expected) - set(new)
+                extra = set(new) - set(expected)
+                diffs.append((role, len(expected), len(new), sorted(missing)[:5], sorted(extra)[:5]))
+        plan = [r[3] for r in conn.execute('EXPLAIN QUERY PLAN ' + NEW_SQL, ('approver1',))]
+    finally:
+        conn.execute('COMMIT')
+    return diffs, timing, plan
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m bench.todos', description='核对待办队列 currentRole 迁移结果。')
+    parser.add_argument('--db', default=DEFAULT_DB, help='数据库路径（默认 server/data/app.db）')
+    parser.add_argument('--migrate', action='store_true', help='先按后端口径加列、建索引并回填（会写入数据库）')
+    args = parser.parse_args(argv)
+
+    db_path = os.path.abspath(args.db)
+    if not os.path.isfile(db_path):
+        raise RuntimeError(f'数据库不存在：{db_path}')
+    if args.migrate:
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    else:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=30, isolation_level=None)
+    try:
+        if args.migrate:
+            t = time.monotonic()
+            n = migrate(conn)
+            print(f'[todos] 已迁移：回填 {n} 张 pending 票据（{time.monotonic() - t:.2f}s）')
+        diffs, timing, plan = check(conn)
+        old_ms = next(iter(timing.values()))[0] if timing else 0
+        print(f'[todos] 旧实现：扫描并解析全部 pending 票据 {old_ms:.1f}ms（每次请求，与角色无关）')
+        for role, (_, new_ms, count) in timing.items():
+            print(f'  {role:<12} {count:>7} 张  索引查询 {new_ms:.1f}ms')
+        print('[todos] 查询计划：' + '；'.join(plan))
+        bad_plan = [p for p in plan if p.startswith('SCAN') or 'TEMP B-TREE' in p]
+        for role, n_old, n_new, missing, extra in diffs:
+            print(f'  {role}：旧 {n_old} 张，新 {n_new} 张，缺少 {missing}，多出 {extra}')
+        if diffs or bad_plan:
+            print(f'[todos] 核对失败：{len(diffs)} 个角色结果不一致' + ('，查询计划未走索引' if bad_plan else ''))
+            sys.exit(1)
+        print(f'[todos] {len(timing)} 个角色的待办结果与旧实现一致')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"核对失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+app.db 数据库维护：WAL、PRAGMA、ANALYZE / optimize、完整性检查、VACUUM 与 WAL 检查点。
+
+后端每个连接启动时设置 synchronous / cache_size / mmap_size 等连接级参数（见 server/index.cjs）；
+本工具处理写在数据库文件里、需要定期执行的部分：
+- journal_mode=WAL（持久化到文件，读写互不阻塞）
+- ANALYZE 更新 sqlite_stat1，随后 PRAGMA optimize
+- PRAGMA integrity_check（只读，WAL 下不阻塞后端写入；发现损坏时跳过 VACUUM 并以退出码 1 结束）
+- 空闲页回收：auto_vacuum=INCREMENTAL 时按 --vacuum-pages 分批 incremental_vacuum，每批是独立的短写事务，
+  批间休眠让出写锁；尚未启用增量模式的旧库需执行一次 --full（设置 auto_vacuum 后整库 VACUUM，
+  期间持有写锁，建议在后端停止时执行，deploy.py --maintain-db 会在后端未运行时自动加上）
+- PRAGMA wal_checkpoint(TRUNCATE) 回写并截断 WAL
+- 报告维护前后的文件大小（含 -wal）、空闲页比例、页内空闲（碎片，dbstat）与一组固定查询（待办、列表翻页、计数、流转历史）的耗时
+
+各项按间隔调度，上次执行时间记录在 .db_maint.json；适合由 cron 每小时调用，未到期的项目自动跳过，
+--force 忽略间隔全部执行。REPLACE INTO bills 与 bill_events 迁移（清空 bills.history）都会留下大量空闲页。
+
+用法：
+  python3 db_maint.py                     # 执行到期项目并输出报告
+  python3 db_maint.py --force --full      # 全部执行，旧库首次启用增量回收
+  python3 db_maint.py --report            # 只输出当前状态与查询耗时（只读）
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(ROOT, 'server', 'data', 'app.db')
+STATE_FILE = os.path.join(ROOT, '.db_maint.json')
+VACUUM_PAGES = 2000
+VACUUM_SLEEP = 0.05
+QUERY_REPEAT = 5
+# 项目 → 默认执行间隔（秒）
+SCHEDULE = {
+    'analyze': 86400,
+    'integrity': 7 * 86400,
+    'vacuum': 86400,
+}
+# 空闲页比例达到该值才回收（--force 时不限）
+VACUUM_MIN_FREE = 0.05
+# --full 时已是增量模式的库，页内空闲（碎片）比例达到该值才整库 VACUUM 重新紧凑存放
+FULL_VACUUM_MIN_SLACK = 0.2
+AUTO_VACUUM_MODES = {0: 'NONE', 1: 'FULL', 2: 'INCREMENTAL'}
+
+
+def connect(db_path):
+    if not os.path.isfile(db_path):
+        raise RuntimeError(f"数据库不存在：{db_path}")
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA busy_timeout = 30000')
+    return conn
+
+
+def pragma(conn, name):
+    row = conn.execute(f'PRAGMA {name}').fetchone()
+    return row[0] if row else None
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def page_slack(conn):
+    """已用页内未使用字节占比（dbstat 虚表，Python 自带的 SQLite 通常已编译；不可用时返回 None）。"""
+    try:
+        row = conn.execute('SELECT SUM(unused) * 1.0 / SUM(pgsize) FROM dbstat WHERE aggregate = 1').fetchone()
+    except sqlite3.Error:
+        return None
+    return row[0] or 0.0
+
+
+def db_stats(conn, db_path):
+    page_size = pragma(conn, 'page_size')
+    pages = pragma(conn, 'page_count')
+    free = pragma(conn, 'freelist_count')
+    return {
+        'slack': page_slack(conn),
+        'db': _file_size(db_path),
+        'wal': _file_size(db_path + '-wal'),
+        'pageSize': page_size,
+        'pages': pages,
+        'free': free,
+        'freeRatio': (free / pages) if pages else 0.0,
+        'journal': pragma(conn, 'journal_mode'),
+        'autoVacuum': AUTO_VACUUM_MODES.get(pragma(conn, 'auto_vacuum'), '?'),
+    }
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def query_set(conn):
+    """与后端热点接口口径一致的固定查询集合；按当前库结构选择（旧库无 currentRole / bill_events 时跳过相应项）。"""
+    cols = _columns(conn, 'bills')
+    if not cols:
+        return []
+    out = []
+    user = conn.execute("SELECT createdBy FROM bills WHERE createdBy IS NOT NULL "
+                        "GROUP BY createdBy ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    user = user[0] if user else ''
+    if 'currentRole' in cols:
+        out.append(('待办:approver1', "SELECT id FROM bills WHERE status = 'pending' AND currentRole = ? "
+                                     "ORDER BY date DESC, id DESC LIMIT 50", ('approver1',)))
+    out.append(('我的票据首页', "SELECT id, title, amount, status, date FROM bills WHERE createdBy = ? "
+                               "ORDER BY date DESC, id DESC LIMIT 50", (user,)))
+    out.append(('我的票据计数', "SELECT status, COUNT(*) FROM bills WHERE createdBy = ? GROUP BY status", (user,)))
+    out.append(('归档首页', "SELECT id, title, amount, date FROM bills WHERE status = 'archived' "
+                           "ORDER BY date DESC, id DESC LIMIT 50", ()))
+    mid = conn.execute("SELECT date, id FROM bills WHERE status = 'archived' ORDER BY date, id "
+                       "LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM bills WHERE status = 'archived')").fetchone()
+    if mid:
+        out.append(('归档深翻页', "SELECT id, title, amount, date FROM bills WHERE status = 'archived' "
+                                 "AND (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT 50", tuple(mid)))
+    if _columns(conn, 'bill_events'):
+        bill = conn.execute('SELECT billId FROM bill_events ORDER BY id DESC LIMIT 1').fetchone()
+        if bill:
+            out.append(('流转历史', "SELECT json_group_array(json(data)) FROM "
+                                   "(SELECT data FROM bill_events WHERE billId = ? ORDER BY id)", tuple(bill)))
+    return out
+
+
+def time_queries(conn, queries, repeat=QUERY_REPEAT):
+    """每条查询执行 repeat 次取中位数（毫秒）。"""
+    out = {}
+    for name, sql, params in queries:
+        samples = []
+        for _ in range(max(1, repeat)):
+            t = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - t) * 1000)
+        out[name] = statistics.median(samples)
+    return out
+
+
+def load_state():
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    try:
+        with open(STATE_FILE, 'w') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+    except OSError:
+        pass
+
+
+def due(state, db_path, task, force=False):
+    if force:
+        return True
+    last = state.get(db_path, {}).get(task, 0)
+    return time.time() - last >= SCHEDULE[task]
+
+
+def mark(state, db_path, task):
+    state.setdefault(db_path, {})[task] = time.time()
+
+
+def ensure_wal(conn):
+    mode = pragma(conn, 'journal_mode')
+    if str(mode).lower() != 'wal':
+        mode = pragma(conn, 'journal_mode = WAL')
+        if str(mode).lower() != 'wal':
+            raise RuntimeError(f'无法切换到 WAL（当前 {mode}），可能有其他连接正在使用旧日志模式')
+        return True
+    return False
+
+
+def integrity(conn):
+    """返回问题列表；空列表表示通过。"""
+    rows = [r[0] for r in conn.execute('PRAGMA integrity_check')]
+    return [] if rows == ['ok'] else rows
+
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES, sleep=VACUUM_SLEEP):
+    """分批释放空闲页，每批一个短写事务；返回释放的页数。"""
+    freed = 0
+    while True:
+        before = pragma(conn, 'freelist_count')
+        if not before:
+            break
+        conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+        after = pragma(conn, 'freelist_count')
+        freed += before - after
+        if after >= before:
+            break
+        if sleep:
+            time.sleep(sleep)
+    return freed
+
+
+def full_vacuum(conn, db_path):
+    """启用 auto_vacuum=INCREMENTAL 并整库 VACUUM（需要约一倍库大小的临时空间，期间持有写锁）。"""
+    need = _file_size(db_path)
+    free_disk = shutil.disk_usage(os.path.dirname(db_path)).free
+    if free_disk < need * 1.2:
+        raise RuntimeError(f'磁盘剩余空间不足以执行 VACUUM（需约 {_fmt_size(need)}，剩余 {_fmt_size(free_disk)}）')
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
+
+
+def checkpoint(conn):
+    """返回 (busy, WAL 帧数, 已回写帧数)；busy=1 表示仍有读事务占用，WAL 未能截断。"""
+    return tuple(conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone())
+
+
+def maintain(db_path, force=False, full=False, repeat=QUERY_REPEAT, pages=VACUUM_PAGES, sleep=VACUUM_SLEEP):
+    """执行到期的维护项目，返回 (报告行列表, 是否发现完整性问题)。"""
+    db_path = os.path.abspath(db_path)
+    state = load_state()
+    conn = connect(db_path)
+    lines, corrupt = [], False
+    try:
+        queries = query_set(conn)
+        before = db_stats(conn, db_path)
+        t_before = time_queries(conn, queries, repeat)
+
+        def step(label, fn):
+            t = time.monotonic()
+            out = fn()
+            lines.append(f'{label}（{time.monotonic() - t:.2f}s）')
+            return out
+
+        if ensure_wal(conn):
+            lines.append('journal_mode：已切换为 WAL')
+        if due(state, db_path, 'integrity', force):
+            problems = step('integrity_check', lambda: integrity(conn))
+            mark(state, db_path, 'integrity')
+            if problems:
+                corrupt = True
+                lines.append(f'完整性检查发现 {len(problems)} 个问题（跳过 VACUUM）：')
+                lines.extend(f'  {p}' for p in problems[:20])
+        if due(state, db_path, 'analyze', force):
+            step('ANALYZE', lambda: conn.execute('ANALYZE'))
+            mark(state, db_path, 'analyze')
+        conn.execute('PRAGMA optimize')
+        if not corrupt and (full or due(state, db_path, 'vacuum', force)):
+            stats = db_stats(conn, db_path)
+            slack = stats['slack'] or 0
+            if full and (force or stats['autoVacuum'] != 'INCREMENTAL' or slack >= FULL_VACUUM_MIN_SLACK):
+                step(f'VACUUM（auto_vacuum {stats["autoVacuum"]} → INCREMENTAL）', lambda: full_vacuum(conn, db_path))
+            else:
+                if stats['autoVacuum'] == 'INCREMENTAL':
+                    if force or stats['freeRatio'] >= VACUUM_MIN_FREE:
+                        n = step('incremental_vacuum', lambda: incremental_vacuum(conn, pages, sleep))
+                        lines[-1] += f'：释放 {n} 页'
+                elif stats['free']:
+                    lines.append(f'空闲页 {stats["free"]}（{stats["freeRatio"]:.1%}）：auto_vacuum={stats["autoVacuum"]}，'
+                                 f'需执行一次 --full（整库 VACUUM，建议在后端停止时）后才能增量回收')
+                if slack >= FULL_VACUUM_MIN_SLACK:
+                    lines.append(f'页内空闲 {slack:.1%}：增量回收只释放空闲页，碎片需 --full 整库 VACUUM 紧凑存放')
+            mark(state, db_path, 'vacuum')
+        busy, log, done = step('wal_checkpoint(TRUNCATE)', lambda: checkpoint(conn))
+        if busy:
+            lines[-1] += f'：有读事务占用，已回写 {done}/{log} 帧，WAL 未截断'
+        after = db_stats(conn, db_path)
+        t_after = time_queries(conn, queries, repeat)
+    finally:
+        conn.close()
+        save_state(state)
+    return lines + format_report(db_path, before, after, t_before, t_after), corrupt
+
+
+def report(db_path, repeat=QUERY_REPEAT):
+    db_path = os.path.abspath(db_path)
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=30)
+    try:
+        stats = db_stats(conn, db_path)
+        timing = time_queries(conn, query_set(conn), repeat)
+    finally:
+        conn.close()
+    last = load_state().get(db_path, {})
+    lines = format_report(db_path, stats, None, timing, None)
+    for task in SCHEDULE:
+        ts = last.get(task)
+        lines.append(f'上次 {task}：' + (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)) if ts else '从未'))
+    return lines
+
+
+def _fmt_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.1f}{unit}" if unit != 'B' else f"{n}B"
+        n /= 1024
+
+
+def _fmt_stats(s):
+    slack = '' if s['slack'] is None else f"，页内空闲 {s['slack']:.1%}"
+    return (f"{_fmt_size(s['db'])} + WAL {_fmt_size(s['wal'])}，{s['pages']} 页，空闲 {s['free']} 页"
+            f"（{s['freeRatio']:.1%}）{slack}，journal={s['journal']}，auto_vacuum={s['autoVacuum']}")
+
+
+def format_report(db_path, before, after, t_before, t_after):
+    lines = [f'数据库：{db_path}']
+    if after is None:
+        lines.append(f'  当前：{_fmt_stats(before)}')
+    else:
+        lines.append(f'  维护前：{_fmt_stats(before)}')
+        lines.append(f'  维护后：{_fmt_stats(after)}')
+    if t_before:
+        lines.append('  查询耗时（中位数）：')
+        for name, ms in t_before.items():
+            tail = f' → {t_after[name]:.2f}ms' if t_after and name in t_after else ''
+            lines.append(f'    {name:<14} {ms:.2f}ms{tail}')
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='app.db 维护：WAL、ANALYZE/optimize、完整性检查、VACUUM 与 WAL 检查点。')
+    parser.add_argument('--db', default=DEFAULT_DB, help='数据库路径（默认 server/data/app.db）')
+    parser.add_argument('--force', action='store_true', help='忽略调度间隔，执行全部项目')
+    parser.add_argument('--full', action='store_true',
+                        help='需要时整库 VACUUM 并启用 auto_vacuum=INCREMENTAL（持有写锁，建议在后端停止时）')
+    parser.add_argument('--report', action='store_true', help='只输出当前状态与查询耗时（只读）')
+    parser.add_argument('--repeat', type=int, default=QUERY_REPEAT, help=f'每条查询计时次数（默认 {QUERY_REPEAT}）')
+    parser.add_argument('--vacuum-pages', type=int, default=VACUUM_PAGES,
+                        help=f'增量回收每批页数（默认 {VACUUM_PAGES}）')
+    parser.add_argument('--vacuum-sleep', type=float, default=VACUUM_SLEEP,
+                        help=f'增量回收批间休眠秒数（默认 {VACUUM_SLEEP}）')
+    args = parser.parse_args()
+
+    if args.report:
+        print('\n'.join(report(args.db, args.repeat)))
+        return
+    lines, corrupt = maintain(args.db, force=args.force, full=args.full, repeat=args.repeat,
+                              pages=args.vacuum_pages, sleep=args.vacuum_sleep)
+    print('\n'.join(lines))
+    if corrupt:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"维护失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+上传文件内容寻址去重（硬链接合并）。
+
+同一张票据常被重复上传（重提单据时图片会再次上传），每份副本都以 Date.now()-随机数 命名存放在
+uploads/bills/<id>/ 下。本工具：
+- 并行计算上传目录中每个文件的 SHA-256（分块读取，内存占用与文件大小无关）
+- 哈希索引持久化在上传目录下的 .dedup-index.db（SQLite），按 大小/mtime/inode 判断文件是否变化，
+  增量运行只哈希新增或变更的文件
+- 内容相同的文件合并为同一份数据（硬链接），路径与文件名不变，票据 images 中的 /uploads/... URL 无需改动
+- 报告本次回收的字节数以及逻辑大小 / 实际占用
+
+上传文件写入后不会原地修改（删除走 unlink，optimize_images.py 生成变体时写临时文件再替换），
+因此共享 inode 是安全的。索引中的 rel → sha256 也可供备份按内容增量上传。
+
+用法：
+  python3 dedupe_uploads.py                 # 哈希新文件并合并重复
+  python3 dedupe_uploads.py --dry-run       # 只报告可回收空间
+  python3 dedupe_uploads.py --verify        # 合并前逐字节比对（更慢，更保守）
+"""
+
+import argparse
+import filecmp
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROOT = os.path.join(ROOT, 'server', 'data', 'uploads')
+INDEX_NAME = '.dedup-index.db'
+CHUNK_SIZE = 1 << 20
+# 刚写入的文件可能仍在上传中，等待其稳定后再处理
+SETTLE_SECONDS = 2.0
+# 同时在途的哈希任务上限，避免超大目录一次性提交全部任务
+MAX_PENDING = 256
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+  rel TEXT PRIMARY KEY,
+  dir TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  mtime_ns INTEGER NOT NULL,
+  ino INTEGER NOT NULL,
+  sha256 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_dir ON files(dir);
+CREATE INDEX IF NOT EXISTS idx_files_sha ON files(sha256);
+"""
+
+
+def open_index(root):
+    """打开（必要时创建）root 下的哈希索引，返回 sqlite3 连接。"""
+    conn = sqlite3.connect(os.path.join(root, INDEX_NAME))
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.executescript(INDEX_SCHEMA)
+    return conn
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    buf = bytearray(CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.hexdigest()
+
+
+def iter_dirs(root):
+    """深度优先列出 root 下所有目录，返回 (相对路径, 目录项列表)；跳过以 . 开头的文件与目录。"""
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                entries = [e for e in it if not e.name.startswith('.')]
+        except OSError:
+            continue
+        rel = os.path.relpath(d, root).replace(os.sep, '/')
+        files = []
+        for e in entries:
+            if e.is_dir(follow_symlinks=False):
+                stack.append(e.path)
+            elif e.is_file(follow_symlinks=False):
+                files.append(e)
+        yield rel, files
+
+
+def refresh_index(root, conn, workers=None, force=False):
+    """扫描目录并更新索引，返回 (文件数, 新哈希文件数, 新哈希字节数)。"""
+    now = time.time()
+    seen_dirs = []
+    total = hashed = hashed_bytes = 0
+    pending = []
+
+    def drain(limit):
+        nonlocal hashed, hashed_bytes
+        while len(pending) > limit:
+            rel, rel_dir, st, fut = pending.pop(0)
+            try:
+                digest = fut.result()
+            except OSError:  # 哈希过程中被删除
+                continue
+            conn.execute('INSERT OR REPLACE INTO files (rel, dir, size, mtime_ns, ino, sha256) VALUES (?,?,?,?,?,?)',
+                         (rel, rel_dir, st.st_size, st.st_mtime_ns, st.st_ino, digest))
+            hashed += 1
+            hashed_bytes += st.st_size
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rel_dir, entries in iter_dirs(root):
+            seen_dirs.append((rel_dir,))
+            known = {rel: (size, mtime_ns, ino) for rel, size, mtime_ns, ino in
+                     conn.execute('SELECT rel, size, mtime_ns, ino FROM files WHERE dir = ?', (rel_dir,))}
+            present = set()
+            for e in entries:
+                rel = e.name if rel_dir == '.' else f'{rel_dir}/{e.name}'
+                try:
+                    st = e.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                present.add(rel)
+                if now - st.st_mtime < SETTLE_SECONDS:
+                    continue
+                total += 1
+                if not force and known.get(rel) == (st.st_size, st.st_mtime_ns, st.st_ino):
+                    continue
+                pending.append((rel, rel_dir, st, pool.submit(file_sha256, e.path)))
+                drain(MAX_PENDING)
+            gone = [(rel,) for rel in known if rel not in present]
+            if gone:
+                conn.executemany('DELETE FROM files WHERE rel = ?', gone)
+        drain(0)
+
+    # 整个目录已删除（如 deleteBillImagesSync）：清理对应索引
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS seen_dirs (dir TEXT PRIMARY KEY)')
+    conn.execute('DELETE FROM seen_dirs')
+    conn.executemany('INSERT OR IGNORE INTO seen_dirs (dir) VALUES (?)', seen_dirs)
+    conn.execute('DELETE FROM files WHERE dir NOT IN (SELECT dir FROM seen_dirs)')
+    conn.commit()
+    return total, hashed, hashed_bytes
+
+
+def _link_replace(src, dst):
+    """以 src 的硬链接原子替换 dst。"""
+    tmp = f'{dst}.dedup{os.getpid()}'
+    os.link(src, tmp)
+    try:
+        os.replace(tmp, dst)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+
+def dedupe(root, conn, dry_run=False, verify=False):
+    """合并内容相同的文件，返回 (合并的文件数, 回收字节数, 失败列表)。"""
+    groups = conn.execute(
+        'SELECT sha256 FROM files WHERE size > 0 GROUP BY sha256 HAVING COUNT(DISTINCT ino) > 1').fetchall()
+    linked = reclaimed = 0
+    failed = []
+    for (digest,) in groups:
+        rows = conn.execute('SELECT rel, size, mtime_ns, ino FROM files WHERE sha256 = ? ORDER BY rel',
+                            (digest,)).fetchall()
+        by_ino = {}
+        for row in rows:
+            by_ino.setdefault(row[3], []).append(row)
+        # 以已被链接最多的 inode 为保留副本，其余 inode 的路径改为指向它
+        keep_ino = min(by_ino, key=lambda ino: (-len(by_ino[ino]), by_ino[ino][0][0]))
+        keep_rel = by_ino[keep_ino][0][0]
+        keep_path = os.path.join(root, *keep_rel.split('/'))
+        try:
+            keep_st = os.stat(keep_path)
+        except OSError as e:
+            failed.append((keep_rel, str(e)))
+            continue
+        if keep_st.st_ino != keep_ino:
+            continue  # 索引过期，下次运行重新哈希后再处理
+        for ino, dup_rows in by_ino.items():
+            if ino == keep_ino:
+                continue
+            done = 0
+            for rel, size, mtime_ns, _ in dup_rows:
+                path = os.path.join(root, *rel.split('/'))
+                try:
+                    st = os.stat(path)
+                    if (st.st_ino, st.st_size, st.st_mtime_ns) != (ino, size, mtime_ns):
+                        continue  # 哈希后又被修改，跳过
+                    if st.st_dev != keep_st.st_dev:
+                        continue
+                    if verify and not filecmp.cmp(keep_path, path, shallow=False):
+                        failed.append((rel, f'内容与 {keep_rel} 不一致（哈希冲突？）'))
+                        continue
+                    if not dry_run:
+                        _link_replace(keep_path, path)
+                        conn.execute('UPDATE files SET ino = ?, mtime_ns = ? WHERE rel = ?',
+                                     (keep_ino, keep_st.st_mtime_ns, rel))
+                except OSError as e:  # 如硬链接数达到上限（EMLINK）
+                    failed.append((rel, str(e)))
+                    continue
+                linked += 1
+                # 该路径是旧 inode 的最后一个链接时（目录外无其他硬链接），其数据块被释放
+                if st.st_nlink - (done if dry_run else 0) == 1:
+                    reclaimed += size
+                done += 1
+    conn.commit()
+    return linked, reclaimed, failed
+
+
+def usage(conn):
+    """返回 (逻辑大小, 实际占用)：实际占用按 inode 去重计。"""
+    logical = conn.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+    physical = conn.execute(
+        'SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM files GROUP BY ino)').fetchone()[0]
+    return logical, physical
+
+
+def _fmt_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def run(root=DEFAULT_ROOT, workers=None, force=False, dry_run=False, verify=False):
+    if not os.path.isdir(root):
+        raise RuntimeError(f"上传目录不存在：{root}")
+    started = time.monotonic()
+    conn = open_index(root)
+    try:
+        total, hashed, hashed_bytes = refresh_index(root, conn, workers=workers, force=force)
+        hash_seconds = time.monotonic() - started
+        logical_before, physical_before = usage(conn)
+        linked, reclaimed, failed = dedupe(root, conn, dry_run=dry_run, verify=verify)
+        logical, physical = usage(conn)
+    finally:
+        conn.close()
+    return {
+        'files': total,
+        'hashed': hashed,
+        'hashed_bytes': hashed_bytes,
+        'hash_seconds': hash_seconds,
+        'linked': linked,
+        'reclaimed': reclaimed,
+        'failed': failed,
+        'logical': logical,
+        'physical': physical if not dry_run else physical_before - reclaimed,
+        'dry_run': dry_run,
+        'seconds': time.monotonic() - started,
+    }
+
+
+def print_report(stats):
+    rate = stats['hashed_bytes'] / stats['hash_seconds'] / 1048576 if stats['hash_seconds'] > 0 else 0
+    print(f"[dedupe] 文件 {stats['files']} 个，新哈希 {stats['hashed']} 个（{_fmt_size(stats['hashed_bytes'])}，"
+          f"{rate:.0f}MB/s），耗时 {stats['seconds']:.2f}s")
+    verb = '可合并' if stats['dry_run'] else '已合并'
+    print(f"[dedupe] {verb} {stats['linked']} 个重复文件，{'可' if stats['dry_run'] else ''}回收 "
+          f"{_fmt_size(stats['reclaimed'])}")
+    print(f"[dedupe] 逻辑大小 {_fmt_size(stats['logical'])}，实际占用 {_fmt_size(stats['physical'])}")
+    for rel, err in stats['failed'][:10]:
+        print(f"  失败：{rel}：{err}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按内容哈希合并上传目录中的重复文件（硬链接，URL 不变）。')
+    parser.add_argument('--root', default=DEFAULT_ROOT, help='上传目录（默认 server/data/uploads）')
+    parser.add_argument('--workers', type=int, default=None, help='并行哈希线程数')
+    parser.add_argument('--force', action='store_true', help='忽略索引，重新哈希全部文件')
+    parser.add_argument('--dry-run', action='store_true', help='只报告，不修改文件')
+    parser.add_argument('--verify', action='store_true', help='合并前逐字节比对')
+    args = parser.parse_args()
+    stats = run(os.path.abspath(args.root), workers=args.workers, force=args.force,
+                dry_run=args.dry_run, verify=args.verify)
+    print_report(stats)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"去重失败：{e}", file=sys.stderr)
+        sys.exit(1)
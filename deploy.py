@@ -6,12 +6,66 @@ import subprocess
 import shlex
 import time
 import shutil
+import glob
+import hashlib
+import json
+import socket
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import supervisor
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
 SERVER_PID = os.path.join(ROOT, 'server.pid')
 FRONT_PID = os.path.join(ROOT, 'frontend.pid')
 SERVER_LOG = os.path.join(ROOT, 'server.log')
 FRONT_LOG = os.path.join(ROOT, 'frontend.log')
+BUILD_DIR = os.path.join(ROOT, 'build_tmp')
+BACKEND_PORT = 6666
+BUILD_CACHE = os.path.join(ROOT, '.build_cache.json')
+STARTUP_LOG = os.path.join(ROOT, 'startup.log')
+READY_TIMEOUT = 30.0
+DB_MAINT = os.path.join(ROOT, 'db_maint.py')
+APP_DB = os.path.join(ROOT, 'server', 'data', 'app.db')
+COLD_DB = os.path.join(ROOT, 'server', 'data', 'cold.db')
+NGINX_SETUP = os.path.join(ROOT, 'nginx_setup.py')
+# 蓝绿部署：blue 占用 6666 起的端口，green 占用 6766 起的端口；当前接流的颜色记录在 .backend_color.json
+BACKEND_STATE = os.path.join(ROOT, '.backend_color.json')
+COLOR_PORTS = {'blue': BACKEND_PORT, 'green': BACKEND_PORT + 100}
+# 切换后等待旧实例连接归零的最长时间，以及发送 SIGTERM 后等待其处理完剩余请求退出的时间
+DRAIN_GRACE = 30.0
+STOP_TIMEOUT = 35.0
+# 影响依赖安装与前端构建产物的输入（相对 ROOT）
+INSTALL_INPUTS = ['package.json', 'package-lock.json']
+BUILD_INPUTS = ['src', 'public', 'index.html', 'vite.config.js', 'tailwind.config.cjs',
+                'postcss.config.cjs', 'package.json', 'package-lock.json']
+
+
+def backend_ports(workers=1, base_port=BACKEND_PORT):
+    return [base_port + i for i in range(max(1, int(workers)))]
+
+
+def backend_pidfile(port):
+    # 升级前以 nohup 启动的实例：首个实例为 server.pid，其余 server-<端口>.pid（现由 supervisor.py 托管，仅用于迁移）
+    return SERVER_PID if port == BACKEND_PORT else os.path.join(ROOT, f'server-{port}.pid')
+
+
+def backend_logfile(port):
+    # 首个实例沿用 server.log，保持单实例部署不变
+    return SERVER_LOG if port == BACKEND_PORT else os.path.join(ROOT, f'server-{port}.log')
+
+
+def backend_pidfiles():
+    """返回升级前遗留的后端 PID 文件 (端口, PID 文件, 日志文件)。"""
+    out = [(BACKEND_PORT, SERVER_PID, SERVER_LOG)]
+    for path in sorted(glob.glob(os.path.join(ROOT, 'server-*.pid'))):
+        try:
+            port = int(os.path.basename(path)[len('server-'):-len('.pid')])
+        except ValueError:
+            continue
+        out.append((port, path, backend_logfile(port)))
+    return out
 
 
 def run(cmd, env=None, cwd=ROOT, check=True):
@@ -30,21 +84,77 @@ def which(bin_name):
     return subprocess.run(['which', bin_name], capture_output=True, text=True).stdout.strip()
 
 
+def node_version():
+    try:
+        return subprocess.run(['node', '--version'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
 def ensure_node():
     if not which('node') or not which('npm'):
         raise RuntimeError('未检测到 node/npm，请先安装 Node.js (>=18) 与 npm 再执行部署。')
 
 
-def npm_install():
+def fingerprint(paths, extra=''):
+    """按相对路径与内容计算输入指纹；目录递归、按路径排序，保证结果稳定。"""
+    h = hashlib.sha256()
+    for rel in paths:
+        full = os.path.join(ROOT, rel)
+        files = []
+        if os.path.isdir(full):
+            for dirpath, dirnames, filenames in os.walk(full):
+                dirnames.sort()
+                files.extend(os.path.join(dirpath, n) for n in sorted(filenames))
+        elif os.path.isfile(full):
+            files.append(full)
+        else:
+            h.update(f"missing:{rel}\0".encode())
+        for path in files:
+            h.update(os.path.relpath(path, ROOT).replace(os.sep, '/').encode() + b'\0')
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+            h.update(b'\0')
+    h.update(extra.encode())
+    return h.hexdigest()
+
+
+def load_build_cache():
+    try:
+        with open(BUILD_CACHE) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_build_cache(key, value):
+    data = load_build_cache()
+    data[key] = value
+    tmp = BUILD_CACHE + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, BUILD_CACHE)
+
+
+def npm_install(force=False):
+    # package-lock 未变化且 node_modules 仍在时跳过安装
+    key = fingerprint(INSTALL_INPUTS, extra=node_version())
+    if not force and load_build_cache().get('install') == key and os.path.isdir(os.path.join(ROOT, 'node_modules')):
+        print('依赖未变化（package-lock.json 指纹一致），跳过 npm ci；如需强制安装请加 --force')
+        return False
     # 优先使用 npm ci（有 package-lock）
     lock_path = os.path.join(ROOT, 'package-lock.json')
     if os.path.exists(lock_path):
         run('npm ci')
     else:
         run('npm install')
+    save_build_cache('install', key)
+    return True
 
 
-def build_frontend(api_base=None):
+def build_frontend(api_base=None, precompress=True, force=False):
     # 不清理 build_tmp：宝塔面板会在站点根投放不可删除的 .user.ini（chattr +i），
     # 清空目录可能失败。改为依赖 Vite 的覆盖输出（emptyOutDir=false）。
     # 如需强制清理，请在服务器手动执行：
@@ -53,22 +163,297 @@ def build_frontend(api_base=None):
     env = os.environ.copy()
     if api_base:
         env['VITE_API_BASE'] = api_base
+    key = fingerprint(BUILD_INPUTS, extra=f"VITE_API_BASE={env.get('VITE_API_BASE', '')}")
+    if not force and load_build_cache().get('build') == key and os.path.exists(os.path.join(BUILD_DIR, 'index.html')):
+        print('前端输入未变化（src/、配置与 VITE_API_BASE 指纹一致），跳过构建；如需强制构建请加 --force')
+        return False
+    if api_base:
         print(f"构建时注入 VITE_API_BASE={api_base}")
     run('npm run build', env=env)
+    save_build_cache('build', key)
+    if precompress:
+        precompress_frontend()
+    return True
+
+
+def precompress_frontend():
+    # 构建后为 JS/CSS/SVG 等生成 .gz/.br，供 Nginx gzip_static 与 preview.py 直接返回
+    from precompress import precompress, print_report
+    try:
+        stats = precompress(BUILD_DIR)
+    except Exception as e:
+        # 预压缩失败不影响部署，仅退化为按请求压缩
+        print(f"预压缩失败（忽略）：{e}", file=sys.stderr)
+        return
+    print_report(stats)
+
+
+def start_backend(workers=1, wait=True):
+    # 后端：默认单实例固定端口 6666；多实例时依次占用 6666、6667…，由 Nginx upstream 负载均衡
+    # 蓝绿部署切换到 green 后，沿用 Nginx 当前指向的端口
+    services = [start_backend_instance(port) for port in backend_ports(workers, COLOR_PORTS[active_color()])]
+    if wait:
+        wait_ready(services)
+    return services
+
+
+def start_service(name, argv, logfile, env=None):
+    """交给 supervisor.py 启动并托管（崩溃后按指数退避自动重启，输出经 logs.py pipe 写入 logfile 并轮转）。
+
+    守护进程未运行时先在后台启动它；服务已在运行时沿用现有进程。返回 PID（字符串）。
+    """
+    supervisor.ensure_running()
+    resp = supervisor.call('start', name=name, argv=argv, log=logfile, env={**os.environ, **(env or {})}, cwd=ROOT)
+    svc = resp['service']
+    if not svc['pid']:
+        raise RuntimeError(f"{name} 启动失败（{svc['state']}），详见 {supervisor.SUPERVISOR_LOG}")
+    if resp['already']:
+        print(f"{name} 已在运行（supervisor 托管），PID={svc['pid']}")
+    return str(svc['pid'])
+
+
+def start_backend_instance(port=BACKEND_PORT):
+    logfile = backend_logfile(port)
+    print(f"启动后端：PORT={int(port)} node server/index.cjs（supervisor 托管，日志 {os.path.basename(logfile)}，自动轮转）")
+    pid = start_service(f'backend:{int(port)}', ['node', 'server/index.cjs'], logfile, env={'PORT': str(int(port))})
+    print(f"后端已启动，PID={pid}，端口={port}，日志：{logfile}")
+    return backend_service(port, pid)
+
+
+def backend_service(port, pid):
+    return {
+        'name': f'后端:{port}',
+        'pid': pid,
+        'log': backend_logfile(port),
+        'probe': partial(probe_http, f'http://127.0.0.1:{int(port)}/api/ping'),
+    }
+
+
+def backend_instances():
+    """所有后端实例 [{port, pid, state, restarts, log, name, pidfile}]：supervisor 托管的（name 为服务名），
+    以及升级前以 nohup + PID 文件启动、尚未停止的（pidfile）。state 为 running/backoff/fatal/stopped。"""
+    out = []
+    for name, svc in supervisor.services().items():
+        if name.startswith('backend:'):
+            out.append({'port': int(name.split(':', 1)[1]), 'pid': str(svc['pid']) if svc['pid'] else None,
+                        'state': svc['state'], 'restarts': svc['restarts'], 'log': svc['log'],
+                        'name': name, 'pidfile': None})
+    for port, pidfile, logfile in backend_pidfiles():
+        pid = read_pid(pidfile)
+        if pid:
+            out.append({'port': port, 'pid': pid, 'state': 'running' if is_running(pid, 'node') else 'stopped',
+                        'restarts': None, 'log': logfile, 'name': None, 'pidfile': pidfile})
+    return sorted(out, key=lambda i: i['port'])
+
+
+def frontend_instance():
+    """前端实例（字段同 backend_instances）；未启动时返回 None。"""
+    svc = supervisor.services().get('frontend')
+    if svc:
+        return {'pid': str(svc['pid']) if svc['pid'] else None, 'state': svc['state'], 'restarts': svc['restarts'],
+                'log': svc['log'], 'name': 'frontend', 'pidfile': None}
+    pid = read_pid(FRONT_PID)
+    if pid:
+        return {'pid': pid, 'state': 'running' if is_running(pid, 'serve') else 'stopped', 'restarts': None,
+                'log': FRONT_LOG, 'name': None, 'pidfile': FRONT_PID}
+    return None
+
+
+def stop_backend():
+    stop_instances(backend_instances())
+
+
+def stop_frontend():
+    inst = frontend_instance()
+    if inst:
+        stop_instances([{**inst, 'port': '前端'}])
+    else:
+        print('前端未运行')
+
+
+def stop_all():
+    """停止全部后端实例与前端，并退出 supervisor 守护进程。"""
+    stop_backend()
+    stop_frontend()
+    if supervisor.ping():
+        supervisor.call('shutdown')
+        deadline = time.monotonic() + 5
+        while supervisor.ping() and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+
+def load_backend_state():
+    try:
+        with open(BACKEND_STATE) as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) and data.get('color') in COLOR_PORTS else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_backend_state(color, ports, previous=None):
+    data = {'color': color, 'ports': ports, 'previous': previous,
+            'switched': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    tmp = BACKEND_STATE + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, BACKEND_STATE)
+
+
+def active_color():
+    return load_backend_state().get('color', 'blue')
+
+
+def port_color(port):
+    return 'green' if int(port) >= COLOR_PORTS['green'] else 'blue'
+
+
+def established_connections(ports):
+    """统计本机 /proc/net/tcp{,6} 中本地端口属于 ports 的 ESTABLISHED 连接数；无法读取时返回 None。"""
+    want = {f'{int(p):04X}' for p in ports}
+    total, readable = 0, False
+    for path in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            f = open(path)
+        except OSError:
+            continue
+        readable = True
+        with f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                # fields[1]=本地地址:端口（十六进制），fields[3]=状态，01 为 ESTABLISHED
+                if len(fields) > 3 and fields[3] == '01' and fields[1].rsplit(':', 1)[-1] in want:
+                    total += 1
+    return total if readable else None
+
+
+def drain_backend(ports, grace=DRAIN_GRACE):
+    """Nginx 重载后旧 worker 处理完进行中的请求（包括上传）才会断开与旧实例的连接：
+    等待这些连接归零，最多 grace 秒。返回剩余连接数（无法统计时为 None，此时等满 grace 秒）。"""
+    started = time.monotonic()
+    remaining = None
+    last_report = 0.0
+    while True:
+        elapsed = time.monotonic() - started
+        remaining = established_connections(ports)
+        # 至少等待 1 秒，让 Nginx 完成重载、新 worker 接管
+        if remaining == 0 and elapsed >= 1.0 or elapsed >= grace:
+            return remaining
+        if remaining and elapsed - last_report >= 5:
+            print(f"排空旧实例 {','.join(map(str, ports))}：剩余连接 {remaining}（已等待 {elapsed:.0f}s）")
+            last_report = elapsed
+        time.sleep(0.2)
+
+
+def stop_instances(instances, timeout=STOP_TIMEOUT):
+    """停止 backend_instances()/frontend_instance() 返回的实例并等待其处理完剩余请求后退出：
+    托管的经 supervisor 停止（SIGTERM，超时 SIGKILL）；遗留 PID 文件的发送 SIGTERM 后轮询。"""
+    names = [i['name'] for i in instances if i['name']]
+    if names:
+        print(f"停止 {', '.join(names)}（等待进行中的请求完成）")
+        supervisor.call('stop', timeout=timeout + 15, names=names, grace=timeout)
+    legacy = [i for i in instances if i['pidfile']]
+    for i in legacy:
+        expect = 'node' if i['pidfile'] != FRONT_PID else 'serve'
+        kill_pidfile(i['pidfile'], f"后端:{i['port']}" if expect == 'node' else '前端', expect=expect)
+    deadline = time.monotonic() + timeout
+    pending = [i for i in legacy if i['state'] == 'running']
+    while pending and time.monotonic() < deadline:
+        pending = [i for i in pending if is_running(i['pid'])]
+        if pending:
+            time.sleep(0.2)
+    for i in pending:
+        print(f"PID={i['pid']}（{i['port']}）在 {timeout:.0f}s 内未退出，请检查日志", file=sys.stderr)
+
+
+def switch_nginx_backend(ports):
+    run(f"{shlex.quote(sys.executable)} {shlex.quote(NGINX_SETUP)} --switch-backend {','.join(map(str, ports))}")
+
+
+def rolling_restart(workers=1, drain=DRAIN_GRACE):
+    """蓝绿重启后端：在另一组端口启动新实例并等待 /api/ping 就绪，经 nginx_setup.py 切换 upstream 并重载，
+    排空旧实例后再停止。任一步骤失败时停止新实例，旧实例与 Nginx 配置保持不变。"""
+    old_color = active_color()
+    new_color = 'green' if old_color == 'blue' else 'blue'
+    new_ports = backend_ports(workers, COLOR_PORTS[new_color])
+    old = [i for i in backend_instances() if i['port'] not in new_ports and (i['name'] or i['state'] == 'running')]
+    busy = [p for p in new_ports if probe_tcp('127.0.0.1', p)]
+    if busy:
+        raise RuntimeError(f"{new_color} 端口 {','.join(map(str, busy))} 已被占用（上次切换的旧实例尚未退出？）")
+    print(f"蓝绿重启：{old_color} → {new_color}（端口 {','.join(map(str, new_ports))}）")
+    started = time.monotonic()
+    try:
+        wait_ready([start_backend_instance(port) for port in new_ports])
+        switch_nginx_backend(new_ports)
+    except Exception:
+        stop_instances([i for i in backend_instances() if i['port'] in new_ports and i['name']])
+        raise
+    save_backend_state(new_color, new_ports, previous=old_color)
+    print(f"Nginx 已切换到 {new_color}，用时 {time.monotonic() - started:.2f}s")
+    if old:
+        remaining = drain_backend([i['port'] for i in old], grace=drain)
+        if remaining:
+            print(f"排空超时（{drain:.0f}s），仍有 {remaining} 个连接；旧实例将在处理完或超时后退出")
+        stop_instances(old)
+    print(f"蓝绿重启完成：当前 {new_color}，总用时 {time.monotonic() - started:.2f}s")
+
+
+def backend_running():
+    return any(i['state'] == 'running' for i in backend_instances())
+
+
+def maintain_db(force=False, check=True):
+    """执行 db_maint.py（到期的 ANALYZE/完整性检查/回收 + WAL 截断）；后端未运行时允许整库 VACUUM。
+    冷库 cold.db（archive_cold.py）存在时同样维护。"""
+    if not os.path.isfile(APP_DB):
+        print('数据库尚未创建，跳过维护')
+        return
+    full = not backend_running()
+    for db in (APP_DB, COLD_DB):
+        if not os.path.isfile(db):
+            continue
+        cmd = f'{shlex.quote(sys.executable)} {shlex.quote(DB_MAINT)} --db {shlex.quote(db)}'
+        if force:
+            cmd += ' --force'
+        if full:
+            cmd += ' --full'
+        run(cmd, check=check)
+
+
+STATE_TEXT = {'running': '运行中', 'backoff': '已退出，等待重启', 'fatal': '崩溃循环，已停止重启', 'stopped': '未运行'}
+
+
+def print_backend_status():
+    state = load_backend_state()
+    color = state.get('color', 'blue')
+    active = state.get('ports') or backend_ports(1, COLOR_PORTS[color])
+    if state:
+        print(f"- 后端颜色：{color}（端口 {','.join(map(str, active))}，{state.get('switched', '-')} 由 "
+              f"{state.get('previous') or '-'} 切换）")
+    instances = backend_instances()
+    for i in instances:
+        role = '接流' if i['port'] in active else '待退出'
+        print(f"- 后端:{i['port']}（{port_color(i['port'])}，{role}）：{describe_instance(i)}")
+    if not instances:
+        print("- 后端：未运行")
+
+
+def describe_instance(inst):
+    text = f"PID={inst['pid'] or '-'}，{STATE_TEXT.get(inst['state'], inst['state'])}"
+    if inst['name']:
+        text += f"，supervisor 托管，已重启 {inst['restarts']} 次"
+    else:
+        text += f"，升级前以 PID 文件启动（{os.path.basename(inst['pidfile'])}，停止后改由 supervisor 托管）"
+    return f"{text}，日志={inst['log']}"
 
 
-def start_backend():
-    # 后端：固定端口 6666
-    cmd = f"nohup env PORT=6666 node server/index.cjs > {SERVER_LOG} 2>&1 & echo $!"
-    print(f"启动后端：{cmd}")
-    pid = subprocess.check_output(cmd, shell=True, cwd=ROOT).decode().strip()
-    with open(SERVER_PID, 'w') as f:
-        f.write(pid)
-    time.sleep(0.5)
-    print(f"后端已启动，PID={pid}，日志：{SERVER_LOG}")
+def print_frontend_status():
+    inst = frontend_instance()
+    print(f"- 前端：{describe_instance(inst)}" if inst else "- 前端：未运行")
 
 
-def start_frontend(port=80, host='0.0.0.0'):
+def start_frontend(port=80, host='0.0.0.0', wait=True):
     # 前端：npx serve -s build_tmp -l <host:port>
     # 绑定 80 端口可能需要 root 或 CAP_NET_BIND_SERVICE 权限
     try:
@@ -78,39 +463,133 @@ def start_frontend(port=80, host='0.0.0.0'):
         # 在部分平台（如 Windows）无 geteuid，忽略此检查
         pass
     bind = f"{host}:{int(port)}"
-    cmd = f"nohup npx serve -s build_tmp -l {bind} > {FRONT_LOG} 2>&1 & echo $!"
-    print(f"启动前端：{cmd}")
-    pid = subprocess.check_output(cmd, shell=True, cwd=ROOT).decode().strip()
-    with open(FRONT_PID, 'w') as f:
-        f.write(pid)
-    time.sleep(0.5)
+    print(f"启动前端：npx serve -s build_tmp -l {bind}（supervisor 托管，日志 {os.path.basename(FRONT_LOG)}，自动轮转）")
+    pid = start_service('frontend', ['npx', 'serve', '-s', 'build_tmp', '-l', bind], FRONT_LOG)
     print(f"前端已启动，PID={pid}，日志：{FRONT_LOG}")
     print("提示：前端已在 0.0.0.0 监听，如无法绑定 80，请用 Nginx 将 80/443 反代到此进程。")
+    service = {
+        'name': f'前端:{int(port)}',
+        'pid': pid,
+        'log': FRONT_LOG,
+        'probe': partial(probe_tcp, '127.0.0.1', int(port)),
+    }
+    if wait:
+        wait_ready([service])
+    return service
+
+
+def probe_http(url, timeout=1.0):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as resp:
+            return resp.status == 200
+    except Exception:
+        return False
+
+
+def probe_tcp(host, port, timeout=1.0):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def tail_file(path, lines=20, max_bytes=8192):
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - max_bytes))
+            data = f.read().decode('utf-8', errors='replace')
+    except OSError:
+        return ''
+    return '\n'.join(data.splitlines()[-lines:])
+
+
+def wait_service(service, deadline=READY_TIMEOUT):
+    """指数退避轮询直到探测成功；进程提前退出或超时则抛出异常并附带日志尾部。返回就绪耗时（秒）。"""
+    started = time.monotonic()
+    delay = 0.05
+    while True:
+        if service['probe']():
+            return time.monotonic() - started
+        elapsed = time.monotonic() - started
+        if not is_running(service['pid']):
+            reason = f"{service['name']} 进程已退出（PID={service['pid']}）"
+        elif elapsed >= deadline:
+            reason = f"{service['name']} 在 {deadline:.0f}s 内未就绪（PID={service['pid']}）"
+        else:
+            time.sleep(min(delay, deadline - elapsed))
+            delay = min(delay * 2, 1.0)
+            continue
+        tail = tail_file(service['log'])
+        raise RuntimeError(f"{reason}，日志 {service['log']} 末尾：\n{tail}" if tail else reason)
+
+
+def wait_ready(services, deadline=READY_TIMEOUT):
+    """并行等待所有服务就绪，打印并记录各自的就绪耗时。"""
+    if not services:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(services)) as pool:
+        futures = {s['name']: pool.submit(wait_service, s, deadline) for s in services}
+        timings = {}
+        errors = []
+        for name, fut in futures.items():
+            try:
+                timings[name] = fut.result()
+            except RuntimeError as e:
+                errors.append(str(e))
+    for name, seconds in timings.items():
+        print(f"{name} 已就绪，用时 {seconds:.2f}s")
+    record_startup(timings)
+    if errors:
+        raise RuntimeError('\n'.join(errors))
+    return timings
+
+
+def record_startup(timings):
+    # 追加到 startup.log（JSON 行），便于追踪启动耗时回归
+    if not timings:
+        return
+    entry = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'ready': {k: round(v, 3) for k, v in timings.items()}}
+    try:
+        with open(STARTUP_LOG, 'a') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    except OSError:
+        pass
 
 
-def kill_pidfile(path, name):
+def kill_pidfile(path, name, expect=None):
     if not os.path.exists(path):
         print(f"{name} 未运行（不存在 {path}）")
         return
     with open(path) as f:
         pid = f.read().strip()
-    try:
-        os.kill(int(pid), 15)  # SIGTERM
-        print(f"已发送停止信号给 {name} 进程 PID={pid}")
-    except Exception as e:
-        print(f"停止 {name} 失败：{e}")
+    if expect and not is_running(pid, expect):
+        print(f"{name} 未运行（PID={pid} 已退出或已被其他进程复用），移除 {os.path.basename(path)}")
+    else:
+        try:
+            os.kill(int(pid), 15)  # SIGTERM
+            print(f"已发送停止信号给 {name} 进程 PID={pid}")
+        except Exception as e:
+            print(f"停止 {name} 失败：{e}")
     try:
         os.remove(path)
     except Exception:
         pass
 
 
-def is_running(pid):
+def is_running(pid, expect=None):
+    """PID 存活；给出 expect 时还要求 /proc/<pid>/cmdline 含该程序名，避免 PID 被复用后误判。"""
     try:
         os.kill(int(pid), 0)
-        return True
     except Exception:
         return False
+    if expect:
+        identity = supervisor.proc_identity(pid)
+        if identity is not None and expect not in ' '.join(identity['cmdline']):
+            return False
+    return True
 
 
 def read_pid(path):
@@ -126,55 +605,69 @@ def main():
     parser.add_argument('--frontend-port', type=int, default=60, help='前端静态服务端口（默认 60）')
     parser.add_argument('--install', action='store_true', help='执行 npm install/ci 安装依赖')
     parser.add_argument('--build', action='store_true', help='构建前端（生成 dist/）')
-    parser.add_argument('--start', action='store_true', help='启动后端与前端')
-    parser.add_argument('--stop', action='store_true', help='停止后端与前端')
+    parser.add_argument('--force', action='store_true', help='忽略构建缓存，强制执行 npm ci 与前端构建；配合 --maintain-db 时忽略维护调度间隔')
+    parser.add_argument('--no-precompress', action='store_true', help='构建后不生成 .gz/.br 预压缩文件')
+    parser.add_argument('--start', action='store_true', help='启动后端与前端（由 supervisor.py 托管，崩溃后自动重启）')
+    parser.add_argument('--workers', type=int, default=1, help='后端实例数（默认 1；多实例占用 6666 起的连续端口，需配合 nginx_setup.py --workers）')
+    parser.add_argument('--stop', action='store_true', help='停止后端与前端，并退出 supervisor 守护进程')
     parser.add_argument('--status', action='store_true', help='查看当前运行状态')
     parser.add_argument('--restart-frontend', action='store_true', help='重启前端静态服务')
+    parser.add_argument('--rolling', action='store_true',
+                        help='蓝绿重启后端：新实例在另一组端口就绪后经 nginx_setup.py 切换 upstream，排空旧实例再停止（需已配置 Nginx）')
+    parser.add_argument('--drain', type=float, default=DRAIN_GRACE,
+                        help=f'--rolling 时等待旧实例连接归零的最长秒数（默认 {DRAIN_GRACE:.0f}）')
+    parser.add_argument('--maintain-db', action='store_true',
+                        help='维护 app.db：WAL、ANALYZE/optimize、完整性检查、空闲页回收与 WAL 截断（加 --force 忽略调度间隔）')
     args = parser.parse_args()
 
     os.chdir(ROOT)
     if args.install:
         ensure_node()
-        npm_install()
+        npm_install(force=args.force)
 
     if args.build:
         ensure_node()
-        build_frontend(api_base=args.api_base)
+        build_frontend(api_base=args.api_base, precompress=not args.no_precompress, force=args.force)
+
+    if args.maintain_db:
+        maintain_db(force=args.force)
 
     if args.start:
         ensure_node()
-        start_backend()
-        start_frontend(port=args.frontend_port)
+        # 启动前执行到期的维护项目；失败只提示，不影响启动
+        maintain_db(check=False)
+        services = start_backend(workers=args.workers, wait=False)
+        services.append(start_frontend(port=args.frontend_port, wait=False))
+        wait_ready(services)
+
+    if args.rolling:
+        ensure_node()
+        maintain_db(check=False)
+        rolling_restart(workers=args.workers, drain=args.drain)
 
     if args.stop:
-        kill_pidfile(SERVER_PID, '后端')
-        kill_pidfile(FRONT_PID, '前端')
+        stop_all()
 
     if args.restart_frontend:
-        kill_pidfile(FRONT_PID, '前端')
+        stop_frontend()
         start_frontend(port=args.frontend_port)
 
     if args.status:
-        spid = read_pid(SERVER_PID)
-        fpid = read_pid(FRONT_PID)
         print('运行状态：')
-        if spid:
-            print(f"- 后端：PID={spid}，{'运行中' if is_running(spid) else '未运行'}，日志={SERVER_LOG}")
-        else:
-            print("- 后端：未运行（无 PID 文件）")
-        if fpid:
-            print(f"- 前端：PID={fpid}，{'运行中' if is_running(fpid) else '未运行'}，日志={FRONT_LOG}")
-        else:
-            print("- 前端：未运行（无 PID 文件）")
+        print_backend_status()
+        print_frontend_status()
 
     # 若未传任何参数，执行最常用的一键流程：安装 + 构建 + 启动
-    if not any([args.install, args.build, args.start, args.stop, args.status, args.restart_frontend]):
+    if not any([args.install, args.build, args.start, args.stop, args.status, args.restart_frontend, args.maintain_db,
+                args.rolling]):
         print('未提供参数，执行默认流程：--install --build --start（前端默认端口 60）')
         ensure_node()
-        npm_install()
-        build_frontend(api_base=args.api_base)
-        start_backend()
-        start_frontend(port=args.frontend_port)
+        npm_install(force=args.force)
+        build_frontend(api_base=args.api_base, precompress=not args.no_precompress, force=args.force)
+        maintain_db(check=False)
+        services = start_backend(workers=args.workers, wait=False)
+        services.append(start_frontend(port=args.frontend_port, wait=False))
+        wait_ready(services)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+孤立上传文件回收（按 bills.images 对账）。
+
+deleteBillImagesSync 只在删除票据和一级拒绝时执行；上传失败、请求中途崩溃以及 REPLACE INTO 覆盖 images
+都会在 uploads/bills/ 下留下无人引用的文件和目录（包括旧 ID 方案留下的时间戳目录）。本工具：
+- 流式读取 app.db 中 bills 表的 id, images 两列（逐行游标，不整表载入），汇总被引用的文件路径；
+  每个 --db 同目录下的冷库 cold.db（archive_cold.py 移出的旧票据）存在时一并读取，避免把冷票据的图片当成孤立文件；
+  --no-cold 跳过冷库时只允许 dry-run
+- 以 os.scandir 遍历上传目录，找出未被引用且 mtime 早于宽限期的文件
+- 被引用原图的变体（optimize_images.py 生成的 <原图>.thumb|display.webp|jpg）视为被引用；
+  以 . 开头的清单/索引文件（.variants.json、.dedup-index.db）不处理
+- 三种模式：默认 dry-run 仅报告；--quarantine 移动到隔离目录（保留相对路径，可原样移回）；--purge 直接删除
+- 同时报告 images 中引用但磁盘上不存在的文件
+
+用法：
+  python3 gc_uploads.py                       # 报告孤立文件（不修改）
+  python3 gc_uploads.py --quarantine          # 移入 server/data/uploads-quarantine/<时间戳>/
+  python3 gc_uploads.py --purge --grace 7d    # 删除 7 天前的孤立文件
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+from urllib.parse import unquote, urlsplit
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, 'server', 'data')
+DEFAULT_DB = os.path.join(DATA_DIR, 'app.db')
+COLD_NAME = 'cold.db'
+DEFAULT_ROOT = os.path.join(DATA_DIR, 'uploads')
+DEFAULT_QUARANTINE = os.path.join(DATA_DIR, 'uploads-quarantine')
+DEFAULT_GRACE = '24h'
+VARIANT_RE = re.compile(r'\.(thumb|display)\.(webp|jpg)$')
+
+
+def parse_duration(text):
+    s = str(text).strip().lower()
+    mult = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}.get(s[-1:], 1)
+    return float(s[:-1] if s[-1:] in 'smhd' else s) * mult
+
+
+def normalize_ref(url):
+    """把 images 中的地址（/uploads/bills/..、旧数据的 /bills/..、完整 URL）转换为相对上传目录的路径。"""
+    path = unquote(urlsplit(str(url)).path)
+    marker = '/uploads/'
+    i = path.find(marker)
+    rel = path[i + len(marker):] if i >= 0 else path
+    parts = [p for p in rel.split('/') if p and p != '.']
+    if not parts or '..' in parts:
+        return None
+    return '/'.join(parts)
+
+
+def parse_images(value):
+    """与后端 parseJsonArraySafe 一致：最多解析两层（兼容被重复 JSON 编码的旧数据），非数组返回 None。"""
+    x = value
+    for _ in range(2):
+        if isinstance(x, list):
+            return x
+        if not isinstance(x, str):
+            break
+        try:
+            x = json.loads(x)
+        except ValueError:
+            break
+    return x if isinstance(x, list) else None
+
+
+def referenced_paths(db_paths):
+    """逐行读取 bills.images，返回 (被引用的相对路径集合, 票据行数, 无法解析的行数)。"""
+    refs = set()
+    rows = bad = 0
+    for db_path in db_paths:
+        conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            cur = conn.execute('SELECT id, images FROM bills')
+            cur.arraysize = 1000
+            for _bill_id, images in cur:
+                rows += 1
+                if not images:
+                    continue
+                urls = parse_images(images)
+                if urls is None:
+                    bad += 1
+                    continue
+                for url in urls:
+                    rel = normalize_ref(url)
+                    if rel:
+                        refs.add(rel)
+        finally:
+            conn.close()
+    return refs, rows, bad
+
+
+def is_referenced(rel, refs):
+    if rel in refs:
+        return True
+    m = VARIANT_RE.search(rel)
+    return bool(m) and rel[:m.start()] in refs
+
+
+def iter_files(root):
+    """递归列出上传目录中的普通文件，返回 (相对路径, 绝对路径, stat)；跳过以 . 开头的文件与目录。"""
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name.startswith('.'):
+                        continue
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.is_file(follow_symlinks=False):
+                        try:
+                            st = e.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        yield os.path.relpath(e.path, root).replace(os.sep, '/'), e.path, st
+        except OSError:
+            continue
+
+
+def remove_empty_dirs(root, cutoff, emptied=()):
+    """自底向上删除 root 下已为空的子目录：mtime 早于 cutoff，或本轮刚被清空（root 本身与 bills/ 保留）。"""
+    removed = 0
+    keep = {os.path.normpath(root), os.path.normpath(os.path.join(root, 'bills'))}
+    for d, subdirs, files in os.walk(root, topdown=False):
+        if os.path.normpath(d) in keep or os.path.basename(d).startswith('.'):
+            continue
+        try:
+            if (d in emptied or os.stat(d).st_mtime < cutoff) and not os.listdir(d):
+                os.rmdir(d)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def collect(root, db_paths, grace):
+    """返回统计字典：孤立文件列表 [(rel, path, size)]、宽限期内的孤立文件数、缺失引用等。"""
+    started = time.monotonic()
+    # 先读数据库再扫描磁盘：读取之后才写入并被引用的新文件一定落在宽限期内
+    refs, rows, bad = referenced_paths(db_paths)
+    cutoff = time.time() - grace
+    orphans = []
+    young = 0
+    total = total_bytes = 0
+    found = set()
+    for rel, path, st in iter_files(root):
+        total += 1
+        total_bytes += st.st_size
+        if is_referenced(rel, refs):
+            found.add(rel)
+            continue
+        if st.st_mtime >= cutoff:
+            young += 1
+            continue
+        orphans.append((rel, path, st.st_size))
+    missing = sorted(refs - found)
+    return {
+        'bills': rows,
+        'bad_rows': bad,
+        'referenced': len(refs),
+        'files': total,
+        'bytes': total_bytes,
+        'orphans': orphans,
+        'orphan_bytes': sum(size for _, _, size in orphans),
+        'young': young,
+        'missing': missing,
+        'cutoff': cutoff,
+        'seconds': time.monotonic() - started,
+    }
+
+
+def quarantine(root, orphans, dest):
+    """把孤立文件移入 dest（保留相对路径），返回失败列表。"""
+    failed = []
+    for rel, path, _ in orphans:
+        target = os.path.join(dest, *rel.split('/'))
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        except OSError as e:
+            # 跨文件系统时 os.replace 失败：复制后删除
+            try:
+                shutil.move(path, target)
+            except OSError:
+                failed.append((rel, str(e)))
+    return failed
+
+
+def purge(orphans):
+    failed = []
+    for rel, path, _ in orphans:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            failed.append((rel, str(e)))
+    return failed
+
+
+def _fmt_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def print_report(stats, mode, list_all=False):
+    print(f"[gc] 票据 {stats['bills']} 行，引用文件 {stats['referenced']} 个"
+          + (f"（{stats['bad_rows']} 行 images 无法解析，已跳过）" if stats['bad_rows'] else ''))
+    print(f"[gc] 上传目录文件 {stats['files']} 个（{_fmt_size(stats['bytes'])}），耗时 {stats['seconds']:.2f}s")
+    orphans = stats['orphans']
+    verb = {'dry-run': '可回收', 'quarantine': '已隔离', 'purge': '已删除'}[mode]
+    print(f"[gc] 孤立文件 {len(orphans)} 个，{verb} {_fmt_size(stats['orphan_bytes'])}；"
+          f"宽限期内未处理 {stats['young']} 个")
+    for rel, _, size in (orphans if list_all else orphans[:20]):
+        print(f"  {rel}  {_fmt_size(size)}")
+    if not list_all and len(orphans) > 20:
+        print(f"  …… 另有 {len(orphans) - 20} 个（--list 查看全部）")
+    if stats['missing']:
+        print(f"[gc] images 引用但磁盘不存在 {len(stats['missing'])} 个：")
+        for rel in stats['missing'][:10]:
+            print(f"  {rel}")
+
+
+def with_cold(db_paths):
+    """在每个库之后补上同目录下存在的 cold.db（与 stats.py / backup.py / archive_cold.py 口径一致），去重保序。"""
+    out = []
+    for p in db_paths:
+        cold = os.path.join(os.path.dirname(p), COLD_NAME)
+        for path in (p, cold) if os.path.isfile(cold) else (p,):
+            if path not in out:
+                out.append(path)
+    return out
+
+
+def unread_cold(db_paths):
+    """已读取的库旁存在、但未被读取的 cold.db。"""
+    colds = {os.path.join(os.path.dirname(p), COLD_NAME) for p in db_paths}
+    return sorted(c for c in colds if os.path.isfile(c) and c not in db_paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回收 bills.images 未引用的上传文件。')
+    parser.add_argument('--db', action='append', default=None,
+                        help='数据库路径（默认 server/data/app.db；可重复指定多个库，同目录的 cold.db 存在时自动一并读取）')
+    parser.add_argument('--no-cold', action='store_true', help='不读取同目录的 cold.db（仅限 dry-run）')
+    parser.add_argument('--root', default=DEFAULT_ROOT, help='上传目录（默认 server/data/uploads）')
+    parser.add_argument('--grace', default=DEFAULT_GRACE,
+                        help=f'只处理早于该时长的文件，如 30m、24h、7d（默认 {DEFAULT_GRACE}）')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--quarantine', nargs='?', const=DEFAULT_QUARANTINE, default=None, metavar='DIR',
+                      help='移入隔离目录（默认 server/data/uploads-quarantine）')
+    mode.add_argument('--purge', action='store_true', help='直接删除')
+    parser.add_argument('--list', action='store_true', help='列出全部孤立文件')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    db_paths = [os.path.abspath(p) for p in (args.db or [DEFAULT_DB])]
+    for p in db_paths:
+        if not os.path.isfile(p):
+            raise RuntimeError(f"数据库不存在：{p}")
+    if not args.no_cold:
+        db_paths = with_cold(db_paths)
+    # 冷票据的图片会被当成孤立文件：未读取冷库时拒绝隔离/删除
+    skipped = unread_cold(db_paths)
+    if skipped and (args.quarantine or args.purge):
+        raise RuntimeError(f"{', '.join(skipped)} 存在但未读取，其中票据的图片会被误判为孤立文件；"
+                           f"去掉 --no-cold 后再执行 --quarantine/--purge")
+    if not os.path.isdir(root):
+        raise RuntimeError(f"上传目录不存在：{root}")
+    grace = parse_duration(args.grace)
+
+    print(f"[gc] 读取数据库：{', '.join(db_paths)}")
+    stats = collect(root, db_paths, grace)
+    failed = []
+    if args.quarantine:
+        dest = os.path.join(os.path.abspath(args.quarantine), time.strftime('%Y%m%d-%H%M%S'))
+        failed = quarantine(root, stats['orphans'], dest)
+        mode_name = 'quarantine'
+    elif args.purge:
+        failed = purge(stats['orphans'])
+        mode_name = 'purge'
+    else:
+        mode_name = 'dry-run'
+    print_report(stats, mode_name, list_all=args.list)
+    if mode_name != 'dry-run':
+        emptied = {os.path.dirname(path) for _, path, _ in stats['orphans']}
+        removed = remove_empty_dirs(root, stats['cutoff'], emptied)
+        if removed:
+            print(f"[gc] 删除空目录 {removed} 个")
+        if mode_name == 'quarantine' and stats['orphans']:
+            print(f"[gc] 隔离目录：{dest}（确认无误后可删除；恢复时按相对路径移回 {root}）")
+    for rel, err in failed[:10]:
+        print(f"  失败：{rel}：{err}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"回收失败：{e}", file=sys.stderr)
+        sys.exit(1)
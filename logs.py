@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+日志管道、轮转与流式分析（仅依赖标准库）。
+
+pipe：作为子进程 stdout/stderr 的读端（deploy.py 以管道启动 node / serve 后交给本进程），
+      为每行加上时间戳写入日志文件，并按大小与时长轮转；轮转出的分段在后台线程中 gzip 压缩，
+      只保留最近若干个。启动时若旧日志非空，先将其轮转，保留上次运行的输出；
+      --append 时接着写入旧日志（supervisor.py 崩溃重启时使用，避免每次重启都占用一个保留分段）。
+analyze：流式读取日志（含轮转出的 .gz 分段），按分钟汇总 approve/reject 次数（按审批角色细分）
+      与错误数；内存占用恒定（按时间顺序逐分钟输出），--follow 持续跟踪并在轮转后自动重新打开。
+
+用法：
+  node server/index.cjs 2>&1 | python3 logs.py pipe server.log     # deploy.py 自动完成
+  python3 logs.py analyze server.log                               # 分钟汇总表
+  python3 logs.py analyze server.log.*.gz server.log --json        # 含历史分段，JSON 行输出
+  python3 logs.py analyze server.log --follow                      # 实时跟踪
+
+轮转参数可通过环境变量调整（deploy.py 启动的管道进程继承当前环境）：
+  LOG_MAX_BYTES  单个日志文件上限，支持 K/M/G 后缀（默认 20M）
+  LOG_MAX_AGE    单个日志文件最长时长，支持 s/m/h/d 后缀（默认 1d）
+  LOG_KEEP       保留的压缩分段数（默认 10）
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import shutil
+import signal
+import sys
+import threading
+import time
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_MAX_AGE = 86400
+DEFAULT_KEEP = 10
+TS_FORMAT = '%Y-%m-%dT%H:%M:%S'
+# 管道写入的行首时间戳：2025-10-17T06:32:12.123
+TS_RE = re.compile(rb'^(\d{4}-\d\d-\d\dT\d\d:\d\d):\d\d(?:\.\d+)? ')
+DEBUG_RE = re.compile(rb'\b(approve|reject) debug\b')
+EXPECTED_RE = re.compile(rb"expected: '([^']*)'")
+ERROR_RE = re.compile(rb'(\berror\b|Error:|ERR!|Unhandled|EADDRINUSE|SQLITE_[A-Z]+)', re.IGNORECASE)
+STACK_RE = re.compile(rb'^\s+at\s')
+MAX_SIGNATURES = 200
+
+
+def parse_size(text):
+    s = str(text).strip().upper().rstrip('B')
+    mult = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def parse_duration(text):
+    s = str(text).strip().lower()
+    mult = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}.get(s[-1:], 1)
+    return float(s[:-1] if s[-1:] in 'smhd' else s) * mult
+
+
+def env_setting(name, parser, default):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return parser(value)
+    except ValueError:
+        print(f"[logs] 忽略无效的 {name}={value!r}", file=sys.stderr)
+        return default
+
+
+# ---------- pipe：写入与轮转 ----------
+
+class RotatingLog:
+    """按大小/时长轮转的追加写日志；轮转分段在后台线程压缩为 .gz。"""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, keep=DEFAULT_KEEP,
+                 rotate_existing=True):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self._compressors = []
+        self._file = None
+        try:
+            if rotate_existing and os.path.getsize(self.path) > 0:
+                self.rotate()
+        except OSError:
+            pass
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, 'ab')
+        self._size = self._file.tell()
+        self._opened = time.time()
+
+    def due(self):
+        return self._size >= self.max_bytes or (self.max_age > 0 and time.time() - self._opened >= self.max_age)
+
+    def write(self, data):
+        if self.due():
+            self.rotate()
+            self._open()
+        self._file.write(data)
+        self._size += len(data)
+
+    def flush(self):
+        if self._file:
+            self._file.flush()
+
+    def rotate(self):
+        """将当前文件改名为 <path>.<时间戳>，并在后台压缩。"""
+        if self._file:
+            self._file.close()
+            self._file = None
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        target = f'{self.path}.{stamp}'
+        n = 1
+        while os.path.exists(target) or os.path.exists(target + '.gz'):
+            target = f'{self.path}.{stamp}-{n}'
+            n += 1
+        os.replace(self.path, target)
+        self._compressors = [t for t in self._compressors if t.is_alive()]
+        t = threading.Thread(target=self._compress, args=(target,), daemon=True)
+        t.start()
+        self._compressors.append(t)
+
+    def _compress(self, segment):
+        try:
+            with open(segment, 'rb') as src, gzip.open(segment + '.gz.tmp', 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(segment + '.gz.tmp', segment + '.gz')
+            os.remove(segment)
+        except OSError as e:
+            print(f"[logs] 压缩 {segment} 失败：{e}", file=sys.stderr)
+            return
+        self.prune()
+
+    def prune(self):
+        segments = sorted(glob.glob(glob.escape(self.path) + '.*.gz'), key=os.path.getmtime)
+        for old in segments[:max(0, len(segments) - self.keep)]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+        for t in self._compressors:
+            t.join()
+
+
+def pipe(path, source, max_bytes, max_age, keep, timestamps=True, append=False):
+    """逐行读取 source 写入轮转日志，直到 EOF（子进程退出）。"""
+    log = RotatingLog(path, max_bytes=max_bytes, max_age=max_age, keep=keep, rotate_existing=not append)
+    try:
+        for line in iter(source.readline, b''):
+            if timestamps:
+                now = time.time()
+                line = f"{time.strftime(TS_FORMAT, time.localtime(now))}.{int(now * 1000) % 1000:03d} ".encode() + line
+            log.write(line)
+            log.flush()
+    finally:
+        log.close()
+
+
+# ---------- analyze：流式汇总 ----------
+
+class Minute:
+    __slots__ = ('key', 'approve', 'reject', 'errors', 'roles')
+
+    def __init__(self, key):
+        self.key = key
+        self.approve = 0
+        self.reject = 0
+        self.errors = 0
+        self.roles = {}
+
+    def as_dict(self):
+        return {'minute': self.key, 'approve': self.approve, 'reject': self.reject,
+                'errors': self.errors, 'roles': self.roles}
+
+
+class Analyzer:
+    """逐行累积当前分钟的计数；分钟切换时通过 emit 输出并丢弃，保证内存恒定。"""
+
+    def __init__(self, emit):
+        self.emit = emit
+        self.current = None
+        self.pending = None  # 多行 debug 对象：(动作) 等待 expected 字段
+        self.totals = Minute('total')
+        self.signatures = {}
+
+    def _bucket(self, key):
+        if self.current is None or self.current.key != key:
+            if self.current is not None:
+                self.emit(self.current)
+            self.current = Minute(key)
+        return self.current
+
+    def _role(self, bucket, action, role):
+        k = f"{action}:{role.decode('utf-8', 'replace')}"
+        bucket.roles[k] = bucket.roles.get(k, 0) + 1
+        self.totals.roles[k] = self.totals.roles.get(k, 0) + 1
+
+    def feed(self, line, now=None):
+        m = TS_RE.match(line)
+        if m:
+            key = m.group(1).decode().replace('T', ' ')
+            body = line[m.end():]
+        else:
+            # 无时间戳（旧日志或未经管道写入）：跟踪模式按到达时间归档
+            key = time.strftime('%Y-%m-%d %H:%M', time.localtime(now)) if now else (self.current.key if self.current else 'unknown')
+            body = line
+        bucket = self._bucket(key)
+        d = DEBUG_RE.search(body)
+        if d:
+            action = d.group(1).decode()
+            setattr(bucket, action, getattr(bucket, action) + 1)
+            setattr(self.totals, action, getattr(self.totals, action) + 1)
+            e = EXPECTED_RE.search(body)
+            if e:
+                self._role(bucket, action, e.group(1))
+                self.pending = None
+            else:
+                self.pending = action
+            return
+        if self.pending:
+            e = EXPECTED_RE.search(body)
+            if e:
+                self._role(bucket, self.pending, e.group(1))
+                self.pending = None
+            elif body.lstrip().startswith(b'}'):
+                self.pending = None
+            return
+        if STACK_RE.match(body) or not ERROR_RE.search(body):
+            return
+        bucket.errors += 1
+        self.totals.errors += 1
+        # 错误签名：去掉数字与十六进制 ID 后截断，条目数有上限
+        sig = re.sub(rb'[0-9a-f]{8,}|\d+', b'#', body.strip())[:100].decode('utf-8', 'replace')
+        if sig in self.signatures or len(self.signatures) < MAX_SIGNATURES:
+            self.signatures[sig] = self.signatures.get(sig, 0) + 1
+
+    def flush(self):
+        if self.current is not None:
+            self.emit(self.current)
+            self.current = None
+
+
+def open_log(path):
+    if path == '-':
+        return sys.stdin.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+SEGMENT_RE = re.compile(r'\.(\d{8}-\d{6})(?:-(\d+))?(?:\.gz)?$')
+
+
+def segment_order(path):
+    # 轮转分段（<日志>.<时间戳>[-n][.gz]）按时间戳与序号排在当前日志之前
+    m = SEGMENT_RE.search(os.path.basename(path))
+    return (0, m.group(1), int(m.group(2) or 0)) if m else (1, os.path.basename(path), 0)
+
+
+def follow(path, analyzer, interval=0.5, idle_flush=65.0):
+    """类 tail -F：读到末尾后等待新数据；文件被轮转（inode 变化或变短）时重新打开。"""
+    f = open(path, 'rb')
+    ino = os.fstat(f.fileno()).st_ino
+    partial = b''
+    caught_up = False  # 读完已有内容之后，无时间戳的行才按到达时间归档
+    last_data = time.time()
+    while True:
+        chunk = f.readline()
+        if chunk:
+            partial += chunk
+            if partial.endswith(b'\n'):
+                analyzer.feed(partial, now=time.time() if caught_up else None)
+                partial = b''
+                last_data = time.time()
+            continue
+        caught_up = True
+        try:
+            st = os.stat(path)
+            rotated = st.st_ino != ino or st.st_size < f.tell()
+        except OSError:
+            rotated = False
+        if rotated:
+            f.close()
+            f = open(path, 'rb')
+            ino = os.fstat(f.fileno()).st_ino
+            continue
+        # 长时间无新行时输出当前分钟，避免最后一分钟迟迟不显示
+        if analyzer.current is not None and time.time() - last_data >= idle_flush:
+            analyzer.flush()
+        time.sleep(interval)
+
+
+def print_row(m):
+    roles = '，'.join(f'{k} {v}' for k, v in sorted(m.roles.items()))
+    print(f"{m.key:<16}  approve {m.approve:>5}  reject {m.reject:>5}  errors {m.errors:>5}" + (f"  （{roles}）" if roles else ''),
+          flush=True)
+
+
+def analyze(paths, as_json=False, follow_mode=False, top=5):
+    emit = (lambda m: print(json.dumps(m.as_dict(), ensure_ascii=False), flush=True)) if as_json else print_row
+    analyzer = Analyzer(emit)
+    paths = sorted(paths, key=segment_order) if '-' not in paths else paths
+    try:
+        for path in paths:
+            if follow_mode and path == paths[-1] and path != '-':
+                follow(path, analyzer)
+            else:
+                f = open_log(path)
+                try:
+                    for line in f:
+                        analyzer.feed(line)
+                finally:
+                    if f is not sys.stdin.buffer:
+                        f.close()
+    except KeyboardInterrupt:
+        pass
+    analyzer.flush()
+    t = analyzer.totals
+    if as_json:
+        print(json.dumps({'total': t.as_dict(), 'top_errors': sorted(analyzer.signatures.items(), key=lambda kv: -kv[1])[:top]},
+                         ensure_ascii=False))
+        return
+    print(f"合计：approve {t.approve}，reject {t.reject}，errors {t.errors}")
+    for sig, n in sorted(analyzer.signatures.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {n:>6} × {sig}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志管道/轮转与流式分析。')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('pipe', help='从 stdin 读取并写入轮转日志（由 deploy.py 调用）')
+    p.add_argument('path', help='日志文件（如 server.log）')
+    p.add_argument('--max-bytes', type=parse_size, default=None, help='单文件上限（默认 LOG_MAX_BYTES 或 20M）')
+    p.add_argument('--max-age', type=parse_duration, default=None, help='单文件最长时长（默认 LOG_MAX_AGE 或 1d）')
+    p.add_argument('--keep', type=int, default=None, help='保留的压缩分段数（默认 LOG_KEEP 或 10）')
+    p.add_argument('--no-timestamps', action='store_true', help='不在行首添加时间戳')
+    p.add_argument('--append', action='store_true', help='接着写入已有日志，启动时不轮转')
+    a = sub.add_parser('analyze', help='按分钟汇总 approve/reject 与错误数')
+    a.add_argument('paths', nargs='+', help='日志文件（可含 .gz 分段；- 表示 stdin）')
+    a.add_argument('--follow', '-f', action='store_true', help='持续跟踪最后一个文件')
+    a.add_argument('--json', action='store_true', help='每分钟输出一行 JSON')
+    a.add_argument('--top', type=int, default=5, help='列出的高频错误数（默认 5）')
+    args = parser.parse_args()
+
+    if args.command == 'pipe':
+        # 与子进程同处一个会话之外：忽略终端挂断，读到 EOF（子进程退出）后再退出
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        pipe(args.path, sys.stdin.buffer,
+             max_bytes=args.max_bytes or env_setting('LOG_MAX_BYTES', parse_size, DEFAULT_MAX_BYTES),
+             max_age=args.max_age if args.max_age is not None else env_setting('LOG_MAX_AGE', parse_duration, DEFAULT_MAX_AGE),
+             keep=args.keep if args.keep is not None else env_setting('LOG_KEEP', int, DEFAULT_KEEP),
+             timestamps=not args.no_timestamps, append=args.append)
+    else:
+        analyze(args.paths, as_json=args.json, follow_mode=args.follow, top=args.top)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except BrokenPipeError:
+        sys.exit(0)
+    except Exception as e:
+        print(f"日志处理失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -12,16 +12,28 @@
   直接静态托管（推荐）：
     sudo python3 nginx_setup.py --mode static --listen-port 60 --static-root /www/wwwroot/HandV/5308uv16qj36.vicp.fun_6666/build_tmp --back-port 6666 --server-name 8.163.7.207
 
+  性能档位（upstream 长连接、open_file_cache、assets 永久缓存、uploads 直出、API 微缓存）：
+    sudo python3 nginx_setup.py --mode static --profile performance --listen-port 60 --back-port 6666
+  仅校验所有配置模板（不安装、不写入）：
+    python3 nginx_setup.py --check
+  只把已写入配置中的后端切换到指定端口并重载（deploy.py --rolling 蓝绿切换时调用）：
+    sudo python3 nginx_setup.py --switch-backend 6766
+
 不带参数时默认：mode=static, listen_port=60, static_root=当前目录/build_tmp, back=6666, server_name="_"（匹配任意主机名）
+未指定 --back-port 时沿用 deploy.py --rolling 记录的当前后端颜色端口（.backend_color.json），避免重新生成配置时指回已停止的实例。
 
 要求：在服务器上以 root 或具备 sudo 权限运行；前端/后端进程已在本机监听对应端口。
 """
 
 import argparse
+import itertools
+import json
 import os
+import re
 import shutil
 import subprocess
 import sys
+import tempfile
 
 
 class NginxSetupError(Exception):
@@ -114,7 +126,9 @@ def resolve_conf_path() -> tuple[str, str | None]:
     return conf_path, None
 
 
-def build_nginx_conf_proxy(listen_port: int, front_port: int, back_port: int, server_name: str) -> str:
+def build_nginx_conf_proxy(listen_port: int, front_port: int, back_port: int, server_name: str,
+                           backend: str | None = None) -> str:
+    backend = backend or f"127.0.0.1:{back_port}"
     return f"""
 server {{
   listen {listen_port} default_server;
@@ -134,7 +148,7 @@ server {{
 
   # 后端 API：转发到本机 {back_port}
   location /api/ {{
-    proxy_pass http://127.0.0.1:{back_port}/api/;
+    proxy_pass http://{backend}/api/;
     proxy_set_header Host $host;
     proxy_set_header X-Real-IP $remote_addr;
     proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
@@ -144,7 +158,7 @@ server {{
 
   # 上传资源（图片等）
   location /uploads/ {{
-    proxy_pass http://127.0.0.1:{back_port}/uploads/;
+    proxy_pass http://{backend}/uploads/;
   }}
 
   client_max_body_size 20m;
@@ -152,7 +166,18 @@ server {{
 """
 
 
-def build_nginx_conf_static(listen_port: int, static_root: str, back_port: int, server_name: str) -> str:
+def build_precompressed_directives(brotli_static: bool = False) -> str:
+    """直接返回 precompress.py 生成的 .gz/.br 文件（brotli_static 需要 ngx_brotli 模块）。"""
+    lines = ["gzip_static on;", "gzip_vary on;"]
+    if brotli_static:
+        lines.insert(0, "brotli_static on;")
+    return "\n    ".join(lines)
+
+
+def build_nginx_conf_static(listen_port: int, static_root: str, back_port: int, server_name: str,
+                            brotli_static: bool = False, backend: str | None = None) -> str:
+    backend = backend or f"127.0.0.1:{back_port}"
+    precompressed = build_precompressed_directives(brotli_static)
     return f"""
 server {{
   listen {listen_port} default_server;
@@ -161,14 +186,15 @@ server {{
   root {static_root};
   index index.html;
 
-  # 前端 SPA 静态托管
+  # 前端 SPA 静态托管（优先返回预压缩文件）
   location / {{
+    {precompressed}
     try_files $uri $uri/ /index.html;
   }}
 
   # 后端 API：转发到本机 {back_port}
   location /api/ {{
-    proxy_pass http://127.0.0.1:{back_port}/api/;
+    proxy_pass http://{backend}/api/;
     proxy_set_header Host $host;
     proxy_set_header X-Real-IP $remote_addr;
     proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
@@ -178,7 +204,7 @@ server {{
 
   # 上传资源（图片等）
   location /uploads/ {{
-    proxy_pass http://127.0.0.1:{back_port}/uploads/;
+    proxy_pass http://{backend}/uploads/;
   }}
 
   client_max_body_size 20m;
@@ -186,6 +212,311 @@ server {{
 """
 
 
+PROFILES = ("default", "performance")
+BACKEND_UPSTREAM = "handv_backend"
+FRONTEND_UPSTREAM = "handv_frontend"
+API_CACHE_ZONE = "handv_api"
+DEFAULT_UPLOADS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server", "data", "uploads")
+DEFAULT_CACHE_DIR = "/var/cache/nginx/handv"
+DEFAULT_BACK_PORT = 6666
+# deploy.py --rolling 记录的当前后端颜色与端口
+BACKEND_STATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".backend_color.json")
+
+# 只读且变化很少的热点 GET 接口，做 1 秒级微缓存（写操作后最多 1 秒可见）
+API_MICROCACHE_PATTERN = r"^/api/(reasons|users|approval-order|setting/[A-Za-z]+)$"
+
+# 上传图片的预生成缩略图（optimize_images.py）：?v=thumb|display 选择尺寸，按 Accept 优先 WebP
+IMAGE_VARIANT_MAPS = """map $arg_v $handv_img_variant {
+  thumb   .thumb;
+  display .display;
+  default .none;
+}
+
+map $http_accept $handv_img_ext {
+  ~*image/webp .webp;
+  default      .jpg;
+}
+"""
+
+
+def build_upstream(name: str, ports: list[int], keepalive: int = 32) -> str:
+    """多个端口时按最少连接数均衡，并启用被动健康检查（连续失败 3 次摘除 10 秒）。"""
+    if len(ports) > 1:
+        lines = ["  least_conn;"] + [f"  server 127.0.0.1:{p} max_fails=3 fail_timeout=10s;" for p in ports]
+    else:
+        lines = [f"  server 127.0.0.1:{p};" for p in ports]
+    servers = "\n".join(lines)
+    return f"""upstream {name} {{
+{servers}
+  keepalive {keepalive};
+}}
+"""
+
+
+def backend_ports(back_port: int, workers: int = 1) -> list[int]:
+    """与 deploy.py --workers 一致：从 back_port 起连续分配端口。"""
+    return [back_port + i for i in range(max(1, workers))]
+
+
+def active_back_port() -> int:
+    """deploy.py --rolling 记录的当前后端首个端口；没有记录时为默认 6666。"""
+    try:
+        with open(BACKEND_STATE, encoding="utf-8") as f:
+            return int(json.load(f)["ports"][0])
+    except (OSError, ValueError, KeyError, IndexError, TypeError):
+        return DEFAULT_BACK_PORT
+
+
+def switch_backend_conf(content: str, ports: list[int]) -> str:
+    """把已生成配置中的后端改为 ports：有 upstream 时重写该块（保留 keepalive），否则改写 /api/、/uploads/ 的直连端口。"""
+    upstream_re = re.compile(r"upstream " + BACKEND_UPSTREAM + r" \{.*?\n\}\n", re.S)
+    m = upstream_re.search(content)
+    if m:
+        keepalive = re.search(r"keepalive (\d+);", m.group(0))
+        block = build_upstream(BACKEND_UPSTREAM, ports, int(keepalive.group(1)) if keepalive else 32)
+        return content[:m.start()] + block + content[m.end():]
+    direct_re = re.compile(r"proxy_pass http://127\.0\.0\.1:\d+/(api|uploads)/;")
+    if not direct_re.search(content):
+        raise NginxSetupError("配置中未找到后端 upstream 或 /api/ 直连地址，无法切换；请先执行 nginx_setup.py 生成配置")
+    target = f"127.0.0.1:{ports[0]}" if len(ports) == 1 else BACKEND_UPSTREAM
+    content = direct_re.sub(lambda d: f"proxy_pass http://{target}/{d.group(1)}/;", content)
+    content = re.sub(r"(# 后端 API：转发到本机) \d+", rf"\g<1> {ports[0]}", content)
+    return content if len(ports) == 1 else build_upstream(BACKEND_UPSTREAM, ports) + content
+
+
+def switch_backend(ports: list[int]) -> None:
+    """改写现有站点配置的后端端口并校验、重载；nginx -t 失败时写回原配置。"""
+    conf_path, _ = resolve_conf_path()
+    if not os.path.isfile(conf_path):
+        raise NginxSetupError(f"站点配置不存在：{conf_path}，请先执行 nginx_setup.py 生成配置")
+    with open(conf_path, encoding="utf-8") as f:
+        original = f.read()
+    content = switch_backend_conf(original, ports)
+    if content == original:
+        print(f"[nginx-setup] 后端已指向 {','.join(map(str, ports))}，无需修改")
+        return
+    write_conf(conf_path, content)
+    try:
+        test_and_reload(check=True)
+    except NginxSetupError:
+        write_conf(conf_path, original)
+        raise
+    print(f"[nginx-setup] 后端已切换到 {','.join(map(str, ports))} 并重载")
+
+
+def build_perf_http_blocks(back_ports: list[int], cache_dir: str, front_port: int | None = None) -> str:
+    """performance 档位中位于 http 上下文的部分（upstream 连接池与微缓存区）。"""
+    blocks = [build_upstream(BACKEND_UPSTREAM, back_ports)]
+    if front_port:
+        blocks.append(build_upstream(FRONTEND_UPSTREAM, [front_port], keepalive=16))
+    blocks.append(
+        f"proxy_cache_path {cache_dir} levels=1:2 keys_zone={API_CACHE_ZONE}:10m "
+        f"max_size=64m inactive=10m use_temp_path=off;\n"
+    )
+    blocks.append(IMAGE_VARIANT_MAPS)
+    return "\n".join(blocks)
+
+
+def build_perf_server_common(uploads_root: str) -> str:
+    """performance 档位中 server 内与模式无关的部分：文件句柄缓存、API 连接复用与微缓存、上传文件直出。"""
+    return f"""  sendfile on;
+  tcp_nopush on;
+  tcp_nodelay on;
+  keepalive_timeout 65;
+
+  # 缓存文件描述符与 stat 结果，减少静态文件与上传图片的系统调用
+  open_file_cache max=2000 inactive=60s;
+  open_file_cache_valid 30s;
+  open_file_cache_min_uses 2;
+  open_file_cache_errors on;
+
+  # 后端 API：经 upstream 长连接池转发
+  location /api/ {{
+    proxy_pass http://{BACKEND_UPSTREAM}/api/;
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+    proxy_read_timeout 300;
+    proxy_next_upstream error timeout http_502 http_503;
+  }}
+
+  # 热点只读 GET：微缓存（仅缓存 GET/HEAD 的 200 响应）
+  location ~ {API_MICROCACHE_PATTERN} {{
+    proxy_pass http://{BACKEND_UPSTREAM};
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+    proxy_cache {API_CACHE_ZONE};
+    proxy_cache_methods GET HEAD;
+    proxy_cache_valid 200 1s;
+    proxy_cache_lock on;
+    proxy_cache_use_stale updating error timeout;
+    proxy_cache_background_update on;
+    add_header X-Cache-Status $upstream_cache_status;
+  }}
+
+  # 上传资源：由 Nginx 直接从磁盘返回（文件名唯一，可长期缓存）
+  # 带 ?v= 时依次尝试 WebP/JPEG 缩略图，尚未生成则回退原图
+  location /uploads/ {{
+    alias {uploads_root.rstrip("/")}/;
+    try_files $uri$handv_img_variant$handv_img_ext $uri$handv_img_variant.jpg $uri =404;
+    add_header Cache-Control "public, max-age=2592000";
+    add_header Vary Accept;
+    access_log off;
+  }}
+
+  client_max_body_size 20m;
+"""
+
+
+def build_nginx_conf_static_perf(listen_port: int, static_root: str, back_ports: list[int], server_name: str,
+                                 uploads_root: str = DEFAULT_UPLOADS_ROOT, cache_dir: str = DEFAULT_CACHE_DIR,
+                                 brotli_static: bool = False) -> str:
+    precompressed = build_precompressed_directives(brotli_static)
+    return build_perf_http_blocks(back_ports, cache_dir) + f"""
+server {{
+  listen {listen_port} default_server;
+  server_name {server_name};
+
+  root {static_root};
+  index index.html;
+
+  # 前端 SPA：入口 index.html 不缓存，保证发布后立即生效
+  location / {{
+    {precompressed}
+    try_files $uri $uri/ /index.html;
+    add_header Cache-Control "no-cache";
+  }}
+
+  # Vite 产物文件名含内容哈希，可永久缓存
+  location /assets/ {{
+    {precompressed}
+    try_files $uri =404;
+    add_header Cache-Control "public, max-age=31536000, immutable";
+    access_log off;
+  }}
+
+{build_perf_server_common(uploads_root)}}}
+"""
+
+
+def build_nginx_conf_proxy_perf(listen_port: int, front_port: int, back_ports: list[int], server_name: str,
+                                uploads_root: str = DEFAULT_UPLOADS_ROOT, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    return build_perf_http_blocks(back_ports, cache_dir, front_port=front_port) + f"""
+server {{
+  listen {listen_port} default_server;
+  server_name {server_name};
+
+  # 前端 SPA：经 upstream 长连接池代理到本机前端进程
+  location / {{
+    proxy_pass http://{FRONTEND_UPSTREAM};
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $host;
+    proxy_set_header X-Real-IP $remote_addr;
+    proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+    proxy_set_header X-Forwarded-Proto $scheme;
+  }}
+
+  # Vite 产物文件名含内容哈希，可永久缓存
+  location /assets/ {{
+    proxy_pass http://{FRONTEND_UPSTREAM};
+    proxy_http_version 1.1;
+    proxy_set_header Connection "";
+    proxy_set_header Host $host;
+    proxy_hide_header Cache-Control;
+    add_header Cache-Control "public, max-age=31536000, immutable";
+  }}
+
+{build_perf_server_common(uploads_root)}}}
+"""
+
+
+def render_conf(mode: str, profile: str, listen_port: int, back_port: int, server_name: str,
+                front_port: int = 8080, static_root: str = "", uploads_root: str = DEFAULT_UPLOADS_ROOT,
+                cache_dir: str = DEFAULT_CACHE_DIR, brotli_static: bool = False, workers: int = 1) -> str:
+    ports = backend_ports(back_port, workers)
+    if profile == "performance":
+        if mode == "proxy":
+            return build_nginx_conf_proxy_perf(listen_port, front_port, ports, server_name, uploads_root, cache_dir)
+        return build_nginx_conf_static_perf(listen_port, static_root, ports, server_name, uploads_root,
+                                            cache_dir, brotli_static)
+    # default 档位：单实例直连端口；多实例时生成 upstream 做负载均衡
+    prefix, backend = "", None
+    if len(ports) > 1:
+        prefix, backend = build_upstream(BACKEND_UPSTREAM, ports), BACKEND_UPSTREAM
+    if mode == "proxy":
+        return prefix + build_nginx_conf_proxy(listen_port, front_port, back_port, server_name, backend=backend)
+    return prefix + build_nginx_conf_static(listen_port, static_root, back_port, server_name,
+                                            brotli_static=brotli_static, backend=backend)
+
+
+def lint_conf(content: str) -> list[str]:
+    """不依赖 nginx 的基础语法检查：括号配对、指令以分号结尾。"""
+    problems = []
+    depth = 0
+    for no, raw in enumerate(content.splitlines(), 1):
+        line = raw.split("#", 1)[0].strip()
+        if not line:
+            continue
+        depth += line.count("{") - line.count("}")
+        if depth < 0:
+            problems.append(f"第 {no} 行：多余的 '}}'")
+            depth = 0
+        if not line.endswith((";", "{", "}")):
+            problems.append(f"第 {no} 行：指令未以 ';' 结尾：{line}")
+    if depth != 0:
+        problems.append("大括号未闭合")
+    return problems
+
+
+def nginx_test_conf(content: str) -> tuple[bool, str]:
+    """在临时前缀目录中用 nginx -t 校验一份站点配置（作为 http 内的 include）。"""
+    with tempfile.TemporaryDirectory(prefix="handv-nginx-") as tmp:
+        site = os.path.join(tmp, "site.conf")
+        main_conf = os.path.join(tmp, "nginx.conf")
+        with open(site, "w", encoding="utf-8") as f:
+            f.write(content)
+        with open(main_conf, "w", encoding="utf-8") as f:
+            f.write(f"pid {tmp}/nginx.pid;\nerror_log stderr;\nevents {{}}\nhttp {{\n  include {site};\n}}\n")
+        proc = subprocess.run(["nginx", "-t", "-p", tmp, "-c", main_conf], text=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return proc.returncode == 0, proc.stdout
+
+
+def check_templates() -> bool:
+    """渲染所有模式 × 档位的配置并校验；有 nginx 时使用 nginx -t，否则做基础语法检查。"""
+    use_nginx = has_cmd("nginx")
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="handv-nginx-check-") as tmp:
+        for mode, profile, workers in itertools.product(("static", "proxy"), PROFILES, (1, 3)):
+            content = render_conf(mode, profile, listen_port=8081, back_port=6666, server_name="_",
+                                  front_port=8080, static_root=os.path.join(tmp, "build_tmp"),
+                                  uploads_root=os.path.join(tmp, "uploads"),
+                                  cache_dir=os.path.join(tmp, "cache"), workers=workers)
+            problems = lint_conf(content)
+            detail = ""
+            if not problems and use_nginx:
+                passed, detail = nginx_test_conf(content)
+                if not passed:
+                    problems.append("nginx -t 失败")
+            label = f"{mode}/{profile}/workers={workers}"
+            if problems:
+                ok = False
+                print(f"[nginx-setup] 校验失败 {label}：" + "；".join(problems), file=sys.stderr)
+                if detail:
+                    print(detail, file=sys.stderr)
+            else:
+                print(f"[nginx-setup] 校验通过 {label}（{'nginx -t' if use_nginx else '基础语法检查'}）")
+    return ok
+
+
 def write_conf(conf_path: str, content: str) -> None:
     # 直接写 /etc 需要 root 权限；使用 sudo tee 可在非 root 下写入
     print(f"[nginx-setup] 写入配置：{conf_path}")
@@ -199,14 +530,14 @@ def ensure_symlink(target: str, link_path: str) -> None:
     run(["sudo", "ln", "-sf", target, link_path])
 
 
-def test_and_reload() -> None:
+def test_and_reload(check: bool = False) -> None:
     print("[nginx-setup] 测试 Nginx 配置")
     run(["sudo", "nginx", "-t"])
     print("[nginx-setup] 重载 Nginx")
     if has_cmd("systemctl"):
-        run(["sudo", "systemctl", "reload", "nginx"], check=False)
+        run(["sudo", "systemctl", "reload", "nginx"], check=check)
     else:
-        run(["sudo", "service", "nginx", "reload"], check=False)
+        run(["sudo", "service", "nginx", "reload"], check=check)
 
 
 def valid_port(p: int) -> bool:
@@ -219,18 +550,40 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--listen-port", type=int, default=60, help="Nginx 对外监听端口（默认 60）")
     parser.add_argument("--front-port", type=int, default=8080, help="前端监听端口（仅 proxy 模式使用）")
     parser.add_argument("--static-root", type=str, default=os.path.join(os.getcwd(), "build_tmp"), help="静态文件根目录（仅 static 模式使用，默认为当前目录/build_tmp）")
-    parser.add_argument("--back-port", type=int, default=6666, help="后端监听端口（默认 6666）")
+    parser.add_argument("--back-port", type=int, default=None, help="后端监听端口（默认沿用 deploy.py --rolling 记录的当前颜色端口，否则 6666）")
     parser.add_argument("--server-name", type=str, default="_", help="Nginx server_name（默认 '_'）")
+    parser.add_argument("--workers", type=int, default=1, help="后端实例数（与 deploy.py --workers 一致，从 --back-port 起连续端口，>1 时生成 upstream 负载均衡）")
+    parser.add_argument("--profile", choices=list(PROFILES), default="default", help="配置档位：default 基础配置；performance 启用 upstream 长连接、open_file_cache、assets 永久缓存、uploads 直出与 API 微缓存")
+    parser.add_argument("--uploads-root", type=str, default=DEFAULT_UPLOADS_ROOT, help="上传文件目录（performance 档位由 Nginx 直接返回，默认 server/data/uploads）")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR, help=f"API 微缓存目录（performance 档位，由 Nginx 启动时自动创建，默认 {DEFAULT_CACHE_DIR}）")
+    parser.add_argument("--check", action="store_true", help="仅渲染所有模式/档位的配置模板并校验（有 nginx 时执行 nginx -t），不安装、不写入")
+    parser.add_argument("--brotli-static", action="store_true", help="启用 brotli_static 返回预压缩 .br（需 Nginx 已加载 ngx_brotli 模块）")
+    parser.add_argument("--switch-backend", metavar="PORTS", help="只把已写入配置中的后端改为这些端口（逗号分隔）并重载，其余配置不变（供 deploy.py --rolling 使用）")
     return parser.parse_args()
 
 
 def main() -> None:
     args = parse_args()
+    if args.check:
+        if not check_templates():
+            raise NginxSetupError("[nginx-setup] 配置模板校验未通过")
+        return
+    if args.switch_backend:
+        try:
+            ports = [int(p) for p in args.switch_backend.split(",") if p.strip()]
+        except ValueError:
+            raise NginxSetupError(f"--switch-backend 端口列表不合法：{args.switch_backend}")
+        if not ports or not all(valid_port(p) for p in ports):
+            raise NginxSetupError("后端端口参数不合法，范围应为 1-65535。")
+        switch_backend(ports)
+        return
+    if args.back_port is None:
+        args.back_port = active_back_port()
     if not valid_port(args.listen_port):
         raise NginxSetupError("监听端口参数不合法，范围应为 1-65535。")
     if args.mode == "proxy" and not valid_port(args.front_port):
         raise NginxSetupError("前端端口参数不合法，范围应为 1-65535。")
-    if not valid_port(args.back_port):
+    if not valid_port(args.back_port) or not valid_port(args.back_port + max(args.workers, 1) - 1):
         raise NginxSetupError("后端端口参数不合法，范围应为 1-65535。")
 
     if args.mode == "proxy":
@@ -241,20 +594,27 @@ def main() -> None:
         print(f"[nginx-setup] 运行模式: static")
         print(f"[nginx-setup] 监听端口: {args.listen_port}")
         print(f"[nginx-setup] 静态根目录: {args.static_root}")
-    print(f"[nginx-setup] 后端端口: {args.back_port}")
+    if args.workers > 1:
+        ports = backend_ports(args.back_port, args.workers)
+        print(f"[nginx-setup] 后端端口: {ports[0]}-{ports[-1]}（{args.workers} 个实例，least_conn 负载均衡）")
+    else:
+        print(f"[nginx-setup] 后端端口: {args.back_port}")
     print(f"[nginx-setup] server_name: {args.server_name}")
+    print(f"[nginx-setup] 配置档位: {args.profile}")
 
     ensure_nginx_installed()
     ensure_nginx_running()
 
     conf_path, symlink_path = resolve_conf_path()
-    if args.mode == "proxy":
-        content = build_nginx_conf_proxy(args.listen_port, args.front_port, args.back_port, args.server_name)
-    else:
-        # 静态模式下确保目录存在提示（不强制创建，避免误写）
-        if not os.path.isdir(args.static_root):
-            print(f"[nginx-setup] 警告：静态根目录不存在：{args.static_root}，请先构建前端（python3 deploy.py --build）", file=sys.stderr)
-        content = build_nginx_conf_static(args.listen_port, args.static_root, args.back_port, args.server_name)
+    # 静态模式下确保目录存在提示（不强制创建，避免误写）
+    if args.mode == "static" and not os.path.isdir(args.static_root):
+        print(f"[nginx-setup] 警告：静态根目录不存在：{args.static_root}，请先构建前端（python3 deploy.py --build）", file=sys.stderr)
+    if args.profile == "performance" and not os.path.isdir(args.uploads_root):
+        print(f"[nginx-setup] 警告：上传目录不存在：{args.uploads_root}，/uploads/ 将返回 404", file=sys.stderr)
+    content = render_conf(args.mode, args.profile, args.listen_port, args.back_port, args.server_name,
+                          front_port=args.front_port, static_root=args.static_root,
+                          uploads_root=args.uploads_root, cache_dir=args.cache_dir,
+                          brotli_static=args.brotli_static, workers=args.workers)
     write_conf(conf_path, content)
     if symlink_path:
         ensure_symlink(conf_path, symlink_path)
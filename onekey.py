@@ -73,8 +73,8 @@ def compute_api_base(server_name: str, back_port: int) -> str:
     return f"http://{server_name}:{back_port}/api"
 
 
-def install_and_build(api_base: str) -> None:
-    """安装依赖并构建前端。"""
+def install_and_build(api_base: str, force: bool = False) -> None:
+    """安装依赖并构建前端（输入指纹未变化时自动跳过，force 时强制执行）。"""
     # 复用 deploy.py 的实现，保证一致性
     try:
         from deploy import ensure_node, npm_install, build_frontend
@@ -82,17 +82,17 @@ def install_and_build(api_base: str) -> None:
         raise OneKeyError(f"无法导入 deploy.py：{e}")
 
     ensure_node()
-    npm_install()
-    build_frontend(api_base=api_base)
+    npm_install(force=force)
+    build_frontend(api_base=api_base, force=force)
 
 
-def start_backend_process() -> None:
-    """启动后端（固定端口 6666）。"""
+def start_backend_process(workers: int = 1) -> None:
+    """启动后端（端口 6666；多实例时 6666 起连续端口）。"""
     try:
         from deploy import start_backend
     except Exception as e:
         raise OneKeyError(f"无法导入 deploy.py：{e}")
-    start_backend()
+    start_backend(workers=workers)
 
 
 def start_frontend_process(front_port: int) -> None:
@@ -105,12 +105,13 @@ def start_frontend_process(front_port: int) -> None:
 
 
 def setup_nginx(mode: str, listen_port: int, server_name: str, back_port: int,
-                front_port: Optional[int] = None, static_root: Optional[str] = None) -> None:
+                front_port: Optional[int] = None, static_root: Optional[str] = None,
+                profile: str = "default", workers: int = 1) -> None:
     """调用 nginx_setup.py 写入并重载 Nginx 配置。"""
     python_bin = shutil.which("python3") or "python3"
     use_sudo = has_cmd("sudo")
 
-    base_cmd = [python_bin, "nginx_setup.py", "--mode", mode, "--listen-port", str(listen_port), "--back-port", str(back_port), "--server-name", server_name]
+    base_cmd = [python_bin, "nginx_setup.py", "--mode", mode, "--listen-port", str(listen_port), "--back-port", str(back_port), "--server-name", server_name, "--profile", profile, "--workers", str(workers)]
     if mode == "proxy":
         if not front_port:
             raise OneKeyError("proxy 模式需要提供 --front-port")
@@ -134,6 +135,9 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--front-port", type=int, default=8080, help="前端进程端口（proxy 模式有效），默认 8080")
     parser.add_argument("--static-root", default=None, help="静态托管根目录（static 模式有效），默认 <项目根>/build_tmp")
     parser.add_argument("--api-base", default=None, help="前端构建注入的 API 基址，不提供则按 server-name/back-port 推导")
+    parser.add_argument("--workers", type=int, default=1, help="后端实例数，默认 1（>1 时 Nginx 生成 upstream 负载均衡）")
+    parser.add_argument("--profile", choices=["default", "performance"], default="default", help="Nginx 配置档位（performance 启用长连接池、静态缓存与 API 微缓存）")
+    parser.add_argument("--force", action="store_true", help="忽略构建缓存，强制执行 npm ci 与前端构建")
     parser.add_argument("--skip-install", action="store_true", help="跳过依赖安装")
     parser.add_argument("--skip-build", action="store_true", help="跳过前端构建")
     parser.add_argument("--skip-backend", action="store_true", help="跳过后端启动")
@@ -150,13 +154,13 @@ def main() -> None:
 
     # 安装 + 构建
     if not (args.skip_install and args.skip_build):
-        install_and_build(api_base)
+        install_and_build(api_base, force=args.force)
     else:
         log.info("跳过安装/构建")
 
     # 启动后端
     if not args.skip_backend:
-        start_backend_process()
+        start_backend_process(args.workers)
     else:
         log.info("跳过后端启动")
 
@@ -174,6 +178,8 @@ def main() -> None:
         back_port=args.back_port,
         front_port=(args.front_port if args.mode == "proxy" else None),
         static_root=(args.static_root if args.mode == "static" else None),
+        profile=args.profile,
+        workers=args.workers,
     )
 
     log.info("部署完成：前端 %s（通过 Nginx %s）、后端 %d", (
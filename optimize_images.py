@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+票据图片变体生成（缩略图 / 展示图，WebP + JPEG）。
+
+功能：
+- 遍历上传目录（默认 server/data/uploads），为每张原图在同目录生成：
+    <原图>.thumb.webp / <原图>.thumb.jpg       长边 320px，用于列表与详情缩略图
+    <原图>.display.webp / <原图>.display.jpg   长边 1600px，用于大图预览
+- 多进程并行处理；按 EXIF 方向摆正，透明背景在 JPEG 中铺白
+- 增量：清单（.variants.json）记录原图 mtime/大小/SHA-256 与目录 mtime，
+  目录未变化直接跳过，仅处理新增或变更的上传；原图删除后清理其变体
+- 体积不小于原图的变体不生成（客户端自然回退原图）
+- --watch 持续轮询新上传
+
+请求方式：/uploads/<原图路径>?v=thumb|display。Nginx（performance 档位，nginx_setup.py）与后端
+express 中间件在变体存在时返回变体（支持 WebP 的浏览器优先 .webp），否则回退原图。
+
+用法：
+  python3 optimize_images.py                  # 一次性补齐（backfill）
+  python3 optimize_images.py --watch          # 持续处理新上传（默认每 5 秒扫描一次）
+  python3 optimize_images.py --force          # 忽略清单，全部重新生成
+
+依赖可选的 Python 包 Pillow（pip install pillow）；未安装时本工具无法运行，站点照常返回原图。
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # 可选依赖
+    Image = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROOT = os.path.join(ROOT, 'server', 'data', 'uploads')
+MANIFEST_NAME = '.variants.json'
+SOURCE_EXTS = {'.jpg', '.jpeg', '.png', '.webp'}
+# 变体名 → 长边像素
+VARIANTS = {'thumb': 320, 'display': 1600}
+VARIANT_RE = re.compile(r'\.(thumb|display)\.(webp|jpg)$')
+JPEG_QUALITY = {'thumb': 72, 'display': 82}
+WEBP_QUALITY = {'thumb': 70, 'display': 80}
+# 刚写入的文件可能仍在上传中，等待其稳定后再处理
+SETTLE_SECONDS = 2.0
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def variant_path(path, name, fmt):
+    return f'{path}.{name}.{fmt}'
+
+
+def is_source(name):
+    return (not name.startswith('.') and os.path.splitext(name)[1].lower() in SOURCE_EXTS
+            and not VARIANT_RE.search(name))
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _encode(img, fmt, quality):
+    buf = io.BytesIO()
+    if fmt == 'jpg':
+        if img.mode not in ('RGB', 'L'):
+            # JPEG 不支持透明：铺白底
+            rgba = img.convert('RGBA')
+            bg = Image.new('RGB', rgba.size, (255, 255, 255))
+            bg.paste(rgba, mask=rgba.split()[-1])
+            img = bg
+        img.save(buf, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        img.save(buf, 'WEBP', quality=quality, method=4)
+    return buf.getvalue()
+
+
+def process_one(path, digest, webp):
+    """在子进程中为单张原图生成全部变体，返回 (path, digest, 原图大小, {变体文件名后缀: 大小或 None})。"""
+    original_size = os.path.getsize(path)
+    out = {}
+    with Image.open(path) as src:
+        # JPEG 按目标尺寸降采样解码，大图省时省内存
+        src.draft('RGB', (max(VARIANTS.values()),) * 2)
+        img = ImageOps.exif_transpose(src)
+        img.load()
+        # 先生成大尺寸，再由其缩小得到小尺寸；原图本身不大时各尺寸像素相同，复用编码结果
+        encoded = {}
+        for name, edge in sorted(VARIANTS.items(), key=lambda kv: -kv[1]):
+            if max(img.size) > edge:
+                img = img.copy()
+                img.thumbnail((edge, edge), Image.LANCZOS)
+            for fmt in (('webp', 'jpg') if webp else ('jpg',)):
+                target = variant_path(path, name, fmt)
+                quality = (WEBP_QUALITY if fmt == 'webp' else JPEG_QUALITY)[name]
+                key = (img.size, fmt)
+                data = encoded.get(key)
+                if data is None:
+                    data = encoded[key] = _encode(img, fmt, quality)
+                if len(data) >= original_size:
+                    # 无收益：删除旧变体，由服务端回退原图
+                    try:
+                        os.remove(target)
+                    except OSError:
+                        pass
+                    out[f'{name}.{fmt}'] = None
+                else:
+                    _write_atomic(target, data)
+                    out[f'{name}.{fmt}'] = len(data)
+    return path, digest, original_size, out
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get('files'), dict):
+            data.setdefault('dirs', {})
+            return data
+    except (OSError, ValueError):
+        pass
+    return {'files': {}, 'dirs': {}}
+
+
+def save_manifest(root, manifest):
+    _write_atomic(os.path.join(root, MANIFEST_NAME),
+                  json.dumps(manifest, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8'))
+
+
+def remove_variants(path):
+    for name in VARIANTS:
+        for fmt in ('webp', 'jpg'):
+            try:
+                os.remove(variant_path(path, name, fmt))
+            except OSError:
+                pass
+
+
+def iter_dirs(root):
+    """深度优先列出 root 下所有目录（含 root），返回 (相对路径, 绝对路径, mtime_ns)。"""
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            st = os.stat(d)
+            with os.scandir(d) as it:
+                subdirs = [e.path for e in it if e.is_dir(follow_symlinks=False) and not e.name.startswith('.')]
+        except OSError:
+            continue
+        rel = os.path.relpath(d, root).replace(os.sep, '/')
+        yield rel, d, st.st_mtime_ns
+        stack.extend(subdirs)
+
+
+def _dir_of(rel):
+    return rel.rsplit('/', 1)[0] if '/' in rel else '.'
+
+
+def scan(root, manifest, force=False):
+    """找出需要处理的原图；清理已删除原图的变体与清单条目。
+
+    返回 (待处理 [(path, rel, stat)], 本轮已完整扫描、处理后需记录 mtime 的目录 {rel: abs})。
+    """
+    files = manifest['files']
+    dirs = manifest['dirs']
+    by_dir = {}
+    for rel in files:
+        by_dir.setdefault(_dir_of(rel), []).append(rel)
+    todo = []
+    touched = {}
+    seen_dirs = set()
+    now = time.time()
+    for rel_dir, abs_dir, mtime_ns in iter_dirs(root):
+        seen_dirs.add(rel_dir)
+        if not force and dirs.get(rel_dir) == mtime_ns:
+            continue
+        settled = True
+        present = set()
+        try:
+            entries = list(os.scandir(abs_dir))
+        except OSError:
+            continue
+        for e in entries:
+            if not e.is_file(follow_symlinks=False) or not is_source(e.name):
+                continue
+            rel = e.name if rel_dir == '.' else f'{rel_dir}/{e.name}'
+            present.add(rel)
+            st = e.stat(follow_symlinks=False)
+            if now - st.st_mtime < SETTLE_SECONDS:
+                settled = False
+                continue
+            prev = files.get(rel)
+            if not force and prev and prev.get('mtime_ns') == st.st_mtime_ns and prev.get('size') == st.st_size:
+                continue
+            todo.append((e.path, rel, st))
+        # 本目录中已不存在的原图：删除其变体
+        for rel in by_dir.get(rel_dir, ()):
+            if rel not in present:
+                remove_variants(os.path.join(root, *rel.split('/')))
+                del files[rel]
+        if settled:
+            touched[rel_dir] = abs_dir
+    # 整个目录已删除（如 deleteBillImagesSync）：变体随目录一起消失，只需清理清单
+    for rel_dir in [d for d in dirs if d not in seen_dirs]:
+        del dirs[rel_dir]
+    for rel_dir, rels in by_dir.items():
+        if rel_dir not in seen_dirs:
+            for rel in rels:
+                files.pop(rel, None)
+    return todo, touched
+
+
+def optimize(root=DEFAULT_ROOT, workers=None, force=False, manifest=None, pool=None):
+    """处理一轮，返回 (统计字典, 清单)。"""
+    if Image is None:
+        raise RuntimeError('需要 Pillow：pip install pillow')
+    if not os.path.isdir(root):
+        raise RuntimeError(f"上传目录不存在：{root}")
+    started = time.monotonic()
+    manifest = manifest if manifest is not None else ({'files': {}, 'dirs': {}} if force else load_manifest(root))
+    webp = features.check('webp')
+    todo, touched = scan(root, manifest, force=force)
+
+    # 内容未变（仅 mtime 变化，如被复制/恢复）且变体仍在：只更新清单
+    jobs = []
+    unchanged = 0
+    for path, rel, st in todo:
+        digest = file_sha256(path)
+        prev = manifest['files'].get(rel)
+        if (not force and prev and prev.get('sha256') == digest
+                and all(size is None or os.path.exists(variant_path(path, *key.split('.')))
+                        for key, size in prev.get('variants', {}).items())):
+            prev.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+            unchanged += 1
+            continue
+        jobs.append((path, rel, st, digest))
+
+    failed = []
+    results = []
+    if jobs:
+        own_pool = pool is None
+        pool = pool or ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        try:
+            futures = [(rel, st, pool.submit(process_one, path, digest, webp)) for path, rel, st, digest in jobs]
+            for rel, st, fut in futures:
+                try:
+                    _, digest, size, variants = fut.result()
+                except Exception as e:  # 损坏或无法识别的图片：记录并跳过，下次仍会重试
+                    failed.append((rel, str(e)))
+                    continue
+                manifest['files'][rel] = {'mtime_ns': st.st_mtime_ns, 'size': size, 'sha256': digest, 'variants': variants}
+                results.append((rel, size, variants))
+        finally:
+            if own_pool:
+                pool.shutdown()
+
+    failed_dirs = {_dir_of(rel) for rel, _ in failed}
+    for rel_dir, abs_dir in touched.items():
+        if rel_dir in failed_dirs:
+            continue
+        try:
+            manifest['dirs'][rel_dir] = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            pass
+    save_manifest(root, manifest)
+
+    entries = manifest['files'].values()
+    totals = {'original': sum(e['size'] for e in entries)}
+    for name in VARIANTS:
+        for fmt in ('webp', 'jpg'):
+            key = f'{name}.{fmt}'
+            totals[key] = sum((e['variants'].get(key) or e['size']) for e in entries if key in e['variants'])
+    return {
+        'files': len(manifest['files']),
+        'processed': len(results),
+        'unchanged': unchanged,
+        'failed': failed,
+        'webp': webp,
+        'totals': totals,
+        'seconds': time.monotonic() - started,
+    }, manifest
+
+
+def _fmt_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def print_report(stats):
+    print(f"[images] 原图 {stats['files']} 张：新处理 {stats['processed']}，内容未变 {stats['unchanged']}，"
+          f"失败 {len(stats['failed'])}，耗时 {stats['seconds']:.2f}s")
+    for rel, err in stats['failed'][:10]:
+        print(f"  失败：{rel}：{err}")
+    t = stats['totals']
+    parts = [f"原图 {_fmt_size(t['original'])}"]
+    for key in sorted(k for k in t if k != 'original'):
+        if t[key]:
+            parts.append(f"{key} {_fmt_size(t[key])}")
+    print('[images] 合计：' + '，'.join(parts) + ('' if stats['webp'] else '（Pillow 不支持 WebP，仅生成 JPEG）'))
+
+
+def watch(root, workers, interval):
+    """常驻轮询：目录 mtime 未变时只需一次 stat，开销很小。"""
+    manifest = load_manifest(root)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        print(f"[images] 监视 {root}（每 {interval:g}s 扫描一次，Ctrl+C 退出）")
+        while True:
+            stats, manifest = optimize(root, manifest=manifest, pool=pool)
+            if stats['processed'] or stats['failed']:
+                print_report(stats)
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='为上传的票据图片生成缩略图/展示图变体（增量、并行）。')
+    parser.add_argument('--root', default=DEFAULT_ROOT, help='上传目录（默认 server/data/uploads）')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数（默认 CPU 核数）')
+    parser.add_argument('--force', action='store_true', help='忽略清单，全部重新生成')
+    parser.add_argument('--watch', action='store_true', help='持续监视新上传')
+    parser.add_argument('--interval', type=float, default=5.0, help='监视模式扫描间隔（秒，默认 5）')
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+    if args.watch:
+        watch(root, args.workers, args.interval)
+        return
+    stats, _ = optimize(root, workers=args.workers, force=args.force)
+    print_report(stats)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"图片处理失败：{e}", file=sys.stderr)
+        sys.exit(1)
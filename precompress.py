@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+前端构建产物预压缩（.gz / .br）。
+
+功能：
+- 遍历构建目录（默认 build_tmp），为可压缩文件（JS/CSS/HTML/SVG/JSON 等）写入同名 .gz 与 .br 文件
+- 多进程并行压缩，充分利用多核
+- 增量：以内容 SHA-256 为键记录清单（.precompress.json），未变化的文件（如带哈希的 assets）不重复压缩
+- 输出体积与压缩比报告
+
+Nginx（gzip_static / brotli_static）与 preview.py 会根据 Accept-Encoding 直接返回这些预压缩文件。
+
+用法：
+  python3 precompress.py                 # 压缩 build_tmp
+  python3 precompress.py --root dist     # 指定目录
+  python3 precompress.py --force         # 忽略清单，全部重新压缩
+
+.br 依赖可选的 Python 包 brotli（pip install brotli）；未安装时仅生成 .gz。
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROOT = os.path.join(ROOT, 'build_tmp')
+MANIFEST_NAME = '.precompress.json'
+COMPRESSIBLE_EXTS = {
+    '.js', '.mjs', '.css', '.html', '.htm', '.svg', '.json', '.map',
+    '.txt', '.xml', '.webmanifest', '.ico', '.wasm',
+}
+# 过小的文件压缩后收益为负，直接跳过
+MIN_SIZE = 256
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def iter_candidates(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        # 跳过隐藏目录与清单文件
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            ext = os.path.splitext(name)[1].lower()
+            if name.startswith('.') or ext not in COMPRESSIBLE_EXTS:
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                if os.path.getsize(path) < MIN_SIZE:
+                    continue
+            except OSError:
+                continue
+            yield path
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _store_variant(path, ext, original, encoded, st):
+    """写入压缩变体；若压缩后不比原文件小则删除旧变体并返回 None。"""
+    target = path + ext
+    if len(encoded) >= len(original):
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+        return None
+    _write_atomic(target, encoded)
+    # 与原文件保持相同 mtime，便于 Nginx/preview.py 输出一致的 Last-Modified
+    os.utime(target, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return len(encoded)
+
+
+def compress_one(path, digest):
+    """在子进程中压缩单个文件，返回 (path, digest, 原始大小, gz 大小, br 大小)；无收益的变体大小为 None。"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    st = os.stat(path)
+    gz_size = _store_variant(path, '.gz', data, gzip.compress(data, compresslevel=9, mtime=0), st)
+    br_size = None
+    if brotli is not None:
+        br_size = _store_variant(path, '.br', data, brotli.compress(data, quality=11), st)
+    return path, digest, len(data), gz_size, br_size
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(root, manifest):
+    _write_atomic(os.path.join(root, MANIFEST_NAME),
+                  json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True).encode('utf-8'))
+
+
+def _siblings_present(path, entry):
+    if entry.get('gz') and not os.path.exists(path + '.gz'):
+        return False
+    # 上次运行时未安装 brotli：需要补生成 .br
+    if brotli is not None and not entry.get('br_checked'):
+        return False
+    return not entry.get('br') or os.path.exists(path + '.br')
+
+
+def _sync_sibling_mtimes(path, entry):
+    """内容未变但源文件被重新写入（如重新构建）时，把已有变体的 mtime 对齐到源文件。
+
+    preview.py 会忽略 mtime 早于源文件的变体（视为旧构建残留），不对齐则重建后预压缩文件不再生效。
+    """
+    st = os.stat(path)
+    for ext in ('.gz', '.br'):
+        if not entry.get(ext[1:]):
+            continue
+        try:
+            os.utime(path + ext, ns=(st.st_atime_ns, st.st_mtime_ns))
+        except OSError:
+            pass
+
+
+def precompress(root=DEFAULT_ROOT, workers=None, force=False):
+    """压缩 root 下所有可压缩文件，返回统计字典。"""
+    if not os.path.isdir(root):
+        raise RuntimeError(f"构建目录不存在：{root}")
+    started = time.monotonic()
+    manifest = {} if force else load_manifest(root)
+    next_manifest = {}
+    todo = []
+    skipped = []
+    for path in iter_candidates(root):
+        rel = os.path.relpath(path, root).replace(os.sep, '/')
+        digest = file_sha256(path)
+        prev = manifest.get(rel)
+        if prev and prev.get('sha256') == digest and _siblings_present(path, prev):
+            _sync_sibling_mtimes(path, prev)
+            next_manifest[rel] = prev
+            skipped.append(prev)
+        else:
+            todo.append((path, digest))
+
+    results = []
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            futures = [pool.submit(compress_one, p, d) for p, d in todo]
+            for fut in futures:
+                results.append(fut.result())
+
+    for path, digest, raw, gz, br in results:
+        rel = os.path.relpath(path, root).replace(os.sep, '/')
+        next_manifest[rel] = {'sha256': digest, 'size': raw, 'gz': gz, 'br': br, 'br_checked': brotli is not None}
+    save_manifest(root, next_manifest)
+
+    entries = list(next_manifest.values())
+    return {
+        'files': len(entries),
+        'compressed': len(results),
+        'skipped': len(skipped),
+        'raw': sum(e['size'] for e in entries),
+        'gz': sum((e['gz'] or e['size']) for e in entries),
+        'br': sum((e.get('br') or e['size']) for e in entries) if brotli is not None else None,
+        'seconds': time.monotonic() - started,
+        'details': sorted(((rel, e) for rel, e in next_manifest.items()),
+                          key=lambda kv: kv[1]['size'], reverse=True),
+    }
+
+
+def _fmt_size(n):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if n < 1024 or unit == 'GB':
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def _ratio(part, whole):
+    return f"{(part / whole * 100):.1f}%" if whole else '-'
+
+
+def print_report(stats, top=10):
+    print(f"[precompress] 文件 {stats['files']} 个：新压缩 {stats['compressed']}，未变化跳过 {stats['skipped']}，耗时 {stats['seconds']:.2f}s")
+    for rel, e in stats['details'][:top]:
+        gz = f"gz {_fmt_size(e['gz'])} ({_ratio(e['gz'], e['size'])})" if e.get('gz') else 'gz -'
+        br = f"br {_fmt_size(e['br'])} ({_ratio(e['br'], e['size'])})" if e.get('br') else 'br -'
+        print(f"  {rel:<48} {_fmt_size(e['size']):>9}  {gz}  {br}")
+    line = f"[precompress] 合计：原始 {_fmt_size(stats['raw'])}，gzip {_fmt_size(stats['gz'])}（{_ratio(stats['gz'], stats['raw'])}）"
+    if stats['br'] is not None:
+        line += f"，brotli {_fmt_size(stats['br'])}（{_ratio(stats['br'], stats['raw'])}）"
+    else:
+        line += "，brotli 未启用（pip install brotli 以生成 .br）"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='为前端构建产物生成 .gz/.br 预压缩文件（增量、并行）。')
+    parser.add_argument('--root', default=DEFAULT_ROOT, help='构建目录（默认 build_tmp）')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数（默认 CPU 核数）')
+    parser.add_argument('--force', action='store_true', help='忽略清单，全部重新压缩')
+    parser.add_argument('--top', type=int, default=10, help='报告中列出的最大文件数（默认 10）')
+    args = parser.parse_args()
+    stats = precompress(os.path.abspath(args.root), workers=args.workers, force=args.force)
+    print_report(stats, top=args.top)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"预压缩失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -6,32 +6,46 @@ What it does:
 - Builds the frontend with an API base pointing to http://<PUBLIC_IP>:6666/api.
 - Starts the Node backend (Express) on PORT=6666.
 - Serves the built SPA from ./dist on port 8080 with proper history fallback.
+  The server is threaded, sends bodies with sendfile, caches resolved paths and
+  index.html in memory, and honours ETag/Last-Modified (304) and Range requests.
+  Precompressed .br/.gz siblings (precompress.py) are served per Accept-Encoding.
 
 Usage:
   PUBLIC_IP=8.163.7.207 python3 preview.py
   # Or edit DEFAULT_PUBLIC_IP below if you prefer not to set env.
+  # Serve an existing build only (e.g. DIST_DIR=build_tmp), no npm/backend:
+  DIST_DIR=build_tmp python3 preview.py --serve-only
 
 Notes:
 - Open your cloud security group ports: 8080 (frontend) and 6666 (backend).
 - Visit: http://<PUBLIC_IP>:8080/
 """
 
+import argparse
+import mimetypes
 import os
+import posixpath
+import stat
 import sys
 import time
 import shutil
 import signal
 import subprocess
-from http.server import SimpleHTTPRequestHandler
-from socketserver import TCPServer
+import threading
+import urllib.request
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import unquote
 
 
 DEFAULT_PUBLIC_IP = "8.163.7.207"
+# Preference order for precompressed siblings (see precompress.py).
+PRECOMPRESSED_ENCODINGS = {"br": ".br", "gzip": ".gz"}
 FRONT_PORT = int(os.environ.get("FRONT_PORT", "8080"))
 BACK_PORT = int(os.environ.get("PORT", "6666"))
 PROJECT_ROOT = Path(__file__).parent.resolve()
-DIST_DIR = PROJECT_ROOT / "dist"
+DIST_DIR = Path(os.environ.get("DIST_DIR", PROJECT_ROOT / "dist")).resolve()
 
 
 def log(msg: str):
@@ -78,57 +92,351 @@ def start_backend() -> subprocess.Popen:
     backend_cmd = [node, str(PROJECT_ROOT / "server" / "index.cjs")]
     log(f"Starting backend on PORT={BACK_PORT}...")
     proc = subprocess.Popen(backend_cmd, cwd=str(PROJECT_ROOT), env=env)
-    time.sleep(1.0)  # small delay for server to bind
+    wait_for_backend(proc)
     return proc
 
 
+def wait_for_backend(proc: subprocess.Popen, deadline: float = 30.0):
+    # Poll /api/ping with exponential backoff instead of sleeping a fixed time.
+    url = f"http://127.0.0.1:{BACK_PORT}/api/ping"
+    started = time.monotonic()
+    delay = 0.05
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1.0) as resp:
+                if resp.status == 200:
+                    log(f"Backend ready in {time.monotonic() - started:.2f}s")
+                    return
+        except Exception:
+            pass
+        if proc.poll() is not None:
+            raise RuntimeError(f"Backend exited early with code {proc.returncode}")
+        elapsed = time.monotonic() - started
+        if elapsed >= deadline:
+            raise RuntimeError(f"Backend not ready on port {BACK_PORT} after {deadline:.0f}s")
+        time.sleep(min(delay, deadline - elapsed))
+        delay = min(delay * 2, 1.0)
+
+
+class StaticEntry:
+    """A resolved file under DIST_DIR plus the validators sent with it."""
+
+    __slots__ = ("path", "size", "mtime", "etag", "last_modified", "ctype", "cache_control",
+                 "encoding", "variants")
+
+    def __init__(self, path: str, st: os.stat_result, ctype: str, cache_control: str,
+                 encoding: str | None = None):
+        self.path = path
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        suffix = f"-{encoding}" if encoding else ""
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{suffix}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.ctype = ctype
+        self.cache_control = cache_control
+        self.encoding = encoding
+        # Precompressed siblings written by precompress.py, keyed by content-coding.
+        self.variants: dict[str, "StaticEntry"] = {}
+
+    def negotiate(self, accept_encoding: str | None) -> "StaticEntry":
+        if not self.variants or not accept_encoding:
+            return self
+        accepted = set()
+        for part in accept_encoding.split(","):
+            coding, _, params = part.strip().partition(";")
+            q = params.strip()
+            if q.startswith("q="):
+                try:
+                    if float(q[2:]) <= 0:
+                        continue
+                except ValueError:
+                    continue
+            accepted.add(coding.strip().lower())
+        for coding in PRECOMPRESSED_ENCODINGS:
+            if coding in self.variants and (coding in accepted or "*" in accepted):
+                return self.variants[coding]
+        return self
+
+
+class StaticCache:
+    """Resolved path table for DIST_DIR with the SPA index.html kept in memory.
+
+    The table is dropped whenever index.html changes on disk (a rebuild), which
+    is checked at most once every REVALIDATE_SECONDS.
+    """
+
+    REVALIDATE_SECONDS = 1.0
+    MAX_ENTRIES = 4096
+
+    def __init__(self, root: Path):
+        self.root = str(root)
+        self.index_path = os.path.join(self.root, "index.html")
+        self._lock = threading.Lock()
+        self._entries: dict[str, StaticEntry | None] = {}
+        self._index: StaticEntry | None = None
+        self._index_body = b""
+        self._index_mtime_ns = None
+        self._loaded = False
+        self._checked_at = 0.0
+
+    def _revalidate(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.REVALIDATE_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            st = os.stat(self.index_path)
+        except OSError:
+            st = None
+        mtime_ns = st.st_mtime_ns if st else None
+        if self._loaded and mtime_ns == self._index_mtime_ns:
+            return
+        self._entries = {}
+        self._index_mtime_ns = mtime_ns
+        self._loaded = True
+        if st is None:
+            self._index, self._index_body = None, b""
+            return
+        with open(self.index_path, "rb") as f:
+            self._index_body = f.read()
+        self._index = StaticEntry(self.index_path, st, "text/html; charset=utf-8", "no-cache")
+
+    @staticmethod
+    def cache_control_for(rel: str) -> str:
+        # Vite emits content-hashed file names under assets/, safe to cache forever.
+        if rel.startswith("assets/"):
+            return "public, max-age=31536000, immutable"
+        if rel.endswith(".html"):
+            return "no-cache"
+        return "public, max-age=3600"
+
+    def _resolve(self, url_path: str) -> StaticEntry | None:
+        rel = posixpath.normpath(unquote(url_path)).lstrip("/")
+        if rel in ("", "."):
+            rel = "index.html"
+        if rel.startswith("..") or "\0" in rel:
+            return None
+        path = os.path.join(self.root, *rel.split("/"))
+        try:
+            st = os.stat(path)
+            if stat.S_ISDIR(st.st_mode):
+                rel = posixpath.join(rel, "index.html")
+                path = os.path.join(path, "index.html")
+                st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if ctype.startswith("text/") or ctype in ("application/javascript", "application/json"):
+            ctype += "; charset=utf-8"
+        cache_control = self.cache_control_for(rel)
+        entry = StaticEntry(path, st, ctype, cache_control)
+        for coding, ext in PRECOMPRESSED_ENCODINGS.items():
+            try:
+                vst = os.stat(path + ext)
+            except OSError:
+                continue
+            # Ignore stale siblings left behind by an older build of the same path.
+            if stat.S_ISREG(vst.st_mode) and vst.st_mtime_ns >= st.st_mtime_ns:
+                entry.variants[coding] = StaticEntry(path + ext, vst, ctype, cache_control, coding)
+        return entry
+
+    def lookup(self, url_path: str) -> StaticEntry | None:
+        """Return the file entry for url_path, or None for the SPA fallback."""
+        with self._lock:
+            self._revalidate()
+            if url_path in self._entries:
+                return self._entries[url_path]
+        entry = self._resolve(url_path)
+        if entry is not None and entry.path == self.index_path:
+            entry = None
+        with self._lock:
+            if len(self._entries) >= self.MAX_ENTRIES:
+                self._entries.clear()
+            self._entries[url_path] = entry
+        return entry
+
+    def index(self) -> tuple[StaticEntry | None, bytes]:
+        with self._lock:
+            self._revalidate()
+            return self._index, self._index_body
+
+
 class SpaFallbackHandler(SimpleHTTPRequestHandler):
-    # Serve built SPA from DIST_DIR with history API fallback to index.html
+    """Serve the built SPA from DIST_DIR with history API fallback to index.html.
+
+    Resolved paths come from a shared StaticCache, bodies are sent with
+    socket.sendfile (os.sendfile where available), and the handler answers
+    conditional (If-None-Match / If-Modified-Since) and single Range requests.
+    """
+
+    protocol_version = "HTTP/1.1"
+    cache: StaticCache | None = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=str(DIST_DIR), **kwargs)
 
-    def send_head(self):
-        # Try to serve the requested file; otherwise, fallback to index.html
-        path = self.translate_path(self.path)
-        if os.path.isdir(path):
-            index = os.path.join(path, "index.html")
-            if os.path.exists(index):
-                path = index
-        if not os.path.exists(path):
-            # Fallback to root index.html
-            path = os.path.join(str(DIST_DIR), "index.html")
-        ctype = self.guess_type(path)
+    def log_message(self, format, *args):
+        if os.environ.get("PREVIEW_ACCESS_LOG"):
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._serve(head_only=False)
+
+    def do_HEAD(self):
+        self._serve(head_only=True)
+
+    def _not_modified(self, entry: StaticEntry) -> bool:
+        inm = self.headers.get("If-None-Match")
+        if inm is not None:
+            tags = [t.strip() for t in inm.split(",")]
+            return "*" in tags or entry.etag in tags or f"W/{entry.etag}" in tags
+        ims = self.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                since = parsedate_to_datetime(ims)
+            except (TypeError, ValueError, IndexError):
+                return False
+            if since is None:
+                return False
+            return entry.mtime <= int(since.timestamp())
+        return False
+
+    def _parse_range(self, entry: StaticEntry):
+        """Return (start, end) for a satisfiable single range, None to send the
+        full body, or False when the range cannot be satisfied."""
+        header = self.headers.get("Range")
+        if not header or not header.startswith("bytes=") or "," in header:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range and if_range.strip() not in (entry.etag, entry.last_modified):
+            return None
+        spec = header[len("bytes="):].strip()
+        first, sep, last = spec.partition("-")
+        if not sep:
+            return None
         try:
-            f = open(path, "rb")
+            if first == "":
+                length = int(last)
+                if length <= 0:
+                    return False
+                start, end = max(entry.size - length, 0), entry.size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else entry.size - 1
+        except ValueError:
+            return None
+        if start >= entry.size or start > end:
+            return False
+        return start, min(end, entry.size - 1)
+
+    def _send_common(self, entry: StaticEntry, vary: bool = False):
+        self.send_header("ETag", entry.etag)
+        self.send_header("Last-Modified", entry.last_modified)
+        self.send_header("Cache-Control", entry.cache_control)
+        if entry.encoding:
+            self.send_header("Content-Encoding", entry.encoding)
+        if vary:
+            self.send_header("Vary", "Accept-Encoding")
+
+    def _serve(self, head_only: bool):
+        url_path = self.path.split("?", 1)[0].split("#", 1)[0]
+        base = self.cache.lookup(url_path)
+        if base is None:
+            self._serve_index(head_only)
+            return
+        vary = bool(base.variants)
+        entry = base.negotiate(self.headers.get("Accept-Encoding"))
+        if self._not_modified(entry):
+            self.send_response(304)
+            self._send_common(entry, vary)
+            self.end_headers()
+            return
+        rng = self._parse_range(entry)
+        if rng is False:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{entry.size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            f = open(entry.path, "rb")
         except OSError:
             self.send_error(404, "File not found")
-            return None
+            return
+        with f:
+            if rng:
+                start, end = rng
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{entry.size}")
+            else:
+                start, end = 0, entry.size - 1
+                self.send_response(200)
+            count = end - start + 1
+            self.send_header("Content-Type", entry.ctype)
+            self.send_header("Content-Length", str(count))
+            self.send_header("Accept-Ranges", "bytes")
+            self._send_common(entry, vary)
+            self.end_headers()
+            if head_only or count <= 0:
+                return
+            self.wfile.flush()
+            self.connection.sendfile(f, start, count)
+
+    def _serve_index(self, head_only: bool):
+        entry, body = self.cache.index()
+        if entry is None:
+            self.send_error(404, "File not found")
+            return
+        if self._not_modified(entry):
+            self.send_response(304)
+            self._send_common(entry)
+            self.end_headers()
+            return
         self.send_response(200)
-        self.send_header("Content-type", ctype)
-        fs = os.fstat(f.fileno())
-        self.send_header("Content-Length", str(fs[6]))
+        self.send_header("Content-Type", entry.ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self._send_common(entry)
         self.end_headers()
-        return f
+        if not head_only:
+            self.wfile.write(body)
+
+
+class PreviewServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
 
 
 def start_front_server():
     # Bind to 0.0.0.0 so it’s reachable via public IP
     addr = ("0.0.0.0", FRONT_PORT)
     log(f"Starting frontend preview server on {addr[0]}:{addr[1]} serving {DIST_DIR}")
-    httpd = TCPServer(addr, SpaFallbackHandler)
+    SpaFallbackHandler.cache = StaticCache(DIST_DIR)
+    httpd = PreviewServer(addr, SpaFallbackHandler)
     return httpd
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build and preview the bills SPA on a public IP.")
+    parser.add_argument("--serve-only", action="store_true",
+                        help="skip npm build and backend start; only serve the existing DIST_DIR")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     public_ip = os.environ.get("PUBLIC_IP", DEFAULT_PUBLIC_IP)
     log(f"Using PUBLIC_IP={public_ip}")
 
     try:
-        # 1) Build frontend bundle
-        build_frontend(public_ip)
+        backend = None
+        if not args.serve_only:
+            # 1) Build frontend bundle
+            build_frontend(public_ip)
 
-        # 2) Start backend
-        backend = start_backend()
+            # 2) Start backend
+            backend = start_backend()
 
         # 3) Start frontend preview server
         httpd = start_front_server()
@@ -0,0 +1,259 @@
+// 流式导出：CSV 与只写 XLSX
+// XLSX 由内置的最小 ZIP 写入器逐行生成（deflate + 数据描述符），不在内存中构建整个工作簿，
+// 导出 1k 与 1M 张票据的内存占用相同，响应头发出后即开始传输
+const zlib = require('zlib')
+
+// 与前端 Stats.jsx 的 BILL_COLUMNS 一致
+const BILL_COLUMNS = [
+  { key: 'id', label: '票据ID' },
+  { key: 'title', label: '标题' },
+  { key: 'amount', label: '金额' },
+  { key: 'category', label: '类别' },
+  { key: 'status', label: '状态' },
+  { key: 'date', label: '票据日期' },
+  { key: 'createdBy', label: '报销人' },
+]
+
+const CRC_TABLE = (() => {
+  const t = new Int32Array(256)
+  for (let n = 0; n < 256; n++) {
+    let c = n
+    for (let k = 0; k < 8; k++) c = (c & 1) ? (0xEDB88320 ^ (c >>> 1)) : (c >>> 1)
+    t[n] = c
+  }
+  return t
+})()
+
+function crc32(buf, crc = 0) {
+  let c = crc ^ -1
+  for (let i = 0; i < buf.length; i++) c = CRC_TABLE[(c ^ buf[i]) & 0xff] ^ (c >>> 8)
+  return (c ^ -1) >>> 0
+}
+
+class ExportAborted extends Error {}
+
+// 等待可写流 drain；客户端断开时抛出 ExportAborted，终止后续查询
+function waitDrain(stream) {
+  return new Promise((resolve, reject) => {
+    const done = () => { cleanup(); stream.destroyed ? reject(new ExportAborted()) : resolve() }
+    const cleanup = () => { stream.off('drain', done); stream.off('close', done) }
+    stream.on('drain', done)
+    stream.on('close', done)
+  })
+}
+
+async function writeOut(stream, data) {
+  if (stream.destroyed) throw new ExportAborted()
+  if (!stream.write(data)) await waitDrain(stream)
+}
+
+function dosDateTime(d) {
+  const time = (d.getHours() << 11) | (d.getMinutes() << 5) | (d.getSeconds() >> 1)
+  const date = ((d.getFullYear() - 1980) << 9) | ((d.getMonth() + 1) << 5) | d.getDate()
+  return { time, date }
+}
+
+// 最小 ZIP 写入器：每个条目先写本地文件头（大小未知，置位 bit 3），压缩数据流出后追加数据描述符
+class ZipWriter {
+  constructor(out) {
+    this.out = out
+    this.offset = 0
+    this.entries = []
+    this.stamp = dosDateTime(new Date())
+  }
+
+  async _write(buf) {
+    this.offset += buf.length
+    await writeOut(this.out, buf)
+  }
+
+  // produce(write)：以 await write(string) 逐段写入条目内容
+  async addEntry(name, produce) {
+    const nameBuf = Buffer.from(name, 'utf8')
+    const entry = { nameBuf, offset: this.offset, crc: 0, size: 0, csize: 0 }
+    const header = Buffer.alloc(30)
+    header.writeUInt32LE(0x04034b50, 0)
+    header.writeUInt16LE(20, 4)
+    header.writeUInt16LE(0x0808, 6) // bit 3：大小在数据描述符中；bit 11：文件名 UTF-8
+    header.writeUInt16LE(8, 8)
+    header.writeUInt16LE(this.stamp.time, 10)
+    header.writeUInt16LE(this.stamp.date, 12)
+    header.writeUInt16LE(nameBuf.length, 26)
+    await this._write(Buffer.concat([header, nameBuf]))
+
+    const deflate = zlib.createDeflateRaw({ level: 6 })
+    const resume = () => deflate.resume()
+    let onClose
+    const drained = new Promise((resolve, reject) => {
+      deflate.on('data', chunk => {
+        entry.csize += chunk.length
+        this.offset += chunk.length
+        if (!this.out.write(chunk)) deflate.pause()
+      })
+      onClose = () => { deflate.destroy(); reject(new ExportAborted()) }
+      this.out.on('drain', resume)
+      this.out.on('close', onClose)
+      deflate.on('end', resolve)
+      deflate.on('error', reject)
+    })
+    const write = async (text) => {
+      if (this.out.destroyed) throw new ExportAborted()
+      const buf = Buffer.from(text, 'utf8')
+      entry.crc = crc32(buf, entry.crc)
+      entry.size += buf.length
+      if (!deflate.write(buf)) await waitDrain(deflate)
+    }
+    drained.catch(() => {})
+    try {
+      try {
+        await produce(write)
+      } catch (e) {
+        deflate.destroy()
+        throw e
+      }
+      deflate.end()
+      await drained
+    } finally {
+      this.out.off('drain', resume)
+      this.out.off('close', onClose)
+    }
+
+    const desc = Buffer.alloc(16)
+    desc.writeUInt32LE(0x08074b50, 0)
+    desc.writeUInt32LE(entry.crc, 4)
+    desc.writeUInt32LE(entry.csize, 8)
+    desc.writeUInt32LE(entry.size, 12)
+    await this._write(desc)
+    this.entries.push(entry)
+  }
+
+  async finish() {
+    const start = this.offset
+    for (const e of this.entries) {
+      const h = Buffer.alloc(46)
+      h.writeUInt32LE(0x02014b50, 0)
+      h.writeUInt16LE(20, 4)
+      h.writeUInt16LE(20, 6)
+      h.writeUInt16LE(0x0808, 8)
+      h.writeUInt16LE(8, 10)
+      h.writeUInt16LE(this.stamp.time, 12)
+      h.writeUInt16LE(this.stamp.date, 14)
+      h.writeUInt32LE(e.crc, 16)
+      h.writeUInt32LE(e.csize, 20)
+      h.writeUInt32LE(e.size, 24)
+      h.writeUInt16LE(e.nameBuf.length, 28)
+      h.writeUInt32LE(e.offset, 42)
+      await this._write(Buffer.concat([h, e.nameBuf]))
+    }
+    const end = Buffer.alloc(22)
+    end.writeUInt32LE(0x06054b50, 0)
+    end.writeUInt16LE(this.entries.length, 8)
+    end.writeUInt16LE(this.entries.length, 10)
+    end.writeUInt32LE(this.offset - start, 12)
+    end.writeUInt32LE(start, 16)
+    await this._write(end)
+  }
+}
+
+const XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+const NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+const NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+const NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+function xmlEscape(v) {
+  // 去掉 XML 1.0 不允许的控制字符
+  return String(v).replace(/[\u0000-\u0008\u000b\u000c\u000e-\u001f]/g, '')
+    .replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;')
+}
+
+function colName(i) {
+  let s = ''
+  for (let n = i + 1; n > 0; n = Math.floor((n - 1) / 26)) s = String.fromCharCode(65 + ((n - 1) % 26)) + s
+  return s
+}
+
+// 单元格样式：0 默认，1 表头加粗，2 金额两位小数
+const STYLES_XML = XML_HEAD + `<styleSheet xmlns="${NS_MAIN}">` +
+  '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>' +
+  '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>' +
+  '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>' +
+  '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>' +
+  '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>' +
+  '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>' +
+  '<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>' +
+  '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>' +
+  '</styleSheet>'
+
+// sheets：[{ name, columns: [{ label, type }], rows: async function* () { yield [[...], ...] } }]
+// type：'amount' 金额（两位小数）、'number' 普通数值，缺省为文本
+async function writeXlsx(out, sheets) {
+  const zip = new ZipWriter(out)
+  await zip.addEntry('[Content_Types].xml', write => write(XML_HEAD +
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">' +
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>' +
+    '<Default Extension="xml" ContentType="application/xml"/>' +
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>' +
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>' +
+    sheets.map((_, i) => `<Override PartName="/xl/worksheets/sheet${i + 1}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>`).join('') +
+    '</Types>'))
+  await zip.addEntry('_rels/.rels', write => write(XML_HEAD +
+    `<Relationships xmlns="${NS_PKG_REL}"><Relationship Id="rId1" Type="${NS_REL}/officeDocument" Target="xl/workbook.xml"/></Relationships>`))
+  await zip.addEntry('xl/workbook.xml', write => write(XML_HEAD +
+    `<workbook xmlns="${NS_MAIN}" xmlns:r="${NS_REL}"><sheets>` +
+    sheets.map((s, i) => `<sheet name="${xmlEscape(s.name)}" sheetId="${i + 1}" r:id="rId${i + 1}"/>`).join('') +
+    '</sheets></workbook>'))
+  await zip.addEntry('xl/_rels/workbook.xml.rels', write => write(XML_HEAD +
+    `<Relationships xmlns="${NS_PKG_REL}">` +
+    sheets.map((_, i) => `<Relationship Id="rId${i + 1}" Type="${NS_REL}/worksheet" Target="worksheets/sheet${i + 1}.xml"/>`).join('') +
+    `<Relationship Id="rId${sheets.length + 1}" Type="${NS_REL}/styles" Target="styles.xml"/></Relationships>`))
+  await zip.addEntry('xl/styles.xml', write => write(STYLES_XML))
+
+  for (let i = 0; i < sheets.length; i++) {
+    const { columns, rows } = sheets[i]
+    const refs = columns.map((_, c) => colName(c))
+    await zip.addEntry(`xl/worksheets/sheet${i + 1}.xml`, async write => {
+      await write(XML_HEAD + `<worksheet xmlns="${NS_MAIN}"><sheetData>` +
+        '<row r="1">' + columns.map((c, j) => `<c r="${refs[j]}1" t="inlineStr" s="1"><is><t>${xmlEscape(c.label)}</t></is></c>`).join('') + '</row>')
+      let r = 1
+      for await (const page of rows()) {
+        let xml = ''
+        for (const row of page) {
+          r += 1
+          xml += `<row r="${r}">`
+          for (let j = 0; j < columns.length; j++) {
+            const v = row[j]
+            if (v === null || v === undefined || v === '') continue
+            const type = columns[j].type
+            if (type) xml += `<c r="${refs[j]}${r}"${type === 'amount' ? ' s="2"' : ''}><v>${Number(v) || 0}</v></c>`
+            else xml += `<c r="${refs[j]}${r}" t="inlineStr"><is><t xml:space="preserve">${xmlEscape(v)}</t></is></c>`
+          }
+          xml += '</row>'
+        }
+        await write(xml)
+      }
+      await write('</sheetData></worksheet>')
+    })
+  }
+  await zip.finish()
+}
+
+function csvCell(v) {
+  if (v === null || v === undefined) return ''
+  if (typeof v === 'number') return String(v)
+  let s = String(v)
+  // 防止表格软件把 =、+、@ 开头的文本当作公式执行
+  if (/^[=+@]/.test(s)) s = "'" + s
+  return /[",\r\n]/.test(s) ? '"' + s.replace(/"/g, '""') + '"' : s
+}
+
+async function writeCsv(out, { columns, rows }) {
+  // BOM：Excel 打开 UTF-8 CSV 时正确识别中文
+  await writeOut(out, '\ufeff' + columns.map(c => csvCell(c.label)).join(',') + '\r\n')
+  for await (const page of rows()) {
+    let text = ''
+    for (const row of page) text += row.map(csvCell).join(',') + '\r\n'
+    await writeOut(out, text)
+  }
+}
+
+module.exports = { BILL_COLUMNS, ExportAborted, writeXlsx, writeCsv, crc32 }
@@ -7,6 +7,8 @@ const multer = require('multer')
 const os = require('os')
 const jwt = require('jsonwebtoken')
 const crypto = require('crypto')
+const { AsyncLocalStorage } = require('async_hooks')
+const { BILL_COLUMNS, ExportAborted, writeXlsx, writeCsv } = require('./export.cjs')
 
 const app = express()
 // 开发便捷：默认启用 ALLOW_DEV_RESET，允许批量重置非管理员密码（仅本地环境使用）
@@ -28,16 +30,47 @@ app.use(express.urlencoded({ extended: false }))
 // 在反向代理（Nginx/Traefik）后部署时，信任代理以便正确解析协议与主机头
 app.set('trust proxy', true)
 
-const DB_PATH = path.join(__dirname, 'data', 'app.db')
+// 数据目录可通过 DATA_DIR 覆盖（基准测试/演练时指向临时副本）
+const DATA_DIR = process.env.DATA_DIR ? path.resolve(process.env.DATA_DIR) : path.join(__dirname, 'data')
+const DB_PATH = path.join(DATA_DIR, 'app.db')
 fs.mkdirSync(path.dirname(DB_PATH), { recursive: true })
 const db = new sqlite3.Database(DB_PATH)
+// 多实例（deploy.py --workers N）共享同一 SQLite 文件：遇锁时等待而非立即 SQLITE_BUSY，
+// 并使用 WAL 让读写互不阻塞
+db.configure('busyTimeout', Number(process.env.SQLITE_BUSY_TIMEOUT) || 5000)
+db.run('PRAGMA journal_mode = WAL')
+db.run('PRAGMA synchronous = NORMAL')
+// 连接级参数（每次打开连接都要设置）：页缓存（负数为 KiB）、内存映射读取、临时表/排序放内存；
+// 持久化到文件的维护项（ANALYZE、VACUUM、WAL 截断）由 db_maint.py 定期执行
+db.run(`PRAGMA cache_size = ${-(Number(process.env.SQLITE_CACHE_KB) || 32768)}`)
+db.run(`PRAGMA mmap_size = ${Number(process.env.SQLITE_MMAP_BYTES) || 268435456}`)
+db.run('PRAGMA temp_store = MEMORY')
 
 // Uploads directory and static serving
-const UPLOAD_DIR = path.join(__dirname, 'data', 'uploads')
+const UPLOAD_DIR = path.join(DATA_DIR, 'uploads')
 fs.mkdirSync(UPLOAD_DIR, { recursive: true })
+// ?v=thumb|display：优先返回 optimize_images.py 预生成的缩略图（支持 WebP 时用 WebP），未生成则回退原图
+const IMAGE_VARIANTS = new Set(['thumb', 'display'])
+app.use('/uploads', (req, res, next) => {
+  const v = req.query.v
+  if (!IMAGE_VARIANTS.has(v)) return next()
+  res.vary('Accept')
+  let rel
+  try { rel = decodeURIComponent(req.path) } catch { return next() }
+  const exts = req.accepts('image/webp') ? ['.webp', '.jpg'] : ['.jpg']
+  for (const ext of exts) {
+    const file = path.join(UPLOAD_DIR, rel + '.' + v + ext)
+    if (!file.startsWith(UPLOAD_DIR + path.sep)) return next()
+    if (fs.existsSync(file)) {
+      req.url = req.path + '.' + v + ext
+      break
+    }
+  }
+  next()
+})
 app.use('/uploads', express.static(UPLOAD_DIR))
 
-function run(sql, params = []) {
+function runNow(sql, params = []) {
   return new Promise((resolve, reject) => {
     db.run(sql, params, function (err) {
       if (err) return reject(err)
@@ -55,6 +88,35 @@ function all(sql, params = []) {
   })
 }
 
+// 串行化本进程内的写操作：所有请求共用一个连接，事务打开期间其他请求的单条写入会并入该事务，
+// 随其回滚而丢失。因此事务与事务外的单条写入（run）都在 txChain 上排队，事务内的语句直接执行
+let txChain = Promise.resolve()
+const txContext = new AsyncLocalStorage()
+function enqueueWrite(fn) {
+  const p = txChain.then(fn)
+  txChain = p.catch(() => {})
+  return p
+}
+
+function run(sql, params = []) {
+  if (txContext.getStore()) return runNow(sql, params)
+  return enqueueWrite(() => runNow(sql, params))
+}
+
+function withTransaction(fn) {
+  return enqueueWrite(() => txContext.run(true, async () => {
+    await runNow('BEGIN IMMEDIATE')
+    try {
+      const out = await fn()
+      await runNow('COMMIT')
+      return out
+    } catch (e) {
+      await runNow('ROLLBACK').catch(() => {})
+      throw e
+    }
+  }))
+}
+
 function parseJsonArraySafe(v) {
   let x = v
   for (let i = 0; i < 2; i++) {
@@ -72,13 +134,215 @@ function normalizeBillRow(r) {
   const out = { ...r }
   out.amount = Number(out.amount) || 0
   out.currentStepIndex = Number(out.currentStepIndex) || 0
-  out.steps = parseJsonArraySafe(out.steps)
-  out.history = parseJsonArraySafe(out.history)
-  out.images = parseJsonArraySafe(out.images)
-  out.relatedId = out.relatedId || null
+  // 列表接口可按 fields 投影，未查询的列不补默认值
+  if ('steps' in out) out.steps = parseJsonArraySafe(out.steps)
+  if ('history' in out) out.history = parseJsonArraySafe(out.history)
+  if ('images' in out) out.images = parseJsonArraySafe(out.images)
+  if ('relatedId' in out) out.relatedId = out.relatedId || null
   return out
 }
 
+// 当前待审角色：仅 pending 票据取 steps[currentStepIndex]，其余状态为 NULL。
+// 冗余存入 bills.currentRole，待办队列按 (status, currentRole, date) 索引范围扫描，无需逐行解析 steps
+function currentRoleOf(status, steps, currentStepIndex) {
+  if (status !== 'pending') return null
+  const role = parseJsonArraySafe(steps)[Number(currentStepIndex) || 0]
+  return typeof role === 'string' ? role : null
+}
+
+// 读取票据时由 bill_events 按插入顺序拼出 history 数组（JSON 文本，normalizeBillRow 解析）
+const HISTORY_SQL = `(SELECT json_group_array(json(data)) FROM (SELECT data FROM bill_events WHERE billId = bills.id ORDER BY id)) AS history`
+
+// ===== 冷数据：较早的归档票据由 archive_cold.py 移入 DATA_DIR/cold.db，后端 ATTACH 为 cold 透明读取 =====
+// 未限定库名的 bills/bill_events/bill_edits 始终解析到热库（main），审批、待办等热路径与冷数据量无关；
+// 详情、修改记录、含归档状态的列表、计数、导出与统计重建同时读取 cold 中的同名表（结构与索引由 attachCold 按热库同步）
+const COLD_DB_PATH = path.join(DATA_DIR, 'cold.db')
+const COLD_TABLES = ['bills', 'bill_events', 'bill_edits']
+const COLD_STATUSES = ['archived', 'rejected-modified']
+
+async function attachCold() {
+  await run(`ATTACH DATABASE ? AS cold`, [COLD_DB_PATH])
+  await run(`PRAGMA cold.journal_mode = WAL`)
+  for (const t of COLD_TABLES) {
+    const ddl = (await all(`SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?`, [t]))[0].sql
+    await run(ddl.replace(/^CREATE TABLE\s+(IF NOT EXISTS\s+)?["`]?\w+["`]?/i, `CREATE TABLE IF NOT EXISTS cold.${t}`))
+    // 热库后来追加的列（ALTER TABLE ADD COLUMN）同步到冷库
+    const have = new Set((await all(`PRAGMA cold.table_info(${t})`)).map(c => c.name))
+    for (const c of await all(`PRAGMA main.table_info(${t})`)) {
+      if (!have.has(c.name)) await run(`ALTER TABLE cold.${t} ADD COLUMN ${c.name} ${c.type || ''}`)
+    }
+  }
+  const indexes = await all(`SELECT sql FROM main.sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN (${COLD_TABLES.map(() => '?').join(',')})`, COLD_TABLES)
+  for (const { sql } of indexes) {
+    await run(sql.replace(/^CREATE (UNIQUE )?INDEX\s+(IF NOT EXISTS\s+)?["`]?(\w+)["`]?/i, (m, u, _, name) => `CREATE ${u || ''}INDEX IF NOT EXISTS cold.${name}`))
+  }
+}
+
+// 字段/子查询改为读取冷库的流转事件（配合 FROM cold.bills AS bills）
+function coldSql(sql) {
+  return sql.replace(/\bbill_events\b/g, 'cold.bill_events')
+}
+
+// 热/冷两路按 (date DESC, id DESC) 各取一页后归并；同一 id 两边都有时（迁移中断的窗口）以热库为准
+function mergeBillPages(pages, limit) {
+  const seen = new Set()
+  const rows = []
+  for (const r of pages.flat()) {
+    if (seen.has(r.id)) continue
+    seen.add(r.id)
+    rows.push(r)
+  }
+  // 与 SQLite 的 ORDER BY date DESC 一致：NULL 小于任何字符串，排在最后
+  rows.sort((a, b) => {
+    const ad = a.date ?? null, bd = b.date ?? null
+    if (ad !== bd) return ad === null ? 1 : bd === null ? -1 : (ad < bd ? 1 : -1)
+    return a.id === b.id ? 0 : (a.id < b.id ? 1 : -1)
+  })
+  return rows.slice(0, limit)
+}
+
+// 冷库各状态计数：冷数据只在 archive_cold.py 执行时变化，按 PRAGMA cold.data_version 缓存
+const coldCounts = { version: null, byUser: new Map() }
+async function getColdCounts(createdBy) {
+  const version = (await all(`PRAGMA cold.data_version`))[0]?.data_version
+  if (version !== coldCounts.version) {
+    coldCounts.version = version
+    coldCounts.byUser.clear()
+  }
+  const key = createdBy ?? ''
+  if (!coldCounts.byUser.has(key)) {
+    const rows = createdBy
+      ? await all(`SELECT status, COUNT(*) AS count FROM cold.bills WHERE createdBy = ? GROUP BY status`, [createdBy])
+      : await all(`SELECT status, COUNT(*) AS count FROM cold.bills GROUP BY status`)
+    coldCounts.byUser.set(key, rows)
+  }
+  return coldCounts.byUser.get(key)
+}
+
+function appendBillEvent(billId, entry) {
+  return run(`INSERT INTO bill_events (billId, action, time, data) VALUES (?, ?, ?, ?)`, [
+    String(billId), entry.action || null, entry.time || null, JSON.stringify(entry)
+  ])
+}
+
+// 审批流转只更新变化的列（不再整行 REPLACE），并以读取时的状态/步骤为条件，
+// 并发请求（含其它实例）已推进同一票据时返回 0 行，由调用方回滚并提示刷新
+async function updateBillFields(id, fields, expect) {
+  const keys = Object.keys(fields)
+  const r = await run(`UPDATE bills SET ${keys.map(k => `${k} = ?`).join(', ')} WHERE id = ? AND status IS ? AND currentStepIndex IS ?`, [
+    ...keys.map(k => fields[k]), String(id), expect.status, expect.currentStepIndex
+  ])
+  if (r.changes === 0) {
+    const err = new Error('票据状态已变化，请刷新后重试')
+    err.status = 409
+    throw err
+  }
+}
+
+// ===== 配置缓存：approval_order / 免审阈值 / 事由分级 / 用户列表 =====
+// 这些表很小且极少修改，读取后按名称缓存在进程内。settings.configVersion 为全局版本号：
+// 每次读取先查这一行（主键查询），与缓存时的版本不同即整体失效，多实例共享同一 SQLite 文件时仍保持一致；
+// 本进程的管理接口通过 writeConfig 在同一事务内写入并递增版本（write-through）。
+// 缓存值为共享对象，调用方不得修改。
+const CONFIG_LOADERS = {
+  approvalOrder: async () => {
+    const rows = await all(`SELECT role FROM approval_order ORDER BY sort ASC`)
+    return rows.map(r => r.role)
+  },
+  approvalThresholds: async () => {
+    const rows = await all(`SELECT value FROM settings WHERE key = 'approvalThresholds' LIMIT 1`)
+    let v = {}
+    try { v = JSON.parse(rows[0]?.value || '{}') } catch { v = {} }
+    return {
+      approver1: Number(v?.approver1) || 0,
+      approver2: Number(v?.approver2) || 0,
+      approver3: Number(v?.approver3) || 0,
+    }
+  },
+  reasons: async () => {
+    const cats = await all(`SELECT id, name, sort, status FROM reason_categories ORDER BY sort ASC, id ASC`)
+    const items = await all(`SELECT id, categoryId, name, sort, status FROM reason_items ORDER BY sort ASC, id ASC`)
+    const byCat = new Map(cats.map(c => [c.id, []]))
+    for (const i of items) byCat.get(i.categoryId)?.push(i)
+    return cats.map(c => ({ ...c, items: byCat.get(c.id) }))
+  },
+  users: async () => {
+    const rows = await all(`SELECT id, name, role FROM users`)
+    const byRole = {}
+    const names = {}
+    for (const u of rows) {
+      if (!(u.role in byRole)) byRole[u.role] = u
+      if (u.name) names[u.id] = u.name
+    }
+    return { list: rows, byRole, names }
+  },
+}
+const configCache = { version: null, entries: new Map(), hits: 0, misses: 0, invalidations: 0, byName: {} }
+let configVersionCheck = null
+
+// 同一时刻的并发请求共用一次版本查询
+function readConfigVersion() {
+  if (!configVersionCheck) {
+    configVersionCheck = all(`SELECT value FROM settings WHERE key = 'configVersion' LIMIT 1`)
+      .then(rows => String(rows[0]?.value ?? '0'))
+      .finally(() => { configVersionCheck = null })
+  }
+  return configVersionCheck
+}
+
+async function getConfig(name) {
+  const version = await readConfigVersion()
+  if (version !== configCache.version) {
+    if (configCache.version !== null) configCache.invalidations++
+    configCache.entries.clear()
+    configCache.version = version
+  }
+  const stat = configCache.byName[name] || (configCache.byName[name] = { hits: 0, misses: 0 })
+  let p = configCache.entries.get(name)
+  if (p) {
+    configCache.hits++
+    stat.hits++
+    return p
+  }
+  configCache.misses++
+  stat.misses++
+  // 缓存 Promise：并发未命中只加载一次；加载失败不缓存
+  p = CONFIG_LOADERS[name]()
+  configCache.entries.set(name, p)
+  p.catch(() => { if (configCache.entries.get(name) === p) configCache.entries.delete(name) })
+  return p
+}
+
+// 配置写入：与版本递增在同一事务内提交，提交后清空本进程缓存
+async function writeConfig(fn) {
+  try {
+    return await withTransaction(async () => {
+      const out = await fn()
+      await run(`INSERT INTO settings (key, value) VALUES ('configVersion', '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1`)
+      return out
+    })
+  } finally {
+    configCache.entries.clear()
+    configCache.version = null
+    configCache.invalidations++
+  }
+}
+
+// 审批步骤：按 approval_order 顺序并应用免审阈值，最后追加 accountant
+async function buildSteps(amount) {
+  let order = await getConfig('approvalOrder')
+  if (!Array.isArray(order) || order.length === 0) order = ['approver1','approver2','approver3']
+  const thr = await getConfig('approvalThresholds')
+  const amt = Number(amount) || 0
+  const filtered = order.filter(role => {
+    if (!/^approver[123]$/.test(role)) return true
+    const limit = Number(thr[role]) || 0
+    return !(amt < limit && limit > 0)
+  })
+  return [...filtered, 'accountant']
+}
+
 async function ensureSchema() {
   await run(`CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, name TEXT, role TEXT, password TEXT)`)
   await run(`CREATE TABLE IF NOT EXISTS approval_order (role TEXT PRIMARY KEY, sort INTEGER)`)
@@ -117,6 +381,15 @@ async function ensureSchema() {
   } catch (e) {
     // ignore
   }
+  // 新增：当前待审角色（见 currentRoleOf），旧库由 backfillCurrentRole 分批回填
+  try {
+    const cols3 = await all(`PRAGMA table_info(bills)`)
+    if (!cols3.some(c => c.name === 'currentRole')) {
+      await run(`ALTER TABLE bills ADD COLUMN currentRole TEXT`)
+    }
+  } catch (e) {
+    // ignore
+  }
   // 新增：修改历史记录表
   await run(`CREATE TABLE IF NOT EXISTS bill_edits (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -126,6 +399,19 @@ async function ensureSchema() {
     time TEXT,
     diff TEXT
   )`)
+  // 修改记录查询（WHERE originalId = ? OR newId = ?）：两列各一个索引，SQLite 按 MULTI-INDEX OR 分别查找
+  await run(`CREATE INDEX IF NOT EXISTS idx_bill_edits_original ON bill_edits(originalId)`)
+  await run(`CREATE INDEX IF NOT EXISTS idx_bill_edits_new ON bill_edits(newId)`)
+
+  // 新增：票据流转事件（只追加）。每次审批/拒绝/重提插入一行，bills.history 仅保留给未迁移的旧数据
+  await run(`CREATE TABLE IF NOT EXISTS bill_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    billId TEXT NOT NULL,
+    action TEXT,
+    time TEXT,
+    data TEXT NOT NULL
+  )`)
+  await run(`CREATE INDEX IF NOT EXISTS idx_bill_events_bill ON bill_events(billId, id)`)
 
   // 新增：票据事由分级（一级分类 + 二级项目）
   await run(`CREATE TABLE IF NOT EXISTS reason_categories (
@@ -142,9 +428,136 @@ async function ensureSchema() {
     status TEXT DEFAULT 'enabled',
     FOREIGN KEY(categoryId) REFERENCES reason_categories(id)
   )`)
+
+  // 按状态 + 日期倒序分页/导出（WHERE status = ? ORDER BY date DESC, id DESC）
+  await run(`CREATE INDEX IF NOT EXISTS idx_bills_status_date ON bills(status, date, id)`)
+  // 待办队列（WHERE status = 'pending' AND currentRole = ? ORDER BY date DESC, id DESC）与“我的票据”
+  await run(`CREATE INDEX IF NOT EXISTS idx_bills_status_role_date ON bills(status, currentRole, date, id)`)
+  await run(`CREATE INDEX IF NOT EXISTS idx_bills_createdby_date ON bills(createdBy, date, id)`)
+  // 不带状态/发起人条件的全量列表同样按 (date, id) 游标翻页，深页与首页代价相同
+  await run(`CREATE INDEX IF NOT EXISTS idx_bills_date ON bills(date, id)`)
+  // 各状态计数（/api/bills/counts?createdBy=，WHERE createdBy = ? GROUP BY status）只读索引、无需临时排序
+  await run(`CREATE INDEX IF NOT EXISTS idx_bills_createdby_status ON bills(createdBy, status)`)
+
+  // 统计汇总表：票据归档时增量累加（金额以分为单位，避免浮点累计误差），python3 stats.py rebuild 可全量重建
+  await run(`CREATE TABLE IF NOT EXISTS stats_monthly (
+    month TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    amountCents INTEGER NOT NULL DEFAULT 0
+  )`)
+  await run(`CREATE TABLE IF NOT EXISTS stats_person (
+    createdBy TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    amountCents INTEGER NOT NULL DEFAULT 0
+  )`)
+  await run(`CREATE TABLE IF NOT EXISTS stats_reason (
+    category TEXT NOT NULL,
+    item TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    amountCents INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, item)
+  )`)
+}
+
+// 统计维度：月份取票据日期 YYYY-MM；事由二级项目取标题“项目 - 备注”中的项目部分
+const STATS_MONTH_SQL = `CASE WHEN date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*' THEN substr(date, 1, 7) END`
+const STATS_PERSON_SQL = `COALESCE(NULLIF(createdBy, ''), '未知')`
+const STATS_CATEGORY_SQL = `COALESCE(NULLIF(category, ''), '其他')`
+const STATS_ITEM_SQL = `COALESCE(NULLIF(CASE WHEN instr(title, ' - ') > 0 THEN substr(title, 1, instr(title, ' - ') - 1) ELSE title END, ''), '未分类')`
+const STATS_CENTS_SQL = `CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER)`
+// 全部归档票据（热库 + 冷库）
+const ARCHIVED_BILLS_SQL = `(SELECT date, amount, createdBy, category, title FROM main.bills WHERE status = 'archived'
+  UNION ALL SELECT date, amount, createdBy, category, title FROM cold.bills WHERE status = 'archived')`
+
+async function rebuildStats() {
+  await run(`DELETE FROM stats_monthly`)
+  await run(`DELETE FROM stats_person`)
+  await run(`DELETE FROM stats_reason`)
+  await run(`INSERT INTO stats_monthly (month, count, amountCents)
+    SELECT ${STATS_MONTH_SQL} AS m, COUNT(*), SUM(${STATS_CENTS_SQL}) FROM ${ARCHIVED_BILLS_SQL} WHERE m IS NOT NULL GROUP BY m`)
+  await run(`INSERT INTO stats_person (createdBy, count, amountCents)
+    SELECT ${STATS_PERSON_SQL} AS p, COUNT(*), SUM(${STATS_CENTS_SQL}) FROM ${ARCHIVED_BILLS_SQL} GROUP BY p`)
+  await run(`INSERT INTO stats_reason (category, item, count, amountCents)
+    SELECT ${STATS_CATEGORY_SQL} AS c, ${STATS_ITEM_SQL} AS i, COUNT(*), SUM(${STATS_CENTS_SQL}) FROM ${ARCHIVED_BILLS_SQL} GROUP BY c, i`)
+  await run(`REPLACE INTO settings (key, value) VALUES ('statsBuiltAt', ?)`, [new Date().toISOString()])
+}
+
+// 单张票据归档时累加到各汇总表（须与 rebuildStats 的维度口径一致）
+async function addArchivedStats(b) {
+  const cents = Math.round((Number(b.amount) || 0) * 100)
+  const date = String(b.date || '')
+  if (/^\d{4}-\d{2}/.test(date)) {
+    await run(`INSERT INTO stats_monthly (month, count, amountCents) VALUES (?, 1, ?)
+      ON CONFLICT(month) DO UPDATE SET count = count + 1, amountCents = amountCents + excluded.amountCents`, [date.slice(0, 7), cents])
+  }
+  await run(`INSERT INTO stats_person (createdBy, count, amountCents) VALUES (?, 1, ?)
+    ON CONFLICT(createdBy) DO UPDATE SET count = count + 1, amountCents = amountCents + excluded.amountCents`, [b.createdBy || '未知', cents])
+  const title = String(b.title || '')
+  const sep = title.indexOf(' - ')
+  const item = (sep >= 0 ? title.slice(0, sep) : title) || '未分类'
+  await run(`INSERT INTO stats_reason (category, item, count, amountCents) VALUES (?, ?, 1, ?)
+    ON CONFLICT(category, item) DO UPDATE SET count = count + 1, amountCents = amountCents + excluded.amountCents`, [b.category || '其他', item, cents])
+}
+
+// 回填 currentRole：每批一个短写事务，避免长时间占用写锁；可重复执行（只处理仍为 NULL 的 pending 票据）
+const BACKFILL_BATCH = 500
+async function backfillCurrentRole() {
+  const ids = (await all(`SELECT rowid AS rid FROM bills WHERE status = 'pending' AND currentRole IS NULL`)).map(r => r.rid)
+  let updated = 0
+  for (let i = 0; i < ids.length; i += BACKFILL_BATCH) {
+    const batch = ids.slice(i, i + BACKFILL_BATCH)
+    updated += await withTransaction(async () => {
+      const rows = await all(`SELECT rowid AS rid, status, steps, currentStepIndex FROM bills WHERE rowid IN (${batch.map(() => '?').join(',')})`, batch)
+      let n = 0
+      for (const r of rows) {
+        const role = currentRoleOf(r.status, r.steps, r.currentStepIndex)
+        if (!role) continue
+        await run(`UPDATE bills SET currentRole = ? WHERE rowid = ? AND status = 'pending' AND currentRole IS NULL`, [role, r.rid])
+        n++
+      }
+      return n
+    })
+  }
+  if (updated > 0) console.log(`currentRole backfilled: ${updated} pending bills`)
+}
+
+// 一次性迁移：把 bills.history 数组拆成 bill_events 行并清空该列；分批短事务，可中断后重复执行
+async function migrateHistoryToEvents() {
+  const ids = (await all(`SELECT rowid AS rid FROM bills WHERE history IS NOT NULL`)).map(r => r.rid)
+  let events = 0
+  for (let i = 0; i < ids.length; i += BACKFILL_BATCH) {
+    const batch = ids.slice(i, i + BACKFILL_BATCH)
+    const marks = batch.map(() => '?').join(',')
+    events += await withTransaction(async () => {
+      // 常规 JSON 数组直接用 json_each 展开；双重编码等异常数据逐行按 parseJsonArraySafe 解析
+      const r = await run(`INSERT INTO bill_events (billId, action, time, data)
+        SELECT b.id, json_extract(e.value, '$.action'), json_extract(e.value, '$.time'),
+          CASE WHEN e.type IN ('object', 'array') THEN e.value ELSE json_quote(e.value) END
+        FROM bills b, json_each(b.history) e
+        WHERE b.rowid IN (${marks}) AND json_valid(b.history) AND json_type(b.history) = 'array'
+        ORDER BY b.rowid, e.key`, batch)
+      let n = r.changes
+      const odd = await all(`SELECT id, history FROM bills WHERE rowid IN (${marks}) AND history IS NOT NULL
+        AND NOT (json_valid(history) AND json_type(history) = 'array')`, batch)
+      for (const b of odd) {
+        for (const h of parseJsonArraySafe(b.history)) {
+          await appendBillEvent(b.id, h && typeof h === 'object' ? h : { action: String(h) })
+          n++
+        }
+      }
+      await run(`UPDATE bills SET history = NULL WHERE rowid IN (${marks})`, batch)
+      return n
+    })
+  }
+  if (ids.length > 0) console.log(`history migrated: ${ids.length} bills, ${events} events`)
 }
 
 async function seedIfEmpty() {
+  // 多实例同时启动时，以写事务串行化“检查 + 预置”，避免重复插入
+  await withTransaction(seedDefaults)
+}
+
+async function seedDefaults() {
   const usersCount = (await all(`SELECT COUNT(*) as c FROM users`))[0].c
   if (usersCount === 0) {
     const defaults = [
@@ -189,11 +602,28 @@ async function seedIfEmpty() {
     const catId = r.lastID
     await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [catId, '未分类', 999])
   }
+
+  // 预置了配置数据时递增版本，使其它实例已缓存的空配置失效
+  if (usersCount === 0 || orderCount === 0 || rcCount === 0) {
+    await run(`INSERT INTO settings (key, value) VALUES ('configVersion', '1')
+      ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1`)
+  }
+
+  // 统计汇总表首次启用：按现有归档票据回填
+  const built = await all(`SELECT value FROM settings WHERE key = 'statsBuiltAt' LIMIT 1`)
+  if (built.length === 0) await rebuildStats()
 }
 
 // Routes
 app.get('/api/ping', (req, res) => res.json({ ok: true }))
 
+// 配置缓存命中统计（本进程）
+app.get('/api/cache/stats', (req, res) => {
+  const { version, hits, misses, invalidations, byName } = configCache
+  const total = hits + misses
+  res.json({ pid: process.pid, version, hits, misses, invalidations, hitRate: total ? hits / total : 0, cached: [...configCache.entries.keys()], byName })
+})
+
 // 返回当前请求可识别的访问基址，便于前端/运维自动适配 IP/域名与协议
 app.get('/api/base', (req, res) => {
   // 优先使用代理头部，其次使用 Express 解析的协议与 Host
@@ -329,15 +759,17 @@ app.post('/api/dev/reset-defaults', async (req, res) => {
       { id: 'user15', name: '用户15', role: 'staff', password: '123456' },
       { id: 'accountant', name: '会计', role: 'accountant', password: '123456' },
     ]
-    await run(`DELETE FROM users`)
-    for (const u of defaults) {
-      await run(`INSERT INTO users (id, name, role, password) VALUES (?, ?, ?, ?)`, [u.id, u.name, u.role, u.password])
-    }
-    const order = ['approver1', 'approver2', 'approver3']
-    await run(`DELETE FROM approval_order`)
-    for (let i = 0; i < order.length; i++) {
-      await run(`INSERT INTO approval_order (role, sort) VALUES (?, ?)`, [order[i], i])
-    }
+    await writeConfig(async () => {
+      await run(`DELETE FROM users`)
+      for (const u of defaults) {
+        await run(`INSERT INTO users (id, name, role, password) VALUES (?, ?, ?, ?)`, [u.id, u.name, u.role, u.password])
+      }
+      const order = ['approver1', 'approver2', 'approver3']
+      await run(`DELETE FROM approval_order`)
+      for (let i = 0; i < order.length; i++) {
+        await run(`INSERT INTO approval_order (role, sort) VALUES (?, ?)`, [order[i], i])
+      }
+    })
     res.json({ ok: true })
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -350,8 +782,7 @@ app.get('/api/me', auth, (req, res) => {
 // 工具：将审批角色格式化为“姓名(工号)”
 async function formatAccountLabelForRole(role) {
   try {
-    const rows = await all(`SELECT id, name FROM users WHERE role = ? LIMIT 1`, [String(role)])
-    const u = rows[0]
+    const u = (await getConfig('users')).byRole[String(role)]
     if (u && u.id && u.name) return `${u.name}(${u.id})`
     return String(role || '')
   } catch {
@@ -359,12 +790,12 @@ async function formatAccountLabelForRole(role) {
   }
 }
 
-// Pending bills for a specific role (server-side filtered)
+// Pending bills for a specific role：idx_bills_status_role_date 范围扫描，已按 date DESC, id DESC 有序
 app.get('/api/todos/:role', async (req, res) => {
   try {
     const role = String(req.params.role || '').trim()
-    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images FROM bills WHERE status = 'pending' ORDER BY date DESC, id DESC`)
-    const parsed = rows.map(r => normalizeBillRow(r)).filter(b => Array.isArray(b.steps) && b.steps[b.currentStepIndex] === role)
+    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, ${HISTORY_SQL}, images FROM bills WHERE status = 'pending' AND currentRole = ? ORDER BY date DESC, id DESC`, [role])
+    const parsed = rows.map(r => normalizeBillRow(r))
     res.json(parsed)
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -373,8 +804,7 @@ app.get('/api/todos/:role', async (req, res) => {
 
 app.get('/api/users', async (req, res) => {
   try {
-    const rows = await all(`SELECT id, name, role FROM users`)
-    res.json(rows)
+    res.json((await getConfig('users')).list)
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
@@ -406,15 +836,7 @@ app.put('/api/setting/companyName', auth, async (req, res) => {
 // 审批免审阈值：读取
 app.get('/api/setting/approvalThresholds', async (req, res) => {
   try {
-    const rows = await all(`SELECT value FROM settings WHERE key = 'approvalThresholds' LIMIT 1`)
-    let v = {}
-    try { v = JSON.parse(rows[0]?.value || '{}') } catch { v = {} }
-    const out = {
-      approver1: Number(v.approver1) || 0,
-      approver2: Number(v.approver2) || 0,
-      approver3: Number(v.approver3) || 0,
-    }
-    res.json(out)
+    res.json(await getConfig('approvalThresholds'))
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
@@ -430,7 +852,7 @@ app.put('/api/setting/approvalThresholds', auth, async (req, res) => {
       approver2: Number(body.approver2 ?? body?.thresholds?.approver2 ?? 0) || 0,
       approver3: Number(body.approver3 ?? body?.thresholds?.approver3 ?? 0) || 0,
     }
-    await run(`REPLACE INTO settings (key, value) VALUES ('approvalThresholds', ?)`, [JSON.stringify(payload)])
+    await writeConfig(() => run(`REPLACE INTO settings (key, value) VALUES ('approvalThresholds', ?)`, [JSON.stringify(payload)]))
     res.json({ ok: true })
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -461,47 +883,49 @@ app.put('/api/setting/reasonHierarchy', auth, async (req, res) => {
       text: String(n.text || ''),
       level: Number(n.level) || 0,
     }))
-    await run(`REPLACE INTO settings (key, value) VALUES ('reasonHierarchy', ?)`, [JSON.stringify(normalized)])
-    // 同步到票据事由（一级分类 + 二级项目）
-    // 策略：level=0 为一级分类；level>=1 视为二级项目，归属最近的一级分类；
-    // 若开头出现二级项目，将先创建一个默认分类“其他”。若某分类没有任何项目，则补充一个“未分类”。
-    await run(`DELETE FROM reason_items`)
-    await run(`DELETE FROM reason_categories`)
-    let catSort = 0
-    let lastCatId = null
-    let itemSort = 0
-    const categories = [] // { id, hasItem }
-    for (const n of normalized) {
-      const text = (String(n.text || '').trim() || '未命名')
-      const lvl = Number(n.level) || 0
-      if (lvl <= 0) {
-        const r = await run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, [text, catSort++])
-        lastCatId = r.lastID
-        itemSort = 0
-        categories.push({ id: lastCatId, hasItem: false })
-      } else {
-        if (!lastCatId) {
-          const rcat = await run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, ['其他', catSort++])
-          lastCatId = rcat.lastID
+    await writeConfig(async () => {
+      await run(`REPLACE INTO settings (key, value) VALUES ('reasonHierarchy', ?)`, [JSON.stringify(normalized)])
+      // 同步到票据事由（一级分类 + 二级项目）
+      // 策略：level=0 为一级分类；level>=1 视为二级项目，归属最近的一级分类；
+      // 若开头出现二级项目，将先创建一个默认分类“其他”。若某分类没有任何项目，则补充一个“未分类”。
+      await run(`DELETE FROM reason_items`)
+      await run(`DELETE FROM reason_categories`)
+      let catSort = 0
+      let lastCatId = null
+      let itemSort = 0
+      const categories = [] // { id, hasItem }
+      for (const n of normalized) {
+        const text = (String(n.text || '').trim() || '未命名')
+        const lvl = Number(n.level) || 0
+        if (lvl <= 0) {
+          const r = await run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, [text, catSort++])
+          lastCatId = r.lastID
           itemSort = 0
           categories.push({ id: lastCatId, hasItem: false })
+        } else {
+          if (!lastCatId) {
+            const rcat = await run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, ['其他', catSort++])
+            lastCatId = rcat.lastID
+            itemSort = 0
+            categories.push({ id: lastCatId, hasItem: false })
+          }
+          await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [lastCatId, text, itemSort++])
+          const cur = categories[categories.length - 1]
+          if (cur) cur.hasItem = true
         }
-        await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [lastCatId, text, itemSort++])
-        const cur = categories[categories.length - 1]
-        if (cur) cur.hasItem = true
       }
-    }
-    // 为没有项目的分类补充一个“未分类”项
-    for (const c of categories) {
-      if (!c.hasItem) {
-        await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [c.id, '未分类', 0, 'enabled'])
+      // 为没有项目的分类补充一个“未分类”项
+      for (const c of categories) {
+        if (!c.hasItem) {
+          await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [c.id, '未分类', 0, 'enabled'])
+        }
       }
-    }
-    // 若没有任何分类，建立默认“其他/未分类”
-    if (categories.length === 0) {
-      const r = await run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, ['其他', 0])
-      await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [r.lastID, '未分类', 0, 'enabled'])
-    }
+      // 若没有任何分类，建立默认“其他/未分类”
+      if (categories.length === 0) {
+        const r = await run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, ['其他', 0])
+        await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [r.lastID, '未分类', 0, 'enabled'])
+      }
+    })
     res.json({ ok: true })
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -530,18 +954,20 @@ app.put('/api/users', auth, async (req, res) => {
     const rows = await all(`SELECT id, role, password FROM users`)
     const pwdMap = {}
     for (const r of rows) pwdMap[String(r.id)] = { role: String(r.role), password: String(r.password || '') }
-    await run(`DELETE FROM users`)
-    for (const u of users) {
-      const id = String(u.id)
-      const name = String(u.name)
-      const role = String(u.role)
-      const existing = pwdMap[id]
-      // 优先使用传入的密码；否则保留原密码；再否则按角色使用默认值
-      const password = (u.password != null && String(u.password) !== '')
-        ? String(u.password)
-        : (existing && existing.password ? existing.password : (id === 'admin' ? 'admin123' : '123456'))
-      await run(`INSERT INTO users (id, name, role, password) VALUES (?, ?, ?, ?)`, [id, name, role, password])
-    }
+    await writeConfig(async () => {
+      await run(`DELETE FROM users`)
+      for (const u of users) {
+        const id = String(u.id)
+        const name = String(u.name)
+        const role = String(u.role)
+        const existing = pwdMap[id]
+        // 优先使用传入的密码；否则保留原密码；再否则按角色使用默认值
+        const password = (u.password != null && String(u.password) !== '')
+          ? String(u.password)
+          : (existing && existing.password ? existing.password : (id === 'admin' ? 'admin123' : '123456'))
+        await run(`INSERT INTO users (id, name, role, password) VALUES (?, ?, ?, ?)`, [id, name, role, password])
+      }
+    })
     res.json({ ok: true })
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -550,8 +976,7 @@ app.put('/api/users', auth, async (req, res) => {
 
 app.get('/api/approval-order', async (req, res) => {
   try {
-    const rows = await all(`SELECT role FROM approval_order ORDER BY sort ASC`)
-    res.json(rows.map(r => r.role))
+    res.json(await getConfig('approvalOrder'))
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
@@ -561,52 +986,273 @@ app.post('/api/approval-order', auth, async (req, res) => {
   if (req.user?.role !== 'admin') return res.status(403).json({ error: '无权限' })
   const { order } = req.body
   try {
-    await run(`DELETE FROM approval_order`)
-    for (let i = 0; i < order.length; i++) {
-      await run(`INSERT INTO approval_order (role, sort) VALUES (?, ?)`, [order[i], i])
-    }
+    await writeConfig(async () => {
+      await run(`DELETE FROM approval_order`)
+      for (let i = 0; i < order.length; i++) {
+        await run(`INSERT INTO approval_order (role, sort) VALUES (?, ?)`, [order[i], i])
+      }
+    })
     res.json({ ok: true })
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
 })
 
+// ===== 票据列表：按 (date DESC, id DESC) 游标分页 =====
+// GET /api/bills?limit=50&cursor=...&fields=id,title,...&createdBy=&status=pending,rejected&from=&to=&q=&excludeStep=
+// 返回 { items, nextCursor }，nextCursor 为 null 表示已到末页；/api/bills/archived 固定 status = 'archived'
+const BILLS_PAGE_SIZE = 50
+const BILLS_PAGE_MAX = 200
+// 可投影的列；createdAt 取 create 事件时间，history 由 bill_events 拼出
+const BILL_LIST_FIELDS = {
+  id: 'id', title: 'title', amount: 'amount', category: 'category', date: 'date', createdBy: 'createdBy',
+  status: 'status', steps: 'steps', currentStepIndex: 'currentStepIndex', images: 'images', relatedId: 'relatedId',
+  history: HISTORY_SQL,
+  createdAt: `(SELECT time FROM bill_events WHERE billId = bills.id AND action = 'create' ORDER BY id LIMIT 1) AS createdAt`,
+}
+const BILL_LIST_DEFAULT_FIELDS = ['id', 'title', 'amount', 'category', 'date', 'createdBy', 'status', 'steps', 'currentStepIndex', 'history', 'images']
+
+// 游标为 [date, id]，date 可为 null（未填日期的票据）
+function encodeBillCursor(row) {
+  return Buffer.from(JSON.stringify([row.date ?? null, row.id])).toString('base64url')
+}
+
+function decodeBillCursor(value) {
+  try {
+    const [date, id] = JSON.parse(Buffer.from(String(value), 'base64url').toString('utf8'))
+    if ((date === null || typeof date === 'string') && typeof id === 'string') return { date, id }
+  } catch {}
+  return null
+}
+
+// 按游标取下一页（最多 n 行）。fetchPage(额外条件, 额外参数, 行数) 执行 ORDER BY date DESC, id DESC 查询。
+// date 为 NULL 的票据排在最后，但行值比较 (date, id) < (?, ?) 遇 NULL 不成立：游标停在非 NULL 日期时，
+// 不足一页的部分再按 date IS NULL 补齐；两段查询都是索引范围扫描
+async function readBillPage(fetchPage, cursor, n) {
+  if (!cursor) return fetchPage([], [], n)
+  if (cursor.date === null) return fetchPage(['date IS NULL', 'id < ?'], [cursor.id], n)
+  // 行值比较可直接作为索引范围条件（OR 展开写法会退化为从头扫描索引）
+  const rows = await fetchPage(['(date, id) < (?, ?)'], [cursor.date, cursor.id], n)
+  if (rows.length >= n) return rows
+  return rows.concat(await fetchPage(['date IS NULL'], [], n - rows.length))
+}
+
+const DATE_RE = /^\d{4}-\d{2}-\d{2}$/
+
+// 票据日期范围：from 含当天；to 含当天（date < 次日，票据日期可能带时间部分）
+function dateRangeWhere(query) {
+  const where = []
+  const params = []
+  const from = String(query.from || '')
+  const to = String(query.to || '')
+  if (DATE_RE.test(from)) { where.push('date >= ?'); params.push(from) }
+  if (DATE_RE.test(to)) {
+    const next = new Date(to + 'T00:00:00Z')
+    next.setUTCDate(next.getUTCDate() + 1)
+    where.push('date < ?')
+    params.push(next.toISOString().slice(0, 10))
+  }
+  return { where, params }
+}
+
+async function listBills(query, fixedStatus) {
+  const limit = Math.min(Math.max(parseInt(query.limit, 10) || BILLS_PAGE_SIZE, 1), BILLS_PAGE_MAX)
+  const requested = String(query.fields || '').split(',').map(s => s.trim()).filter(k => BILL_LIST_FIELDS[k])
+  // 游标依赖 id/date，始终返回
+  const fields = [...new Set(['id', 'date', ...(requested.length ? requested : BILL_LIST_DEFAULT_FIELDS)])]
+
+  const { where, params } = dateRangeWhere(query)
+  const statuses = fixedStatus ? [fixedStatus] : String(query.status || '').split(',').map(s => s.trim()).filter(Boolean)
+  if (statuses.length) {
+    where.push(`status IN (${statuses.map(() => '?').join(',')})`)
+    params.push(...statuses)
+  }
+  if (query.createdBy) { where.push('createdBy = ?'); params.push(String(query.createdBy)) }
+  // 流程中不含某审批角色的票据（免审列表）
+  if (query.excludeStep) {
+    where.push(`NOT EXISTS (SELECT 1 FROM json_each(CASE WHEN json_valid(steps) THEN steps ELSE '[]' END) WHERE value = ?)`)
+    params.push(String(query.excludeStep))
+  }
+  const q = String(query.q || '').trim()
+  if (q) {
+    const like = '%' + q.replace(/[\\%_]/g, m => '\\' + m) + '%'
+    where.push(`(title LIKE ? ESCAPE '\\' OR category LIKE ? ESCAPE '\\' OR id LIKE ? ESCAPE '\\' OR CAST(amount AS TEXT) LIKE ? ESCAPE '\\')`)
+    params.push(like, like, like, like)
+  }
+  const cursor = query.cursor ? decodeBillCursor(query.cursor) : null
+
+  const cols = fields.map(k => BILL_LIST_FIELDS[k]).join(', ')
+  // 冷库只有归档/已修改票据：只查待审等状态时不访问
+  const withCold = !statuses.length || statuses.some(s => COLD_STATUSES.includes(s))
+  const rows = await readBillPage(async (extraWhere, extraParams, n) => {
+    const w = [...where, ...extraWhere]
+    const p = [...params, ...extraParams]
+    const tail = (w.length ? ` WHERE ${w.join(' AND ')}` : '') + ` ORDER BY date DESC, id DESC LIMIT ${n}`
+    const pages = [await all(`SELECT ${cols} FROM bills${tail}`, p)]
+    if (withCold) pages.push(await all(`SELECT ${coldSql(cols)} FROM cold.bills AS bills${tail}`, p))
+    return mergeBillPages(pages, n)
+  }, cursor, limit + 1)
+  const more = rows.length > limit
+  const items = rows.slice(0, limit).map(r => normalizeBillRow(r))
+  const last = items[items.length - 1]
+  return { items, nextCursor: more && last ? encodeBillCursor(last) : null }
+}
+
 app.get('/api/bills', async (req, res) => {
   try {
-    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images FROM bills ORDER BY date DESC, id DESC`)
-    const parsed = rows.map(r => normalizeBillRow(r))
-    res.json(parsed)
+    res.json(await listBills(req.query))
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
 })
 
-// Server-side filtered todos by role (duplicate kept in sync for now)
-app.get('/api/todos/:role', async (req, res) => {
+app.get('/api/bills/archived', async (req, res) => {
   try {
-    const role = String(req.params.role || '').trim()
-    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images FROM bills WHERE status = 'pending' ORDER BY date DESC, id DESC`)
-    const parsed = rows.map(r => normalizeBillRow(r)).filter(b => Array.isArray(b.steps) && b.steps[b.currentStepIndex] === role)
-    res.json(parsed)
+    res.json(await listBills(req.query, 'archived'))
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
 })
 
-app.get('/api/bills/archived', async (req, res) => {
+// 各状态票据数（首页状态卡片），可按发起人过滤
+app.get('/api/bills/counts', async (req, res) => {
   try {
-    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images FROM bills WHERE status = 'archived' ORDER BY date DESC, id DESC`)
-    const parsed = rows.map(r => normalizeBillRow(r))
-    res.json(parsed)
+    const createdBy = req.query.createdBy ? String(req.query.createdBy) : null
+    const rows = createdBy
+      ? await all(`SELECT status, COUNT(*) AS count FROM bills WHERE createdBy = ? GROUP BY status`, [createdBy])
+      : await all(`SELECT status, COUNT(*) AS count FROM bills GROUP BY status`)
+    const out = {}
+    for (const r of [...rows, ...await getColdCounts(createdBy)]) out[r.status] = (out[r.status] || 0) + r.count
+    res.json(out)
+  } catch (e) {
+    res.status(500).json({ error: e.message })
+  }
+})
+
+// 归档统计：只返回汇总结果，数据量与归档票据总数无关
+app.get('/api/stats/summary', async (req, res) => {
+  try {
+    const withTotal = r => { const { amountCents, ...rest } = r; return { ...rest, total: (Number(amountCents) || 0) / 100 } }
+    const monthly = await all(`SELECT month, count, amountCents FROM stats_monthly ORDER BY month DESC`)
+    const people = await all(`SELECT s.createdBy, u.name, s.count, s.amountCents FROM stats_person s LEFT JOIN users u ON u.id = s.createdBy ORDER BY s.amountCents DESC`)
+    const reasons = await all(`SELECT category, item, count, amountCents FROM stats_reason ORDER BY amountCents DESC`)
+    const count = people.reduce((n, r) => n + (Number(r.count) || 0), 0)
+    const cents = people.reduce((n, r) => n + (Number(r.amountCents) || 0), 0)
+    res.json({
+      monthly: monthly.map(withTotal),
+      people: people.map(withTotal),
+      reasons: reasons.map(withTotal),
+      totals: { count, total: cents / 100 },
+    })
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
 })
 
+// ===== 流式导出 =====
+// GET /api/export/bills?format=xlsx|csv&columns=id,title,...&from=YYYY-MM-DD&to=YYYY-MM-DD[&sheet=bills|monthly|person]
+// XLSX 含三张表（归档票据 / 按月汇总 / 按人汇总）；CSV 单表，由 sheet 指定（默认 bills）
+const EXPORT_PAGE_SIZE = 1000
+
+function exportRange(query) {
+  const { where, params } = dateRangeWhere(query)
+  return { where: [`status = 'archived'`, ...where], params, filtered: params.length > 0 }
+}
+
+// 按 (date, id) 游标分页读取，内存中只保留一页
+async function* iterExportBills(range, keys, names) {
+  let cursor = null
+  for (;;) {
+    const rows = await readBillPage(async (extraWhere, extraParams, n) => {
+      const params = [...range.params, ...extraParams]
+      const tail = ` WHERE ${[...range.where, ...extraWhere].join(' AND ')} ORDER BY date DESC, id DESC LIMIT ${n}`
+      return mergeBillPages([
+        await all(`SELECT id, title, amount, category, status, date, createdBy FROM bills${tail}`, params),
+        await all(`SELECT id, title, amount, category, status, date, createdBy FROM cold.bills${tail}`, params),
+      ], n)
+    }, cursor, EXPORT_PAGE_SIZE)
+    if (rows.length === 0) return
+    yield rows.map(r => keys.map(k => {
+      if (k === 'amount') return Number(r.amount) || 0
+      if (k === 'createdBy') return names[r.createdBy] || r.createdBy
+      return r[k]
+    }))
+    if (rows.length < EXPORT_PAGE_SIZE) return
+    cursor = rows[rows.length - 1]
+  }
+}
+
+// 按范围聚合热库与冷库并合并同键（结果行数很少）
+async function aggregateRange(range, keySql, extraWhere = '') {
+  const byKey = new Map()
+  for (const table of ['bills', 'cold.bills']) {
+    const rows = await all(`SELECT ${keySql} AS k, COUNT(*) AS count, SUM(${STATS_CENTS_SQL}) AS amountCents FROM ${table} WHERE ${range.where.join(' AND ')}${extraWhere} GROUP BY k`, range.params)
+    for (const r of rows) {
+      const cur = byKey.get(r.k) || { k: r.k, count: 0, amountCents: 0 }
+      cur.count += Number(r.count) || 0
+      cur.amountCents += Number(r.amountCents) || 0
+      byKey.set(r.k, cur)
+    }
+  }
+  return [...byKey.values()]
+}
+
+// 汇总表：无日期过滤时直接读 stats_* 汇总表，否则按范围聚合
+async function exportAggregate(range, kind, names) {
+  let rows
+  if (kind === 'monthly') {
+    rows = range.filtered
+      ? (await aggregateRange(range, STATS_MONTH_SQL, ' AND k IS NOT NULL')).sort((a, b) => (a.k < b.k ? 1 : a.k > b.k ? -1 : 0))
+      : await all(`SELECT month AS k, count, amountCents FROM stats_monthly ORDER BY month DESC`)
+  } else {
+    rows = range.filtered
+      ? (await aggregateRange(range, STATS_PERSON_SQL)).sort((a, b) => b.amountCents - a.amountCents)
+      : await all(`SELECT createdBy AS k, count, amountCents FROM stats_person ORDER BY amountCents DESC`)
+  }
+  return rows.map(r => [kind === 'person' ? (names[r.k] || r.k) : r.k, Number(r.count) || 0, (Number(r.amountCents) || 0) / 100])
+}
+
+app.get('/api/export/bills', async (req, res) => {
+  const format = req.query.format === 'csv' ? 'csv' : 'xlsx'
+  const requested = String(req.query.columns || '').split(',').map(s => s.trim()).filter(Boolean)
+  const columns = requested.length ? BILL_COLUMNS.filter(c => requested.includes(c.key)) : BILL_COLUMNS
+  if (columns.length === 0) return res.status(400).json({ error: '未选择导出列' })
+  const range = exportRange(req.query)
+  const keys = columns.map(c => c.key)
+  try {
+    const names = {}
+    Object.assign(names, (await getConfig('users')).names)
+    const sheets = {
+      bills: { name: '归档票据', columns: columns.map(c => ({ label: c.label, type: c.key === 'amount' ? 'amount' : undefined })), rows: () => iterExportBills(range, keys, names) },
+      monthly: { name: '按月汇总', columns: [{ label: '月份' }, { label: '张数', type: 'number' }, { label: '报销总额', type: 'amount' }], rows: async function* () { yield await exportAggregate(range, 'monthly', names) } },
+      person: { name: '按人汇总', columns: [{ label: '报销人' }, { label: '张数', type: 'number' }, { label: '报销总额', type: 'amount' }], rows: async function* () { yield await exportAggregate(range, 'person', names) } },
+    }
+    const now = new Date()
+    const stamp = `${now.getFullYear()}${String(now.getMonth()+1).padStart(2,'0')}${String(now.getDate()).padStart(2,'0')}`
+    const sheet = sheets[req.query.sheet] ? String(req.query.sheet) : 'bills'
+    const fname = format === 'csv' ? `财务统计_${sheets[sheet].name}_${stamp}.csv` : `财务统计_${stamp}.xlsx`
+    res.setHeader('Content-Type', format === 'csv' ? 'text/csv; charset=utf-8' : 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    res.setHeader('Content-Disposition', `attachment; filename="export.${format}"; filename*=UTF-8''${encodeURIComponent(fname)}`)
+    res.setHeader('Cache-Control', 'no-store')
+    // 关闭 Nginx 代理缓冲，边查边传
+    res.setHeader('X-Accel-Buffering', 'no')
+    res.flushHeaders()
+    if (format === 'csv') await writeCsv(res, sheets[sheet])
+    else await writeXlsx(res, [sheets.bills, sheets.monthly, sheets.person])
+    res.end()
+  } catch (e) {
+    if (e instanceof ExportAborted) return
+    console.error('export error:', e)
+    if (res.headersSent) res.destroy(e)
+    else res.status(500).json({ error: e.message })
+  }
+})
+
 app.get('/api/bill/:id', async (req, res) => {
   try {
-    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images, relatedId FROM bills WHERE id = ? LIMIT 1`, [req.params.id])
-    const r = rows[0]
+    const cols = `id, title, amount, category, date, createdBy, status, steps, currentStepIndex, ${HISTORY_SQL}, images, relatedId`
+    const r = (await all(`SELECT ${cols} FROM bills WHERE id = ? LIMIT 1`, [req.params.id]))[0]
+      || (await all(`SELECT ${coldSql(cols)} FROM cold.bills AS bills WHERE id = ? LIMIT 1`, [req.params.id]))[0]
     if (!r) return res.status(404).json({ error: '票据不存在' })
     const nr = normalizeBillRow(r)
     res.json(nr)
@@ -619,34 +1265,21 @@ app.post('/api/bill', auth, async (req, res) => {
   try {
     const { title = '票据', amount = 0, category = '通用', date = new Date().toISOString().slice(0,10) } = req.body || {}
     const createdBy = req.user?.id || 'admin'
-    // 读取审批顺序
-    const orows = await all(`SELECT role FROM approval_order ORDER BY sort ASC`)
-    let order = orows.map(r => r.role)
-    if (!Array.isArray(order) || order.length === 0) {
-      order = ['approver1','approver2','approver3']
-    }
-    // 读取免审阈值并按金额裁剪审批步骤
-    let thr = {}
-    try {
-      const rows = await all(`SELECT value FROM settings WHERE key = 'approvalThresholds' LIMIT 1`)
-      thr = JSON.parse(rows[0]?.value || '{}')
-    } catch { thr = {} }
-    const amt = Number(amount) || 0
-    const filtered = order.filter(role => {
-      if (!/^approver[123]$/.test(role)) return true
-      const limit = Number(thr[role]) || 0
-      return !(amt < limit && limit > 0)
-    })
-    // 计算步骤：严格按照配置顺序，从第一个审批人开始，最后追加 accountant
-    const steps = [...filtered, 'accountant']
+    // 计算步骤：严格按照配置顺序（免审阈值裁剪），从第一个审批人开始，最后追加 accountant
+    const steps = await buildSteps(amount)
     const id = String(req.body?.id || (crypto.randomUUID ? crypto.randomUUID() : (Date.now().toString(36) + '-' + Math.random().toString(36).slice(2,8))))
     const nowISO = new Date().toISOString()
     const history = [{ action: 'create', by: createdBy, time: nowISO }]
     const status = 'pending'
     const currentStepIndex = 0
-    await run(`REPLACE INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
-      id, title, Number(amount) || 0, category, date, createdBy, status, JSON.stringify(steps), currentStepIndex, JSON.stringify(history), JSON.stringify([])
-    ])
+    // 指定 id 时按覆盖处理（setBills 逐条 upsert），旧事件一并清除
+    await withTransaction(async () => {
+      await run(`REPLACE INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, images, currentRole) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
+        id, title, Number(amount) || 0, category, date, createdBy, status, JSON.stringify(steps), currentStepIndex, JSON.stringify([]), currentRoleOf(status, steps, currentStepIndex)
+      ])
+      await run(`DELETE FROM bill_events WHERE billId = ?`, [id])
+      await appendBillEvent(id, history[0])
+    })
     res.json({ id, title, amount: Number(amount)||0, category, date, createdBy, status, steps, currentStepIndex, history, images: [] })
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -656,9 +1289,11 @@ app.post('/api/bill', auth, async (req, res) => {
 app.post('/api/bill/approve', async (req, res) => {
   const { id } = req.body
   try {
-    const rows = await all(`SELECT * FROM bills WHERE id = ?`, [id])
+    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, ${HISTORY_SQL}, images, relatedId FROM bills WHERE id = ?`, [id])
     const b = rows[0]
     if (!b) return res.status(404).json({ error: '票据不存在' })
+    const expect = { status: b.status, currentStepIndex: b.currentStepIndex }
+    const extra = {}
     // normalize bill fields
     try { b.steps = Array.isArray(b.steps) ? b.steps : JSON.parse(b.steps || '[]') } catch { b.steps = [] }
     try { b.history = Array.isArray(b.history) ? b.history : JSON.parse(b.history || '[]') } catch { b.history = [] }
@@ -668,22 +1303,9 @@ app.post('/api/bill/approve', async (req, res) => {
     if (!Number.isFinite(b.currentStepIndex)) b.currentStepIndex = 0
     // if steps empty, rebuild from approval_order + accountant，并应用免审阈值
     if (!Array.isArray(b.steps) || b.steps.length === 0) {
-      const orows = await all(`SELECT role FROM approval_order ORDER BY sort ASC`)
-      let order = orows.map(r => r.role)
-      if (!Array.isArray(order) || order.length === 0) order = ['approver1','approver2','approver3']
-      let thr = {}
-      try {
-        const srows = await all(`SELECT value FROM settings WHERE key = 'approvalThresholds' LIMIT 1`)
-        thr = JSON.parse(srows[0]?.value || '{}')
-      } catch { thr = {} }
-      const amt = Number(b.amount) || 0
-      const filtered = order.filter(role => {
-        if (!/^approver[123]$/.test(role)) return true
-        const limit = Number(thr[role]) || 0
-        return !(amt < limit && limit > 0)
-      })
-      b.steps = [...filtered, 'accountant']
+      b.steps = await buildSteps(b.amount)
       b.currentStepIndex = 0
+      extra.steps = JSON.stringify(b.steps)
     }
     // clamp index
     if (b.currentStepIndex < 0 || b.currentStepIndex >= b.steps.length) b.currentStepIndex = 0
@@ -692,9 +1314,10 @@ app.post('/api/bill/approve', async (req, res) => {
     // 最终以流程当前步骤为准，避免客户端令牌与所需角色不同步导致阻塞
     const role = expected
     // default date if empty
-    if (!b.date) b.date = new Date().toISOString().slice(0,10)
+    if (!b.date) extra.date = b.date = new Date().toISOString().slice(0,10)
     console.log('approve debug', { id: b.id, expected: role, currentStepIndex: b.currentStepIndex, historyType: Array.isArray(b.history) ? 'array' : typeof b.history, historyPreview: (() => { try { return JSON.stringify(b.history).slice(0, 120) } catch { return String(b.history) } })() })
-    b.history.push({ action: 'approve', role: role, time: new Date().toISOString() })
+    const event = { action: 'approve', role: role, time: new Date().toISOString() }
+    b.history.push(event)
     if (b.currentStepIndex < b.steps.length - 1) {
       b.currentStepIndex += 1
     } else {
@@ -702,13 +1325,17 @@ app.post('/api/bill/approve', async (req, res) => {
       const finalRole = b.steps[b.currentStepIndex]
       b.status = finalRole === 'accountant' ? 'archived' : 'approved'
     }
-    await run(`REPLACE INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
-      b.id, b.title, Number(b.amount)||0, b.category, b.date, b.createdBy, b.status, JSON.stringify(b.steps||[]), Number(b.currentStepIndex)||0, JSON.stringify(b.history||[]), JSON.stringify(b.images||[])
-    ])
+    // 状态推进、事件追加与统计累加在同一事务内，归档状态与汇总表保持一致
+    b.currentRole = currentRoleOf(b.status, b.steps, b.currentStepIndex)
+    await withTransaction(async () => {
+      await updateBillFields(b.id, { status: b.status, currentStepIndex: b.currentStepIndex, currentRole: b.currentRole, ...extra }, expect)
+      await appendBillEvent(b.id, event)
+      if (b.status === 'archived') await addArchivedStats(b)
+    })
     res.json(b)
   } catch (e) {
     console.error('approve error:', e)
-    res.status(500).json({ error: e.message })
+    res.status(e.status || 500).json({ error: e.message })
   }
 })
 
@@ -716,13 +1343,22 @@ app.post('/api/bill/approve', async (req, res) => {
 app.delete('/api/bill/:id', auth, async (req, res) => {
   try {
     const billId = String(req.params.id || '')
-    const rows = await all(`SELECT id, createdBy, status FROM bills WHERE id = ?`, [billId])
-    const b = rows[0]
+    let schema = 'main'
+    let b = (await all(`SELECT id, createdBy, status FROM bills WHERE id = ?`, [billId]))[0]
+    if (!b) {
+      schema = 'cold'
+      b = (await all(`SELECT id, createdBy, status FROM cold.bills WHERE id = ?`, [billId]))[0]
+    }
     if (!b) return res.status(404).json({ error: '票据不存在' })
     if (b.createdBy !== req.user?.id) return res.status(403).json({ error: '无权限删除他人票据' })
     if (b.status === 'archived') return res.status(400).json({ error: '已归档票据不可删除' })
+    await withTransaction(async () => {
+      await run(`DELETE FROM ${schema}.bills WHERE id = ?`, [billId])
+      await run(`DELETE FROM ${schema}.bill_events WHERE billId = ?`, [billId])
+    })
     deleteBillImagesSync(billId)
-    await run(`DELETE FROM bills WHERE id = ?`, [billId])
+    // 本连接自身的写入不改变 data_version，需手动使冷库计数缓存失效
+    if (schema === 'cold') coldCounts.version = null
     res.json({ ok: true })
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -749,9 +1385,11 @@ function deleteBillImagesSync(billId) {
 app.post('/api/bill/reject', async (req, res) => {
   const { id, reason = '' } = req.body
   try {
-    const rows = await all(`SELECT * FROM bills WHERE id = ?`, [id])
+    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex, ${HISTORY_SQL}, images, relatedId FROM bills WHERE id = ?`, [id])
     const b = rows[0]
     if (!b) return res.status(404).json({ error: '票据不存在' })
+    const expect = { status: b.status, currentStepIndex: b.currentStepIndex }
+    const extra = {}
     // normalize bill fields
     try { b.steps = Array.isArray(b.steps) ? b.steps : JSON.parse(b.steps || '[]') } catch { b.steps = [] }
     try { b.history = Array.isArray(b.history) ? b.history : JSON.parse(b.history || '[]') } catch { b.history = [] }
@@ -760,29 +1398,16 @@ app.post('/api/bill/reject', async (req, res) => {
     b.currentStepIndex = Number(b.currentStepIndex)
     if (!Number.isFinite(b.currentStepIndex)) b.currentStepIndex = 0
     if (!Array.isArray(b.steps) || b.steps.length === 0) {
-      const orows = await all(`SELECT role FROM approval_order ORDER BY sort ASC`)
-      let order = orows.map(r => r.role)
-      if (!Array.isArray(order) || order.length === 0) order = ['approver1','approver2','approver3']
-      let thr = {}
-      try {
-        const srows = await all(`SELECT value FROM settings WHERE key = 'approvalThresholds' LIMIT 1`)
-        thr = JSON.parse(srows[0]?.value || '{}')
-      } catch { thr = {} }
-      const amt = Number(b.amount) || 0
-      const filtered = order.filter(role => {
-        if (!/^approver[123]$/.test(role)) return true
-        const limit = Number(thr[role]) || 0
-        return !(amt < limit && limit > 0)
-      })
-      b.steps = [...filtered, 'accountant']
+      b.steps = await buildSteps(b.amount)
       b.currentStepIndex = 0
+      extra.steps = JSON.stringify(b.steps)
     }
     if (b.currentStepIndex < 0 || b.currentStepIndex >= b.steps.length) b.currentStepIndex = 0
     if (b.status !== 'pending') return res.status(400).json({ error: '当前票据不在审批中' })
     const expected = b.steps[b.currentStepIndex]
     // 同 approve，直接以当前步骤为准
     const role = expected
-    if (!b.date) b.date = new Date().toISOString().slice(0,10)
+    if (!b.date) extra.date = b.date = new Date().toISOString().slice(0,10)
     // 拒绝策略：一级拒绝直接终止，其它级别退回上一级
     console.log('reject debug', { id: b.id, expected: role, currentStepIndex: b.currentStepIndex, historyType: Array.isArray(b.history) ? 'array' : typeof b.history, historyPreview: (() => { try { return JSON.stringify(b.history).slice(0, 120) } catch { return String(b.history) } })() })
     if (b.currentStepIndex === 0) {
@@ -791,8 +1416,8 @@ app.post('/api/bill/reject', async (req, res) => {
       // 统一历史记录字段格式：demoteTo 使用“姓名(工号)”
       b.history.push({ action: 'reject', role, reason, time: new Date().toISOString() })
       b.status = 'rejected'
-      deleteBillImagesSync(String(b.id))
       b.images = []
+      extra.images = JSON.stringify([])
     } else {
       // 高级别拒绝：流程回退到前一审批人，保持 pending
       const demoteRole = b.steps[b.currentStepIndex - 1]
@@ -801,13 +1426,17 @@ app.post('/api/bill/reject', async (req, res) => {
       b.currentStepIndex = b.currentStepIndex - 1
       b.status = 'pending'
     }
-    await run(`REPLACE INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
-      b.id, b.title, Number(b.amount)||0, b.category, b.date, b.createdBy, b.status, JSON.stringify(b.steps||[]), Number(b.currentStepIndex)||0, JSON.stringify(b.history||[]), JSON.stringify(b.images||[])
-    ])
+    b.currentRole = currentRoleOf(b.status, b.steps, b.currentStepIndex)
+    await withTransaction(async () => {
+      await updateBillFields(b.id, { status: b.status, currentStepIndex: b.currentStepIndex, currentRole: b.currentRole, ...extra }, expect)
+      await appendBillEvent(b.id, b.history[b.history.length - 1])
+    })
+    // 提交成功后再删除图片：并发修改（409）回滚时票据仍引用原图片
+    if (b.status === 'rejected') deleteBillImagesSync(String(b.id))
     res.json(b)
   } catch (e) {
     console.error('reject error:', e)
-    res.status(500).json({ error: e.message })
+    res.status(e.status || 500).json({ error: e.message })
   }
 })
 
@@ -815,10 +1444,7 @@ app.post('/api/bill/reject', async (req, res) => {
 // 列出所有分类及其二级项目
 app.get('/api/reasons', async (req, res) => {
   try {
-    const cats = await all(`SELECT id, name, sort, status FROM reason_categories ORDER BY sort ASC, id ASC`)
-    const items = await all(`SELECT id, categoryId, name, sort, status FROM reason_items ORDER BY sort ASC, id ASC`)
-    const grouped = cats.map(c => ({ ...c, items: items.filter(i => i.categoryId === c.id) }))
-    res.json(grouped)
+    res.json(await getConfig('reasons'))
   } catch (e) {
     res.status(500).json({ error: e.message })
   }
@@ -831,7 +1457,7 @@ app.post('/api/reasons/category', auth, async (req, res) => {
     const name = String(req.body?.name || '').trim()
     const sort = Number(req.body?.sort || 0)
     if (!name) return res.status(400).json({ error: '分类名称必填' })
-    const r = await run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, [name, sort])
+    const r = await writeConfig(() => run(`INSERT INTO reason_categories (name, sort, status) VALUES (?, ?, 'enabled')`, [name, sort]))
     res.json({ id: r.lastID, name, sort, status: 'enabled' })
   } catch (e) { res.status(500).json({ error: e.message }) }
 })
@@ -847,7 +1473,7 @@ app.put('/api/reasons/category/:id', auth, async (req, res) => {
     const rows = await all(`SELECT id, name, sort, status FROM reason_categories WHERE id = ? LIMIT 1`, [id])
     const c = rows[0]
     if (!c) return res.status(404).json({ error: '分类不存在' })
-    await run(`UPDATE reason_categories SET name = COALESCE(?, name), sort = COALESCE(?, sort), status = COALESCE(?, status) WHERE id = ?`, [name, sort, status, id])
+    await writeConfig(() => run(`UPDATE reason_categories SET name = COALESCE(?, name), sort = COALESCE(?, sort), status = COALESCE(?, status) WHERE id = ?`, [name, sort, status, id]))
     const updated = (await all(`SELECT id, name, sort, status FROM reason_categories WHERE id = ?`, [id]))[0]
     res.json(updated)
   } catch (e) { res.status(500).json({ error: e.message }) }
@@ -864,7 +1490,7 @@ app.delete('/api/reasons/category/:id', auth, async (req, res) => {
     if (String(c.name) === '其他') return res.status(400).json({ error: '默认分类不可删除' })
     const cnt = (await all(`SELECT COUNT(*) as c FROM reason_items WHERE categoryId = ?`, [id]))[0]?.c || 0
     if (cnt > 0) return res.status(400).json({ error: '存在二级项目，不能删除' })
-    await run(`DELETE FROM reason_categories WHERE id = ?`, [id])
+    await writeConfig(() => run(`DELETE FROM reason_categories WHERE id = ?`, [id]))
     res.json({ ok: true })
   } catch (e) { res.status(500).json({ error: e.message }) }
 })
@@ -878,7 +1504,7 @@ app.post('/api/reasons/item', auth, async (req, res) => {
     const sort = Number(req.body?.sort || 0)
     if (!categoryId) return res.status(400).json({ error: '缺少所属一级分类' })
     if (!name) return res.status(400).json({ error: '项目名称必填' })
-    const r = await run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [categoryId, name, sort])
+    const r = await writeConfig(() => run(`INSERT INTO reason_items (categoryId, name, sort, status) VALUES (?, ?, ?, 'enabled')`, [categoryId, name, sort]))
     res.json({ id: r.lastID, categoryId, name, sort, status: 'enabled' })
   } catch (e) { res.status(500).json({ error: e.message }) }
 })
@@ -894,7 +1520,7 @@ app.put('/api/reasons/item/:id', auth, async (req, res) => {
     const rows = await all(`SELECT id FROM reason_items WHERE id = ? LIMIT 1`, [id])
     const it = rows[0]
     if (!it) return res.status(404).json({ error: '项目不存在' })
-    await run(`UPDATE reason_items SET name = COALESCE(?, name), sort = COALESCE(?, sort), status = COALESCE(?, status) WHERE id = ?`, [name, sort, status, id])
+    await writeConfig(() => run(`UPDATE reason_items SET name = COALESCE(?, name), sort = COALESCE(?, sort), status = COALESCE(?, status) WHERE id = ?`, [name, sort, status, id]))
     const updated = (await all(`SELECT id, categoryId, name, sort, status FROM reason_items WHERE id = ?`, [id]))[0]
     res.json(updated)
   } catch (e) { res.status(500).json({ error: e.message }) }
@@ -905,7 +1531,7 @@ app.delete('/api/reasons/item/:id', auth, async (req, res) => {
   try {
     if (req.user?.role !== 'admin') return res.status(403).json({ error: '无权限' })
     const id = Number(req.params.id)
-    await run(`DELETE FROM reason_items WHERE id = ?`, [id])
+    await writeConfig(() => run(`DELETE FROM reason_items WHERE id = ?`, [id]))
     res.json({ ok: true })
   } catch (e) { res.status(500).json({ error: e.message }) }
 })
@@ -915,9 +1541,11 @@ app.post('/api/reasons/category/reorder', auth, async (req, res) => {
   try {
     if (req.user?.role !== 'admin') return res.status(403).json({ error: '无权限' })
     const ids = Array.isArray(req.body?.ids) ? req.body.ids.map(n=>Number(n)).filter(n=>Number.isFinite(n)) : []
-    for (let i = 0; i < ids.length; i++) {
-      await run(`UPDATE reason_categories SET sort = ? WHERE id = ?`, [i, ids[i]])
-    }
+    await writeConfig(async () => {
+      for (let i = 0; i < ids.length; i++) {
+        await run(`UPDATE reason_categories SET sort = ? WHERE id = ?`, [i, ids[i]])
+      }
+    })
     res.json({ ok: true })
   } catch (e) { res.status(500).json({ error: e.message }) }
 })
@@ -931,9 +1559,11 @@ app.post('/api/reasons/item/reorder', auth, async (req, res) => {
     if (!categoryId) return res.status(400).json({ error: '缺少分类' })
     const items = await all(`SELECT id FROM reason_items WHERE categoryId = ?`, [categoryId])
     const valid = new Set(items.map(i=>i.id))
-    for (let i = 0; i < ids.length; i++) {
-      if (valid.has(ids[i])) await run(`UPDATE reason_items SET sort = ? WHERE id = ?`, [i, ids[i]])
-    }
+    await writeConfig(async () => {
+      for (let i = 0; i < ids.length; i++) {
+        if (valid.has(ids[i])) await run(`UPDATE reason_items SET sort = ? WHERE id = ?`, [i, ids[i]])
+      }
+    })
     res.json({ ok: true })
   } catch (e) { res.status(500).json({ error: e.message }) }
 })
@@ -941,15 +1571,14 @@ app.post('/api/reasons/item/reorder', auth, async (req, res) => {
 app.post('/api/bill/resubmit', auth, async (req, res) => {
   const { id, editorId, updates = {} } = req.body
   try {
-    const rows = await all(`SELECT * FROM bills WHERE id = ?`, [id])
+    const rows = await all(`SELECT id, title, amount, category, date, createdBy, status, steps, currentStepIndex FROM bills WHERE id = ?`, [id])
     const b = rows[0]
     if (!b) return res.status(404).json({ error: '票据不存在' })
     const steps = b.steps ? (Array.isArray(b.steps) ? b.steps : JSON.parse(b.steps)) : []
-    const history = b.history ? (Array.isArray(b.history) ? b.history : JSON.parse(b.history)) : []
-    const images = b.images ? (Array.isArray(b.images) ? b.images : JSON.parse(b.images)) : []
     if (b.status !== 'rejected') return res.status(400).json({ error: '当前票据未被拒绝' })
     if (b.createdBy !== editorId) return res.status(403).json({ error: '仅发起人可再次提交' })
-    const lastReject = [...history].reverse().find(h => h.action === 'reject')
+    const rejects = await all(`SELECT data FROM bill_events WHERE billId = ? AND action = 'reject' ORDER BY id DESC LIMIT 1`, [String(id)])
+    const lastReject = (() => { try { return JSON.parse(rejects[0]?.data || 'null') } catch { return null } })()
     if (!lastReject || lastReject.role !== 'approver1') return res.status(400).json({ error: '仅一级拒绝后可再次提交' })
 
     const before = { title: b.title, amount: Number(b.amount)||0, category: b.category, date: b.date }
@@ -970,24 +1599,25 @@ app.post('/api/bill/resubmit', auth, async (req, res) => {
       { action: 'create', by: editorId, time: nowISO },
       { action: 'resubmit_from', from: String(id), time: nowISO }
     ]
-    await run(`REPLACE INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images, relatedId) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
-      newId, after.title, after.amount, after.category, after.date, b.createdBy, 'pending', JSON.stringify(steps), 0, JSON.stringify(newHistory), JSON.stringify([]), String(id)
-    ])
+    await withTransaction(async () => {
+      await run(`INSERT INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, images, relatedId, currentRole) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
+        newId, after.title, after.amount, after.category, after.date, b.createdBy, 'pending', JSON.stringify(steps), 0, JSON.stringify([]), String(id), currentRoleOf('pending', steps, 0)
+      ])
+      for (const h of newHistory) await appendBillEvent(newId, h)
 
-    // 更新原票据：标记为已拒绝-已修改，建立关联并记录变更
-    history.push({ action: 'modified', by: editorId, time: nowISO, nextId: newId })
-    await run(`REPLACE INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images, relatedId) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
-      String(id), b.title, Number(b.amount)||0, b.category, b.date, b.createdBy, 'rejected-modified', JSON.stringify(steps), Number(b.currentStepIndex)||0, JSON.stringify(history), JSON.stringify(images), newId
-    ])
+      // 更新原票据：标记为已拒绝-已修改，建立关联并记录变更
+      await updateBillFields(String(id), { status: 'rejected-modified', relatedId: newId, currentRole: null }, { status: 'rejected', currentStepIndex: b.currentStepIndex })
+      await appendBillEvent(String(id), { action: 'modified', by: editorId, time: nowISO, nextId: newId })
 
-    // 记录修改历史
-    await run(`INSERT INTO bill_edits (originalId, newId, editorId, time, diff) VALUES (?, ?, ?, ?, ?)`, [
-      String(id), newId, editorId, nowISO, JSON.stringify(diff)
-    ])
+      // 记录修改历史
+      await run(`INSERT INTO bill_edits (originalId, newId, editorId, time, diff) VALUES (?, ?, ?, ?, ?)`, [
+        String(id), newId, editorId, nowISO, JSON.stringify(diff)
+      ])
+    })
 
     res.json({ id: newId, title: after.title, amount: after.amount, category: after.category, date: after.date, createdBy: b.createdBy, status: 'pending', steps, currentStepIndex: 0, history: newHistory, images: [], relatedId: String(id) })
   } catch (e) {
-    res.status(500).json({ error: e.message })
+    res.status(e.status || 500).json({ error: e.message })
   }
 })
 
@@ -1024,20 +1654,20 @@ const upload = multer({
 app.post('/api/bill/:id/upload', auth, upload.array('images', 5), async (req, res) => {
   const billId = String(req.params.id || '')
   try {
-    const rows = await all(`SELECT * FROM bills WHERE id = ?`, [billId])
-    const b = rows[0]
-    if (!b) return res.status(404).json({ error: '票据不存在' })
     const files = (req.files || [])
     const rels = files.map(f => {
       const rel = path.relative(UPLOAD_DIR, f.path).replace(/\\+/g, '/')
       return '/uploads/' + rel
     })
-    const existing = b.images ? (Array.isArray(b.images) ? b.images : JSON.parse(b.images || '[]')) : []
-    const merged = existing.concat(rels)
-    b.images = merged
-    await run(`REPLACE INTO bills (id, title, amount, category, date, createdBy, status, steps, currentStepIndex, history, images) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`, [
-      b.id, b.title, b.amount, b.category, b.date, b.createdBy, b.status, JSON.stringify(b.steps || []), b.currentStepIndex, JSON.stringify(b.history || []), JSON.stringify(merged)
-    ])
+    // 读取与追加在同一写事务内，并发上传不会互相覆盖；只更新 images 列
+    const merged = await withTransaction(async () => {
+      const rows = await all(`SELECT images FROM bills WHERE id = ?`, [billId])
+      if (!rows[0]) return null
+      const merged = parseJsonArraySafe(rows[0].images).concat(rels)
+      await run(`UPDATE bills SET images = ? WHERE id = ?`, [JSON.stringify(merged), billId])
+      return merged
+    })
+    if (!merged) return res.status(404).json({ error: '票据不存在' })
     res.json({ ok: true, images: merged })
   } catch (e) {
     res.status(500).json({ error: e.message })
@@ -1047,8 +1677,11 @@ app.post('/api/bill/:id/upload', auth, upload.array('images', 5), async (req, re
 const PORT = process.env.PORT || 6666
 ;(async () => {
   await ensureSchema()
+  await attachCold()
   await seedIfEmpty()
-  app.listen(PORT, () => {
+  await backfillCurrentRole()
+  await migrateHistoryToEvents()
+  const server = app.listen(PORT, () => {
     // 打印本机可访问地址（回环地址 + 局域网 IPv4）
     const ifaces = os.networkInterfaces()
     const addrs = []
@@ -1060,12 +1693,42 @@ const PORT = process.env.PORT || 6666
     const originList = ['http://127.0.0.1:' + PORT].concat(addrs.map(a=>`http://${a}:${PORT}`))
     console.log('Server running on:\n' + originList.join('\n'))
   })
+  // 优雅退出：deploy.py --rolling 切换 upstream 并排空后发送 SIGTERM；停止接受新连接，
+  // 等待进行中的请求（包括上传）完成后关闭数据库再退出，超时（SHUTDOWN_TIMEOUT_MS，默认 30s）则强制退出
+  let shuttingDown = false
+  const shutdown = (signal) => {
+    if (shuttingDown) return
+    shuttingDown = true
+    console.log(`收到 ${signal}，停止接受新连接，等待进行中的请求完成`)
+    server.close(() => db.close(() => process.exit(0)))
+    if (server.closeIdleConnections) {
+      server.closeIdleConnections()
+      setInterval(() => server.closeIdleConnections(), 500).unref()
+    }
+    setTimeout(() => {
+      console.error('等待请求完成超时，强制退出')
+      process.exit(1)
+    }, Number(process.env.SHUTDOWN_TIMEOUT_MS) || 30000).unref()
+  }
+  process.on('SIGTERM', () => shutdown('SIGTERM'))
+  process.on('SIGINT', () => shutdown('SIGINT'))
 })()
 
 app.get('/api/bill/:id/edits', async (req, res) => {
   try {
     const id = String(req.params.id)
-    const rows = await all(`SELECT id, originalId, newId, editorId, time, diff FROM bill_edits WHERE originalId = ? OR newId = ? ORDER BY time DESC`, [id, id])
+    // 热库与冷库的自增 id 各自分配、可能相同，按记录内容去重（archive_cold.py 搬迁间隙两库各有一份时以热库为准）
+    const seen = new Set()
+    const rows = [
+      ...await all(`SELECT id, originalId, newId, editorId, time, diff FROM bill_edits WHERE originalId = ? OR newId = ?`, [id, id]),
+      ...await all(`SELECT id, originalId, newId, editorId, time, diff FROM cold.bill_edits WHERE originalId = ? OR newId = ?`, [id, id]),
+    ].filter(r => {
+      const key = JSON.stringify([r.originalId, r.newId, r.time])
+      if (seen.has(key)) return false
+      seen.add(key)
+      return true
+    })
+      .sort((a, b) => (String(a.time || '') < String(b.time || '') ? 1 : String(a.time || '') > String(b.time || '') ? -1 : 0))
     const parsed = rows.map(r => ({ ...r, diff: (()=>{ try { return JSON.parse(r.diff||'{}') } catch { return {} } })() }))
     res.json(parsed)
   } catch (e) {
@@ -1,16 +1,26 @@
 import { useEffect, useState } from 'react'
-import { getArchivedBills } from '../store/bills'
+import { getArchivedBillsPage } from '../store/bills'
 import { getUsers } from '../store/users'
 
+// 列表只需基本字段，不返回审批记录与图片
+const ARCHIVE_FIELDS = 'id,title,amount,category,date,createdBy'
+
 export default function Archive() {
   const [archived, setArchived] = useState([])
   const [loading, setLoading] = useState(true)
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [idNameMap, setIdNameMap] = useState({})
   useEffect(() => {
     (async () => {
       setLoading(true)
-      const list = await getArchivedBills()
-      setArchived(list)
+      try {
+        const page = await getArchivedBillsPage({ fields: ARCHIVE_FIELDS })
+        setArchived(page.items)
+        setNextCursor(page.nextCursor)
+      } catch {
+        setArchived([])
+      }
       try {
         const users = await getUsers()
         const map = {}
@@ -20,6 +30,18 @@ export default function Archive() {
       setLoading(false)
     })()
   }, [])
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return
+    setLoadingMore(true)
+    try {
+      const page = await getArchivedBillsPage({ fields: ARCHIVE_FIELDS, cursor: nextCursor })
+      setArchived(prev => prev.concat(page.items))
+      setNextCursor(page.nextCursor)
+    } catch {} finally {
+      setLoadingMore(false)
+    }
+  }
   return (
     <div className="space-y-4">
       <div className="rounded-xl overflow-hidden">
@@ -41,6 +63,9 @@ export default function Archive() {
             <div className="text-xs text-gray-500 mt-1">发起人：{idNameMap[b.createdBy] || b.createdBy}</div>
           </div>
         ))}
+        {!loading && nextCursor && (
+          <button onClick={loadMore} disabled={loadingMore} className="w-full text-xs py-2 rounded border border-primary/20 text-primary disabled:opacity-50">{loadingMore ? '加载中...' : '加载更多'}</button>
+        )}
       </div>
     </div>
   )
@@ -1,5 +1,5 @@
 import { useEffect, useState, useRef } from 'react'
-import { getApiBase, getApiHost } from '../store/api'
+import { getApiBase, imageUrl } from '../store/api'
 import { useParams, useNavigate } from 'react-router-dom'
 import { getBillById, approveBill, rejectBill, resubmitBill } from '../store/bills'
 import { getCurrentUser, getUsers } from '../store/users'
@@ -15,7 +15,6 @@ export default function BillDetail() {
   const [isEditing, setIsEditing] = useState(false)
   const firstEditableRef = useRef(null)
   const API_BASE = getApiBase()
-  const API_HOST = getApiHost()
   const user = getCurrentUser()
   const [roleNameMap, setRoleNameMap] = useState({})
   // 注意：Hook 必须在组件顶层声明，不能放在条件返回之后
@@ -218,10 +217,10 @@ export default function BillDetail() {
                 {bill.images.map((img, idx) => (
                   <img
                     key={idx}
-                    src={`${API_HOST}${img}`}
+                    src={imageUrl(img, 'thumb')}
                     alt={`票据图片${idx+1}`}
                     className="w-full h-20 object-cover rounded border cursor-zoom-in"
-                    onClick={() => setViewerSrc(`${API_HOST}${img}`)}
+                    onClick={() => setViewerSrc(imageUrl(img, 'display'))}
                   />
                 ))}
               </div>
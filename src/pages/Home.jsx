@@ -1,18 +1,27 @@
 ﻿import { Link, useNavigate } from 'react-router-dom'
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { getCurrentUser } from '../store/users'
-import { seedBills, getTodosByRole, getBills, deleteBill, approveBill } from '../store/bills'
+import { seedBills, getTodosByRole, getBillsPage, getBillCounts, deleteBill, approveBill } from '../store/bills'
 import { getUsers, getApprovalOrder } from '../store/users'
 import { Accordion, AccordionSummary, AccordionDetails } from '@mui/material'
 import ExpandMoreIcon from '@mui/icons-material/ExpandMore'
 import Drawer from '../components/Drawer'
-import { getApiBase, getApiHost } from '../store/api'
+import { getApiBase, imageUrl } from '../store/api'
 import { getApprovalThresholds } from '../store/settings'
 
+// “我发起的”列表字段：不含审批记录与图片（编号/提交时间取 createdAt）
+const MINE_FIELDS = 'id,title,amount,category,date,createdBy,status,steps,currentStepIndex,createdAt'
+// 筛选项 → 服务端 status 过滤
+const MINE_STATUS = { all: '', pending: 'pending', approved: 'approved,archived', rejected: 'rejected' }
+
 export default function Home() {
   const user = getCurrentUser()
   const [todos, setTodos] = useState([])
   const [mine, setMine] = useState([])
+  const [mineCursor, setMineCursor] = useState(null)
+  const [mineLoading, setMineLoading] = useState(false)
+  const [counts, setCounts] = useState({})
+  const mineSeq = useRef(0)
   const [search, setSearch] = useState('')
   const [mineFilter, setMineFilter] = useState('all')
   const [openIds, setOpenIds] = useState({})
@@ -35,26 +44,8 @@ export default function Home() {
         try {
           todosList = await getTodosByRole(user.role)
         } catch {}
-        const all = await getBills()
-        // Fallback: if server endpoint missing or returns error/empty unexpectedly, compute on client
-        if (!Array.isArray(todosList) || (todosList.length === 0 && Array.isArray(all) && all.length > 0)) {
-          const role = user.role
-          const computed = (all || []).filter(b => {
-            if (!b || b.status !== 'pending') return false
-            let steps = b.steps
-            if (typeof steps === 'string') {
-              try { steps = JSON.parse(steps) } catch { steps = [] }
-            }
-            if (!Array.isArray(steps)) steps = []
-            const idx = Number(b.currentStepIndex) || 0
-            return steps[idx] === role
-          })
-          setTodos(computed)
-        } else {
-          setTodos(todosList)
-        }
-        // mine list
-        setMine(all.filter(b => b.createdBy === user.id))
+        setTodos(Array.isArray(todosList) ? todosList : [])
+        refreshCounts()
         try {
           const users = await getUsers()
           const mapRole = {}
@@ -69,6 +60,30 @@ export default function Home() {
     })()
   }, [])
 
+  // 我发起的：按发起人/状态/关键字在服务端过滤，按 (date, id) 游标分页；cursor 为空时重新加载首页
+  const loadMine = async (cursor = null) => {
+    const u = getCurrentUser()
+    if (!u) return
+    const seq = ++mineSeq.current
+    setMineLoading(true)
+    try {
+      const page = await getBillsPage({ createdBy: u.id, status: MINE_STATUS[mineFilter], q: search.trim(), fields: MINE_FIELDS, cursor })
+      if (seq !== mineSeq.current) return // 已有更新的筛选条件
+      setMine(prev => cursor ? prev.concat(page.items) : page.items)
+      setMineCursor(page.nextCursor)
+    } catch {} finally {
+      if (seq === mineSeq.current) setMineLoading(false)
+    }
+  }
+  const refreshCounts = () => {
+    const u = getCurrentUser()
+    if (u) getBillCounts(u.id).then(setCounts).catch(() => {})
+  }
+  useEffect(() => {
+    const t = setTimeout(() => { loadMine() }, search ? 300 : 0)
+    return () => clearTimeout(t)
+  }, [mineFilter, search])
+
   // 角色显示为形式名：approver1/2/3 显示为“一级/二级/三级审批”，会计/管理员分别显示对应中文
   const displayRoleLabel = (role) => {
     if (!role) return ''
@@ -86,22 +101,18 @@ export default function Home() {
       const u = getCurrentUser()
       if (!u) return
       try {
-        const [order, thresholds, all] = await Promise.all([
+        const [order, thresholds] = await Promise.all([
           getApprovalOrder().catch(() => []),
           getApprovalThresholds().catch(() => ({ approver1:0, approver2:0, approver3:0 })),
-          getBills().catch(() => [])
         ])
         const baseHasRole = Array.isArray(order) && order.includes(u.role)
         setIsApprover(!!baseHasRole)
-        if (baseHasRole) {
-          const limit = Number(thresholds[u.role]) || 0
-          const skippedList = (all || []).filter(b => {
-            if (b.status !== 'pending') return false
-            const steps = Array.isArray(b.steps) ? b.steps : []
-            // 若流程中不包含该审批角色，且存在阈值配置，则视为因阈值被跳过
-            return limit > 0 && !steps.includes(u.role)
-          })
-          setSkipped(skippedList)
+        const limit = baseHasRole ? (Number(thresholds[u.role]) || 0) : 0
+        if (limit > 0) {
+          // 若流程中不包含该审批角色，且存在阈值配置，则视为因阈值被跳过（服务端过滤，最多取一页）
+          const page = await getBillsPage({ status: 'pending', excludeStep: u.role, limit: 200 }).catch(() => ({ items: [], nextCursor: null }))
+          setSkipped(page.items)
+          setSkippedMore(!!page.nextCursor)
         } else {
           setSkipped([])
         }
@@ -112,8 +123,8 @@ export default function Home() {
   // 仅在 effect 中获取当前用户用于初始化
 
   const todoCount = todos.length
-  const myInProgressCount = mine.filter(b => b.status === 'pending').length
-  const myCompletedCount = mine.filter(b => b.status === 'approved' || b.status === 'archived').length
+  const myInProgressCount = Number(counts.pending) || 0
+  const myCompletedCount = (Number(counts.approved) || 0) + (Number(counts.archived) || 0)
 
   const matches = (b) => {
     const q = search.trim().toLowerCase()
@@ -127,13 +138,7 @@ export default function Home() {
   }
 
   const filteredTodos = todos.filter(matches)
-  const filteredMine = mine.filter(b => !hiddenIds.includes(b.id)).filter(b => {
-    if (mineFilter === 'all') return matches(b)
-    if (mineFilter === 'pending') return b.status === 'pending' && matches(b)
-    if (mineFilter === 'approved') return (b.status === 'approved' || b.status === 'archived') && matches(b)
-    if (mineFilter === 'rejected') return b.status === 'rejected' && matches(b)
-    return matches(b)
-  })
+  const filteredMine = mine.filter(b => !hiddenIds.includes(b.id))
 
   const statusText = (s) => {
     if (s === 'pending') return '审批中'
@@ -157,6 +162,7 @@ export default function Home() {
   // 免审抽屉（审查员视角）
   const [skippedOpen, setSkippedOpen] = useState(false)
   const [skipped, setSkipped] = useState([])
+  const [skippedMore, setSkippedMore] = useState(false)
   const [isApprover, setIsApprover] = useState(false)
   // 图片预览
   const [viewerSrc, setViewerSrc] = useState(null)
@@ -166,6 +172,7 @@ export default function Home() {
     try {
       await deleteBill(b.id)
       setMine(prev => prev.filter(x => x.id !== b.id))
+      refreshCounts()
       setConfirmDeleteId(null)
       alert('删除成功')
     } catch (e) {
@@ -200,8 +207,8 @@ export default function Home() {
       const cu = getCurrentUser()
       const todosList = await getTodosByRole(cu.role)
       setTodos(todosList)
-      const all = await getBills()
-      setMine(all.filter(x => x.createdBy === cu.id))
+      loadMine()
+      refreshCounts()
     } finally {
       setBatchProgress(prev => ({ ...prev, [key]: { ...prev[key], running: false } }))
       alert('本批次审批已完成（含不可审批的项）')
@@ -213,6 +220,10 @@ export default function Home() {
     return `${d.getFullYear()}-${pad(d.getMonth()+1)}-${pad(d.getDate())} ${pad(d.getHours())}:${pad(d.getMinutes())}`
   }
   const getCreateDate = (b) => {
+    if (b.createdAt) {
+      const d = new Date(b.createdAt)
+      if (!isNaN(d.valueOf())) return d
+    }
     let hist = Array.isArray(b.history) ? b.history : []
     if (!Array.isArray(hist)) {
       try { hist = JSON.parse(b.history || '[]') } catch { hist = [] }
@@ -251,7 +262,7 @@ export default function Home() {
     try {
       let hist = Array.isArray(b.history) ? b.history : []
       if (!Array.isArray(hist)) { try { hist = JSON.parse(b.history || '[]') } catch { hist = [] } }
-      const t = hist.find(h => h && h.action === 'create' && h.time)?.time
+      const t = b.createdAt || hist.find(h => h && h.action === 'create' && h.time)?.time
       const pad = (n) => String(n).padStart(2, '0')
       if (t) {
         const d = new Date(t)
@@ -409,7 +420,7 @@ return (
             <button
               onClick={() => setSkippedOpen(o => !o)}
               className="px-2 py-1 rounded bg-white border border-primary/30 text-xs"
-            >{skippedOpen ? '收起' : `展开（${skipped.length}）`}</button>
+            >{skippedOpen ? '收起' : `展开（${skipped.length}${skippedMore ? '+' : ''}）`}</button>
           </div>
               {skippedOpen && (
                 <div className="mt-[2px] space-y-[2px]">
@@ -445,7 +456,7 @@ return (
               <option value="bill">按票据日期</option>
             </select>
             <button onClick={() => setOlderOpen(true)} className="text-xs px-2 py-1 rounded bg-primary/10 text-primary border border-primary/20">
-              本周前（{olderMine.length}）
+              本周前（{olderMine.length}{mineCursor ? '+' : ''}）
             </button>
           </div>
         </div>
@@ -485,7 +496,7 @@ return (
             </div>
           ))}
           {recentMine.length === 0 && (
-            <div className="text-xs text-gray-500">本周内暂无发起的票据（旧单请打开上方抽屉查看）</div>
+            <div className="text-xs text-gray-500">{mineLoading ? '加载中...' : '本周内暂无发起的票据（旧单请打开上方抽屉查看）'}</div>
           )}
         </div>
       </section>
@@ -513,7 +524,6 @@ return (
               let imgs = Array.isArray(drawerBill.images) ? drawerBill.images : []
               if (!Array.isArray(imgs)) { try { imgs = JSON.parse(drawerBill.images || '[]') } catch { imgs = [] } }
               const API_BASE = getApiBase()
-              const API_HOST = getApiHost()
               return imgs.length > 0 ? (
                 <div>
                   <div className="text-xs text-gray-700 mb-[2px]">附件图片</div>
@@ -521,10 +531,10 @@ return (
                     {imgs.map((u, i) => (
                       <img
                         key={i}
-                        src={`${API_HOST}${u}`}
+                        src={imageUrl(u, 'thumb')}
                         alt={`票据图片${i+1}`}
                         className="w-full h-20 object-cover rounded border cursor-zoom-in"
-                        onClick={() => setViewerSrc(`${API_HOST}${u}`)}
+                        onClick={() => setViewerSrc(imageUrl(u, 'display'))}
                       />
                     ))}
                   </div>
@@ -599,6 +609,9 @@ return (
               </div>
             </div>
           ))}
+          {mineCursor && (
+            <button onClick={() => loadMine(mineCursor)} disabled={mineLoading} className="w-full text-xs py-2 rounded border border-primary/20 text-primary disabled:opacity-50">{mineLoading ? '加载中...' : '加载更多'}</button>
+          )}
         </div>
       </Drawer>
       </div>
@@ -1,5 +1,5 @@
 ﻿import { useEffect, useState } from 'react'
-import { getApiBase, getApiHost } from '../store/api'
+import { getApiBase, imageUrl } from '../store/api'
 import { createBill } from '../store/bills'
 import { getReasons, findDefaultSelection } from '../store/reasons'
 import { useNavigate } from 'react-router-dom'
@@ -18,7 +18,6 @@ export default function NewBill() {
   const [uploadedImages, setUploadedImages] = useState([])
 
 const API_BASE = getApiBase()
-const API_HOST = getApiHost()
 
   // 加载事由分级与默认选择
   useEffect(() => {
@@ -224,7 +223,7 @@ const API_HOST = getApiHost()
               <div className="text-xs text-gray-600 mb-[2px]">已上传附件</div>
               <div className="grid grid-cols-3 gap-[2px]">
                 {uploadedImages.map((img, i) => (
-                  <img key={i} src={`${API_HOST}${img}`} alt={`已上传${i+1}`} className="w-full h-20 object-cover rounded border" />
+                  <img key={i} src={imageUrl(img, 'thumb')} alt={`已上传${i+1}`} className="w-full h-20 object-cover rounded border" />
                 ))}
               </div>
             </div>
@@ -1,12 +1,14 @@
 import { useEffect, useMemo, useState } from 'react'
-import { getArchivedBills } from '../store/bills'
-import { getUsers } from '../store/users'
-import * as XLSX from 'xlsx'
+import { exportBillsUrl, getStatsSummary } from '../store/bills'
+
+const EMPTY_SUMMARY = { monthly: [], people: [], reasons: [], totals: { count: 0, total: 0 } }
 
 export default function Stats({ embedded = false }) {
-  const [archived, setArchived] = useState([])
+  // 服务端汇总表（/api/stats/summary），数据量与归档票据数量无关
+  const [summary, setSummary] = useState(EMPTY_SUMMARY)
   const [loading, setLoading] = useState(true)
-  const [idNameMap, setIdNameMap] = useState({})
+  const [exportFrom, setExportFrom] = useState('')
+  const [exportTo, setExportTo] = useState('')
 
   // 导出选项（默认全选）
   const BILL_COLUMNS = [
@@ -29,88 +31,50 @@ export default function Stats({ embedded = false }) {
     (async () => {
       setLoading(true)
       try {
-        const list = await getArchivedBills()
-        setArchived(Array.isArray(list) ? list : [])
-        const users = await getUsers().catch(()=>[])
-        const map = {}
-        for (const u of users) map[u.id] = u.name
-        setIdNameMap(map)
+        const data = await getStatsSummary()
+        setSummary({ ...EMPTY_SUMMARY, ...data })
       } catch {
-        setArchived([])
+        setSummary(EMPTY_SUMMARY)
       } finally {
         setLoading(false)
       }
     })()
   }, [])
 
-  // 月度合计: 以票据日期 b.date 为基准，聚合已归档
-  const monthlyTotals = useMemo(() => {
-    const agg = {}
-    for (const b of archived) {
-      if (!b || b.status !== 'archived') continue
-      const d = new Date(b.date)
-      if (isNaN(d.valueOf())) continue
-      const k = `${d.getFullYear()}-${String(d.getMonth()+1).padStart(2,'0')}`
-      const amt = Number(b.amount) || 0
-      agg[k] = (agg[k] || 0) + amt
-    }
-    const entries = Object.entries(agg).sort((a,b)=> (a[0] < b[0] ? 1 : -1))
-    return entries
-  }, [archived])
-
-  // 报销人分布（饼图数据）：以 createdBy 聚合已归档金额
+  const hasData = summary.totals.count > 0
+
+  // 报销人姓名：汇总接口已关联 users 表
+  const idNameMap = useMemo(() => {
+    const map = {}
+    for (const p of summary.people) if (p.name) map[p.createdBy] = p.name
+    return map
+  }, [summary])
+
+  // 月度合计（按月份倒序）
+  const monthlyTotals = useMemo(() => summary.monthly.map(m => [m.month, Number(m.total) || 0]), [summary])
+
+  // 报销人分布（饼图数据，按金额倒序）
   const byPersonTotals = useMemo(() => {
-    const agg = {}
-    for (const b of archived) {
-      if (!b || b.status !== 'archived') continue
-      const key = b.createdBy || '未知'
-      const amt = Number(b.amount) || 0
-      agg[key] = (agg[key] || 0) + amt
-    }
-    const entries = Object.entries(agg).sort((a,b)=> b[1]-a[1])
-    const total = entries.reduce((sum, [,v])=> sum+v, 0)
-    return { entries, total }
-  }, [archived])
+    const entries = summary.people.map(p => [p.createdBy, Number(p.total) || 0])
+    return { entries, total: Number(summary.totals.total) || 0 }
+  }, [summary])
 
   const fmtCurrency = (n) => `¥${(Number(n)||0).toFixed(2)}`
 
-  // 导出 Excel（按导出选项）
-  const exportExcel = () => {
-    try {
-      const wb = XLSX.utils.book_new()
-      // 归档票据明细（按列选择）
-      const billsRows = archived
-        .filter(b => b && b.status === 'archived')
-        .map(b => {
-          const row = {}
-          for (const c of BILL_COLUMNS) {
-            if (!exportSel[c.key]) continue
-            let val = b[c.key]
-            if (c.key === 'amount') val = Number(val) || 0
-            if (c.key === 'createdBy') val = idNameMap[b.createdBy] || b.createdBy
-            row[c.label] = val
-          }
-          return row
-        })
-      const wsBills = XLSX.utils.json_to_sheet(billsRows)
-      XLSX.utils.book_append_sheet(wb, wsBills, '归档票据')
-
-      // 按月汇总
-      const monthlyRows = monthlyTotals.map(([month, total]) => ({ 月份: month, 报销总额: Number(total) || 0 }))
-      const wsMonthly = XLSX.utils.json_to_sheet(monthlyRows)
-      XLSX.utils.book_append_sheet(wb, wsMonthly, '按月汇总')
-
-      // 按人汇总
-      const personRows = byPersonTotals.entries.map(([uid, total]) => ({ 报销人: idNameMap[uid] || uid, 报销总额: Number(total) || 0 }))
-      const wsPerson = XLSX.utils.json_to_sheet(personRows)
-      XLSX.utils.book_append_sheet(wb, wsPerson, '按人汇总')
-
-      const now = new Date()
-      const fname = `财务统计_${now.getFullYear()}${String(now.getMonth()+1).padStart(2,'0')}${String(now.getDate()).padStart(2,'0')}.xlsx`
-      XLSX.writeFile(wb, fname)
-    } catch (e) {
-      alert(e?.message || '导出失败')
-    }
+  // 导出（按导出选项与日期范围）：由服务端分页查询并流式生成文件，浏览器直接下载
+  const exportFile = (format) => {
+    const url = exportBillsUrl({
+      format,
+      columns: BILL_COLUMNS.filter(c => exportSel[c.key]).map(c => c.key),
+      from: exportFrom,
+      to: exportTo,
+    })
+    const a = document.createElement('a')
+    a.href = url
+    a.download = ''
+    document.body.appendChild(a)
+    a.click()
+    a.remove()
   }
 
   // 简易环形饼图：使用多个圆弧段（stroke-dasharray/dashoffset）绘制
@@ -165,7 +129,7 @@ export default function Stats({ embedded = false }) {
       )}
 
       {/* 工具栏：导出 + 选项 */}
-      {!loading && archived.length > 0 && (
+      {!loading && hasData && (
         <div className="flex items-center justify-between gap-3">
           <div className="flex items-center gap-2">
             <button onClick={() => setShowExportOpts(v=>!v)} className="text-xs px-3 py-1 rounded border border-primary/20">导出选项</button>
@@ -179,21 +143,30 @@ export default function Stats({ embedded = false }) {
                     </label>
                   ))}
                 </div>
+                <div className="flex items-center gap-1 mt-2">
+                  <span>票据日期</span>
+                  <input type="date" className="border rounded px-1" value={exportFrom} onChange={e=>setExportFrom(e.target.value)} />
+                  <span>至</span>
+                  <input type="date" className="border rounded px-1" value={exportTo} onChange={e=>setExportTo(e.target.value)} />
+                </div>
               </div>
             )}
           </div>
-          <button onClick={exportExcel} className="text-xs px-3 py-1 rounded bg-primary text-black border border-primary/20">导出Excel</button>
+          <div className="flex items-center gap-2">
+            <button onClick={() => exportFile('csv')} className="text-xs px-3 py-1 rounded border border-primary/20">导出CSV</button>
+            <button onClick={() => exportFile('xlsx')} className="text-xs px-3 py-1 rounded bg-primary text-black border border-primary/20">导出Excel</button>
+          </div>
         </div>
       )}
 
       {/* 加载与空态 */}
       {loading && <div className="text-xs text-gray-500">加载中...</div>}
-      {!loading && archived.length === 0 && (
+      {!loading && !hasData && (
         <div className="text-xs text-gray-500">暂无归档数据，统计为空。</div>
       )}
 
       {/* 月度合计表格 */}
-      {!loading && archived.length > 0 && (
+      {!loading && hasData && (
         <section className="bg-white rounded-lg border border-primary/20 p-3">
           <div className="flex items-center justify-between mb-2">
             <h3 className="text-sm text-gray-700">月度报销总额</h3>
@@ -225,7 +198,7 @@ export default function Stats({ embedded = false }) {
       )}
 
       {/* 报销人饼图 */}
-      {!loading && archived.length > 0 && (
+      {!loading && hasData && (
         <section className="bg-white rounded-lg border border-primary/20 p-3">
           <div className="flex items-center justify-between mb-2">
             <h3 className="text-sm text-gray-700">按报销人分布</h3>
@@ -249,6 +222,38 @@ export default function Stats({ embedded = false }) {
           )}
         </section>
       )}
+
+      {/* 按事由汇总 */}
+      {!loading && hasData && summary.reasons.length > 0 && (
+        <section className="bg-white rounded-lg border border-primary/20 p-3">
+          <div className="flex items-center justify-between mb-2">
+            <h3 className="text-sm text-gray-700">按事由汇总</h3>
+            <div className="text-xs text-gray-500">仅统计已归档</div>
+          </div>
+          <div className="overflow-auto">
+            <table className="w-full text-sm">
+              <thead>
+                <tr className="text-left text-xs text-gray-500">
+                  <th className="py-2 pr-3">分类</th>
+                  <th className="py-2 pr-3">项目</th>
+                  <th className="py-2 pr-3">张数</th>
+                  <th className="py-2">报销总额</th>
+                </tr>
+              </thead>
+              <tbody>
+                {summary.reasons.map(r => (
+                  <tr key={`${r.category}/${r.item}`} className="border-t">
+                    <td className="py-2 pr-3">{r.category}</td>
+                    <td className="py-2 pr-3">{r.item}</td>
+                    <td className="py-2 pr-3">{r.count}</td>
+                    <td className="py-2">{fmtCurrency(r.total)}</td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          </div>
+        </section>
+      )}
     </div>
   )
 }
\ No newline at end of file
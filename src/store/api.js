@@ -21,4 +21,10 @@ export function getApiBase() {
 export function getApiHost() {
   const base = getApiBase()
   return base.replace(/\/api$/, '')
-}
\ No newline at end of file
+}
+
+// 上传图片地址；variant 为 'thumb' | 'display' 时请求预生成的缩略图（未生成时服务端回退原图）
+export function imageUrl(path, variant) {
+  const url = `${getApiHost()}${path}`
+  return variant ? `${url}?v=${variant}` : url
+}
@@ -9,8 +9,8 @@ function authHeaders(base = {}) {
 }
 
 export async function seedBills() {
-  const list = await getBills()
-  if (list.length > 0) return
+  const { items } = await getBillsPage({ limit: 1, fields: 'id' })
+  if (items.length > 0) return
   const steps = [...await getApprovalOrder(), 'accountant']
   const sample = [
     { id: '1', title: '差旅报销', amount: 1000, category: '差旅', date: '2025-10-01', createdBy: 'admin', status: 'pending', steps, currentStepIndex: 0, history: [] },
@@ -25,12 +25,56 @@ export async function seedBills() {
   }
 }
 
-export function getBills() {
-  return fetch(`${API_BASE}/bills`).then(r => r.json())
+// 列表分页：返回 { items, nextCursor }，将 nextCursor 作为 cursor 传回获取下一页（null 表示已到末页）
+// 过滤：createdBy / status（逗号分隔）/ from / to / q / excludeStep；fields 为返回列（逗号分隔）
+function billsQuery(opts) {
+  const params = new URLSearchParams()
+  for (const [k, v] of Object.entries(opts || {})) {
+    if (v !== undefined && v !== null && v !== '') params.set(k, Array.isArray(v) ? v.join(',') : String(v))
+  }
+  return params.toString()
+}
+
+function fetchBillsPage(path, opts) {
+  return fetch(`${API_BASE}${path}?${billsQuery(opts)}`).then(async (r) => {
+    if (!r.ok) throw new Error(`加载票据失败(${r.status})`)
+    const data = await r.json()
+    return { items: Array.isArray(data.items) ? data.items : [], nextCursor: data.nextCursor || null }
+  })
+}
+
+export function getBillsPage(opts = {}) {
+  return fetchBillsPage('/bills', opts)
+}
+
+export function getArchivedBillsPage(opts = {}) {
+  return fetchBillsPage('/bills/archived', opts)
+}
+
+// 各状态票据数 { pending: n, archived: n, ... }
+export function getBillCounts(createdBy) {
+  return fetch(`${API_BASE}/bills/counts?${billsQuery({ createdBy })}`).then(async (r) => {
+    if (!r.ok) return {}
+    return r.json()
+  })
+}
+
+// 归档统计汇总（月度 / 报销人 / 事由），只含聚合结果
+export function getStatsSummary() {
+  return fetch(`${API_BASE}/stats/summary`).then(async (r) => {
+    if (!r.ok) throw new Error(`加载统计失败(${r.status})`)
+    return r.json()
+  })
 }
 
-export function getArchivedBills() {
-  return fetch(`${API_BASE}/bills/archived`).then(r => r.json())
+// 服务端流式导出地址（浏览器直接下载，不在前端构建工作簿）
+export function exportBillsUrl({ format = 'xlsx', columns = [], from = '', to = '', sheet = '' } = {}) {
+  const params = new URLSearchParams({ format })
+  if (columns.length) params.set('columns', columns.join(','))
+  if (from) params.set('from', from)
+  if (to) params.set('to', to)
+  if (sheet) params.set('sheet', sheet)
+  return `${API_BASE}/export/bills?${params}`
 }
 
 export function getTodosByRole(role) {
@@ -81,8 +125,7 @@ export async function createBill({ title, amount, category, date }) {
 }
 
 export async function getTodosForRole(role) {
-  const all = await getBills()
-  return all.filter(b => b.status === 'pending' && b.steps[b.currentStepIndex] === role)
+  return getTodosByRole(role)
 }
 
 export async function approveBill(id, role) {
@@ -1,19 +1,21 @@
 #!/usr/bin/env python3
+import argparse
 import os
 import sys
-import time
 
 # 复用 deploy.py 中的工具与启动函数
 try:
     from deploy import (
         ensure_node,
-        start_backend,
+        start_backend_instance,
         start_frontend,
-        read_pid,
-        is_running,
-        kill_pidfile,
-        SERVER_PID,
-        FRONT_PID,
+        backend_ports,
+        active_color,
+        COLOR_PORTS,
+        backend_instances,
+        frontend_instance,
+        stop_instances,
+        wait_ready,
         build_frontend,
     )
 except Exception as e:
@@ -24,6 +26,9 @@ ROOT = os.path.dirname(os.path.abspath(__file__))
 
 
 def main():
+    parser = argparse.ArgumentParser(description='启动后端与前端（由 supervisor.py 托管，崩溃后自动重启；已运行的实例会被跳过）。')
+    parser.add_argument('--workers', type=int, default=1, help='后端实例数（默认 1，端口 6666 起连续分配）')
+    args = parser.parse_args()
     os.chdir(ROOT)
 
     # 若前端构建产物缺失，自动构建（默认 API 指向外网后端）
@@ -33,32 +38,35 @@ def main():
         ensure_node()
         build_frontend(api_base='http://8.163.7.207:6666/api')
 
-    # 清理无效的 PID 文件
-    spid = read_pid(SERVER_PID)
-    if spid and not is_running(spid):
-        kill_pidfile(SERVER_PID, '后端')
-        spid = None
-    fpid = read_pid(FRONT_PID)
-    if fpid and not is_running(fpid):
-        kill_pidfile(FRONT_PID, '前端')
-        fpid = None
+    # 清理升级前遗留、进程已退出的 PID 文件
+    stale = [i for i in backend_instances() if i['pidfile'] and i['state'] != 'running']
+    front = frontend_instance()
+    if front and front['pidfile'] and front['state'] != 'running':
+        stale.append({**front, 'port': '前端'})
+        front = None
+    if stale:
+        stop_instances(stale)
+    running = {i['port'] for i in backend_instances() if i['state'] == 'running'}
 
-    # 先启动后端（固定 6666）
-    if spid and is_running(spid):
-        print(f"后端已运行，PID={spid}")
-    else:
+    # 先启动后端（6666 起，每个实例一个端口；蓝绿部署切换到 green 后为 6766 起），与前端一起并行等待就绪
+    ports = backend_ports(args.workers, COLOR_PORTS[active_color()])
+    services = []
+    for port in ports:
+        if port in running:
+            print(f"后端:{port} 已运行")
+            continue
         ensure_node()
-        start_backend()
-        # 给后端预留片刻启动时间
-        time.sleep(0.8)
+        services.append(start_backend_instance(port))
 
     # 再启动前端（固定 60）
-    if fpid and is_running(fpid):
-        print(f"前端已运行，PID={fpid}")
+    if front and front['state'] == 'running':
+        print(f"前端已运行，PID={front['pid']}")
     else:
-        start_frontend(port=60)
+        services.append(start_frontend(port=60, wait=False))
+    wait_ready(services)
 
-    print('启动完成：后端 6666、前端 60（build_tmp）。若使用花生壳/反向代理，请将 60 映射到当前前端进程或通过 Nginx 配置对外访问。')
+    back_desc = str(ports[0]) if len(ports) == 1 else f'{ports[0]}-{ports[-1]}（{len(ports)} 个实例）'
+    print(f'启动完成：后端 {back_desc}、前端 60（build_tmp）。若使用花生壳/反向代理，请将 60 映射到当前前端进程或通过 Nginx 配置对外访问。')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+归档统计汇总表维护（stats_monthly / stats_person / stats_reason）。
+
+后端在票据归档时（/api/bill/approve 最后一步）增量累加汇总表，首次启动时自动回填；
+/api/stats/summary 只读汇总表，统计页面的数据量与归档票据总数无关。
+本工具用于在手工修正数据、恢复备份或迁移归档后全量重建，以及核对汇总表与 bills 是否一致。
+归档票据包括 archive_cold.py 移入冷库（同目录 cold.db）的部分，存在时自动 ATTACH 一并统计。
+
+用法：
+  python3 stats.py rebuild        # 在一个写事务内全量重建（后端运行中也可执行）
+  python3 stats.py check          # 对比汇总表与按 bills 实时聚合的结果，不一致时退出码为 1
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(ROOT, 'server', 'data', 'app.db')
+COLD_NAME = 'cold.db'
+
+# 统计口径与 server/index.cjs 中的 STATS_*_SQL 保持一致
+MONTH_SQL = "CASE WHEN date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]*' THEN substr(date, 1, 7) END"
+PERSON_SQL = "COALESCE(NULLIF(createdBy, ''), '未知')"
+CATEGORY_SQL = "COALESCE(NULLIF(category, ''), '其他')"
+ITEM_SQL = ("COALESCE(NULLIF(CASE WHEN instr(title, ' - ') > 0 THEN substr(title, 1, instr(title, ' - ') - 1) "
+            "ELSE title END, ''), '未分类')")
+CENTS_SQL = "CAST(ROUND(COALESCE(amount, 0) * 100) AS INTEGER)"
+# 全部归档票据：热库，以及已 ATTACH 的冷库（与后端 ARCHIVED_BILLS_SQL 一致）
+HOT_ARCHIVED = "SELECT date, amount, createdBy, category, title FROM main.bills WHERE status = 'archived'"
+COLD_ARCHIVED = "SELECT date, amount, createdBy, category, title FROM cold.bills WHERE status = 'archived'"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats_monthly (
+  month TEXT PRIMARY KEY,
+  count INTEGER NOT NULL DEFAULT 0,
+  amountCents INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS stats_person (
+  createdBy TEXT PRIMARY KEY,
+  count INTEGER NOT NULL DEFAULT 0,
+  amountCents INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS stats_reason (
+  category TEXT NOT NULL,
+  item TEXT NOT NULL,
+  count INTEGER NOT NULL DEFAULT 0,
+  amountCents INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (category, item)
+);
+"""
+
+# 表名 → (键列, 按归档票据聚合的 SELECT 模板，{src} 为票据来源子查询)
+TABLES = {
+    'stats_monthly': (('month',), f"SELECT {MONTH_SQL} AS m, COUNT(*), SUM({CENTS_SQL}) FROM {{src}} "
+                                  f"WHERE m IS NOT NULL GROUP BY m"),
+    'stats_person': (('createdBy',), f"SELECT {PERSON_SQL} AS p, COUNT(*), SUM({CENTS_SQL}) FROM {{src}} GROUP BY p"),
+    'stats_reason': (('category', 'item'), f"SELECT {CATEGORY_SQL} AS c, {ITEM_SQL} AS i, COUNT(*), SUM({CENTS_SQL}) "
+                                           f"FROM {{src}} GROUP BY c, i"),
+}
+
+
+def connect(db_path):
+    if not os.path.isfile(db_path):
+        raise RuntimeError(f"数据库不存在：{db_path}")
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA busy_timeout = 30000')
+    cold = os.path.join(os.path.dirname(db_path), COLD_NAME)
+    if os.path.isfile(cold):
+        conn.execute('ATTACH DATABASE ? AS cold', (cold,))
+    return conn
+
+
+def archived_source(conn):
+    attached = any(r[1] == 'cold' for r in conn.execute('PRAGMA database_list'))
+    has_bills = attached and conn.execute("SELECT 1 FROM cold.sqlite_master WHERE type = 'table' AND name = 'bills'").fetchone()
+    return f'({HOT_ARCHIVED} UNION ALL {COLD_ARCHIVED})' if has_bills else f'({HOT_ARCHIVED})'
+
+
+def rebuild(conn):
+    """全量重建汇总表，返回 {表名: 行数}。"""
+    conn.executescript(SCHEMA)
+    counts = {}
+    src = archived_source(conn)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for table, (keys, select) in TABLES.items():
+            conn.execute(f'DELETE FROM {table}')
+            cols = ', '.join(keys + ('count', 'amountCents'))
+            conn.execute(f'INSERT INTO {table} ({cols}) {select.format(src=src)}')
+            counts[table] = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        conn.execute("REPLACE INTO settings (key, value) VALUES ('statsBuiltAt', ?)",
+                     (time.strftime('%Y-%m-%dT%H:%M:%S'),))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return counts
+
+
+def check(conn):
+    """返回不一致列表 [(表名, 键, 汇总表中的 (count, cents), 实际的 (count, cents))]。"""
+    conn.executescript(SCHEMA)
+    src = archived_source(conn)
+    conn.execute('BEGIN')  # 在同一读快照内比较
+    try:
+        diffs = []
+        for table, (keys, select) in TABLES.items():
+            cols = ', '.join(keys + ('count', 'amountCents'))
+            stored = {tuple(r[:-2]): tuple(r[-2:]) for r in conn.execute(f'SELECT {cols} FROM {table}')}
+            actual = {tuple(r[:-2]): tuple(r[-2:]) for r in conn.execute(select.format(src=src))}
+            for key in sorted(set(stored) | set(actual), key=str):
+                if stored.get(key) != actual.get(key):
+                    diffs.append((table, key, stored.get(key), actual.get(key)))
+        return diffs
+    finally:
+        conn.execute('COMMIT')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重建或核对归档统计汇总表。')
+    parser.add_argument('command', choices=('rebuild', 'check'))
+    parser.add_argument('--db', default=DEFAULT_DB, help='数据库路径（默认 server/data/app.db）')
+    args = parser.parse_args()
+
+    conn = connect(os.path.abspath(args.db))
+    try:
+        if args.command == 'rebuild':
+            started = time.monotonic()
+            counts = rebuild(conn)
+            print(f"[stats] 已重建（{time.monotonic() - started:.2f}s）："
+                  + '，'.join(f"{t} {n} 行" for t, n in counts.items()))
+        else:
+            diffs = check(conn)
+            for table, key, stored, actual in diffs[:50]:
+                print(f"  {table} {'/'.join(map(str, key))}：汇总表 {stored}，实际 {actual}")
+            if diffs:
+                print(f"[stats] 汇总表与 bills 不一致 {len(diffs)} 处，可执行 python3 stats.py rebuild")
+                sys.exit(1)
+            print('[stats] 汇总表与 bills 一致')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"统计表处理失败：{e}", file=sys.stderr)
+        sys.exit(1)
@@ -1,14 +1,37 @@
 #!/usr/bin/env python3
+"""
+运行状态与资源监控（仅依赖标准库）。
+
+用法：
+  python3 status.py                    # 进程状态 + 资源快照
+  python3 status.py --watch [-i 2]     # 持续刷新的表格
+  python3 status.py --json             # JSON 快照
+  python3 status.py --prometheus       # Prometheus 文本格式（输出到 stdout）
+  python3 status.py --prometheus --output /var/lib/node_exporter/textfile/handv.prom
+                                        # 供 node_exporter textfile collector 采集（原子写入）
+
+资源数据读取自 /proc/<pid>（CPU%、RSS、线程数、打开的 FD、运行时长），
+并测量 /api/ping 往返耗时与 server/data/app.db（含 WAL）及 uploads 目录大小；
+后端实例标注蓝绿颜色（deploy.py --rolling），表格中 * 为 Nginx 当前指向的实例；
+进程由 supervisor.py 托管，状态与重启次数取自其控制套接字，PID 经 /proc 启动时间与命令行校验。
+"""
+import argparse
+import json
 import os
 import sys
+import time
+import urllib.request
 
 try:
     from deploy import (
-        read_pid,
-        is_running,
-        SERVER_PID,
-        FRONT_PID,
-        SERVER_LOG,
+        print_backend_status,
+        print_frontend_status,
+        backend_instances,
+        frontend_instance,
+        backend_ports,
+        load_backend_state,
+        port_color,
+        COLOR_PORTS,
         FRONT_LOG,
     )
 except Exception as e:
@@ -16,21 +39,314 @@ except Exception as e:
     sys.exit(1)
 
 ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, 'server', 'data')
+DB_PATH = os.path.join(DATA_DIR, 'app.db')
+UPLOAD_DIR = os.path.join(DATA_DIR, 'uploads')
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def read_proc(pid):
+    """读取 /proc/<pid> 的原始计数；进程不存在或非 Linux 时返回 None。"""
+    base = f'/proc/{int(pid)}'
+    try:
+        with open(f'{base}/stat') as f:
+            stat = f.read()
+        # comm 字段可能含空格，以最后一个 ')' 之后的字段为准
+        fields = stat[stat.rindex(')') + 2:].split()
+        with open('/proc/uptime') as f:
+            sys_uptime = float(f.read().split()[0])
+        threads = rss = None
+        with open(f'{base}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    threads = int(line.split()[1])
+                elif line.startswith('VmRSS:'):
+                    rss = int(line.split()[1]) * 1024
+        try:
+            fds = len(os.listdir(f'{base}/fd'))
+        except OSError:
+            fds = None
+    except (OSError, ValueError, IndexError):
+        return None
+    utime, stime = int(fields[11]), int(fields[12])
+    start_ticks = int(fields[19])
+    if rss is None:
+        rss = int(fields[21]) * PAGE_SIZE
+    return {
+        'cpu_seconds': (utime + stime) / CLK_TCK,
+        'rss_bytes': rss,
+        'threads': threads if threads is not None else int(fields[17]),
+        'open_fds': fds,
+        'uptime_seconds': max(0.0, sys_uptime - start_ticks / CLK_TCK),
+        'sampled_at': time.monotonic(),
+    }
+
+
+def cpu_percent(prev, cur):
+    if not prev or not cur:
+        return None
+    wall = cur['sampled_at'] - prev['sampled_at']
+    if wall <= 0:
+        return None
+    return max(0.0, (cur['cpu_seconds'] - prev['cpu_seconds']) / wall * 100.0)
+
+
+def ping(port, timeout=2.0):
+    """返回 /api/ping 往返耗时（秒），失败返回 None。"""
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{int(port)}/api/ping', timeout=timeout) as resp:
+            resp.read()
+            if resp.status != 200:
+                return None
+    except Exception:
+        return None
+    return time.perf_counter() - started
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def dir_usage(path):
+    """os.scandir 递归统计目录大小与文件数。"""
+    total = files = 0
+    stack = [path]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+                        files += 1
+                except OSError:
+                    continue
+    return total, files
+
+
+def list_processes():
+    """返回 [(服务名, 标签, 端口 或 None, 实例信息 或 None)]；实例信息见 deploy.backend_instances()。"""
+    procs = [('backend', str(i['port']), i['port'], i) for i in backend_instances()]
+    if not procs:
+        # 未运行时仍列出当前颜色的主实例
+        port = (load_backend_state().get('ports') or [COLOR_PORTS[load_backend_state().get('color', 'blue')]])[0]
+        procs.append(('backend', str(port), port, None))
+    procs.append(('frontend', 'frontend', None, frontend_instance()))
+    return procs
+
+
+def collect(prev_samples=None, include_uploads=True):
+    """采集一次快照。prev_samples 为上一次 /proc 采样（用于计算 CPU%）。"""
+    prev_samples = prev_samples or {}
+    samples = {}
+    processes = []
+    state = load_backend_state()
+    color = state.get('color', 'blue')
+    active = state.get('ports') or backend_ports(1, COLOR_PORTS[color])
+    for service, label, port, inst in list_processes():
+        pid = inst['pid'] if inst else None
+        running = bool(pid) and inst['state'] == 'running'
+        item = {'service': service, 'instance': label, 'pid': int(pid) if pid else None,
+                'running': running, 'state': inst['state'] if inst else 'stopped',
+                'restarts': inst['restarts'] if inst else None,
+                'log': inst['log'] if inst else (FRONT_LOG if service == 'frontend' else None)}
+        if running:
+            cur = read_proc(pid)
+            if cur:
+                samples[pid] = cur
+                item.update({k: v for k, v in cur.items() if k not in ('cpu_seconds', 'sampled_at')})
+                item['cpu_seconds_total'] = cur['cpu_seconds']
+                item['cpu_percent'] = cpu_percent(prev_samples.get(pid), cur)
+        if port is not None:
+            item['port'] = port
+            item['color'] = port_color(port)
+            item['active'] = port in active
+            item['ping_seconds'] = ping(port) if running else None
+        processes.append(item)
+    storage = {
+        'db_bytes': file_size(DB_PATH),
+        'db_wal_bytes': file_size(DB_PATH + '-wal'),
+        'db_shm_bytes': file_size(DB_PATH + '-shm'),
+    }
+    if include_uploads:
+        storage['uploads_bytes'], storage['uploads_files'] = dir_usage(UPLOAD_DIR)
+    return {'time': time.time(), 'backend_color': color, 'processes': processes, 'storage': storage}, samples
+
+
+def sample_with_cpu(interval=0.5, include_uploads=True):
+    """一次性输出时先采样一次，间隔 interval 后再采样，以得到 CPU%。"""
+    _, first = collect(include_uploads=False)
+    time.sleep(interval)
+    snapshot, _ = collect(first, include_uploads=include_uploads)
+    return snapshot
+
+
+def _fmt_bytes(n):
+    if n is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if n < 1024 or unit == 'TB':
+            return f"{n:.0f}{unit}" if unit == 'B' else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+def _fmt_duration(sec):
+    if sec is None:
+        return '-'
+    sec = int(sec)
+    d, rem = divmod(sec, 86400)
+    h, rem = divmod(rem, 3600)
+    m, s = divmod(rem, 60)
+    return f"{d}d{h:02d}h" if d else (f"{h}h{m:02d}m" if h else f"{m}m{s:02d}s")
+
+
+def _fmt(v, spec):
+    return '-' if v is None else format(v, spec)
+
+
+STATE_SHORT = {'running': '运行', 'backoff': '重启中', 'fatal': '崩溃', 'stopped': '停止'}
+
+
+def render_table(snapshot):
+    lines = [f"{'实例':<10} {'PID':>7} {'状态':<4} {'CPU%':>6} {'RSS':>9} {'线程':>4} {'FD':>5} {'运行时长':>8} {'ping':>8} {'重启':>4}"]
+    for p in snapshot['processes']:
+        ping_ms = p.get('ping_seconds')
+        label = p['instance'] + ('*' if p.get('active') else '')
+        lines.append(
+            f"{label:<10} {_fmt(p['pid'], 'd'):>7} {STATE_SHORT.get(p['state'], p['state']):<4} "
+            f"{_fmt(p.get('cpu_percent'), '.1f'):>6} {_fmt_bytes(p.get('rss_bytes')):>9} "
+            f"{_fmt(p.get('threads'), 'd'):>4} {_fmt(p.get('open_fds'), 'd'):>5} "
+            f"{_fmt_duration(p.get('uptime_seconds')):>8} "
+            f"{(f'{ping_ms * 1000:.1f}ms' if ping_ms is not None else '-'):>8} "
+            f"{_fmt(p.get('restarts'), 'd'):>4}"
+        )
+    lines.append(f"后端颜色 {snapshot['backend_color']}（* 为 Nginx 当前指向的实例）")
+    st = snapshot['storage']
+    line = (f"数据库 {_fmt_bytes(st['db_bytes'])}（WAL {_fmt_bytes(st['db_wal_bytes'])}，"
+            f"SHM {_fmt_bytes(st['db_shm_bytes'])}）")
+    if 'uploads_bytes' in st:
+        line += f"；uploads {_fmt_bytes(st['uploads_bytes'])} / {st['uploads_files']} 个文件"
+    lines.append(line)
+    return '\n'.join(lines)
+
+
+def _prom_labels(p):
+    return f'service="{p["service"]}",instance="{p["instance"]}"'
+
+
+def render_prometheus(snapshot):
+    metrics = [
+        ('handv_process_up', 'gauge', '进程是否运行（1/0）', lambda p: 1 if p['running'] else 0),
+        ('handv_process_cpu_seconds_total', 'counter', '累计 CPU 时间（秒）', lambda p: p.get('cpu_seconds_total')),
+        ('handv_process_cpu_percent', 'gauge', '采样间隔内 CPU 占用（%）', lambda p: p.get('cpu_percent')),
+        ('handv_process_resident_memory_bytes', 'gauge', '常驻内存（字节）', lambda p: p.get('rss_bytes')),
+        ('handv_process_threads', 'gauge', '线程数', lambda p: p.get('threads')),
+        ('handv_process_open_fds', 'gauge', '打开的文件描述符数', lambda p: p.get('open_fds')),
+        ('handv_process_uptime_seconds', 'gauge', '进程运行时长（秒）', lambda p: p.get('uptime_seconds')),
+        ('handv_api_ping_seconds', 'gauge', '/api/ping 往返耗时（秒）', lambda p: p.get('ping_seconds')),
+        ('handv_process_restarts_total', 'counter', 'supervisor 自动重启次数', lambda p: p.get('restarts')),
+        ('handv_backend_active', 'gauge', '是否为 Nginx 当前指向的后端实例（1/0）',
+         lambda p: (1 if p['active'] else 0) if 'active' in p else None),
+    ]
+    out = []
+    for name, kind, help_text, getter in metrics:
+        out.append(f'# HELP {name} {help_text}')
+        out.append(f'# TYPE {name} {kind}')
+        for p in snapshot['processes']:
+            v = getter(p)
+            if v is not None:
+                out.append(f'{name}{{{_prom_labels(p)}}} {v:g}' if isinstance(v, float) else f'{name}{{{_prom_labels(p)}}} {v}')
+    st = snapshot['storage']
+    storage_metrics = [
+        ('handv_db_bytes', '数据库文件大小（字节）', st['db_bytes'], 'file="app.db"'),
+        ('handv_db_bytes', None, st['db_wal_bytes'], 'file="app.db-wal"'),
+        ('handv_db_bytes', None, st['db_shm_bytes'], 'file="app.db-shm"'),
+        ('handv_uploads_bytes', '上传目录总大小（字节）', st.get('uploads_bytes'), ''),
+        ('handv_uploads_files', '上传文件数', st.get('uploads_files'), ''),
+    ]
+    for name, help_text, value, labels in storage_metrics:
+        if value is None:
+            continue
+        if help_text:
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} gauge')
+        out.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+    return '\n'.join(out) + '\n'
+
+
+def write_atomic(path, text):
+    # textfile collector 要求原子替换，避免采集到半写文件
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def watch(interval, include_uploads):
+    prev = None
+    last_uploads = None
+    last_uploads_at = 0.0
+    while True:
+        # uploads 目录遍历较重，最多每 30 秒统计一次
+        scan = include_uploads and time.monotonic() - last_uploads_at >= 30
+        snapshot, prev = collect(prev, include_uploads=scan)
+        if scan:
+            last_uploads = (snapshot['storage']['uploads_bytes'], snapshot['storage']['uploads_files'])
+            last_uploads_at = time.monotonic()
+        elif last_uploads:
+            snapshot['storage']['uploads_bytes'], snapshot['storage']['uploads_files'] = last_uploads
+        sys.stdout.write('\033[H\033[2J')
+        print(f"运行状态（每 {interval:g}s 刷新，Ctrl+C 退出） {time.strftime('%Y-%m-%d %H:%M:%S')}")
+        print(render_table(snapshot))
+        sys.stdout.flush()
+        time.sleep(interval)
 
 
 def main():
+    parser = argparse.ArgumentParser(description='查看后端/前端运行状态与资源占用。')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--watch', action='store_true', help='持续刷新的资源表格')
+    mode.add_argument('--json', action='store_true', help='输出 JSON 快照')
+    mode.add_argument('--prometheus', action='store_true', help='输出 Prometheus 文本格式')
+    parser.add_argument('-i', '--interval', type=float, default=2.0, help='--watch 刷新间隔（秒，默认 2）')
+    parser.add_argument('--output', help='--prometheus 时写入该文件（原子替换），供 node_exporter textfile collector 采集')
+    parser.add_argument('--no-uploads', action='store_true', help='不统计 uploads 目录大小（目录很大时可加快速度）')
+    args = parser.parse_args()
     os.chdir(ROOT)
-    spid = read_pid(SERVER_PID)
-    fpid = read_pid(FRONT_PID)
+    include_uploads = not args.no_uploads
+
+    if args.watch:
+        try:
+            watch(max(0.2, args.interval), include_uploads)
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.json:
+        print(json.dumps(sample_with_cpu(include_uploads=include_uploads), ensure_ascii=False, indent=2))
+        return
+    if args.prometheus:
+        text = render_prometheus(sample_with_cpu(include_uploads=include_uploads))
+        if args.output:
+            write_atomic(args.output, text)
+        else:
+            sys.stdout.write(text)
+        return
+
     print('运行状态：')
-    if spid:
-        print(f"- 后端：PID={spid}，{'运行中' if is_running(spid) else '未运行'}，日志={SERVER_LOG}")
-    else:
-        print("- 后端：未运行（无 PID 文件）")
-    if fpid:
-        print(f"- 前端：PID={fpid}，{'运行中' if is_running(fpid) else '未运行'}，日志={FRONT_LOG}")
-    else:
-        print("- 前端：未运行（无 PID 文件）")
+    print_backend_status()
+    print_frontend_status()
+    print()
+    print(render_table(sample_with_cpu(include_uploads=include_uploads)))
 
 
 if __name__ == '__main__':
@@ -38,4 +354,4 @@ if __name__ == '__main__':
         main()
     except Exception as e:
         print(f"状态查询失败：{e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
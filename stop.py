@@ -3,11 +3,7 @@ import os
 import sys
 
 try:
-    from deploy import (
-        kill_pidfile,
-        SERVER_PID,
-        FRONT_PID,
-    )
+    from deploy import stop_all
 except Exception as e:
     print(f"无法导入 deploy.py：{e}", file=sys.stderr)
     sys.exit(1)
@@ -17,9 +13,8 @@ ROOT = os.path.dirname(os.path.abspath(__file__))
 
 def main():
     os.chdir(ROOT)
-    kill_pidfile(SERVER_PID, '后端')
-    kill_pidfile(FRONT_PID, '前端')
-    print('已尝试停止：后端与前端（如仍在运行，请检查日志或手动结束进程）。')
+    stop_all()
+    print('已停止：全部后端实例、前端与 supervisor 守护进程（如仍在运行，请检查日志或手动结束进程）。')
 
 
 if __name__ == '__main__':
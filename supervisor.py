@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+进程守护（替代 nohup + PID 文件）。
+
+- 常驻 asyncio 进程，托管后端（backend:<端口>）与前端（frontend）子进程；子进程输出经 logs.py pipe 写入各自日志。
+  首次启动时轮转旧日志，意外退出后的重启接着写入同一文件（崩溃前后的输出在一起，也不会挤掉保留的分段）
+- 子进程意外退出后按指数退避重启（1s、2s、4s…，最长 60s；持续运行 30s 以上视为恢复，退避清零）；
+  60s 内退出 5 次判定为崩溃循环，停止重启并标记 fatal，需排查日志后重新 start
+- 进程身份以 /proc/<pid>/stat 的启动时间 + /proc/<pid>/cmdline 校验，不会因 PID 复用把无关进程当成服务，
+  也不会向其发送信号
+- 本地控制套接字 .supervisor.sock（仅属主可访问，JSON 行协议）：deploy.py / start.py / stop.py / status.py
+  通过它启动、停止与查询服务
+- 服务以调用方（deploy.py 等）的完整环境变量启动，与原先 nohup 继承环境一致
+- 服务清单（含环境变量，文件权限 0600）与 PID 记录在 .supervisor.json：守护进程被 SIGTERM 结束
+  （如 systemd 停止、重启主机）后再次运行时，仍在运行的子进程按身份接管，其余重新启动；
+  shutdown 命令会停止全部服务并清空清单
+
+用法：
+  python3 supervisor.py start                  # 后台启动守护进程（deploy.py 会按需自动启动）
+  python3 supervisor.py run                    # 前台运行（供 systemd 等使用）
+  python3 supervisor.py status [--json]        # 列出托管的服务
+  python3 supervisor.py restart frontend       # 重启某个服务
+  python3 supervisor.py stop backend:6666      # 停止并移除某个服务
+  python3 supervisor.py shutdown               # 停止全部服务并退出守护进程
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.path.join(ROOT, '.supervisor.sock')
+STATE_FILE = os.path.join(ROOT, '.supervisor.json')
+SUPERVISOR_LOG = os.path.join(ROOT, 'supervisor.log')
+LOG_PIPE = os.path.join(ROOT, 'logs.py')
+# 重启退避：BACKOFF_BASE * 2^(连续失败次数-1)，上限 BACKOFF_MAX；运行超过 STABLE_AFTER 秒后退出不计入连续失败
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+STABLE_AFTER = 30.0
+# 崩溃循环：CRASH_LOOP_WINDOW 秒内退出 CRASH_LOOP_COUNT 次
+CRASH_LOOP_COUNT = 5
+CRASH_LOOP_WINDOW = 60.0
+# 停止服务时 SIGTERM 后等待退出的秒数（后端处理完进行中的请求），超时发送 SIGKILL
+STOP_TIMEOUT = 35.0
+# 接管的（非本进程启动的）子进程无法 wait，按此间隔轮询身份
+ADOPT_POLL = 1.0
+START_TIMEOUT = 5.0
+
+
+class SupervisorError(Exception):
+    """守护进程不可用或拒绝请求。"""
+
+
+# ---------- 进程身份 ----------
+
+def proc_identity(pid):
+    """返回 {'start': 启动时间(时钟滴答), 'cmdline': [...]}；进程不存在或非 Linux 时返回 None。"""
+    try:
+        with open(f'/proc/{int(pid)}/stat') as f:
+            stat = f.read()
+        with open(f'/proc/{int(pid)}/cmdline', 'rb') as f:
+            cmdline = [a.decode('utf-8', 'replace') for a in f.read().split(b'\0') if a]
+        # comm 字段可能含空格，以最后一个 ')' 之后的字段为准；第 22 个字段为启动时间
+        fields = stat[stat.rindex(')') + 2:].split()
+        if fields[0] == 'Z':
+            return None  # 僵尸进程：已退出，只是尚未被回收
+        return {'start': int(fields[19]), 'cmdline': cmdline}
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def same_process(pid, identity):
+    """pid 仍是记录时的那个进程（启动时间与命令行一致）。"""
+    return bool(pid and identity) and proc_identity(pid) == identity
+
+
+# ---------- 守护进程 ----------
+
+class Service:
+    def __init__(self, name, argv, log, env=None, cwd=ROOT):
+        self.name = name
+        self.argv = list(argv)
+        self.log = log
+        self.env = dict(env or {})
+        self.cwd = cwd
+        self.state = 'stopped'
+        self.pid = None
+        self.identity = None
+        self.proc = None
+        self.started_at = None
+        self.started_mono = None
+        self.restarts = 0
+        self.failures = 0
+        self.exits = collections.deque(maxlen=CRASH_LOOP_COUNT)
+        self.last_exit = None
+        self.stopping = False
+        self.task = None
+
+    def spec(self):
+        return {'argv': self.argv, 'log': self.log, 'env': self.env, 'cwd': self.cwd}
+
+    def info(self):
+        alive = self.state == 'running' and same_process(self.pid, self.identity)
+        return {
+            'name': self.name,
+            'state': self.state,
+            'pid': self.pid if alive else None,
+            'uptime': round(time.monotonic() - self.started_mono, 1) if alive and self.started_mono else None,
+            'started': self.started_at if alive else None,
+            'restarts': self.restarts,
+            'last_exit': self.last_exit,
+            'argv': self.argv,
+            'log': self.log,
+        }
+
+
+class Supervisor:
+    def __init__(self, socket_path=SOCKET_PATH, state_file=STATE_FILE):
+        self.socket_path = socket_path
+        self.state_file = state_file
+        self.services = {}
+        self.started = time.monotonic()
+        self.done = asyncio.Event()
+        self.clear_state = False
+
+    def log(self, msg):
+        print(f"[supervisor] {msg}", flush=True)
+
+    # ----- 状态持久化 -----
+
+    def save(self):
+        data = {name: {**s.spec(), 'pid': s.pid, 'identity': s.identity} for name, s in self.services.items()}
+        tmp = f'{self.state_file}.tmp'
+        try:
+            with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.state_file)
+        except OSError as e:
+            self.log(f"写入 {self.state_file} 失败：{e}")
+
+    def load(self):
+        try:
+            with open(self.state_file) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, spec in (data if isinstance(data, dict) else {}).items():
+            try:
+                svc = Service(name, spec['argv'], spec['log'], spec.get('env'), spec.get('cwd') or ROOT)
+            except (KeyError, TypeError):
+                continue
+            self.services[name] = svc
+            if same_process(spec.get('pid'), spec.get('identity')):
+                self.log(f"{name}：接管仍在运行的进程 PID={spec['pid']}")
+                svc.pid, svc.identity = spec['pid'], spec['identity']
+                svc.state, svc.started_at, svc.started_mono = 'running', None, time.monotonic()
+                svc.task = asyncio.create_task(self.supervise(svc, adopted=True))
+            else:
+                svc.task = asyncio.create_task(self.supervise(svc))
+
+    # ----- 子进程 -----
+
+    async def spawn(self, svc, append=False):
+        """启动子进程，输出经 logs.py pipe 写入日志（append 时不轮转旧日志）；子进程自成会话，便于整组发送信号。"""
+        os.makedirs(os.path.dirname(os.path.abspath(svc.log)), exist_ok=True)
+        r, w = os.pipe()
+        try:
+            logger = await asyncio.create_subprocess_exec(
+                sys.executable, LOG_PIPE, 'pipe', svc.log, *(['--append'] if append else []), cwd=ROOT, stdin=r,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+            os.close(r)
+            r = None
+            try:
+                svc.proc = await asyncio.create_subprocess_exec(
+                    *svc.argv, cwd=svc.cwd, env=svc.env or None, stdin=subprocess.DEVNULL,
+                    stdout=w, stderr=subprocess.STDOUT, start_new_session=True)
+            except OSError:
+                os.close(w)
+                w = None
+                await logger.wait()
+                raise
+        finally:
+            for fd in (r, w):
+                if fd is not None:
+                    os.close(fd)
+        # 管道写端只由子进程持有：子进程退出后 logs.py 读到 EOF 随之退出
+        asyncio.create_task(logger.wait())
+        svc.pid = svc.proc.pid
+        svc.identity = proc_identity(svc.pid)
+        svc.started_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        svc.started_mono = time.monotonic()
+        svc.state = 'running'
+        self.save()
+        self.log(f"{svc.name}：已启动 PID={svc.pid}：{' '.join(svc.argv)}")
+
+    async def wait_exit(self, svc, adopted):
+        if not adopted:
+            return await svc.proc.wait()
+        while same_process(svc.pid, svc.identity):
+            await asyncio.sleep(ADOPT_POLL)
+        return None  # 非本进程的子进程，拿不到退出码
+
+    async def supervise(self, svc, adopted=False):
+        """运行并看护一个服务，直到被要求停止或判定为崩溃循环。"""
+        # 只有首次启动轮转旧日志；重启（含接管的进程退出后）接着写入
+        append = adopted
+        while True:
+            if not adopted:
+                try:
+                    await self.spawn(svc, append)
+                except OSError as e:
+                    self.log(f"{svc.name}：启动失败：{e}")
+                    code, uptime = None, 0.0
+                else:
+                    append = True
+                    code = await self.wait_exit(svc, False)
+                    uptime = time.monotonic() - svc.started_mono
+            else:
+                code = await self.wait_exit(svc, True)
+                uptime = time.monotonic() - svc.started_mono
+                adopted = False
+            svc.proc = None
+            if svc.stopping:
+                svc.state = 'stopped'
+                return
+            now = time.monotonic()
+            svc.last_exit = {'code': code, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'uptime': round(uptime, 1)}
+            svc.exits.append(now)
+            svc.failures = 1 if uptime >= STABLE_AFTER else svc.failures + 1
+            if len(svc.exits) == CRASH_LOOP_COUNT and now - svc.exits[0] <= CRASH_LOOP_WINDOW:
+                svc.state = 'fatal'
+                svc.pid = svc.identity = None
+                self.save()
+                self.log(f"{svc.name}：{CRASH_LOOP_WINDOW:.0f}s 内退出 {CRASH_LOOP_COUNT} 次，判定为崩溃循环，停止重启；"
+                         f"请检查 {svc.log} 后执行 supervisor.py restart {svc.name}")
+                return
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (svc.failures - 1))
+            svc.state = 'backoff'
+            self.log(f"{svc.name}：进程退出（code={code}，运行 {uptime:.1f}s），{delay:.0f}s 后重启")
+            await asyncio.sleep(delay)
+            svc.restarts += 1
+
+    def signal(self, svc, sig):
+        """校验身份后向服务的进程组发送信号。"""
+        if not same_process(svc.pid, svc.identity):
+            return False
+        try:
+            if os.getpgid(svc.pid) == svc.pid:
+                os.killpg(svc.pid, sig)
+            else:
+                os.kill(svc.pid, sig)
+            return True
+        except OSError:
+            return False
+
+    async def stop_service(self, svc, timeout=STOP_TIMEOUT):
+        svc.stopping = True
+        task = svc.task
+        if task is None or task.done():
+            svc.state = 'stopped'
+            return
+        if svc.state != 'running':
+            task.cancel()  # 退避等待中：直接取消
+        else:
+            self.log(f"{svc.name}：停止 PID={svc.pid}")
+            self.signal(svc, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self.log(f"{svc.name}：{timeout:.0f}s 内未退出，发送 SIGKILL")
+            self.signal(svc, signal.SIGKILL)
+            try:
+                await asyncio.wait_for(asyncio.shield(task), 5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+        except asyncio.CancelledError:
+            pass
+        svc.state = 'stopped'
+
+    # ----- 控制命令 -----
+
+    async def cmd_ping(self, req):
+        return {'pid': os.getpid(), 'uptime': round(time.monotonic() - self.started, 1)}
+
+    async def cmd_status(self, req):
+        return {'services': {name: s.info() for name, s in sorted(self.services.items())}}
+
+    async def cmd_start(self, req):
+        name = req.get('name')
+        if not name or not req.get('argv') or not req.get('log'):
+            raise SupervisorError('start 需要 name、argv 与 log')
+        svc = self.services.get(name)
+        if svc and svc.state == 'running' and svc.task and not svc.task.done():
+            return {'service': svc.info(), 'already': True}
+        if svc and svc.task and not svc.task.done():
+            await self.stop_service(svc)
+        svc = Service(name, req['argv'], req['log'], req.get('env'), req.get('cwd') or ROOT)
+        self.services[name] = svc
+        svc.task = asyncio.create_task(self.supervise(svc))
+        # 等到首次启动完成再返回，调用方随即拿到 PID
+        while svc.state == 'stopped' and not svc.task.done():
+            await asyncio.sleep(0.01)
+        return {'service': svc.info(), 'already': False}
+
+    async def cmd_stop(self, req):
+        names = req.get('names') or ([req['name']] if req.get('name') else [])
+        missing = [n for n in names if n not in self.services]
+        if missing:
+            raise SupervisorError(f"未托管的服务：{', '.join(missing)}")
+        grace = float(req.get('grace') or STOP_TIMEOUT)
+        await asyncio.gather(*(self.stop_service(self.services[n], grace) for n in names))
+        for n in names:
+            self.services.pop(n, None)
+        self.save()
+        return {'stopped': names}
+
+    async def cmd_restart(self, req):
+        svc = self.services.get(req.get('name'))
+        if not svc:
+            raise SupervisorError(f"未托管的服务：{req.get('name')}")
+        await self.stop_service(svc, float(req.get('grace') or STOP_TIMEOUT))
+        return await self.cmd_start({'name': svc.name, **svc.spec()})
+
+    async def cmd_shutdown(self, req):
+        self.clear_state = True
+        self.done.set()
+        return {}
+
+    async def handle(self, reader, writer):
+        try:
+            line = await reader.readline()
+            try:
+                req = json.loads(line)
+                handler = getattr(self, f"cmd_{req.get('cmd')}", None)
+                if handler is None:
+                    raise SupervisorError(f"未知命令：{req.get('cmd')}")
+                resp = {'ok': True, **await handler(req)}
+            except (ValueError, SupervisorError) as e:
+                resp = {'ok': False, 'error': str(e)}
+            writer.write(json.dumps(resp, ensure_ascii=False).encode() + b'\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        if ping():
+            raise SupervisorError(f"守护进程已在运行（{self.socket_path}）")
+        try:
+            os.unlink(self.socket_path)  # 上次异常退出留下的套接字文件
+        except FileNotFoundError:
+            pass
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle, path=self.socket_path, limit=1 << 20)
+        finally:
+            os.umask(old_umask)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.done.set)
+        self.log(f"已启动 PID={os.getpid()}，控制套接字 {self.socket_path}")
+        self.load()
+        try:
+            await self.done.wait()
+        finally:
+            server.close()
+            await asyncio.gather(*(self.stop_service(s) for s in self.services.values()))
+            # shutdown 命令：清空清单；收到 SIGTERM（systemd 停止、关机）：保留清单，下次运行时重新拉起
+            if self.clear_state:
+                self.services.clear()
+            self.save()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+            self.log('已退出')
+
+
+# ---------- 客户端 ----------
+
+def call(cmd, timeout=10.0, **payload):
+    """向守护进程发送一条命令并返回响应；不可用或请求失败时抛出 SupervisorError。"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(SOCKET_PATH)
+            s.sendall(json.dumps({'cmd': cmd, **payload}, ensure_ascii=False).encode() + b'\n')
+            buf = b''
+            while not buf.endswith(b'\n'):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+    except (OSError, socket.timeout) as e:
+        raise SupervisorError(f"无法连接守护进程（{SOCKET_PATH}）：{e}")
+    try:
+        resp = json.loads(buf)
+    except ValueError:
+        raise SupervisorError('守护进程响应无效')
+    if not resp.get('ok'):
+        raise SupervisorError(resp.get('error') or '请求失败')
+    return resp
+
+
+def ping():
+    try:
+        return call('ping', timeout=2.0)
+    except SupervisorError:
+        return None
+
+
+def services():
+    """托管的服务 {name: info}；守护进程未运行时返回空字典。"""
+    try:
+        return call('status')['services']
+    except SupervisorError:
+        return {}
+
+
+def ensure_running(timeout=START_TIMEOUT):
+    """守护进程未运行时在后台启动（新会话，输出经 logs.py pipe 写入 supervisor.log），并等待控制套接字可用。"""
+    if ping():
+        return False
+    r, w = os.pipe()
+    try:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'run'], cwd=ROOT, stdin=subprocess.DEVNULL,
+                                stdout=w, stderr=subprocess.STDOUT, start_new_session=True)
+        subprocess.Popen([sys.executable, LOG_PIPE, 'pipe', SUPERVISOR_LOG], cwd=ROOT, stdin=r,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    finally:
+        os.close(r)
+        os.close(w)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if ping():
+            print(f"守护进程已启动，PID={proc.pid}，日志：{SUPERVISOR_LOG}")
+            return True
+        if proc.poll() is not None:
+            break
+        time.sleep(0.05)
+    raise SupervisorError(f"守护进程启动失败，请查看 {SUPERVISOR_LOG}")
+
+
+def _fmt_uptime(sec):
+    if sec is None:
+        return '-'
+    sec = int(sec)
+    h, rem = divmod(sec, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h{m:02d}m" if h else f"{m}m{s:02d}s"
+
+
+def print_services(items):
+    if not items:
+        print('[supervisor] 没有托管的服务')
+        return
+    print(f"{'服务':<16} {'状态':<8} {'PID':>7} {'运行时长':>8} {'重启':>4}  最近退出")
+    for name, s in items.items():
+        last = s.get('last_exit')
+        last_desc = f"code={last['code']}，运行 {last['uptime']}s，{last['time']}" if last else '-'
+        print(f"{name:<16} {s['state']:<8} {s['pid'] or '-':>7} {_fmt_uptime(s['uptime']):>8} {s['restarts']:>4}  {last_desc}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端/前端进程守护：崩溃自动重启、崩溃循环检测与本地控制套接字。')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('run', help='前台运行守护进程')
+    sub.add_parser('start', help='后台启动守护进程')
+    p_status = sub.add_parser('status', help='列出托管的服务')
+    p_status.add_argument('--json', action='store_true', help='输出 JSON')
+    p_restart = sub.add_parser('restart', help='重启服务（崩溃循环后恢复也用它）')
+    p_restart.add_argument('name')
+    p_stop = sub.add_parser('stop', help='停止并移除服务')
+    p_stop.add_argument('name', nargs='+')
+    sub.add_parser('shutdown', help='停止全部服务并退出守护进程')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        asyncio.run(Supervisor().run())
+    elif args.command == 'start':
+        if not ensure_running():
+            print(f"[supervisor] 已在运行，PID={ping()['pid']}")
+    elif args.command == 'status':
+        info = ping()
+        items = services() if info else {}
+        if args.json:
+            print(json.dumps({'supervisor': info, 'services': items}, ensure_ascii=False, indent=2))
+            return
+        if not info:
+            print('[supervisor] 守护进程未运行')
+            return
+        print(f"[supervisor] PID={info['pid']}，已运行 {_fmt_uptime(info['uptime'])}")
+        print_services(items)
+    elif args.command == 'restart':
+        s = call('restart', timeout=STOP_TIMEOUT + 15, name=args.name)['service']
+        print(f"[supervisor] {args.name} 已重启，PID={s['pid']}")
+    elif args.command == 'stop':
+        call('stop', timeout=STOP_TIMEOUT + 15, names=args.name)
+        print(f"[supervisor] 已停止：{', '.join(args.name)}")
+    elif args.command == 'shutdown':
+        if not ping():
+            print('[supervisor] 守护进程未运行')
+            return
+        call('shutdown')
+        deadline = time.monotonic() + STOP_TIMEOUT + 15
+        while ping() and time.monotonic() < deadline:
+            time.sleep(0.2)
+        print('[supervisor] 已停止全部服务并退出')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"守护进程操作失败：{e}", file=sys.stderr)
+        sys.exit(1)